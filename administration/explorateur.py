@@ -0,0 +1,203 @@
+"""Outils de l'explorateur de données (administration/views.py: database_management, model_list_view).
+
+- Comptages: sous PostgreSQL, estimation du planificateur (`pg_class.reltuples`)
+  au-delà de SEUIL_EXACT lignes; ailleurs (SQLite), compteurs en cache rafraîchis
+  en arrière-plan quand ils ont plus de COMPTAGES_TTL secondes, et ajustés par
+  les suppressions faites depuis l'explorateur.
+- Pagination par clé (`pk` décroissante, paramètres `apres`/`avant`): chaque page
+  est une lecture d'index bornée, sans OFFSET ni COUNT(*).
+- Recherche limitée aux colonnes texte indexées (préfixe, sensible à la casse
+  comme l'index) et à la clé primaire.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+SEUIL_EXACT = 10_000  # en dessous, un COUNT(*) exact reste instantané
+TAILLE_PAGE = 25
+LIMITE_RESULTATS = 1000  # au-delà, la recherche affiche « 1000+ »
+TAILLE_LOT_SUPPRESSION = 200
+CLE_RAFRAICHISSEMENT = 'explorateur:rafraichissement'
+
+
+def _cle(model):
+    return f"explorateur:comptage:{model._meta.label_lower}"
+
+
+def _ttl():
+    return getattr(settings, 'COMPTAGES_TTL', 300)
+
+
+def _estimation_postgresql(model, alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+            [connections[alias].ops.quote_name(model._meta.db_table)],
+        )
+        ligne = cursor.fetchone()
+    # -1: table jamais analysée (PostgreSQL 14+)
+    return ligne[0] if ligne and ligne[0] is not None and ligne[0] >= 0 else None
+
+
+def compter_exact(model):
+    nombre = model._base_manager.using(router.db_for_read(model)).count()
+    cache.set(_cle(model), {'nombre': nombre, 'le': time.time()}, None)
+    return nombre
+
+
+def compter_modeles(modeles):
+    """{model: (nombre, estimé)} pour l'explorateur; lance un rafraîchissement des compteurs périmés."""
+    resultat, perimes = {}, []
+    for model in modeles:
+        alias = router.db_for_read(model)
+        if connections[alias].vendor == 'postgresql':
+            estimation = _estimation_postgresql(model, alias)
+            if estimation is not None and estimation >= SEUIL_EXACT:
+                resultat[model] = (estimation, True)
+            else:
+                resultat[model] = (model._base_manager.using(alias).count(), False)
+            continue
+        entree = cache.get(_cle(model))
+        if entree is None:
+            resultat[model] = (compter_exact(model), False)
+            continue
+        if time.time() - entree['le'] > _ttl():
+            perimes.append(model)
+        resultat[model] = (entree['nombre'], True)
+    if perimes:
+        rafraichir_en_arriere_plan(perimes)
+    return resultat
+
+
+def rafraichir(modeles):
+    for model in modeles:
+        compter_exact(model)
+
+
+def rafraichir_en_arriere_plan(modeles):
+    """Recompte `modeles` dans un thread (un seul à la fois); retourne le thread ou None."""
+    if not cache.add(CLE_RAFRAICHISSEMENT, 1, 60):
+        return None
+
+    def _worker():
+        try:
+            rafraichir(modeles)
+        except Exception:
+            logger.exception("Rafraîchissement des comptages de l'explorateur en échec")
+        finally:
+            cache.delete(CLE_RAFRAICHISSEMENT)
+            connections.close_all()
+
+    thread = threading.Thread(target=_worker, daemon=True)
+    thread.start()
+    return thread
+
+
+def ajuster(detail_suppression):
+    """Reporte sur les compteurs en cache le détail renvoyé par `QuerySet.delete()`."""
+    from django.apps import apps
+
+    for label, nombre in detail_suppression.items():
+        cle = _cle(apps.get_model(label))
+        entree = cache.get(cle)
+        if entree is not None:
+            entree['nombre'] = max(0, entree['nombre'] - nombre)
+            cache.set(cle, entree, None)
+
+
+def champs_recherche(model):
+    """Colonnes texte indexées (clé primaire, unique, db_index ou première colonne d'un index)."""
+    premieres = set()
+    for index in model._meta.indexes:
+        if index.fields:
+            premieres.add(index.fields[0].lstrip('-'))
+    for contrainte in model._meta.constraints:
+        if getattr(contrainte, 'fields', None):
+            premieres.add(contrainte.fields[0])
+    for ensemble in model._meta.unique_together:
+        premieres.add(ensemble[0])
+    return [
+        field.name for field in model._meta.fields
+        if field.get_internal_type() in ('CharField', 'SlugField')
+        and (field.primary_key or field.unique or field.db_index or field.name in premieres)
+    ]
+
+
+def filtrer_recherche(queryset, terme):
+    """Filtre `queryset` sur les colonnes de `champs_recherche` (préfixe) et la clé primaire."""
+    model = queryset.model
+    q = Q()
+    for champ in champs_recherche(model):
+        q |= Q(**{f"{champ}__startswith": terme})
+    try:
+        q |= Q(pk=model._meta.pk.to_python(terme))
+    except (ValidationError, ValueError, TypeError):
+        pass
+    return queryset.filter(q) if q else queryset.none()
+
+
+def compter_resultats(queryset, limite=LIMITE_RESULTATS):
+    """(nombre, tronqué): le comptage s'arrête à `limite` lignes."""
+    nombre = queryset.order_by()[:limite + 1].count()
+    return min(nombre, limite), nombre > limite
+
+
+def cle_page(model, valeur):
+    """Valeur de clé primaire lue dans l'URL, ou None si absente ou invalide."""
+    if valeur in (None, ''):
+        return None
+    try:
+        return model._meta.pk.to_python(valeur)
+    except (ValidationError, ValueError, TypeError):
+        return None
+
+
+def page_par_cle(queryset, apres=None, avant=None, taille=TAILLE_PAGE):
+    """Page de `queryset` par clé primaire décroissante.
+
+    Retourne (objets, precedent, suivant): `precedent` et `suivant` sont les valeurs à
+    passer en `avant`/`apres` pour les pages voisines (None en bout de liste).
+    """
+    if avant is not None:
+        objets = list(queryset.filter(pk__gt=avant).order_by('pk')[:taille + 1])
+        if objets:
+            plus = len(objets) > taille
+            objets = objets[:taille][::-1]
+            return objets, (objets[0].pk if plus else None), objets[-1].pk
+        apres = None
+    qs = queryset.order_by('-pk')
+    if apres is not None:
+        qs = qs.filter(pk__lt=apres)
+    objets = list(qs[:taille + 1])
+    suivant = objets[taille - 1].pk if len(objets) > taille else None
+    objets = objets[:taille]
+    precedent = objets[0].pk if apres is not None and objets else None
+    return objets, precedent, suivant
+
+
+def supprimer_par_lots(queryset, ids, taille=TAILLE_LOT_SUPPRESSION, progression=None):
+    """Supprime `ids` de `queryset` par lots, une transaction (et une cascade bornée) par lot.
+
+    `progression(total, detail)` est appelé après chaque lot: en cas d'erreur sur un lot,
+    les lots précédents restent supprimés. Retourne (total, détail par modèle).
+    """
+    total, detail = 0, {}
+    ids = list(ids)
+    for i in range(0, len(ids), taille):
+        with transaction.atomic(using=router.db_for_write(queryset.model)):
+            nombre, par_modele = queryset.filter(pk__in=ids[i:i + taille]).delete()
+        total += nombre
+        for label, n in par_modele.items():
+            detail[label] = detail.get(label, 0) + n
+        ajuster(par_modele)
+        if progression:
+            progression(total, detail)
+    return total, detail
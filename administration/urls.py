@@ -15,6 +15,11 @@ urlpatterns = [
     path('reset/', views.system_reset_dashboard, name='system_reset_dashboard'),
     path('reset/confirm/', views.confirm_system_reset, name='confirm_system_reset'),
     path('backup/', views.backup_before_reset, name='backup_before_reset'),
+
+    # Performance
+    path('profilage-sql/', views.sql_profiler_dashboard, name='sql_profiler_dashboard'),
+    path('profilage/armer/', views.armer_profilage, name='armer_profilage'),
+    path('profilage/<str:nom>/', views.telecharger_profil, name='telecharger_profil'),
     
     # Gestion des retards de paiement
     path('retards-paiement/', views.eleves_retard_paiement, name='eleves_retard_paiement'),
@@ -7,15 +7,18 @@ from django.contrib import messages
 from django.db import transaction, IntegrityError
 from django.db.models.deletion import ProtectedError
 from django.apps import apps
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, Http404, StreamingHttpResponse
 from django.core.paginator import Paginator
 from django.db.models import Q, F, Value, Sum, Case, When, DecimalField, ExpressionWrapper
 from django.db.models.functions import Coalesce, Least, Greatest
 from decimal import Decimal
 from datetime import datetime, timedelta
+from django.conf import settings
 from django.utils import timezone
 import logging
 import json
+from ecole_moderne import request_profiler, sauvegardes
+from . import explorateur
 from ecole_moderne.security_decorators import delete_permission_required
 from utilisateurs.utils import filter_by_user_school
 
@@ -72,7 +75,9 @@ def system_reset_dashboard(request):
     context = {
         'stats': stats,
         'titre_page': 'Réinitialisation Système',
-        'warning_message': 'ATTENTION: Cette opération supprimera DÉFINITIVEMENT toutes les données du système!'
+        'warning_message': 'ATTENTION: Cette opération supprimera DÉFINITIVEMENT toutes les données du système!',
+        'derniere_sauvegarde': sauvegardes.sauvegarde_recente(settings.SAUVEGARDE_RESET_MINUTES),
+        'sauvegarde_reset_minutes': settings.SAUVEGARDE_RESET_MINUTES,
     }
     
     return render(request, 'administration/system_reset.html', context)
@@ -121,6 +126,20 @@ def confirm_system_reset(request):
             'error': 'Mot de passe administrateur incorrect.'
         })
     
+    # Une sauvegarde récente (restaurable avec manage.py restaurer) est exigée: elle n'est pas
+    # produite ici, une sauvegarde complète dépassant la durée d'une requête
+    sauvegarde = sauvegardes.sauvegarde_recente(settings.SAUVEGARDE_RESET_MINUTES)
+    if sauvegarde is None:
+        logger.warning("Réinitialisation refusée: aucune sauvegarde récente")
+        return JsonResponse({
+            'success': False,
+            'error': (
+                f'Aucune sauvegarde de moins de {settings.SAUVEGARDE_RESET_MINUTES} minutes: lancez '
+                '"python manage.py sauvegarder" (ou le bouton de sauvegarde) puis recommencez. '
+                'Aucune donnée supprimée.'
+            )
+        })
+    
     try:
         with transaction.atomic():
             # Log de l'opération AVANT suppression
@@ -248,6 +267,7 @@ def confirm_system_reset(request):
             return JsonResponse({
                 'success': True,
                 'message': 'Système réinitialisé avec succès. Toutes les données ont été supprimées.',
+                'sauvegarde': sauvegarde['nom'],
                 'stats_supprimees': stats_avant,
                 'detail_suppressions': suppressions_effectuees
             })
@@ -262,32 +282,54 @@ def confirm_system_reset(request):
 @login_required
 @user_passes_test(is_super_admin, login_url='/admin/')
 def backup_before_reset(request):
-    """Créer une sauvegarde avant réinitialisation (optionnel)"""
+    """Sauvegarde avant réinitialisation: écrite dans SAUVEGARDES_DIR, ou téléchargée avec ?telecharger=1"""
+    
+    if request.GET.get('telecharger'):
+        debut = timezone.now()
+        response = StreamingHttpResponse(sauvegardes.flux(debut=debut), content_type='application/gzip')
+        response['Content-Disposition'] = (
+            f'attachment; filename="sauvegarde-{timezone.localtime(debut):%Y%m%d-%H%M%S}.ndjson.gz"'
+        )
+        return response
     
     try:
-        # Ici on pourrait implémenter une sauvegarde automatique
-        # Pour l'instant, on retourne juste les statistiques
-        
-        stats = {
-            'timestamp': timezone.now().isoformat(),
-            'eleves': Eleve.objects.count(),
-            'paiements': Paiement.objects.count(),
-            'depenses': Depense.objects.count(),
-            'users': User.objects.count(),
-        }
+        entree = sauvegardes.sauvegarder(incrementale=request.GET.get('incrementale') == '1')
+        logger.info(f"Sauvegarde {entree['nom']} créée par {request.user.username}")
         
         return JsonResponse({
             'success': True,
-            'message': 'Statistiques récupérées pour sauvegarde',
-            'stats': stats
+            'message': f"Sauvegarde {entree['mode']} créée: {entree['nom']}",
+            'sauvegarde': {cle: entree[cle] for cle in ('nom', 'mode', 'debut', 'lignes', 'octets', 'sha256')},
         })
         
     except Exception as e:
+        logger.error(f"Erreur lors de la sauvegarde: {str(e)}")
         return JsonResponse({
             'success': False,
-            'error': f'Erreur lors de la préparation de sauvegarde: {str(e)}'
+            'error': f'Erreur lors de la sauvegarde: {str(e)}'
         })
 
+@login_required
+@user_passes_test(is_super_admin, login_url='/admin/')
+def sql_profiler_dashboard(request):
+    """Statistiques SQL par vue collectées par SQLProfilerMiddleware (processus courant)"""
+    from ecole_moderne.sql_profiler import statistiques
+
+    if request.method == 'POST':
+        statistiques.reinitialiser()
+        messages.success(request, "Statistiques de profilage réinitialisées.")
+        return redirect('administration:sql_profiler_dashboard')
+
+    context = {
+        'titre_page': 'Profilage SQL',
+        'vues': statistiques.resume(),
+        'actif': getattr(settings, 'SQL_PROFILER_ENABLED', False),
+        'taux': getattr(settings, 'SQL_PROFILER_SAMPLE_RATE', 0),
+        'seuil_n1': getattr(settings, 'SQL_PROFILER_N1_THRESHOLD', 0),
+        'seuil_lent_ms': getattr(settings, 'SQL_PROFILER_SLOW_MS', 0),
+    }
+    return render(request, 'administration/sql_profiler.html', context)
+
 @login_required
 @user_passes_test(is_super_admin, login_url='/admin/')
 def database_management(request):
@@ -350,10 +392,13 @@ def database_management(request):
         }
     }
     
-    # Calculer les statistiques pour chaque modèle
+    # Comptages estimés ou en cache (voir explorateur.py): pas de COUNT(*) par table à chaque affichage
+    comptes = explorateur.compter_modeles(
+        [info['model'] for data in models_config.values() for info in data['models']]
+    )
     for category_key, category_data in models_config.items():
         for model_info in category_data['models']:
-            model_info['count'] = model_info['model'].objects.count()
+            model_info['count'], model_info['estime'] = comptes[model_info['model']]
             # Ajouter les métadonnées du modèle pour éviter l'erreur _meta
             model_info['app_label'] = model_info['model']._meta.app_label
             model_info['model_name'] = model_info['model']._meta.model_name
@@ -361,10 +406,45 @@ def database_management(request):
     context = {
         'models_config': models_config,
         'titre_page': 'Administration des Bases de Données',
+        'profils': request_profiler.profils_disponibles()[:50],
+        'cibles_profilage': request_profiler.cibles_armees(),
     }
     
     return render(request, 'administration/database_management.html', context)
 
+@login_required
+@user_passes_test(is_super_admin, login_url='/admin/')
+@require_POST
+@csrf_protect
+def armer_profilage(request):
+    """Arme (ou désarme) le profilage des N prochaines requêtes d'une vue"""
+    vue = (request.POST.get('vue') or '').strip()
+    if not vue:
+        messages.error(request, "Indiquez le nom de la vue (ex: rapports:rapport_mensuel).")
+    elif request.POST.get('action') == 'desarmer':
+        request_profiler.desarmer(vue)
+        messages.success(request, f"Profilage désarmé pour {vue}.")
+    else:
+        try:
+            nombre = max(1, min(int(request.POST.get('nombre') or 5), 100))
+            ttl = max(1, min(int(request.POST.get('ttl') or 30), 24 * 60))
+        except ValueError:
+            messages.error(request, "Nombre de requêtes et durée doivent être des entiers.")
+            return redirect('administration:database_management')
+        mode = request.POST.get('mode') or request_profiler.MODE_PILES
+        request_profiler.armer(vue, nombre, ttl, par=request.user, mode=mode)
+        messages.success(request, f"Les {nombre} prochaines requêtes vers {vue} seront profilées (pendant {ttl} min).")
+    return redirect('administration:database_management')
+
+@login_required
+@user_passes_test(is_super_admin, login_url='/admin/')
+def telecharger_profil(request, nom):
+    """Téléchargement d'un profil (.collapsed ou .prof)"""
+    chemin = request_profiler.chemin_profil(nom)
+    if not chemin:
+        raise Http404("Profil introuvable")
+    return FileResponse(open(chemin, 'rb'), as_attachment=True, filename=nom)
+
 @login_required
 @user_passes_test(is_super_admin, login_url='/admin/')
 def model_list_view(request, app_label, model_name):
@@ -377,31 +457,21 @@ def model_list_view(request, app_label, model_name):
         messages.error(request, f"Modèle {app_label}.{model_name} introuvable.")
         return redirect('administration:database_management')
     
-    # Recherche
-    search_query = request.GET.get('search', '')
+    # Recherche (colonnes indexées seulement)
+    search_query = request.GET.get('search', '').strip()
     queryset = model.objects.all()
-    
+    filtered_count = filtered_truncated = None
     if search_query:
-        # Recherche dans tous les champs texte du modèle
-        search_fields = []
-        for field in model._meta.fields:
-            if field.get_internal_type() in ['CharField', 'TextField']:
-                search_fields.append(f"{field.name}__icontains")
-        
-        if search_fields:
-            q_objects = Q()
-            for field in search_fields:
-                q_objects |= Q(**{field: search_query})
-            queryset = queryset.filter(q_objects)
-    
-    # Pagination avec ordre pour éviter l'avertissement UnorderedObjectListWarning
-    if not queryset.ordered:
-        # Ajouter un ordre par défaut basé sur la clé primaire
-        queryset = queryset.order_by('pk')
-    
-    paginator = Paginator(queryset, 25)  # 25 éléments par page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        queryset = explorateur.filtrer_recherche(queryset, search_query)
+        filtered_count, filtered_truncated = explorateur.compter_resultats(queryset)
+    
+    # Pagination par clé primaire (pas d'OFFSET ni de COUNT(*) complet)
+    page_obj, precedent, suivant = explorateur.page_par_cle(
+        queryset,
+        apres=explorateur.cle_page(model, request.GET.get('apres')),
+        avant=explorateur.cle_page(model, request.GET.get('avant')),
+    )
+    total_count, total_estime = explorateur.compter_modeles([model])[model]
     
     # Récupérer les champs du modèle pour l'affichage
     fields = []
@@ -418,11 +488,16 @@ def model_list_view(request, app_label, model_name):
         'model_name': model_name,
         'app_label': app_label,
         'page_obj': page_obj,
+        'precedent': precedent,
+        'suivant': suivant,
         'fields': fields,
         'search_query': search_query,
+        'search_fields': explorateur.champs_recherche(model),
         'titre_page': f'Liste des {model._meta.verbose_name_plural}',
-        'total_count': model.objects.count(),
-        'filtered_count': queryset.count() if search_query else None,
+        'total_count': total_count,
+        'total_estime': total_estime,
+        'filtered_count': filtered_count,
+        'filtered_truncated': filtered_truncated,
         'verbose_name_plural': model._meta.verbose_name_plural,
         'verbose_name': model._meta.verbose_name,
     }
@@ -491,7 +566,8 @@ def model_delete_view(request, app_label, model_name, object_id):
     
     try:
         obj_str = str(obj)
-        obj.delete()
+        _, detail = obj.delete()
+        explorateur.ajuster(detail)
         
         # Log de l'action
         logger.info(f"Suppression {model._meta.verbose_name}: {obj_str} par {request.user.username}")
@@ -561,6 +637,7 @@ def model_bulk_delete_view(request, app_label, model_name):
             'error': 'Cette action nécessite une requête AJAX.'
         })
     
+    deleted_count = 0
     try:
         # Récupérer les IDs à supprimer
         ids_to_delete = request.POST.getlist('ids[]')
@@ -571,8 +648,12 @@ def model_bulk_delete_view(request, app_label, model_name):
                 'error': 'Aucun élément sélectionné pour la suppression.'
             })
         
-        # Supprimer les objets
-        deleted_count, _ = model.objects.filter(pk__in=ids_to_delete).delete()
+        # Supprimer les objets par lots: une transaction et une cascade bornée par lot
+        def progression(total, detail):
+            nonlocal deleted_count
+            deleted_count = total
+
+        explorateur.supprimer_par_lots(model.objects.all(), ids_to_delete, progression=progression)
         
         # Log de l'action
         logger.info(f"Suppression en masse {model._meta.verbose_name_plural}: {deleted_count} éléments par {request.user.username}")
@@ -596,6 +677,7 @@ def model_bulk_delete_view(request, app_label, model_name):
                 "Suppression en masse impossible: certains éléments sont référencés par d'autres données protégées"
                 + (f" (≈{nb_blocking} dépendances)" if nb_blocking else '')
                 + ". Supprimez/retirez d'abord les éléments liés."
+                + (f" {deleted_count} élément(s) des lots précédents ont été supprimés." if deleted_count else '')
             )
         })
     except IntegrityError as e:
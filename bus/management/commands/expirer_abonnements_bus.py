@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bus.models import AbonnementBus
+
+
+class Command(BaseCommand):
+    help = "Passe au statut EXPIRE les abonnements bus actifs dont la date d'expiration est dépassée (à lancer chaque nuit)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Ne pas écrire en base, seulement compter")
+        parser.add_argument('--ecole-id', type=int, help='Limiter à une école (via eleve.classe.ecole_id)')
+
+    def handle(self, *args, **options):
+        dry_run = bool(options.get('dry_run'))
+        ecole_id = options.get('ecole_id')
+        today = timezone.localdate()
+
+        qs = AbonnementBus.objects.filter(AbonnementBus.q_expire(today), statut=AbonnementBus.Statut.ACTIF)
+        if ecole_id:
+            qs = qs.filter(eleve__classe__ecole_id=ecole_id)
+
+        if dry_run:
+            self.stdout.write(self.style.NOTICE(f"[DRY] Abonnements à expirer: {qs.count()}"))
+            return
+
+        # Un seul UPDATE ; update() ne déclenche pas auto_now, on renseigne updated_at explicitement
+        nb = qs.update(statut=AbonnementBus.Statut.EXPIRE, updated_at=timezone.now())
+        self.stdout.write(self.style.SUCCESS(f"Abonnements passés à EXPIRE: {nb}"))
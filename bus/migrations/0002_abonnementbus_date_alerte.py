@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:47
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def remplir_date_alerte(apps, schema_editor):
+    AbonnementBus = apps.get_model('bus', 'AbonnementBus')
+    batch = []
+    for abo in AbonnementBus.objects.only('id', 'date_expiration', 'alerte_avant_jours').iterator(chunk_size=2000):
+        if abo.date_expiration:
+            abo.date_alerte = abo.date_expiration - timedelta(days=abo.alerte_avant_jours or 7)
+            batch.append(abo)
+        if len(batch) >= 2000:
+            AbonnementBus.objects.bulk_update(batch, ['date_alerte'])
+            batch = []
+    if batch:
+        AbonnementBus.objects.bulk_update(batch, ['date_alerte'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus', '0001_initial'),
+        ('eleves', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='abonnementbus',
+            name='date_alerte',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='abonnementbus',
+            index=models.Index(fields=['date_alerte', 'date_expiration'], name='bus_abonnem_date_al_b4d740_idx'),
+        ),
+        migrations.RunPython(remplir_date_alerte, migrations.RunPython.noop),
+    ]
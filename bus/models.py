@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.db import models
 from django.utils import timezone
 from eleves.models import Eleve
@@ -26,6 +28,9 @@ class AbonnementBus(models.Model):
     # Alertes / relances
     alerte_avant_jours = models.PositiveIntegerField(default=7)
     derniere_relance = models.DateTimeField(null=True, blank=True)
+    # Date à partir de laquelle l'abonnement entre dans la fenêtre d'alerte
+    # (date_expiration - alerte_avant_jours), maintenue dans save() pour filtrer en base
+    date_alerte = models.DateField(null=True, blank=True, editable=False)
 
     # Infos logistiques
     zone = models.CharField(max_length=100, blank=True)
@@ -48,11 +53,37 @@ class AbonnementBus(models.Model):
             models.Index(fields=['eleve', 'statut']),
             models.Index(fields=['eleve', 'date_expiration']),
             models.Index(fields=['statut', 'date_expiration']),
+            models.Index(fields=['date_alerte', 'date_expiration']),
         ]
 
     def __str__(self):
         return f"Bus: {self.eleve} ({self.get_periodicite_display()})"
 
+    @staticmethod
+    def calculer_date_alerte(date_expiration, alerte_avant_jours):
+        if not date_expiration:
+            return None
+        return date_expiration - timedelta(days=alerte_avant_jours or 7)
+
+    def save(self, *args, **kwargs):
+        self.date_alerte = self.calculer_date_alerte(self.date_expiration, self.alerte_avant_jours)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'date_expiration', 'alerte_avant_jours'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'date_alerte'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def q_proche_expiration(cls, today=None):
+        """Filtre équivalent à est_proche_expiration, exécutable en base."""
+        today = today or timezone.localdate()
+        return models.Q(date_alerte__lte=today, date_expiration__gte=today)
+
+    @classmethod
+    def q_expire(cls, today=None):
+        """Filtre équivalent à est_expire, exécutable en base."""
+        today = today or timezone.localdate()
+        return models.Q(date_expiration__lt=today)
+
     @property
     def est_proche_expiration(self) -> bool:
         if not self.date_expiration:
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from bus.models import AbonnementBus
+from eleves.models import Ecole, Classe, Eleve, Responsable
+
+
+class AbonnementBusDateAlerteTests(TestCase):
+    def setUp(self):
+        ecole = Ecole.objects.create(nom="Ecole A", adresse="Adresse A", telephone="+224620000001", directeur="Dir A")
+        classe = Classe.objects.create(nom="C1", ecole=ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        resp = Responsable.objects.create(prenom="P1", nom="R1", relation="PERE", telephone="+224620000011", adresse="Adr1")
+        self.eleve = Eleve.objects.create(
+            nom="Alpha", prenom="A", matricule="A-001", classe=classe, sexe='M',
+            date_naissance=date(2015, 1, 1), lieu_naissance="Conakry",
+            date_inscription=date(2024, 9, 1), responsable_principal=resp,
+        )
+        self.today = timezone.localdate()
+
+    def _abo(self, jours, alerte=7, **kwargs):
+        return AbonnementBus.objects.create(
+            eleve=self.eleve, montant=100000,
+            date_expiration=self.today + timedelta(days=jours),
+            alerte_avant_jours=alerte, **kwargs,
+        )
+
+    def test_date_alerte_maintenue_au_save(self):
+        abo = self._abo(10, alerte=5)
+        self.assertEqual(abo.date_alerte, abo.date_expiration - timedelta(days=5))
+        abo.alerte_avant_jours = 12
+        abo.save(update_fields=['alerte_avant_jours'])
+        abo.refresh_from_db()
+        self.assertEqual(abo.date_alerte, abo.date_expiration - timedelta(days=12))
+
+    def test_filtres_en_base_equivalents_aux_proprietes(self):
+        abos = [self._abo(j, alerte=a) for j, a in [(-3, 7), (0, 7), (5, 7), (8, 7), (8, 10), (30, 7)]]
+        proches = set(AbonnementBus.objects.filter(AbonnementBus.q_proche_expiration(self.today)).values_list('id', flat=True))
+        expires = set(AbonnementBus.objects.filter(AbonnementBus.q_expire(self.today)).values_list('id', flat=True))
+        self.assertEqual(proches, {a.id for a in abos if a.est_proche_expiration})
+        self.assertEqual(expires, {a.id for a in abos if a.est_expire})
+
+    def test_commande_expiration_en_masse(self):
+        expire = self._abo(-1)
+        actif = self._abo(3)
+        call_command('expirer_abonnements_bus', stdout=StringIO())
+        expire.refresh_from_db()
+        actif.refresh_from_db()
+        self.assertEqual(expire.statut, AbonnementBus.Statut.EXPIRE)
+        self.assertEqual(actif.statut, AbonnementBus.Statut.ACTIF)
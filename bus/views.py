@@ -7,8 +7,6 @@ from django.http import HttpResponse
 from django.http import JsonResponse
 from django.db.models import Q, Sum, Count
 from django.utils import timezone
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
 import io
 import csv
 
@@ -16,8 +14,11 @@ from eleves.models import Eleve
 from .models import AbonnementBus
 from .forms import AbonnementBusForm
 from utilisateurs.utils import user_is_admin, filter_by_user_school
+from ecole_moderne.metrics import incrementer
 from ecole_moderne.security_decorators import require_school_object
 from ecole_moderne.pdf_utils import draw_logo_watermark
+from ecole_moderne.exports import Colonne, exporter
+from ecole_moderne.replica import lecture_replica
 from paiements.twilio_utils import send_message_async
 
 
@@ -27,9 +28,15 @@ def tableau_bord(request):
     if not user_is_admin(request.user):
         qs = filter_by_user_school(qs, request.user, 'eleve__classe__ecole')
 
-    total = qs.count()
-    exp = sum(1 for a in qs if a.est_expire)
-    proche = sum(1 for a in qs if a.est_proche_expiration)
+    today = timezone.localdate()
+    agg = qs.aggregate(
+        total=Count('id'),
+        exp=Count('id', filter=AbonnementBus.q_expire(today)),
+        proche=Count('id', filter=AbonnementBus.q_proche_expiration(today)),
+    )
+    total = agg['total'] or 0
+    exp = agg['exp'] or 0
+    proche = agg['proche'] or 0
 
     context = {
         'titre_page': 'Abonnements Bus',
@@ -65,21 +72,14 @@ def liste_abonnements(request):
     elif filtre == 'suspendus':
         qs = qs.filter(statut=AbonnementBus.Statut.SUSPENDU)
     elif filtre == 'depassees':
-        qs = qs.filter(date_expiration__lt=today)
+        qs = qs.filter(AbonnementBus.q_expire(today))
     elif filtre == 'proches':
-        # Sélectionner par logique métier est_proche_expiration (fenêtre d'alerte)
-        ids_proches = []
-        for a_id, date_exp, alerte_jours in qs.values_list('id', 'date_expiration', 'alerte_avant_jours'):
-            if date_exp:
-                if date_exp >= today:
-                    delta = (date_exp - today).days
-                    if 0 <= delta <= (alerte_jours or 7):
-                        ids_proches.append(a_id)
-        qs = qs.filter(id__in=ids_proches)
+        # Fenêtre d'alerte (est_proche_expiration) via la colonne indexée date_alerte
+        qs = qs.filter(AbonnementBus.q_proche_expiration(today))
 
     # Aggregates for dashboard (sur le queryset filtré)
-    total_count = qs.count()
     agg = qs.aggregate(
+        total_count=Count('id'),
         total_montant=Sum('montant'),
         nb_actifs=Count('id', filter=Q(statut=AbonnementBus.Statut.ACTIF)),
         nb_expires=Count('id', filter=Q(statut=AbonnementBus.Statut.EXPIRE)),
@@ -87,20 +87,10 @@ def liste_abonnements(request):
         montant_actifs=Sum('montant', filter=Q(statut=AbonnementBus.Statut.ACTIF)),
         montant_expires=Sum('montant', filter=Q(statut=AbonnementBus.Statut.EXPIRE)),
         montant_suspendus=Sum('montant', filter=Q(statut=AbonnementBus.Statut.SUSPENDU)),
+        nb_expiration_proche=Count('id', filter=AbonnementBus.q_proche_expiration(today)),
+        nb_expiration_depassee=Count('id', filter=AbonnementBus.q_expire(today)),
     )
 
-    # Counts for expiration proximity using only necessary fields
-    nb_expiration_proche = 0
-    nb_expiration_depassee = 0
-    for date_exp, alerte_jours in qs.values_list('date_expiration', 'alerte_avant_jours'):
-        if date_exp:
-            if date_exp < today:
-                nb_expiration_depassee += 1
-            else:
-                delta = (date_exp - today).days
-                if 0 <= delta <= (alerte_jours or 7):
-                    nb_expiration_proche += 1
-
     # Breakdown by periodicite
     choices_map = dict(AbonnementBus.Periodicite.choices)
     periodicite_rows = []
@@ -128,13 +118,13 @@ def liste_abonnements(request):
         'q': q,
         'filtre': filtre,
         # Dashboard context
-        'total_count': total_count,
+        'total_count': agg.get('total_count') or 0,
         'total_montant': agg.get('total_montant') or 0,
         'nb_actifs': agg.get('nb_actifs') or 0,
         'nb_expires': agg.get('nb_expires') or 0,
         'nb_suspendus': agg.get('nb_suspendus') or 0,
-        'nb_expiration_proche': nb_expiration_proche,
-        'nb_expiration_depassee': nb_expiration_depassee,
+        'nb_expiration_proche': agg.get('nb_expiration_proche') or 0,
+        'nb_expiration_depassee': agg.get('nb_expiration_depassee') or 0,
         'montant_actifs': agg.get('montant_actifs') or 0,
         'montant_expires': agg.get('montant_expires') or 0,
         'montant_suspendus': agg.get('montant_suspendus') or 0,
@@ -180,13 +170,22 @@ def abonnement_edit(request, abo_id):
     return render(request, 'bus/form.html', {'form': form, 'titre_page': 'Modifier abonnement Bus'})
 
 
+def _q_a_relancer(today=None):
+    """Abonnements expirés, proches de l'expiration ou non actifs."""
+    return (
+        AbonnementBus.q_expire(today)
+        | AbonnementBus.q_proche_expiration(today)
+        | ~Q(statut=AbonnementBus.Statut.ACTIF)
+    )
+
+
 @login_required
 def relances(request):
     qs = AbonnementBus.objects.select_related('eleve', 'eleve__classe', 'eleve__classe__ecole')
     if not user_is_admin(request.user):
         qs = filter_by_user_school(qs, request.user, 'eleve__classe__ecole')
 
-    a_relancer = [a for a in qs if a.est_expire or a.est_proche_expiration or a.statut != AbonnementBus.Statut.ACTIF]
+    a_relancer = qs.filter(_q_a_relancer())
 
     context = {
         'titre_page': 'Relances Abonnements Bus',
@@ -196,40 +195,28 @@ def relances(request):
 
 
 @login_required
+@lecture_replica
 def export_relances_excel(request):
     qs = AbonnementBus.objects.select_related('eleve', 'eleve__classe', 'eleve__classe__ecole')
     if not user_is_admin(request.user):
         qs = filter_by_user_school(qs, request.user, 'eleve__classe__ecole')
 
-    data = [a for a in qs if a.est_expire or a.est_proche_expiration or a.statut != AbonnementBus.Statut.ACTIF]
-
-    wb = Workbook(); ws = wb.active; ws.title = 'Relances Bus'
-    headers = ['Élève', 'Classe', 'École', 'Périodicité', 'Montant', 'Début', 'Expiration', 'Statut', 'Zone', "Point d'arrêt", 'Contact parent']
-    ws.append(headers)
-    for a in data:
-        el = a.eleve
-        ws.append([
-            f"{el.prenom} {el.nom} ({el.matricule})",
-            getattr(el.classe, 'nom', ''),
-            getattr(getattr(el.classe, 'ecole', None), 'nom', ''),
-            a.get_periodicite_display(),
-            int(a.montant or 0),
-            a.date_debut.strftime('%d/%m/%Y') if a.date_debut else '',
-            a.date_expiration.strftime('%d/%m/%Y') if a.date_expiration else '',
-            a.get_statut_display(),
-            a.zone,
-            a.point_arret,
-            a.contact_parent,
-        ])
-    widths = [30, 16, 22, 16, 14, 14, 14, 12, 16, 18, 20]
-    for i, w in enumerate(widths, 1):
-        ws.column_dimensions[get_column_letter(i)].width = w
-
-    import io
-    stream = io.BytesIO(); wb.save(stream); stream.seek(0)
-    resp = HttpResponse(stream.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    resp['Content-Disposition'] = 'attachment; filename="relances_bus.xlsx"'
-    return resp
+    data = qs.filter(_q_a_relancer())
+
+    colonnes = [
+        Colonne('Élève', lambda a: f"{a.eleve.prenom} {a.eleve.nom} ({a.eleve.matricule})", largeur=30),
+        Colonne('Classe', 'eleve.classe.nom', largeur=16),
+        Colonne('École', 'eleve.classe.ecole.nom', largeur=22),
+        Colonne('Périodicité', 'get_periodicite_display', largeur=16),
+        Colonne('Montant', 'montant', format='montant', largeur=14),
+        Colonne('Début', 'date_debut', format='date', largeur=14),
+        Colonne('Expiration', 'date_expiration', format='date', largeur=14),
+        Colonne('Statut', 'get_statut_display', largeur=12),
+        Colonne('Zone', 'zone', largeur=16),
+        Colonne("Point d'arrêt", 'point_arret', largeur=18),
+        Colonne('Contact parent', 'contact_parent', largeur=20),
+    ]
+    return exporter(request, data, colonnes, nom_fichier='relances_bus', titre_feuille='Relances Bus')
 
 
 @login_required
@@ -241,9 +228,7 @@ def generer_recu_abonnement_pdf(request, abo_id):
     abo = get_object_or_404(AbonnementBus.objects.select_related('eleve', 'eleve__classe', 'eleve__classe__ecole'), id=abo_id)
     try:
         import io
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib import colors
+        from ecole_moderne.pdf import canvas, A4, colors
         from django.contrib.staticfiles import finders
     except Exception:
         messages.error(request, "ReportLab requis (pip install reportlab)")
@@ -291,6 +276,7 @@ def generer_recu_abonnement_pdf(request, abo_id):
     line('Contact parent', abo.contact_parent)
 
     c.showPage(); c.save(); pdf = buffer.getvalue(); buffer.close()
+    incrementer('ecole_recus_generes_total', type='abonnement_bus')
     resp = HttpResponse(content_type='application/pdf')
     resp['Content-Disposition'] = f'inline; filename=recu_abonnement_{abo.id}.pdf'
     resp.write(pdf)
@@ -315,10 +301,14 @@ def envoyer_relances_bus(request):
     channel = 'whatsapp' if message_type == 'whatsapp' else 'sms'
     envoyes = 0
 
-    abonnements = AbonnementBus.objects.select_related('eleve', 'eleve__classe', 'eleve__classe__ecole').filter(id__in=ids)
+    abonnements = AbonnementBus.objects.select_related(
+        'eleve', 'eleve__classe', 'eleve__classe__ecole',
+        'eleve__responsable_principal', 'eleve__responsable_secondaire',
+    ).filter(id__in=ids)
     if not user_is_admin(request.user):
         abonnements = filter_by_user_school(abonnements, request.user, 'eleve__classe__ecole')
 
+    relances_faites = []
     for abo in abonnements:
         el = abo.eleve
 
@@ -352,6 +342,7 @@ def envoyer_relances_bus(request):
         classe_nom = getattr(el.classe, 'nom', 'Non définie')
         ecole_nom = getattr(getattr(el.classe, 'ecole', None), 'nom', 'École')
 
+        relance_envoyee = False
         for nom_resp, numero in destinataires:
             try:
                 msg = base_msg.format(
@@ -373,16 +364,23 @@ def envoyer_relances_bus(request):
             try:
                 send_message_async(to_number=numero, body=msg, channel=channel)
                 envoyes += 1
-                abo.derniere_relance = timezone.now()
-                abo.save(update_fields=['derniere_relance'])
+                relance_envoyee = True
             except Exception:
                 # Continuer autres destinataires
                 pass
+        if relance_envoyee:
+            abo.derniere_relance = abo.updated_at = timezone.now()
+            relances_faites.append(abo)
+
+    # Une seule écriture pour toutes les relances envoyées
+    if relances_faites:
+        AbonnementBus.objects.bulk_update(relances_faites, ['derniere_relance', 'updated_at'])
 
     return JsonResponse({'success': True, 'message': f'{envoyes} message(s) envoyé(s)'})
 
 
 @login_required
+@lecture_replica
 def export_abonnements_breakdown_csv(request, kind: str):
     """Exporte au format CSV les répartitions par périodicité ou par zone.
 
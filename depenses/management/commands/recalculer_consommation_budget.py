@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from depenses.models import ConsommationBudget
+from eleves.models import Ecole
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les compteurs de consommation budgétaire (et BudgetAnnuel) à partir des dépenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ecole-id', type=int, help="Limiter la reconstruction à une école")
+        parser.add_argument('--annee', type=int, help="Limiter la reconstruction à une année (date de facture)")
+
+    def handle(self, *args, **options):
+        ecole = None
+        ecole_id = options.get('ecole_id')
+        if ecole_id:
+            ecole = Ecole.objects.filter(id=ecole_id).first()
+            if ecole is None:
+                raise CommandError(f"École introuvable: {ecole_id}")
+        annee = options.get('annee')
+
+        nb = ConsommationBudget.recalculer(ecole=ecole, annee=annee)
+        self.stdout.write(self.style.SUCCESS(f"Compteurs de consommation reconstruits: {nb} ligne(s)."))
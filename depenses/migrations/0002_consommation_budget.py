@@ -0,0 +1,115 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:49
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import ExtractYear
+
+
+COMPTEURS_STATUT = {
+    'EN_ATTENTE': ('nb_en_attente', 'montant_en_attente'),
+    'VALIDEE': ('nb_validees', 'montant_valide'),
+    'PAYEE': ('nb_payees', 'montant_paye'),
+}
+
+
+def initialiser_consommation(apps, schema_editor):
+    Depense = apps.get_model('depenses', 'Depense')
+    Profil = apps.get_model('utilisateurs', 'Profil')
+    ConsommationBudget = apps.get_model('depenses', 'ConsommationBudget')
+
+    # Rattacher les dépenses existantes à l'école du profil de leur créateur
+    Depense.objects.filter(ecole__isnull=True, cree_par__isnull=False).update(
+        ecole_id=Subquery(Profil.objects.filter(user_id=OuterRef('cree_par_id')).values('ecole_id')[:1])
+    )
+
+    agregats = {'nb_depenses': Count('id'), 'montant_total': Sum('montant_ttc')}
+    for statut, (champ_nb, champ_montant) in COMPTEURS_STATUT.items():
+        agregats[champ_nb] = Count('id', filter=Q(statut=statut))
+        agregats[champ_montant] = Sum('montant_ttc', filter=Q(statut=statut))
+    lignes = (
+        Depense.objects.annotate(annee_facture=ExtractYear('date_facture'))
+        .values('ecole_id', 'annee_facture', 'categorie_id')
+        .annotate(**agregats)
+        .order_by()
+    )
+    ConsommationBudget.objects.bulk_create([
+        ConsommationBudget(
+            ecole_id=row['ecole_id'], annee=row['annee_facture'], categorie_id=row['categorie_id'],
+            **{champ: row[champ] or 0 for champ in agregats},
+        )
+        for row in lignes
+    ], batch_size=500)
+
+    # Aligner les montants engagés/consommés des budgets existants sur les compteurs
+    BudgetAnnuel = apps.get_model('depenses', 'BudgetAnnuel')
+    for budget in BudgetAnnuel.objects.all():
+        totaux = ConsommationBudget.objects.filter(annee=budget.annee, categorie_id=budget.categorie_id).aggregate(
+            attente=Sum('montant_en_attente'), valide=Sum('montant_valide'), paye=Sum('montant_paye'),
+        )
+        budget.budget_engage = (totaux['attente'] or 0) + (totaux['valide'] or 0) + (totaux['paye'] or 0)
+        budget.budget_consomme = totaux['paye'] or 0
+        budget.save(update_fields=['budget_engage', 'budget_consomme'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('depenses', '0001_initial'),
+        ('eleves', '0001_initial'),
+        ('utilisateurs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsommationBudget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveIntegerField(verbose_name='Année')),
+                ('nb_depenses', models.IntegerField(default=0, verbose_name='Nombre de dépenses')),
+                ('montant_total', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14, verbose_name='Montant total (GNF)')),
+                ('nb_en_attente', models.IntegerField(default=0)),
+                ('montant_en_attente', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('nb_validees', models.IntegerField(default=0)),
+                ('montant_valide', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('nb_payees', models.IntegerField(default=0)),
+                ('montant_paye', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('date_modification', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Consommation budgétaire',
+                'verbose_name_plural': 'Consommations budgétaires',
+            },
+        ),
+        migrations.AddField(
+            model_name='depense',
+            name='ecole',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='depenses', to='eleves.ecole', verbose_name='École'),
+        ),
+        migrations.AddIndex(
+            model_name='depense',
+            index=models.Index(fields=['ecole', 'statut'], name='depenses_de_ecole_i_b0febe_idx'),
+        ),
+        migrations.AddField(
+            model_name='consommationbudget',
+            name='categorie',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consommations', to='depenses.categoriedepense'),
+        ),
+        migrations.AddField(
+            model_name='consommationbudget',
+            name='ecole',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='consommations_budget', to='eleves.ecole', verbose_name='École'),
+        ),
+        migrations.AddIndex(
+            model_name='consommationbudget',
+            index=models.Index(fields=['ecole', 'annee'], name='depenses_co_ecole_i_83a9a7_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='consommationbudget',
+            unique_together={('ecole', 'annee', 'categorie')},
+        ),
+        migrations.RunPython(initialiser_consommation, migrations.RunPython.noop),
+    ]
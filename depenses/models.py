@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import User
 from decimal import Decimal
+from eleves.models import Ecole
 
 class CategorieDepense(models.Model):
     """Modèle pour les catégories de dépenses"""
@@ -72,6 +75,10 @@ class Depense(models.Model):
     numero_facture = models.CharField(max_length=50, verbose_name="Numéro de facture")
     categorie = models.ForeignKey(CategorieDepense, on_delete=models.CASCADE, related_name='depenses')
     fournisseur = models.ForeignKey(Fournisseur, on_delete=models.CASCADE, related_name='depenses')
+    ecole = models.ForeignKey(
+        Ecole, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='depenses', verbose_name="École"
+    )
     
     # Informations de la dépense
     libelle = models.CharField(max_length=200, verbose_name="Libellé")
@@ -123,6 +130,9 @@ class Depense(models.Model):
         verbose_name_plural = "Dépenses"
         ordering = ['-date_facture', '-date_creation']
         unique_together = ['numero_facture', 'fournisseur']
+        indexes = [
+            models.Index(fields=['ecole', 'statut']),
+        ]
     
     def __str__(self):
         return f"{self.numero_facture} - {self.libelle} - {self.montant_ttc:,.0f} GNF"
@@ -134,7 +144,30 @@ class Depense(models.Model):
             self.montant_ttc = self.montant_ht + self.montant_tva
         elif self.montant_ht:
             self.montant_ttc = self.montant_ht
-        super().save(*args, **kwargs)
+        # École rattachée: celle du profil du créateur
+        if self.ecole_id is None and self.cree_par_id:
+            from utilisateurs.models import Profil
+            self.ecole_id = (
+                Profil.objects.filter(user_id=self.cree_par_id)
+                .values_list('ecole_id', flat=True).first()
+            )
+        with transaction.atomic():
+            # État précédent lu sous verrou: deux modifications concurrentes de la même
+            # dépense calculent leur delta l'une après l'autre
+            ancien = self._etat_verrouille() if self.pk else None
+            super().save(*args, **kwargs)
+            ConsommationBudget.enregistrer_changement(ancien, self)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            ancien = self._etat_verrouille()
+            ConsommationBudget.enregistrer_changement(ancien, None)
+            return super().delete(*args, **kwargs)
+
+    def _etat_verrouille(self):
+        return Depense.objects.select_for_update().filter(pk=self.pk).only(
+            'ecole_id', 'categorie_id', 'date_facture', 'statut', 'montant_ttc'
+        ).first()
     
     @property
     def est_en_retard(self):
@@ -217,6 +250,172 @@ class BudgetAnnuel(models.Model):
             return (self.budget_engage / self.budget_prevu) * 100
         return 0
 
+class ConsommationBudget(models.Model):
+    """Compteurs de consommation budgétaire par (école, année, catégorie).
+
+    Maintenus de façon incrémentale par Depense.save()/delete(); la commande
+    `recalculer_consommation_budget` les reconstruit à partir des dépenses.
+    """
+    # Statut de dépense -> (champ compteur, champ montant)
+    COMPTEURS_STATUT = {
+        'EN_ATTENTE': ('nb_en_attente', 'montant_en_attente'),
+        'VALIDEE': ('nb_validees', 'montant_valide'),
+        'PAYEE': ('nb_payees', 'montant_paye'),
+    }
+
+    ecole = models.ForeignKey(
+        Ecole, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='consommations_budget', verbose_name="École"
+    )
+    annee = models.PositiveIntegerField(verbose_name="Année")
+    categorie = models.ForeignKey(CategorieDepense, on_delete=models.CASCADE, related_name='consommations')
+
+    # Toutes dépenses confondues
+    nb_depenses = models.IntegerField(default=0, verbose_name="Nombre de dépenses")
+    montant_total = models.DecimalField(
+        max_digits=14, decimal_places=0, default=Decimal('0'),
+        verbose_name="Montant total (GNF)"
+    )
+    # Ventilation par statut
+    nb_en_attente = models.IntegerField(default=0)
+    montant_en_attente = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+    nb_validees = models.IntegerField(default=0)
+    montant_valide = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+    nb_payees = models.IntegerField(default=0)
+    montant_paye = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+
+    date_modification = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Consommation budgétaire"
+        verbose_name_plural = "Consommations budgétaires"
+        unique_together = ['ecole', 'annee', 'categorie']
+        indexes = [
+            models.Index(fields=['ecole', 'annee']),
+        ]
+
+    def __str__(self):
+        return f"Consommation {self.annee} - {self.categorie} - {self.ecole or 'Sans école'}"
+
+    @property
+    def montant_engage(self):
+        return self.montant_en_attente + self.montant_valide + self.montant_paye
+
+    @classmethod
+    def contribution(cls, depense):
+        """Retourne (clé, {champ: valeur}) représentant l'apport d'une dépense aux compteurs."""
+        if depense is None or not depense.categorie_id or not depense.date_facture:
+            return None, {}
+        montant = depense.montant_ttc or Decimal('0')
+        valeurs = {'nb_depenses': 1, 'montant_total': montant}
+        champs = cls.COMPTEURS_STATUT.get(depense.statut)
+        if champs:
+            valeurs[champs[0]] = 1
+            valeurs[champs[1]] = montant
+        return (depense.ecole_id, depense.date_facture.year, depense.categorie_id), valeurs
+
+    @classmethod
+    def enregistrer_changement(cls, ancienne, nouvelle):
+        """Applique en base la différence entre deux états d'une même dépense.
+
+        `ancienne` vaut None à la création, `nouvelle` vaut None à la suppression.
+        """
+        deltas = {}
+        for depense, signe in ((ancienne, -1), (nouvelle, 1)):
+            cle, valeurs = cls.contribution(depense)
+            if cle is None:
+                continue
+            ligne = deltas.setdefault(cle, {})
+            for champ, valeur in valeurs.items():
+                ligne[champ] = ligne.get(champ, 0) + signe * valeur
+        for (ecole_id, annee, categorie_id), ligne in deltas.items():
+            ligne = {champ: v for champ, v in ligne.items() if v}
+            if not ligne:
+                continue
+            # update() ne renseigne pas auto_now: date_modification explicite (sauvegardes incrémentales)
+            maintenant = timezone.now()
+            obj, _ = cls.objects.get_or_create(ecole_id=ecole_id, annee=annee, categorie_id=categorie_id)
+            cls.objects.filter(pk=obj.pk).update(
+                date_modification=maintenant, **{champ: F(champ) + v for champ, v in ligne.items()},
+            )
+            engage = sum(ligne.get(cls.COMPTEURS_STATUT[s][1], 0) for s in cls.COMPTEURS_STATUT)
+            paye = ligne.get('montant_paye', 0)
+            if engage or paye:
+                BudgetAnnuel.objects.filter(annee=annee, categorie_id=categorie_id).update(
+                    budget_engage=F('budget_engage') + engage,
+                    budget_consomme=F('budget_consomme') + paye,
+                    date_modification=maintenant,
+                )
+
+    @classmethod
+    def recalculer(cls, ecole=None, annee=None):
+        """Reconstruit les compteurs (et les montants de BudgetAnnuel) depuis les dépenses.
+
+        Retourne le nombre de lignes de compteurs écrites.
+        """
+        from django.db.models import Count, Q, Sum
+        from django.db.models.functions import ExtractYear
+
+        depenses = Depense.objects.all()
+        compteurs = cls.objects.all()
+        if ecole is not None:
+            depenses = depenses.filter(ecole=ecole)
+            compteurs = compteurs.filter(ecole=ecole)
+        if annee is not None:
+            depenses = depenses.filter(date_facture__year=annee)
+            compteurs = compteurs.filter(annee=annee)
+
+        agregats = {
+            'nb_depenses': Count('id'),
+            'montant_total': Sum('montant_ttc'),
+        }
+        for statut, (champ_nb, champ_montant) in cls.COMPTEURS_STATUT.items():
+            agregats[champ_nb] = Count('id', filter=Q(statut=statut))
+            agregats[champ_montant] = Sum('montant_ttc', filter=Q(statut=statut))
+        lignes = (
+            depenses.annotate(annee_facture=ExtractYear('date_facture'))
+            .values('ecole_id', 'annee_facture', 'categorie_id')
+            .annotate(**agregats)
+            .order_by()
+        )
+        objets = [
+            cls(
+                ecole_id=row['ecole_id'], annee=row['annee_facture'], categorie_id=row['categorie_id'],
+                **{champ: row[champ] or 0 for champ in agregats},
+            )
+            for row in lignes
+        ]
+        with transaction.atomic():
+            compteurs.delete()
+            cls.objects.bulk_create(objets, batch_size=500)
+            # BudgetAnnuel n'est pas ventilé par école: on le recalcule sur l'ensemble
+            budgets = BudgetAnnuel.objects.all()
+            if annee is not None:
+                budgets = budgets.filter(annee=annee)
+            totaux = {
+                (row['annee'], row['categorie_id']): row
+                for row in cls.objects.filter(annee__in=budgets.values('annee'))
+                .values('annee', 'categorie_id')
+                .annotate(
+                    engage=Sum(F('montant_en_attente') + F('montant_valide') + F('montant_paye')),
+                    paye=Sum('montant_paye'),
+                )
+                .order_by()
+            }
+            a_maj = []
+            maintenant = timezone.now()
+            for budget in budgets:
+                row = totaux.get((budget.annee, budget.categorie_id), {})
+                budget.budget_engage = row.get('engage') or Decimal('0')
+                budget.budget_consomme = row.get('paye') or Decimal('0')
+                budget.date_modification = maintenant
+                a_maj.append(budget)
+            BudgetAnnuel.objects.bulk_update(
+                a_maj, ['budget_engage', 'budget_consomme', 'date_modification'], batch_size=500,
+            )
+        return len(objets)
+
+
 class HistoriqueDepense(models.Model):
     """Modèle pour l'historique des modifications des dépenses"""
     ACTION_CHOICES = [
@@ -1,3 +1,71 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from depenses.models import BudgetAnnuel, CategorieDepense, ConsommationBudget, Depense, Fournisseur
+from eleves.models import Ecole
+from utilisateurs.models import Profil
+
+
+class ConsommationBudgetTests(TestCase):
+    def setUp(self):
+        self.ecole = Ecole.objects.create(nom="Ecole A", adresse="Adresse A", telephone="+224620000001", directeur="Dir A")
+        self.user = get_user_model().objects.create_user(username="compta", password="pass12345")
+        Profil.objects.create(user=self.user, role='COMPTABLE', ecole=self.ecole, telephone="+224620000021")
+        self.categorie = CategorieDepense.objects.create(nom="Fournitures", code="FOUR")
+        self.fournisseur = Fournisseur.objects.create(
+            nom="Papeterie", type_fournisseur='ENTREPRISE', adresse="Conakry", telephone="+224620000031"
+        )
+        self.budget = BudgetAnnuel.objects.create(annee=2025, categorie=self.categorie, budget_prevu=Decimal('1000000'))
+
+    def _depense(self, numero, montant, statut='BROUILLON'):
+        return Depense.objects.create(
+            numero_facture=numero, categorie=self.categorie, fournisseur=self.fournisseur,
+            libelle=numero, description=numero, type_depense='FONCTIONNEMENT',
+            montant_ht=Decimal(montant), date_facture=date(2025, 3, 1), date_echeance=date(2025, 4, 1),
+            statut=statut, cree_par=self.user,
+        )
+
+    def _compteur(self):
+        return ConsommationBudget.objects.get(ecole=self.ecole, annee=2025, categorie=self.categorie)
+
+    def test_compteurs_suivent_statut_et_montant(self):
+        d1 = self._depense("F1", 100000, 'EN_ATTENTE')
+        self._depense("F2", 50000)
+        self.assertEqual(d1.ecole, self.ecole)
+        c = self._compteur()
+        self.assertEqual((c.nb_depenses, c.montant_total), (2, Decimal('150000')))
+        self.assertEqual((c.nb_en_attente, c.montant_en_attente), (1, Decimal('100000')))
+
+        d1.statut = 'PAYEE'
+        d1.montant_ht = Decimal('120000')
+        d1.save()
+        c = self._compteur()
+        self.assertEqual((c.nb_en_attente, c.montant_en_attente), (0, Decimal('0')))
+        self.assertEqual((c.nb_payees, c.montant_paye), (1, Decimal('120000')))
+        self.assertEqual(c.montant_total, Decimal('170000'))
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.budget_consomme, Decimal('120000'))
+        self.assertEqual(self.budget.budget_engage, Decimal('120000'))
+
+        d1.delete()
+        c = self._compteur()
+        self.assertEqual((c.nb_depenses, c.nb_payees, c.montant_paye), (1, 0, Decimal('0')))
+
+    def test_recalcul_reconstruit_les_compteurs(self):
+        self._depense("F1", 100000, 'VALIDEE')
+        self._depense("F2", 40000, 'PAYEE')
+        ConsommationBudget.objects.update(nb_depenses=99, montant_valide=0)
+        BudgetAnnuel.objects.update(budget_engage=0, budget_consomme=0)
+        call_command('recalculer_consommation_budget', stdout=StringIO())
+        c = self._compteur()
+        self.assertEqual(c.nb_depenses, 2)
+        self.assertEqual(c.montant_valide, Decimal('100000'))
+        self.assertEqual(c.montant_engage, Decimal('140000'))
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.budget_engage, Decimal('140000'))
+        self.assertEqual(self.budget.budget_consomme, Decimal('40000'))
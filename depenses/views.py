@@ -10,7 +10,7 @@ from decimal import Decimal
 
 from .models import (
     Depense, CategorieDepense, Fournisseur, 
-    PieceJustificative, BudgetAnnuel, HistoriqueDepense
+    PieceJustificative, BudgetAnnuel, HistoriqueDepense, ConsommationBudget
 )
 from .forms import (
     DepenseForm, CategorieDepenseForm, FournisseurForm,
@@ -25,26 +25,32 @@ def tableau_bord(request):
     """Tableau de bord principal du module dépenses"""
     # Base filtrée par école pour non-admin
     base_qs = Depense.objects.all()
+    compteurs = ConsommationBudget.objects.all()
     if not user_is_admin(request.user):
-        base_qs = base_qs.filter(cree_par__profil__ecole=user_school(request.user))
-    # Statistiques générales
-    total_depenses = base_qs.count()
-    depenses_validees = base_qs.filter(statut='VALIDEE').count()
-    depenses_payees = base_qs.filter(statut='PAYEE').count()
-    depenses_en_attente = base_qs.filter(statut='EN_ATTENTE').count()
-    
-    # Montants
-    montant_total = base_qs.aggregate(
-        total=Sum('montant_ttc')
-    )['total'] or Decimal('0')
-    
-    montant_paye = base_qs.filter(statut='PAYEE').aggregate(
-        total=Sum('montant_ttc')
-    )['total'] or Decimal('0')
-    
-    montant_en_attente = base_qs.filter(statut='EN_ATTENTE').aggregate(
-        total=Sum('montant_ttc')
-    )['total'] or Decimal('0')
+        ecole = user_school(request.user)
+        if ecole is None:
+            base_qs, compteurs = base_qs.none(), compteurs.none()
+        else:
+            base_qs = base_qs.filter(ecole=ecole)
+            compteurs = compteurs.filter(ecole=ecole)
+
+    # Statistiques générales et montants: lecture des compteurs incrémentaux
+    totaux = compteurs.aggregate(
+        total_depenses=Sum('nb_depenses'),
+        depenses_validees=Sum('nb_validees'),
+        depenses_payees=Sum('nb_payees'),
+        depenses_en_attente=Sum('nb_en_attente'),
+        montant_total=Sum('montant_total'),
+        montant_paye=Sum('montant_paye'),
+        montant_en_attente=Sum('montant_en_attente'),
+    )
+    total_depenses = totaux['total_depenses'] or 0
+    depenses_validees = totaux['depenses_validees'] or 0
+    depenses_payees = totaux['depenses_payees'] or 0
+    depenses_en_attente = totaux['depenses_en_attente'] or 0
+    montant_total = totaux['montant_total'] or Decimal('0')
+    montant_paye = totaux['montant_paye'] or Decimal('0')
+    montant_en_attente = totaux['montant_en_attente'] or Decimal('0')
     
     # Dépenses récentes
     depenses_recentes = base_qs.select_related(
@@ -57,16 +63,18 @@ def tableau_bord(request):
         statut__in=['VALIDEE', 'EN_ATTENTE']
     ).count()
     
-    # Statistiques par catégorie
-    # Statistiques par catégorie (portée approximée si non-admin)
-    stats_categories = CategorieDepense.objects.filter(actif=True)
-    # NOTE: Les annotations globales peuvent inclure des dépenses d'autres écoles.
-    # Pour éviter toute fuite de données, on ne joint pas de totaux précis ici pour les non-admins.
-    if user_is_admin(request.user):
-        stats_categories = stats_categories.annotate(
-            nb_depenses=Count('depenses'),
-            montant_total=Sum('depenses__montant_ttc')
-        )
+    # Statistiques par catégorie, exactes pour l'école grâce aux compteurs
+    par_categorie = {
+        row['categorie_id']: row
+        for row in compteurs.values('categorie_id').annotate(
+            nb=Sum('nb_depenses'), montant=Sum('montant_total')
+        ).order_by()
+    }
+    stats_categories = list(CategorieDepense.objects.filter(actif=True))
+    for categorie in stats_categories:
+        row = par_categorie.get(categorie.id, {})
+        categorie.nb_depenses = row.get('nb') or 0
+        categorie.montant_total = row.get('montant') or 0
     
     context = {
         'total_depenses': total_depenses,
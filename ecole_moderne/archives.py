@@ -0,0 +1,352 @@
+"""Archivage des années scolaires clôturées dans une base d'archives.
+
+Les tables qui grossissent chaque année (Paiement et ses remises, Relance,
+JournalActivite, Evaluation, Note, EcheancierPaiement) ne gardent sur la base
+principale que l'année scolaire en cours et la précédente.
+
+- Chaque ligne porte son année scolaire (`annee_scolaire`, indexée), posée au
+  save() et complétée par `etiqueter()` pour les lignes créées en masse.
+- `manage.py cloturer_annee` déplace les années plus anciennes vers l'alias
+  `archives` (même schéma, voir ARCHIVE_DATABASE_* dans settings.py): chaque lot
+  est copié avec tout ce qu'il entraîne en cascade et les lignes qu'il référence
+  (élèves, classes, utilisateurs...), puis supprimé de la base principale. Une
+  reprise après interruption recopie sans doublon ce qui reste.
+- Lecture: `utiliser_archives()` envoie les lectures du bloc sur les archives. Les
+  collectes des rapports (`@selon_periode`) l'activent d'elles-mêmes quand la
+  période demandée est entièrement archivée; une période à cheval sur une année
+  archivée et une année active est lue sur la base principale.
+"""
+import contextvars
+import functools
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, models, transaction
+from django.db.models import Max, Min
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from ecole_moderne.sauvegardes import champ_modification
+
+logger = logging.getLogger(__name__)
+
+CLE_LIMITE = 'archives:limite'
+
+# Tables archivées, dans l'ordre de déplacement (les cascades suivent: remises, notes)
+MODELES_ARCHIVES = (
+    'paiements.Paiement',
+    'paiements.Relance',
+    'utilisateurs.JournalActivite',
+    'notes.Note',
+    'notes.Evaluation',
+    'paiements.EcheancierPaiement',
+)
+
+# Copiées telles qu'à la clôture pour que les rapports archivés retrouvent élèves, classes et profils
+REFERENTIEL = (
+    'auth.User',
+    'eleves.Ecole',
+    'utilisateurs.Profil',
+    'eleves.Responsable',
+    'eleves.Classe',
+    'eleves.GrilleTarifaire',
+    'eleves.Eleve',
+    'paiements.TypePaiement',
+    'paiements.ModePaiement',
+    'paiements.RemiseReduction',
+    'notes.MatiereClasse',
+)
+
+# Lus sur les archives dans un bloc `utiliser_archives()`; les autres tables (dépenses,
+# salaires...) ne sont pas archivées et restent lues sur la base principale.
+MODELES_LUS_SUR_ARCHIVES = frozenset(MODELES_ARCHIVES + ('paiements.PaiementRemise',) + REFERENTIEL)
+
+_archives = contextvars.ContextVar('lecture_archives', default=False)
+
+
+def annee_scolaire_de(jour) -> str:
+    """Année scolaire d'une date, la rentrée étant en septembre (ex: '2024-2025')."""
+    if isinstance(jour, datetime):
+        jour = timezone.localtime(jour).date() if timezone.is_aware(jour) else jour.date()
+    if jour.month >= 9:
+        return f"{jour.year}-{jour.year + 1}"
+    return f"{jour.year - 1}-{jour.year}"
+
+
+def decaler(annee: str, n: int) -> str:
+    """'2024-2025' décalé de n années ('2025-2026' pour n=1)."""
+    debut = int(annee[:4]) + n
+    return f"{debut}-{debut + 1}"
+
+
+def bornes(annee: str):
+    """(1er septembre, 1er septembre suivant) de l'année scolaire: intervalle semi-ouvert."""
+    debut = int(annee[:4])
+    return date(debut, 9, 1), date(debut + 1, 9, 1)
+
+
+def alias_archives():
+    """Alias de la base d'archives, ou None s'il n'est pas déclaré dans DATABASES."""
+    alias = getattr(settings, 'ARCHIVE_DATABASE_ALIAS', None)
+    return alias if alias in connections.databases else None
+
+
+def limite_archives() -> str:
+    """Plus ancienne année scolaire encore sur la base principale ('' si rien n'est archivé).
+
+    Clôturer l'année Y garde Y et Y+1 sur la base principale: tout ce qui précède Y est archivé.
+    """
+    limite = cache.get(CLE_LIMITE)
+    if limite is None:
+        from utilisateurs.models import ClotureAnnee
+
+        limite = (
+            ClotureAnnee.objects.using('default').filter(etape='TERMINEE')
+            .order_by('-annee_scolaire').values_list('annee_scolaire', flat=True).first()
+        ) or ''
+        cache.set(CLE_LIMITE, limite, None)
+    return limite
+
+
+def invalider_limite():
+    cache.delete(CLE_LIMITE)
+
+
+def annee_archivee(annee: str) -> bool:
+    limite = limite_archives()
+    return bool(limite and annee and annee < limite)
+
+
+def periode_archivee(debut, fin=None) -> bool:
+    """Vrai si toute la période [debut, fin] tombe dans des années archivées."""
+    fin = fin or debut
+    if annee_archivee(annee_scolaire_de(fin)):
+        return True
+    if annee_archivee(annee_scolaire_de(debut)):
+        logger.warning("Période %s - %s à cheval sur une année archivée: lecture sur la base principale", debut, fin)
+    return False
+
+
+def lecture_sur_archives():
+    return _archives.get() and bool(alias_archives())
+
+
+@contextmanager
+def utiliser_archives(actif=True):
+    """Envoie les lectures du bloc sur la base d'archives (si configurée et `actif`)."""
+    jeton = _archives.set(bool(actif and alias_archives()))
+    try:
+        yield
+    finally:
+        _archives.reset(jeton)
+
+
+def selon_periode(fonction):
+    """Décorateur des collectes `f(debut, fin, ...)` ou `f(jour, ...)`: lectures sur les
+    archives quand la période est entièrement archivée."""
+    @functools.wraps(fonction)
+    def wrapper(debut, *args, **kwargs):
+        fin = args[0] if args and isinstance(args[0], date) else debut
+        with utiliser_archives(periode_archivee(debut, fin)):
+            return fonction(debut, *args, **kwargs)
+    return wrapper
+
+
+class RouteurArchives:
+    """Routeur Django: dans un bloc `utiliser_archives()`, lectures des MODELES_LUS_SUR_ARCHIVES
+    vers l'alias des archives. Placé avant RouteurReplica; les écritures restent sur `default`."""
+
+    def db_for_read(self, model, **hints):
+        if lecture_sur_archives() and model._meta.label in MODELES_LUS_SUR_ARCHIVES:
+            return alias_archives()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        alias = alias_archives()
+        if alias and alias in (obj1._state.db, obj2._state.db):
+            return obj1._state.db == obj2._state.db
+        return None
+
+
+# Étiquetage ---------------------------------------------------------------------------
+
+def etiqueter_par_dates(qs, champ_date):
+    """Pose `annee_scolaire` sur les lignes de `qs` qui n'en ont pas: un UPDATE par année couverte."""
+    qs = qs.filter(models.Q(annee_scolaire__isnull=True) | models.Q(annee_scolaire=''))
+    etendue = qs.aggregate(debut=Min(champ_date), fin=Max(champ_date))
+    if etendue['debut'] is None:
+        return 0
+    horodate = isinstance(qs.model._meta.get_field(champ_date), models.DateTimeField)
+    # update() ne renseigne pas auto_now: sans cela, les sauvegardes incrémentales manqueraient l'étiquetage
+    champ = champ_modification(qs.model)
+    horodatage = {champ: timezone.now()} if champ else {}
+    total = 0
+    annee, derniere = annee_scolaire_de(etendue['debut']), annee_scolaire_de(etendue['fin'])
+    while annee <= derniere:
+        debut, fin = bornes(annee)
+        if horodate:
+            debut = timezone.make_aware(datetime.combine(debut, datetime.min.time()))
+            fin = timezone.make_aware(datetime.combine(fin, datetime.min.time()))
+        total += qs.filter(**{f'{champ_date}__gte': debut, f'{champ_date}__lt': fin}).update(
+            annee_scolaire=annee, **horodatage)
+        annee = decaler(annee, 1)
+    return total
+
+
+def etiqueter():
+    """Étiquette toutes les lignes sans année scolaire; retourne {modèle: lignes mises à jour}."""
+    Paiement = apps.get_model('paiements', 'Paiement')
+    Relance = apps.get_model('paiements', 'Relance')
+    JournalActivite = apps.get_model('utilisateurs', 'JournalActivite')
+    Evaluation = apps.get_model('notes', 'Evaluation')
+    Note = apps.get_model('notes', 'Note')
+    Classe = apps.get_model('eleves', 'Classe')
+    sans_annee = models.Q(annee_scolaire__isnull=True) | models.Q(annee_scolaire='')
+    maintenant = timezone.now()
+
+    return {
+        'paiements.Paiement': etiqueter_par_dates(Paiement.objects.all(), 'date_paiement'),
+        'paiements.Relance': etiqueter_par_dates(Relance.objects.all(), 'date_creation'),
+        'utilisateurs.JournalActivite': etiqueter_par_dates(JournalActivite.objects.all(), 'date_action'),
+        # Évaluations sans année: celle de leur classe; notes: celle de leur évaluation
+        'notes.Evaluation': Evaluation.objects.filter(sans_annee).update(annee_scolaire=models.Subquery(
+            Classe.objects.filter(pk=models.OuterRef('classe_id')).values('annee_scolaire')[:1]
+        ), date_modification=maintenant),
+        'notes.Note': Note.objects.filter(sans_annee).update(annee_scolaire=models.Subquery(
+            Evaluation.objects.filter(pk=models.OuterRef('evaluation_id')).values('annee_scolaire')[:1]
+        ), date_modification=maintenant),
+    }
+
+
+# Copie et déplacement -----------------------------------------------------------------
+
+class Copieur:
+    """Copie des instances de la base principale vers les archives, références d'abord.
+
+    Les lignes déjà présentes (même clé) ne sont ni recopiées ni modifiées: une
+    reprise ne crée pas de doublon. Les insertions sont « brutes » (comme loaddata):
+    ni save(), ni auto_now, les horodatages d'origine sont conservés.
+    """
+
+    def __init__(self, alias=None):
+        self.alias = alias or alias_archives()
+        self.presents = set()
+
+    def _existants(self, modele, champ, valeurs):
+        existants = set()
+        valeurs = list(valeurs)
+        for i in range(0, len(valeurs), 500):
+            existants.update(
+                modele._base_manager.using(self.alias)
+                .filter(**{f'{champ}__in': valeurs[i:i + 500]}).values_list(champ, flat=True)
+            )
+        return existants
+
+    def copier(self, modele, objets):
+        """Copie `objets` (instances de `modele` lues sur `default`); retourne le nombre de lignes insérées."""
+        objets = [o for o in objets if (modele, o.pk) not in self.presents]
+        if not objets:
+            return 0
+        self.presents.update((modele, o.pk) for o in objets)
+
+        for champ in modele._meta.concrete_fields:
+            if not (champ.many_to_one or champ.one_to_one):
+                continue
+            cible = champ.target_field.attname
+            valeurs = {getattr(o, champ.attname) for o in objets} - {None}
+            if champ.target_field.primary_key:
+                valeurs = {v for v in valeurs if (champ.related_model, v) not in self.presents}
+            if not valeurs:
+                continue
+            manquants = valeurs - self._existants(champ.related_model, cible, valeurs)
+            if manquants:
+                self.copier(champ.related_model,
+                            champ.related_model._base_manager.using('default').filter(**{f'{cible}__in': manquants}))
+
+        existants = self._existants(modele, 'pk', [o.pk for o in objets])
+        nouveaux = [o for o in objets if o.pk not in existants]
+        if nouveaux:
+            champs = modele._meta.local_concrete_fields
+            taille = connections[self.alias].ops.bulk_batch_size(champs, nouveaux) or len(nouveaux)
+            for i in range(0, len(nouveaux), taille):
+                modele._base_manager._insert(nouveaux[i:i + taille], fields=champs, using=self.alias, raw=True)
+        return len(nouveaux)
+
+
+def copier_referentiel(taille_lot=1000, copieur=None):
+    """Copie les lignes du REFERENTIEL absentes des archives; retourne {modèle: lignes insérées}."""
+    copieur = copieur or Copieur()
+    resultat = {}
+    for label in REFERENTIEL:
+        modele = apps.get_model(label)
+        total = 0
+        qs = modele._base_manager.using('default').order_by('pk')
+        dernier = None
+        while True:
+            lot = list((qs.filter(pk__gt=dernier) if dernier is not None else qs)[:taille_lot])
+            if not lot:
+                break
+            with transaction.atomic(using=copieur.alias):
+                total += copieur.copier(modele, lot)
+            dernier = lot[-1].pk
+        resultat[label] = total
+    return resultat
+
+
+def deplacer_lot(modele, lot, copieur):
+    """Copie `lot` et ses cascades dans les archives puis le supprime de la base principale.
+    Retourne le nombre de lignes supprimées de la base principale."""
+    with transaction.atomic(using='default'):
+        collecteur = Collector(using='default')
+        collecteur.collect(lot)
+        a_copier = [(m, list(instances)) for m, instances in collecteur.data.items()]
+        a_copier += [(qs.model, list(qs)) for qs in collecteur.fast_deletes]
+        with transaction.atomic(using=copieur.alias):
+            for modele_cascade, instances in a_copier:
+                copieur.copier(modele_cascade, instances)
+        supprimes, _ = collecteur.delete()
+    return supprimes
+
+
+def archiver(limite, taille_lot=500, copieur=None, progression=None):
+    """Déplace les lignes des MODELES_ARCHIVES d'années antérieures à `limite`.
+
+    `progression(label, lignes)` est appelé après chaque lot. Retourne {modèle: lignes supprimées}.
+    """
+    copieur = copieur or Copieur()
+    resultat = {}
+    for label in MODELES_ARCHIVES:
+        modele = apps.get_model(label)
+        qs = modele._base_manager.using('default').filter(annee_scolaire__lt=limite).order_by('pk')
+        total = 0
+        while True:
+            lot = list(qs[:taille_lot])
+            if not lot:
+                break
+            supprimes = deplacer_lot(modele, lot, copieur)
+            total += supprimes
+            if progression:
+                progression(label, supprimes)
+        resultat[label] = total
+    return resultat
+
+
+def a_archiver(limite):
+    """{modèle: lignes d'années antérieures à `limite`} sur la base principale (simulation)."""
+    return {
+        label: apps.get_model(label)._base_manager.using('default').filter(annee_scolaire__lt=limite).count()
+        for label in MODELES_ARCHIVES
+    }
+
+
+def a_archiver_sans_annee():
+    """{modèle: lignes sans année scolaire}, étiquetées avant l'archivage (simulation)."""
+    sans_annee = models.Q(annee_scolaire__isnull=True) | models.Q(annee_scolaire='')
+    return {
+        label: apps.get_model(label)._base_manager.using('default').filter(sans_annee).count()
+        for label in MODELES_ARCHIVES
+    }
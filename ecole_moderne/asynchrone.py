@@ -0,0 +1,76 @@
+"""Outils des vues asynchrones (servies par `ecole_moderne.asgi` sous uvicorn).
+
+Dans une vue `async def`, `request.user.profil`, `user_is_admin()` ou
+`filter_by_user_school()` déclencheraient une requête SQL synchrone
+(SynchronousOnlyOperation). La portée de l'utilisateur (superutilisateur, rôle,
+école) est donc lue une seule fois avec l'ORM asynchrone par `portee_async()`,
+puis appliquée aux querysets par `Portee.filtrer()` (mêmes règles que
+`filter_by_user_school`).
+
+La portée est mise en cache par utilisateur et par version de navigation
+(`ecole_moderne.fragments`): toute modification d'un Profil ou d'une École
+l'invalide, comme les menus. Les réponses des points d'accès AJAX sont mises en
+cache `AJAX_CACHE_SECONDS` secondes par portée via `en_cache_async()`.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ecole_moderne.fragments import CLE_VERSION, TIMEOUT
+
+
+@dataclass(frozen=True)
+class Portee:
+    superutilisateur: bool
+    role: Optional[str] = None
+    ecole_id: Optional[int] = None
+
+    @property
+    def est_admin(self):
+        """Équivalent de `user_is_admin()`."""
+        return self.superutilisateur or self.role == 'ADMIN'
+
+    @property
+    def cle(self):
+        """Identifiant de cache: deux utilisateurs de même clé voient les mêmes données."""
+        if self.superutilisateur:
+            return 'tout'
+        return f"ecole-{self.ecole_id}" if self.ecole_id else 'aucune'
+
+    def filtrer(self, qs, field_path='ecole'):
+        """Équivalent de `filter_by_user_school()`, sans accès au profil."""
+        if self.superutilisateur:
+            return qs
+        if self.ecole_id is None:
+            return qs.none()
+        return qs.filter(**{field_path: self.ecole_id})
+
+
+async def portee_async(request):
+    """Portée de l'utilisateur connecté (une requête SQL au plus, puis cache)."""
+    portee = getattr(request, '_portee_async', None)
+    if portee is not None:
+        return portee
+    from utilisateurs.models import Profil
+
+    user = await request.auser()
+    version = await cache.aget(CLE_VERSION) or 1
+    cle = f"asynchrone:portee:{user.pk}:{int(user.is_superuser)}:{version}"
+    portee = await cache.aget(cle)
+    if portee is None:
+        profil = await Profil.objects.filter(user_id=user.pk).values('role', 'ecole_id').afirst() or {}
+        portee = Portee(bool(user.is_superuser), profil.get('role'), profil.get('ecole_id'))
+        await cache.aset(cle, portee, TIMEOUT)
+    request._portee_async = portee
+    return portee
+
+
+async def en_cache_async(cle, calcul, timeout=None):
+    """Mémoïse le résultat de la coroutine `calcul()` sous `cle`."""
+    valeur = await cache.aget(cle)
+    if valeur is None:
+        valeur = await calcul()
+        await cache.aset(cle, valeur, getattr(settings, 'AJAX_CACHE_SECONDS', 30) if timeout is None else timeout)
+    return valeur
@@ -0,0 +1,4 @@
+"""Banc d'essai de performance: générateur de données synthétiques et suite de mesures.
+
+Utilisé par `python manage.py benchmark_performances`.
+"""
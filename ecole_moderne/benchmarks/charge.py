@@ -0,0 +1,184 @@
+"""Test de charge des points d'accès AJAX: workers synchrones contre vues asynchrones.
+
+Deux modèles de service sont comparés à concurrence égale:
+
+- `wsgi`: l'application WSGI servie par un nombre fixe de workers (pool de
+  threads de taille `workers`), comme gunicorn en workers synchrones: une
+  requête occupe son worker pendant toute l'attente de la base;
+- `asgi`: l'application `ecole_moderne.asgi` appelée directement sur une boucle
+  asyncio, comme un worker uvicorn: les requêtes en attente ne bloquent rien.
+
+En local, SQLite répond en quelques microsecondes et masque l'effet de
+l'attente réseau d'une vraie base: `latence_sql(ms)` ajoute une pause à chaque
+requête SQL pour la simuler. `envoyeur_http` vise un serveur réel à la place.
+"""
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.db.backends.signals import connection_created
+
+# (nom d'URL synchrone ou routé par AJAX_ASYNC, nom d'URL asynchrone, arguments)
+POINTS_ACCES = (
+    ('paiements:ajax_eleve_info', 'paiements:ajax_eleve_info_async', 'matricule'),
+    ('paiements:ajax_statistiques_paiements', 'paiements:ajax_statistiques_paiements_async', None),
+    ('paiements:ajax_classes_par_ecole', 'paiements:ajax_classes_par_ecole_async', None),
+    ('eleves:ajax_statistiques_eleves', 'eleves:ajax_statistiques_eleves_async', None),
+    ('eleves:ajax_classes_par_ecole', 'eleves:ajax_classes_par_ecole_async', 'ecole_id'),
+)
+
+
+@contextmanager
+def latence_sql(ms):
+    """Ajoute `ms` millisecondes à chaque requête SQL des connexions ouvertes pendant le bloc."""
+    if not ms:
+        yield
+        return
+
+    def attendre(execute, sql, params, many, context):
+        time.sleep(ms / 1000)
+        return execute(sql, params, many, context)
+
+    def installer(sender, connection, **kwargs):
+        if attendre not in connection.execute_wrappers:
+            connection.execute_wrappers.append(attendre)
+
+    connection_created.connect(installer, dispatch_uid='charge_latence_sql')
+    try:
+        yield
+    finally:
+        connection_created.disconnect(dispatch_uid='charge_latence_sql')
+
+
+def _en_tetes(cookies):
+    return [(b'host', b'testserver'), (b'cookie', '; '.join(f'{k}={v}' for k, v in cookies.items()).encode())]
+
+
+def envoyeur_asgi(application, cookies):
+    """Appel en mémoire de l'application ASGI (une coroutine par requête)."""
+    async def envoyer(chemin):
+        path, _, query = chemin.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': _en_tetes(cookies), 'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        statut = {}
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def recevoir():
+            if messages:
+                return messages.pop()
+            await asyncio.Event().wait()  # ne se déconnecte jamais
+
+        async def emettre(message):
+            if message['type'] == 'http.response.start':
+                statut['code'] = message['status']
+
+        await application(scope, recevoir, emettre)
+        return statut.get('code', 0)
+    return envoyer
+
+
+def envoyeur_wsgi(application, cookies, workers):
+    """Application WSGI servie par `workers` workers synchrones (pool de threads)."""
+    pool = ThreadPoolExecutor(max_workers=workers)
+    cookie = '; '.join(f'{k}={v}' for k, v in cookies.items())
+
+    def appeler(chemin):
+        path, _, query = chemin.partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.input': BytesIO(b''), 'wsgi.errors': BytesIO(), 'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        statut = []
+        reponse = application(environ, lambda s, h, exc_info=None: statut.append(int(s.split()[0])))
+        try:
+            for _ in reponse:
+                pass
+        finally:
+            if hasattr(reponse, 'close'):
+                reponse.close()
+        return statut[0]
+
+    async def envoyer(chemin):
+        return await asyncio.get_running_loop().run_in_executor(pool, appeler, chemin)
+    envoyer.pool = pool
+    return envoyer
+
+
+def envoyeur_http(base_url, cookies, delai=30):
+    """Requêtes HTTP/1.1 réelles vers un serveur lancé à part (gunicorn, uvicorn)."""
+    url = urlsplit(base_url)
+    hote, port = url.hostname, url.port or 80
+    cookie = '; '.join(f'{k}={v}' for k, v in cookies.items())
+
+    async def envoyer(chemin):
+        lecteur, ecrivain = await asyncio.wait_for(asyncio.open_connection(hote, port), delai)
+        try:
+            ecrivain.write(
+                f"GET {chemin} HTTP/1.1\r\nHost: {url.netloc}\r\nCookie: {cookie}\r\n"
+                f"X-Requested-With: XMLHttpRequest\r\nConnection: close\r\n\r\n".encode()
+            )
+            await ecrivain.drain()
+            premiere = await asyncio.wait_for(lecteur.readline(), delai)
+            await asyncio.wait_for(lecteur.read(), delai)
+            return int(premiere.split()[1])
+        finally:
+            ecrivain.close()
+    return envoyer
+
+
+async def charger(envoyer, chemins, requetes, concurrence):
+    """Envoie `requetes` requêtes (chemins en rotation) avec au plus `concurrence` en vol."""
+    semaphore = asyncio.Semaphore(concurrence)
+    durees, erreurs = [], 0
+
+    async def une(i):
+        nonlocal erreurs
+        async with semaphore:
+            debut = time.perf_counter()
+            try:
+                code = await envoyer(chemins[i % len(chemins)])
+            except Exception:
+                code = 0
+            durees.append((time.perf_counter() - debut) * 1000)
+            if code != 200:
+                erreurs += 1
+
+    debut = time.perf_counter()
+    await asyncio.gather(*(une(i) for i in range(requetes)))
+    total = time.perf_counter() - debut
+    durees.sort()
+    return {
+        'requetes': requetes,
+        'erreurs': erreurs,
+        'secondes': round(total, 3),
+        'req_par_s': round(requetes / total, 1) if total else 0.0,
+        'p50_ms': round(statistics.median(durees), 1),
+        'p95_ms': round(durees[min(len(durees) - 1, int(len(durees) * 0.95))], 1),
+    }
+
+
+def chemins(asynchrone, matricule, ecole_id):
+    """Chemins des POINTS_ACCES, version routée par AJAX_ASYNC ou version `ajax/async/`."""
+    from django.urls import reverse
+
+    resultat = []
+    for nom_sync, nom_async, argument in POINTS_ACCES:
+        nom = nom_async if asynchrone else nom_sync
+        if argument == 'ecole_id':
+            resultat.append(reverse(nom, args=[ecole_id]))
+        elif argument == 'matricule':
+            resultat.append(f"{reverse(nom)}?matricule={matricule}")
+        else:
+            resultat.append(reverse(nom))
+    return resultat
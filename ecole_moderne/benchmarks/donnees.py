@@ -0,0 +1,174 @@
+"""Générateur de données synthétiques à grande échelle (N écoles × M classes × K élèves).
+
+Tout est inséré par `bulk_create`: les `save()` personnalisés (slug d'école, matricule,
+numéro de reçu, date d'alerte bus) sont donc reproduits explicitement ici.
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from bus.models import AbonnementBus
+from eleves.models import Classe, Ecole, Eleve, GrilleTarifaire, Responsable
+from notes.models import Evaluation, MatiereClasse, Note
+from paiements.echeanciers import IndexGrilles, construire_echeancier, synchroniser_echeanciers_ecole
+from paiements.models import (
+    EcheancierPaiement, ModePaiement, Paiement, PaiementRemise, RemiseReduction, TypePaiement,
+)
+from utilisateurs.models import Profil
+
+ANNEE_SCOLAIRE = '2024-2025'
+NIVEAUX = [code for code, _ in Classe.NIVEAUX_CHOICES]
+MATIERES = ['Mathématiques', 'Français', 'Sciences', 'Histoire-Géographie']
+PRENOMS = ['Mamadou', 'Fatoumata', 'Ibrahima', 'Aissatou', 'Ousmane', 'Mariama', 'Alpha', 'Kadiatou']
+NOMS = ['Diallo', 'Barry', 'Bah', 'Camara', 'Sylla', 'Soumah', 'Keita', 'Touré']
+BATCH = 1000
+
+
+def _telephone(n: int) -> str:
+    return f"+224620{n:06d}"
+
+
+@transaction.atomic
+def generer_donnees(nb_ecoles=2, nb_classes=4, nb_eleves=30, seed=42):
+    """Crée un jeu de données complet et retourne un résumé {modèle: nombre}.
+
+    Par élève: 2 paiements (1 validé, 1 en attente), un échéancier synchronisé,
+    une note par évaluation; ~10 % des paiements portent une remise, ~20 % des
+    élèves ont un abonnement bus. Les responsables sont partagés par fratries de 2.
+    """
+    rnd = random.Random(seed)
+    today = date.today()
+
+    ecoles = Ecole.objects.bulk_create([
+        Ecole(
+            nom=f"Ecole Bench {i}", slug=f"ecole-bench-{seed}-{i}", adresse="Conakry",
+            telephone=_telephone(i), directeur=f"Directeur {i}", statut='ACTIVE',
+        )
+        for i in range(nb_ecoles)
+    ])
+    classes = Classe.objects.bulk_create([
+        Classe(
+            ecole=ecole, nom=f"Classe {j}", niveau=NIVEAUX[j % len(NIVEAUX)],
+            code_matricule=f"B{ecole.id}C{j}", annee_scolaire=ANNEE_SCOLAIRE, capacite_max=nb_eleves,
+        )
+        for ecole in ecoles for j in range(nb_classes)
+    ], batch_size=BATCH)
+    GrilleTarifaire.objects.bulk_create([
+        GrilleTarifaire(
+            ecole=ecole, niveau=niveau, annee_scolaire=ANNEE_SCOLAIRE,
+            frais_inscription=Decimal('50000'), tranche_1=Decimal('300000'),
+            tranche_2=Decimal('300000'), tranche_3=Decimal('300000'),
+        )
+        for ecole in ecoles for niveau in {c.niveau for c in classes if c.ecole_id == ecole.id}
+    ], batch_size=BATCH)
+
+    # Élèves et responsables (fratries de 2)
+    responsables = []
+    eleves = []
+    for classe in classes:
+        for k in range(nb_eleves):
+            if k % 2 == 0:
+                n = len(responsables)
+                responsables.append(Responsable(
+                    prenom=rnd.choice(PRENOMS), nom=rnd.choice(NOMS), relation='PERE',
+                    telephone=_telephone(100000 + n), telephone_e164=_telephone(100000 + n), adresse="Conakry",
+                ))
+            eleves.append(Eleve(
+                matricule=f"{classe.code_matricule}-{k + 1:04d}", prenom=rnd.choice(PRENOMS), nom=rnd.choice(NOMS),
+                sexe=rnd.choice('MF'), date_naissance=date(2012, 1, 1) + timedelta(days=rnd.randint(0, 2000)),
+                lieu_naissance="Conakry", classe=classe, date_inscription=date(2024, 9, 1) + timedelta(days=rnd.randint(0, 30)),
+                responsable_principal=responsables[-1],
+            ))
+    Responsable.objects.bulk_create(responsables, batch_size=BATCH)
+    for eleve in eleves:
+        eleve.responsable_principal_id = eleve.responsable_principal.id
+    Eleve.objects.bulk_create(eleves, batch_size=BATCH)
+
+    # Paiements et remises
+    type_scolarite, _ = TypePaiement.objects.get_or_create(nom="Scolarité")
+    mode_especes, _ = ModePaiement.objects.get_or_create(nom="Espèces")
+    remise, _ = RemiseReduction.objects.get_or_create(
+        nom="Fratrie (bench)", motif='FRATRIE',
+        defaults={'type_remise': 'POURCENTAGE', 'valeur': Decimal('10'),
+                  'date_debut': date(2024, 9, 1), 'date_fin': date(2025, 7, 31)},
+    )
+    prefixe = f"BN{seed % 100:02d}"
+    paiements = []
+    for eleve in eleves:
+        for statut in ('VALIDE', 'EN_ATTENTE'):
+            paiements.append(Paiement(
+                eleve=eleve, type_paiement=type_scolarite, mode_paiement=mode_especes,
+                numero_recu=f"{prefixe}{len(paiements):09d}", montant=Decimal(rnd.choice([100000, 200000, 350000])),
+                date_paiement=date(2024, 9, 15) + timedelta(days=rnd.randint(0, 200)), statut=statut,
+                reference_externe=f"OM{rnd.randint(10**8, 10**9)}",
+            ))
+    Paiement.objects.bulk_create(paiements, batch_size=BATCH)
+    PaiementRemise.objects.bulk_create([
+        PaiementRemise(paiement=p, remise=remise, montant_remise=(p.montant * Decimal('0.1')).quantize(Decimal('1')))
+        for p in paiements if p.statut == 'VALIDE' and rnd.random() < 0.1
+    ], batch_size=BATCH)
+
+    # Échéanciers synchronisés
+    grilles = IndexGrilles.charger(ecole_ids=[e.id for e in ecoles])
+    EcheancierPaiement.objects.bulk_create(
+        [construire_echeancier(eleve, grilles=grilles, today=date(2024, 9, 1)) for eleve in eleves],
+        batch_size=BATCH,
+    )
+    for ecole in ecoles:
+        synchroniser_echeanciers_ecole(ecole)
+
+    # Matières, évaluations (T1) et notes
+    matieres = MatiereClasse.objects.bulk_create([
+        MatiereClasse(ecole=classe.ecole, classe=classe, nom=nom, coefficient=rnd.randint(1, 4))
+        for classe in classes for nom in MATIERES
+    ], batch_size=BATCH)
+    evaluations = Evaluation.objects.bulk_create([
+        Evaluation(
+            ecole=m.ecole, classe=m.classe, matiere=m, titre=f"Composition {m.nom}",
+            date=date(2024, 12, 10), trimestre='T1', annee_scolaire=ANNEE_SCOLAIRE,
+        )
+        for m in matieres
+    ], batch_size=BATCH)
+    eleves_par_classe = {}
+    for eleve in eleves:
+        eleves_par_classe.setdefault(eleve.classe_id, []).append(eleve)
+    notes = [
+        Note(
+            ecole=ev.ecole, classe=ev.classe, matiere=ev.matiere, evaluation=ev, eleve=eleve,
+            matricule=eleve.matricule, note=Decimal(rnd.randint(0, 40)) / 2,
+        )
+        for ev in evaluations for eleve in eleves_par_classe.get(ev.classe_id, [])
+    ]
+    Note.objects.bulk_create(notes, batch_size=BATCH)
+
+    # Abonnements bus
+    abonnements = []
+    for eleve in eleves:
+        if rnd.random() < 0.2:
+            expiration = today + timedelta(days=rnd.randint(-30, 60))
+            abonnements.append(AbonnementBus(
+                eleve=eleve, montant=Decimal('150000'), date_debut=expiration - timedelta(days=90),
+                date_expiration=expiration, date_alerte=AbonnementBus.calculer_date_alerte(expiration, 7),
+                zone=rnd.choice(['Kaloum', 'Dixinn', 'Ratoma', 'Matam']),
+            ))
+    AbonnementBus.objects.bulk_create(abonnements, batch_size=BATCH)
+
+    return {
+        'ecoles': len(ecoles),
+        'classes': len(classes),
+        'eleves': len(eleves),
+        'responsables': len(responsables),
+        'paiements': len(paiements),
+        'notes': len(notes),
+        'abonnements_bus': len(abonnements),
+    }
+
+
+def creer_superutilisateur(ecole=None, username='bench-admin', password='bench-pass-12345'):
+    """Superutilisateur (profil ADMIN) utilisé par la suite pour parcourir les vues."""
+    user = User.objects.create_superuser(username=username, password=password, email='bench@example.com')
+    Profil.objects.create(user=user, role='ADMIN', ecole=ecole, telephone='+224620999999')
+    return user
@@ -0,0 +1,96 @@
+"""Temps d'import au démarrage: `django.setup()` + chargement de l'URLconf.
+
+La mesure se fait dans un interpréteur neuf lancé avec `python -X importtime`
+(les modules déjà importés par le processus courant fausseraient tout). Le
+processus enfant chronomètre les deux étapes et liste les bibliothèques lourdes
+chargées; la sortie importtime (stderr) est analysée pour attribuer le coût
+aux modules et aux paquets.
+
+Utilisé par `python manage.py mesurer_imports` (budget pour la CI).
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+
+# Bibliothèques qui doivent rester chargées au premier usage (ecole_moderne.pdf / ecole_moderne.xlsx)
+MODULES_LOURDS = ('reportlab', 'openpyxl', 'twilio', 'PIL')
+
+_LIGNE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+_SCRIPT = """
+import json, sys, time
+debut = time.perf_counter()
+import django
+django.setup()
+apres_setup = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+fin = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (apres_setup - debut) * 1000,
+    'urls_ms': (fin - apres_setup) * 1000,
+    'lourds': sorted(m for m in %r if m in sys.modules),
+}))
+"""
+
+
+def budget_ms():
+    return float(getattr(settings, 'IMPORT_BUDGET_MS', 1500))
+
+
+def analyser_importtime(texte):
+    """Lignes `-X importtime` -> [{'module', 'propre_us', 'cumul_us', 'profondeur'}]."""
+    entrees = []
+    for ligne in texte.splitlines():
+        m = _LIGNE.match(ligne)
+        if m:
+            entrees.append({
+                'module': m.group(4),
+                'propre_us': int(m.group(1)),
+                'cumul_us': int(m.group(2)),
+                'profondeur': len(m.group(3)) // 2,
+            })
+    return entrees
+
+
+def par_paquet(entrees):
+    """Temps propre cumulé par paquet de premier niveau, en ms, du plus coûteux au moins coûteux."""
+    totaux = defaultdict(int)
+    for e in entrees:
+        totaux[e['module'].split('.')[0]] += e['propre_us']
+    return sorted(((p, us / 1000) for p, us in totaux.items()), key=lambda t: -t[1])
+
+
+def mesurer(python=None, settings_module=None):
+    """Lance un interpréteur neuf et retourne la mesure (temps, modules lourds, détail importtime)."""
+    env = dict(os.environ)
+    env['DJANGO_SETTINGS_MODULE'] = settings_module or os.environ.get('DJANGO_SETTINGS_MODULE', 'ecole_moderne.settings')
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (str(settings.BASE_DIR), env.get('PYTHONPATH')) if p)
+    resultat = subprocess.run(
+        [python or sys.executable, '-X', 'importtime', '-c', _SCRIPT % (MODULES_LOURDS,)],
+        capture_output=True, text=True, cwd=str(settings.BASE_DIR), env=env, check=False,
+    )
+    if resultat.returncode != 0:
+        raise RuntimeError(f"Échec de la mesure d'import:\n{resultat.stderr[-2000:]}")
+    mesure = json.loads(resultat.stdout.strip().splitlines()[-1])
+    entrees = analyser_importtime(resultat.stderr)
+    mesure['total_ms'] = mesure['setup_ms'] + mesure['urls_ms']
+    mesure['modules'] = entrees
+    mesure['paquets'] = par_paquet(entrees)
+    return mesure
+
+
+def depassements(mesure, budget=None):
+    """Liste des manquements au budget (vide si tout va bien)."""
+    budget = budget_ms() if budget is None else budget
+    erreurs = []
+    if mesure['total_ms'] > budget:
+        erreurs.append(f"django.setup() + URLconf: {mesure['total_ms']:.0f} ms > budget {budget:.0f} ms")
+    if mesure['lourds']:
+        erreurs.append(f"Bibliothèques lourdes importées au démarrage: {', '.join(mesure['lourds'])}")
+    return erreurs
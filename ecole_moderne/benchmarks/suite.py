@@ -0,0 +1,136 @@
+"""Suite de mesures: temps (médiane) et nombre de requêtes SQL des chemins critiques.
+
+Chaque scénario est une fonction `(contexte) -> None` exécutée `repetitions` fois,
+caches vidés avant chaque passage. Le contexte contient le client HTTP connecté,
+l'utilisateur et quelques identifiants du jeu de données (voir `preparer_contexte`).
+"""
+import json
+import statistics
+import time
+from datetime import date, datetime
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from eleves.models import Classe
+
+# Une régression de temps n'est signalée qu'au-delà de ce plancher (bruit de mesure)
+PLANCHER_MS = 5.0
+
+
+def _vue(nom_url, *args_contexte):
+    """Scénario qui appelle une vue par GET et exige une réponse 200."""
+    def scenario(contexte):
+        args = [contexte[cle] if cle in contexte else cle for cle in args_contexte]
+        response = contexte['client'].get(reverse(nom_url, args=args))
+        if response.status_code != 200:
+            raise AssertionError(f"{nom_url}: statut HTTP {response.status_code}")
+        # Les réponses en streaming ne sont produites qu'à la lecture
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+    return scenario
+
+
+def _rapport_journalier(contexte):
+    from rapports.views import collecter_donnees_journalieres
+    collecter_donnees_journalieres(contexte['date'], user=contexte['user'])
+
+
+def _rapport_annuel(contexte):
+    from rapports.utils import collecter_donnees_periode
+    annee = contexte['date'].year
+    debut = timezone.make_aware(datetime.combine(date(annee, 1, 1), datetime.min.time()))
+    fin = timezone.make_aware(datetime.combine(date(annee, 12, 31), datetime.max.time()))
+    collecter_donnees_periode(debut, fin, 'ANNUEL', user=contexte['user'])
+
+
+SCENARIOS = {
+    'eleves.liste': _vue('eleves:liste_eleves'),
+    'eleves.statistiques': _vue('eleves:statistiques_eleves'),
+    'paiements.tableau_bord': _vue('paiements:tableau_bord'),
+    'paiements.liste': _vue('paiements:liste_paiements'),
+    'paiements.eleves_soldes': _vue('paiements:liste_eleves_soldes'),
+    'bus.liste': _vue('bus:liste'),
+    'bus.relances': _vue('bus:relances'),
+    'notes.bulletins_classe_pdf': _vue('notes:bulletins_classe_pdf', 'classe_id', 'T1'),
+    'rapports.journalier': _rapport_journalier,
+    'rapports.annuel': _rapport_annuel,
+}
+
+
+def preparer_contexte(user, jour=None):
+    client = Client()
+    client.force_login(user)
+    classe = Classe.objects.order_by('id').first()
+    return {
+        'client': client,
+        'user': user,
+        'classe_id': classe.id if classe else 0,
+        'date': jour or date(2025, 3, 1),
+    }
+
+
+def _vider_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+def mesurer(scenario, contexte, repetitions=3):
+    """Retourne {'ms': médiane, 'ms_min': minimum, 'requetes': nombre de requêtes du dernier passage}."""
+    durees = []
+    requetes = 0
+    for _ in range(max(1, repetitions)):
+        _vider_caches()
+        with CaptureQueriesContext(connection) as capture:
+            debut = time.perf_counter()
+            scenario(contexte)
+            durees.append((time.perf_counter() - debut) * 1000)
+        requetes = len(capture.captured_queries)
+    return {
+        'ms': round(statistics.median(durees), 2),
+        'ms_min': round(min(durees), 2),
+        'requetes': requetes,
+    }
+
+
+def executer_suite(contexte, repetitions=3, noms=None):
+    """Exécute les scénarios (tous, ou ceux de `noms`) et retourne {nom: mesure}."""
+    resultats = {}
+    for nom, scenario in SCENARIOS.items():
+        if noms and nom not in noms:
+            continue
+        resultats[nom] = mesurer(scenario, contexte, repetitions)
+    return resultats
+
+
+def comparer(resultats, baseline, seuil=0.2, plancher_ms=PLANCHER_MS):
+    """Liste les régressions par rapport à une baseline.
+
+    Régression: plus de requêtes que la baseline, ou un temps médian supérieur à
+    baseline × (1 + seuil) et d'au moins `plancher_ms`.
+    """
+    regressions = []
+    for nom, mesure in resultats.items():
+        reference = baseline.get(nom)
+        if not reference:
+            continue
+        if mesure['requetes'] > reference['requetes']:
+            regressions.append(f"{nom}: {mesure['requetes']} requêtes (baseline {reference['requetes']})")
+        limite = reference['ms'] * (1 + seuil)
+        if mesure['ms'] > limite and mesure['ms'] - reference['ms'] >= plancher_ms:
+            regressions.append(f"{nom}: {mesure['ms']:.1f} ms (baseline {reference['ms']:.1f} ms, +{seuil:.0%} max)")
+    return regressions
+
+
+def lire_baseline(chemin):
+    with open(chemin, 'r', encoding='utf-8') as fh:
+        return json.load(fh).get('scenarios', {})
+
+
+def ecrire_baseline(chemin, resultats, parametres):
+    with open(chemin, 'w', encoding='utf-8') as fh:
+        json.dump({'parametres': parametres, 'scenarios': resultats}, fh, indent=2, sort_keys=True)
@@ -0,0 +1,287 @@
+"""Moteur d'export tabulaire commun (XLSX, CSV, NDJSON) en flux.
+
+Une vue déclare ses colonnes et fournit les lignes (queryset ou itérable):
+
+    colonnes = [
+        Colonne('Élève', lambda p: p.eleve.nom_complet, largeur=25),
+        Colonne('Montant (GNF)', 'montant', format='montant', total=True),
+        Colonne('Date', 'date_paiement', format='date'),
+    ]
+    return exporter(request, qs, colonnes, nom_fichier='paiements', titre_feuille='Paiements')
+
+Le format vient de `?format=xlsx|csv|ndjson` (xlsx par défaut).
+
+- CSV et NDJSON: `StreamingHttpResponse`, une ligne produite par ligne lue; rien
+  n'est accumulé en mémoire.
+- XLSX: classeur openpyxl en mode `write_only` (lignes écrites au fil de l'eau dans
+  un fichier temporaire) avec styles nommés, puis fichier servi par morceaux. Un
+  fichier zip ne peut pas être envoyé avant d'être complet, mais la mémoire reste
+  constante quel que soit le nombre de lignes.
+
+Les querysets sont parcourus avec `.iterator(chunk_size=...)`. Ils sont liés à leur
+base de lecture (`.using()`) au moment où la réponse est construite: un flux est
+consommé après le retour de la vue, donc hors du bloc `@lecture_replica`.
+"""
+import csv
+import json
+import tempfile
+from dataclasses import dataclass, replace
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Union
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.text import slugify
+
+from ecole_moderne import xlsx
+
+FORMATS = ('xlsx', 'csv', 'ndjson')
+TAILLE_LOT = 2000
+COULEUR_ENTETE = '366092'
+
+TYPES_CONTENU = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+# Formats de nombre/date appliqués par les styles nommés XLSX
+FORMATS_CELLULE = {
+    'texte': 'General',
+    'entier': '0',
+    'montant': '#,##0',
+    'decimal': '0.00',
+    'date': 'DD/MM/YYYY',
+}
+
+
+@dataclass
+class Colonne:
+    """Colonne d'export: `valeur` est un chemin d'attributs ('eleve.classe.nom') ou une fonction."""
+    titre: str
+    valeur: Union[str, Callable[[Any], Any]]
+    largeur: int = 15
+    format: str = 'texte'
+    total: bool = False
+    cle: str = ''
+
+    def __post_init__(self):
+        if self.format not in FORMATS_CELLULE:
+            raise ValueError(f"Format de colonne inconnu: {self.format}")
+        if not self.cle:
+            self.cle = slugify(self.titre).replace('-', '_') or 'colonne'
+
+    def extraire(self, obj):
+        if callable(self.valeur):
+            return self.valeur(obj)
+        valeur = obj
+        for attribut in self.valeur.split('.'):
+            if valeur is None:
+                return None
+            valeur = valeur.get(attribut) if isinstance(valeur, dict) else getattr(valeur, attribut, None)
+        return valeur() if callable(valeur) else valeur
+
+
+@dataclass
+class Feuille:
+    titre: str
+    colonnes: list
+    lignes: Iterable
+    intitule: str = ''  # ligne de titre au-dessus des en-têtes (XLSX)
+    couleur_entete: str = COULEUR_ENTETE
+
+
+def format_demande(request, defaut='xlsx'):
+    fmt = (request.GET.get('format') or defaut).lower()
+    return fmt if fmt in FORMATS else defaut
+
+
+def _parcourir(lignes):
+    if isinstance(lignes, QuerySet):
+        return lignes.iterator(chunk_size=TAILLE_LOT)
+    return iter(lignes)
+
+
+def _nombre(valeur):
+    if isinstance(valeur, Decimal):
+        return int(valeur) if valeur == valeur.to_integral_value() else float(valeur)
+    return valeur
+
+
+def _valeur_xlsx(colonne, valeur):
+    if valeur is None or valeur == '':
+        return None
+    if colonne.format in ('entier', 'montant', 'decimal'):
+        try:
+            return _nombre(Decimal(str(valeur)))
+        except Exception:
+            return str(valeur)
+    if colonne.format == 'date' and isinstance(valeur, datetime):
+        return valeur.replace(tzinfo=None)
+    if isinstance(valeur, Decimal):
+        return _nombre(valeur)
+    return valeur
+
+
+def _valeur_texte(colonne, valeur):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, (date, datetime)):
+        return valeur.strftime('%d/%m/%Y %H:%M' if isinstance(valeur, datetime) else '%d/%m/%Y')
+    if isinstance(valeur, Decimal):
+        return str(_nombre(valeur))
+    return valeur
+
+
+def _ligne_totaux(colonnes, totaux, libelle='Total:'):
+    """Ligne de totaux: `totaux` {index: valeur}; libellé juste avant la première colonne totalisée."""
+    ligne = [None] * len(colonnes)
+    for i, valeur in totaux.items():
+        ligne[i] = valeur
+    ligne[max(min(totaux) - 1, 0)] = ligne[max(min(totaux) - 1, 0)] or libelle
+    return ligne
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer: retourne la ligne au lieu de l'écrire."""
+
+    def write(self, valeur):
+        return valeur
+
+
+def _flux_csv(feuilles, separateur):
+    ecrivain = csv.writer(_Echo(), delimiter=separateur)
+    yield '\ufeff'  # BOM: accents corrects à l'ouverture dans Excel
+    for index, feuille in enumerate(feuilles):
+        if len(feuilles) > 1:
+            if index:
+                yield '\r\n'
+            yield ecrivain.writerow([feuille.titre])
+        colonnes = feuille.colonnes
+        yield ecrivain.writerow([c.titre for c in colonnes])
+        totaux = {i: Decimal('0') for i, c in enumerate(colonnes) if c.total}
+        for obj in _parcourir(feuille.lignes):
+            valeurs = [c.extraire(obj) for c in colonnes]
+            for i in totaux:
+                try:
+                    totaux[i] += Decimal(str(valeurs[i] or 0))
+                except Exception:
+                    pass
+            yield ecrivain.writerow([_valeur_texte(c, v) for c, v in zip(colonnes, valeurs)])
+        if totaux:
+            ligne = _ligne_totaux(colonnes, {i: str(_nombre(t)) for i, t in totaux.items()})
+            yield ecrivain.writerow(['' if v is None else v for v in ligne])
+
+
+def _flux_ndjson(feuilles):
+    for feuille in feuilles:
+        colonnes = feuille.colonnes
+        for obj in _parcourir(feuille.lignes):
+            donnees = {c.cle: _nombre(c.extraire(obj)) for c in colonnes}
+            if len(feuilles) > 1:
+                donnees = {'feuille': feuille.titre, **donnees}
+            yield json.dumps(donnees, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def _styles_nommes(wb, feuilles):
+    from ecole_moderne.xlsx import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+    fin = Side(style='thin', color='DDDDDD')
+    bordure = Border(left=fin, right=fin, top=fin, bottom=fin)
+    for couleur in {f.couleur_entete for f in feuilles}:
+        wb.add_named_style(NamedStyle(
+            name=f'export_entete_{couleur}', font=Font(bold=True, color='FFFFFF'),
+            fill=PatternFill(start_color=couleur, end_color=couleur, fill_type='solid'),
+            alignment=Alignment(horizontal='center', vertical='center'), border=bordure,
+        ))
+    for nom, format_nombre in FORMATS_CELLULE.items():
+        wb.add_named_style(NamedStyle(
+            name=f'export_{nom}', number_format=format_nombre, border=bordure,
+            alignment=Alignment(vertical='top'),
+        ))
+        wb.add_named_style(NamedStyle(
+            name=f'export_{nom}_total', number_format=format_nombre, border=bordure, font=Font(bold=True),
+        ))
+    wb.add_named_style(NamedStyle(name='export_intitule', font=Font(bold=True, size=14)))
+
+
+def ecrire_xlsx(feuilles, flux):
+    """Écrit les feuilles dans `flux` (fichier binaire) en mode write_only."""
+    from ecole_moderne.xlsx import Workbook, WriteOnlyCell, get_column_letter
+
+    wb = Workbook(write_only=True)
+    _styles_nommes(wb, feuilles)
+
+    def cellule(ws, valeur, style):
+        c = WriteOnlyCell(ws, value=valeur)
+        c.style = style
+        return c
+
+    for feuille in feuilles:
+        ws = wb.create_sheet(title=feuille.titre[:31])
+        colonnes = feuille.colonnes
+        for i, colonne in enumerate(colonnes, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = colonne.largeur
+        ligne_courante = 0
+        if feuille.intitule:
+            ws.append([cellule(ws, feuille.intitule, 'export_intitule')])
+            ligne_courante += 1
+        style_entete = f'export_entete_{feuille.couleur_entete}'
+        ws.append([cellule(ws, c.titre, style_entete) for c in colonnes])
+        ligne_courante += 1
+        premiere = ligne_courante + 1
+        styles = [f'export_{c.format}' for c in colonnes]
+        for obj in _parcourir(feuille.lignes):
+            ws.append([
+                cellule(ws, _valeur_xlsx(c, c.extraire(obj)), style)
+                for c, style in zip(colonnes, styles)
+            ])
+            ligne_courante += 1
+        totaux = {
+            i: f'=SUM({get_column_letter(i + 1)}{premiere}:{get_column_letter(i + 1)}{ligne_courante})'
+            for i, c in enumerate(colonnes) if c.total
+        }
+        if totaux and ligne_courante >= premiere:
+            ws.append([
+                None if v is None else cellule(ws, v, f'export_{colonnes[i].format if i in totaux else "texte"}_total')
+                for i, v in enumerate(_ligne_totaux(colonnes, totaux))
+            ])
+    wb.save(flux)
+
+
+def _lier_base(feuille):
+    """Fige la base de lecture routée maintenant (réplique, archives ou primaire)."""
+    if isinstance(feuille.lignes, QuerySet):
+        return replace(feuille, lignes=feuille.lignes.using(feuille.lignes.db))
+    return feuille
+
+
+def reponse_export(feuilles, *, nom_fichier, format='xlsx', separateur=';'):
+    """Réponse HTTP (en flux) pour une liste de `Feuille` dans le format demandé."""
+    if format not in FORMATS:
+        raise ValueError(f"Format d'export inconnu: {format}")
+    feuilles = [_lier_base(f) for f in feuilles]
+    nom = f"{nom_fichier}.{format}"
+    if format == 'csv':
+        response = StreamingHttpResponse(_flux_csv(feuilles, separateur), content_type=TYPES_CONTENU['csv'])
+    elif format == 'ndjson':
+        response = StreamingHttpResponse(_flux_ndjson(feuilles), content_type=TYPES_CONTENU['ndjson'])
+    else:
+        if not xlsx.disponible():
+            return HttpResponse("Erreur: openpyxl n'est pas installé sur le serveur.", status=500)
+        fichier = tempfile.TemporaryFile()
+        ecrire_xlsx(feuilles, fichier)
+        fichier.seek(0)
+        response = FileResponse(fichier, content_type=TYPES_CONTENU['xlsx'])
+    response['Content-Disposition'] = f'attachment; filename="{nom}"'
+    return response
+
+
+def exporter(request, lignes, colonnes, *, nom_fichier, titre_feuille='Export', intitule='',
+             couleur_entete=COULEUR_ENTETE, separateur=';', format=None):
+    """Export d'une seule feuille au format demandé par `?format=` (xlsx par défaut)."""
+    feuille = Feuille(titre_feuille, colonnes, lignes, intitule=intitule, couleur_entete=couleur_entete)
+    return reponse_export([feuille], nom_fichier=nom_fichier, format=format or format_demande(request),
+                          separateur=separateur)
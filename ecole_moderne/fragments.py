@@ -0,0 +1,82 @@
+"""
+Cache des fragments de navigation (menus de base.html, sélecteur d'école)
+
+Les fragments sont mis en cache (300 s) avec la balise `{% cache %}` de Django, variés sur
+`nav_cache_key` (rôle, permissions, école, langue, version). La version est un
+compteur en cache incrémenté par `invalider_navigation()` à chaque modification
+d'une École ou d'un Profil (rôle, école, permissions): les anciennes clés ne sont
+plus jamais lues et expirent d'elles-mêmes.
+
+Avec un cache local au processus (LocMemCache), l'invalidation ne touche que le
+worker courant: les autres se resynchronisent à l'expiration des fragments.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+
+CLE_VERSION = 'fragments:navigation:version'
+
+
+TIMEOUT = 300  # identique aux balises {% cache 300 ... %} des templates
+
+
+def version_navigation():
+    version = cache.get(CLE_VERSION)
+    if version is None:
+        cache.add(CLE_VERSION, 1, None)
+        version = cache.get(CLE_VERSION) or 1
+    return version
+
+
+def invalider_navigation():
+    """Invalide tous les fragments de navigation et les données associées."""
+    try:
+        cache.incr(CLE_VERSION)
+    except ValueError:
+        cache.set(CLE_VERSION, 2, None)
+
+
+def bits_permissions(permissions):
+    """Représentation compacte et stable d'un dict de permissions booléennes."""
+    return ''.join('1' if permissions[cle] else '0' for cle in sorted(permissions)) or '-'
+
+
+def cle_navigation(user, role, permissions, ecole_id):
+    """Clé de variation des fragments: deux utilisateurs de même clé voient les mêmes menus."""
+    brut = '|'.join(str(v) for v in (
+        version_navigation(),
+        int(bool(user.is_authenticated)),
+        int(bool(getattr(user, 'is_superuser', False))),
+        role or '-',
+        bits_permissions(permissions),
+        ecole_id or '-',
+        translation.get_language() or settings.LANGUAGE_CODE,
+    ))
+    return hashlib.md5(brut.encode(), usedforsecurity=False).hexdigest()
+
+
+def permissions_en_cache(user, calcul):
+    """Mémoïse `calcul(user)` (dict de permissions ou de restrictions) par utilisateur et version."""
+    cle = f"fragments:{calcul.__name__}:{user.pk}:{int(user.is_superuser)}:{version_navigation()}"
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = calcul(user)
+        cache.set(cle, valeur, TIMEOUT)
+    return valeur
+
+
+def ecoles_actives():
+    """Écoles actives pour le sélecteur des superutilisateurs: [{'id', 'nom', 'type'}], en cache."""
+    from eleves.models import Ecole
+
+    cle = f"fragments:ecoles_actives:{version_navigation()}"
+    ecoles = cache.get(cle)
+    if ecoles is None:
+        ecoles = [
+            {'id': e.id, 'nom': e.nom, 'type': e.get_type_ecole_display()}
+            for e in Ecole.objects.filter(statut='ACTIVE').only('id', 'nom', 'type_ecole').order_by('nom')
+        ]
+        cache.set(cle, ecoles, TIMEOUT)
+    return ecoles
@@ -0,0 +1,89 @@
+"""
+Banc d'essai de performance sur une base de test jetable.
+Usage: python manage.py benchmark_performances --ecoles 5 --classes 10 --eleves 40 --baseline perf.json
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from ecole_moderne.benchmarks import suite
+from ecole_moderne.benchmarks.donnees import creer_superutilisateur, generer_donnees
+
+
+class Command(BaseCommand):
+    help = ("Génère un jeu de données synthétique dans une base de test jetable, mesure les vues critiques "
+            "(temps médian et requêtes SQL) et compare à une baseline JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ecoles', type=int, default=2, help="Nombre d'écoles (défaut 2)")
+        parser.add_argument('--classes', type=int, default=4, help="Classes par école (défaut 4)")
+        parser.add_argument('--eleves', type=int, default=30, help="Élèves par classe (défaut 30)")
+        parser.add_argument('--seed', type=int, default=42, help="Graine du générateur aléatoire")
+        parser.add_argument('--repetitions', type=int, default=3, help="Passages par scénario (défaut 3)")
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help="Limiter à un scénario (répétable)")
+        parser.add_argument('--baseline', help="Fichier JSON de référence")
+        parser.add_argument('--ecrire-baseline', action='store_true',
+                            help="Écrire les mesures dans --baseline au lieu de comparer")
+        parser.add_argument('--seuil', type=float, default=0.2,
+                            help="Tolérance sur le temps médian (0.2 = +20%%)")
+
+    def handle(self, *args, **options):
+        noms = options.get('scenarios') or None
+        inconnus = set(noms or []) - set(suite.SCENARIOS)
+        if inconnus:
+            raise CommandError(f"Scénarios inconnus: {', '.join(sorted(inconnus))}. "
+                               f"Disponibles: {', '.join(suite.SCENARIOS)}")
+        baseline_path = options.get('baseline')
+        if options.get('ecrire_baseline') and not baseline_path:
+            raise CommandError("--ecrire-baseline nécessite --baseline")
+        baseline = None
+        if baseline_path and not options.get('ecrire_baseline'):
+            if not os.path.exists(baseline_path):
+                raise CommandError(f"Baseline introuvable: {baseline_path}")
+            baseline = suite.lire_baseline(baseline_path)
+
+        parametres = {k: options[k] for k in ('ecoles', 'classes', 'eleves', 'seed', 'repetitions')}
+
+        # Bases de test jetables pour tous les alias (default, archives; la réplique devient
+        # un miroir de default): aucune base configurée n'est lue ni modifiée pendant la mesure
+        setup_test_environment()
+        anciennes_bases = setup_databases(
+            verbosity=0, interactive=False, aliases=set(connections), serialized_aliases=set(),
+        )
+        try:
+            debut = time.monotonic()
+            resume = generer_donnees(options['ecoles'], options['classes'], options['eleves'], seed=options['seed'])
+            self.stdout.write(self.style.NOTICE(
+                f"Données générées en {time.monotonic() - debut:.1f}s: "
+                + ", ".join(f"{k}={v}" for k, v in resume.items())
+            ))
+            contexte = suite.preparer_contexte(creer_superutilisateur())
+            resultats = suite.executer_suite(contexte, options['repetitions'], noms)
+        finally:
+            teardown_databases(anciennes_bases, verbosity=0)
+            teardown_test_environment()
+
+        for nom, mesure in resultats.items():
+            reference = (baseline or {}).get(nom)
+            ecart = f"  (baseline {reference['ms']:.1f} ms / {reference['requetes']} req.)" if reference else ""
+            self.stdout.write(f"{nom:<30} {mesure['ms']:>9.1f} ms {mesure['requetes']:>6} req.{ecart}")
+
+        if options.get('ecrire_baseline'):
+            suite.ecrire_baseline(baseline_path, resultats, parametres)
+            self.stdout.write(self.style.SUCCESS(f"Baseline écrite: {baseline_path}"))
+            return
+        if baseline is None:
+            return
+
+        regressions = suite.comparer(resultats, baseline, seuil=options['seuil'])
+        if regressions:
+            for ligne in regressions:
+                self.stderr.write(self.style.ERROR(f"Régression - {ligne}"))
+            raise CommandError(f"{len(regressions)} régression(s) de performance détectée(s)")
+        self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la baseline"))
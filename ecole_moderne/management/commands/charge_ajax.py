@@ -0,0 +1,105 @@
+"""
+Test de charge des points d'accès AJAX: workers synchrones (WSGI) contre vues asynchrones (ASGI).
+Usage: python manage.py charge_ajax --concurrence 50 --requetes 500 --workers 3 --latence-ms 20
+       python manage.py charge_ajax --url http://127.0.0.1:8000 --url-async http://127.0.0.1:8001 --session <id>
+"""
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from ecole_moderne.benchmarks import charge
+from ecole_moderne.benchmarks.donnees import creer_superutilisateur, generer_donnees
+
+
+class Command(BaseCommand):
+    help = ("Charge concurrente sur les points d'accès AJAX: N workers synchrones contre une boucle ASGI, "
+            "en mémoire sur une base de test jetable ou contre des serveurs lancés à part (--url)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=300, help="Requêtes par modèle (défaut 300)")
+        parser.add_argument('--concurrence', type=int, default=50, help="Requêtes simultanées (défaut 50)")
+        parser.add_argument('--workers', type=int, default=3, help="Workers synchrones simulés (défaut 3)")
+        parser.add_argument('--latence-ms', type=float, default=20,
+                            help="Latence ajoutée à chaque requête SQL en mémoire (défaut 20 ms)")
+        parser.add_argument('--eleves', type=int, default=20, help="Élèves par classe en mémoire (défaut 20)")
+        parser.add_argument('--url', help="Serveur synchrone (gunicorn) à charger à la place du mode en mémoire")
+        parser.add_argument('--url-async', help="Serveur ASGI (uvicorn); défaut: --url, chemins ajax/async/")
+        parser.add_argument('--session', help="Cookie sessionid d'un utilisateur connecté (avec --url)")
+        parser.add_argument('--matricule', default='', help="Matricule pour eleve-info (avec --url)")
+        parser.add_argument('--ecole', type=int, default=1, help="École pour classes-par-ecole (avec --url)")
+        parser.add_argument('--json', action='store_true', help="Sortie JSON")
+
+    def handle(self, *args, **options):
+        if options['requetes'] < 1 or options['concurrence'] < 1 or options['workers'] < 1:
+            raise CommandError("--requetes, --concurrence et --workers doivent être positifs")
+        if options.get('url'):
+            resultats = self._charger_serveurs(options)
+        else:
+            resultats = self._charger_en_memoire(options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultats, indent=2))
+            return
+        for nom, mesure in resultats.items():
+            self.stdout.write(
+                f"{nom:<12} {mesure['req_par_s']:>8.1f} req/s  p50 {mesure['p50_ms']:>7.1f} ms  "
+                f"p95 {mesure['p95_ms']:>7.1f} ms  erreurs {mesure['erreurs']}"
+            )
+        sync, asynchrone = resultats['wsgi'], resultats['asgi']
+        if sync['req_par_s']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Débit ASGI / WSGI: x{asynchrone['req_par_s'] / sync['req_par_s']:.1f}"
+            ))
+
+    def _charger_serveurs(self, options):
+        if not options.get('session'):
+            raise CommandError("--url nécessite --session (cookie sessionid d'un utilisateur connecté)")
+        cookies = {'sessionid': options['session']}
+        args = (options['matricule'], options['ecole'])
+        envoyeurs = {
+            'wsgi': (charge.envoyeur_http(options['url'], cookies), charge.chemins(False, *args)),
+            'asgi': (charge.envoyeur_http(options.get('url_async') or options['url'], cookies),
+                     charge.chemins(True, *args)),
+        }
+        return {
+            nom: asyncio.run(charge.charger(envoyer, liste, options['requetes'], options['concurrence']))
+            for nom, (envoyer, liste) in envoyeurs.items()
+        }
+
+    def _charger_en_memoire(self, options):
+        from django.core.handlers.asgi import ASGIHandler
+        from django.core.handlers.wsgi import WSGIHandler
+        from eleves.models import Eleve
+
+        # Base de test jetable: la base configurée n'est jamais modifiée
+        setup_test_environment()
+        ancien_nom = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            generer_donnees(2, 4, options['eleves'])
+            client = Client()
+            client.force_login(creer_superutilisateur())
+            cookies = {'sessionid': client.cookies['sessionid'].value}
+            eleve = Eleve.objects.select_related('classe').order_by('id').first()
+            args = (eleve.matricule, eleve.classe.ecole_id)
+
+            wsgi = charge.envoyeur_wsgi(WSGIHandler(), cookies, options['workers'])
+            envoyeurs = {
+                'wsgi': (wsgi, charge.chemins(False, *args)),
+                'asgi': (charge.envoyeur_asgi(ASGIHandler(), cookies), charge.chemins(True, *args)),
+            }
+            resultats = {}
+            with charge.latence_sql(options['latence_ms']):
+                for nom, (envoyer, liste) in envoyeurs.items():
+                    resultats[nom] = asyncio.run(
+                        charge.charger(envoyer, liste, options['requetes'], options['concurrence'])
+                    )
+            wsgi.pool.shutdown()
+        finally:
+            connection.creation.destroy_test_db(ancien_nom, verbosity=0)
+            teardown_test_environment()
+        return resultats
@@ -0,0 +1,141 @@
+"""
+Clôture d'une année scolaire: passage à l'année suivante et archivage des années anciennes.
+Usage: python manage.py cloturer_annee 2025-2026 [--simulation] [--sans-passage] [--lot 500]
+
+Étapes (reprises là où une exécution interrompue s'est arrêtée, voir ClotureAnnee):
+1. ETIQUETAGE  - année scolaire posée sur les lignes qui n'en ont pas;
+2. REFERENTIEL - élèves, classes, écoles, profils... copiés dans la base d'archives;
+3. PASSAGE     - classes, grilles tarifaires et échéanciers des élèves actifs passent
+                 de l'année clôturée à la suivante (ancien scripts/update_annee_scolaire.py);
+4. ARCHIVAGE   - les lignes des années antérieures à l'année clôturée quittent la base
+                 principale pour les archives, par lots.
+La base principale garde ainsi l'année clôturée et la nouvelle année.
+"""
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from ecole_moderne import archives
+from eleves.models import Classe, GrilleTarifaire
+from paiements.models import EcheancierPaiement
+from utilisateurs.models import ClotureAnnee
+
+ETAPES = [code for code, _ in ClotureAnnee.ETAPE_CHOICES]
+
+
+class Command(BaseCommand):
+    help = ("Clôture une année scolaire: passage des classes, grilles et échéanciers à l'année suivante, "
+            "puis archivage des années plus anciennes dans la base d'archives (reprise possible)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('annee', help="Année scolaire clôturée, ex: 2025-2026")
+        parser.add_argument('--lot', type=int, default=500, help="Lignes déplacées par transaction (défaut 500)")
+        parser.add_argument('--sans-passage', action='store_true',
+                            help="Ne pas faire passer classes, grilles et échéanciers à l'année suivante")
+        parser.add_argument('--simulation', action='store_true', help="Afficher ce qui serait fait, sans rien modifier")
+        parser.add_argument('--forcer', action='store_true',
+                            help="Relancer l'archivage d'une année déjà clôturée (lignes ajoutées depuis)")
+
+    def handle(self, *args, **options):
+        annee = options['annee']
+        if not re.fullmatch(r'\d{4}-\d{4}', annee) or int(annee[5:]) != int(annee[:4]) + 1:
+            raise CommandError(f"Année scolaire invalide: {annee} (format attendu: 2025-2026)")
+        courante = archives.annee_scolaire_de(timezone.localdate())
+        if annee > courante:
+            raise CommandError(f"{annee} n'a pas commencé (année en cours: {courante})")
+        if options['lot'] < 1:
+            raise CommandError("--lot doit être positif")
+        suivante = archives.decaler(annee, 1)
+
+        if options['simulation']:
+            self._simuler(annee, suivante, options['sans_passage'])
+            return
+        self._verifier_base_archives()
+
+        cloture, _ = ClotureAnnee.objects.get_or_create(annee_scolaire=annee)
+        if cloture.etape == 'TERMINEE':
+            if not options['forcer']:
+                self.stdout.write(self.style.SUCCESS(f"{annee} est déjà clôturée (--forcer pour relancer l'archivage)"))
+                return
+            cloture.etape = 'ARCHIVAGE'
+        elif cloture.etape != 'ETIQUETAGE':
+            self.stdout.write(self.style.NOTICE(f"Reprise de la clôture {annee} à l'étape {cloture.get_etape_display()}"))
+
+        copieur = archives.Copieur()
+        for etape in ETAPES[ETAPES.index(cloture.etape):-1]:
+            if etape == 'ETIQUETAGE':
+                cloture.compteurs[etape] = archives.etiqueter()
+            elif etape == 'REFERENTIEL':
+                cloture.compteurs[etape] = archives.copier_referentiel(options['lot'], copieur)
+            elif etape == 'PASSAGE':
+                cloture.compteurs[etape] = ({} if options['sans_passage'] else self._passage(annee, suivante))
+            elif etape == 'ARCHIVAGE':
+                faits = cloture.compteurs.setdefault(etape, {})
+
+                def progression(label, lignes):
+                    faits[label] = faits.get(label, 0) + lignes
+                    cloture.save(update_fields=['compteurs'])
+
+                archives.archiver(annee, options['lot'], copieur, progression)
+            cloture.etape = ETAPES[ETAPES.index(etape) + 1]
+            cloture.save()
+            self._afficher(etape, cloture.compteurs.get(etape) or {})
+
+        cloture.date_fin = timezone.now()
+        cloture.save()
+        self.stdout.write(self.style.SUCCESS(
+            f"Année {annee} clôturée: la base principale garde {annee} et {suivante}, "
+            f"les années antérieures sont lues sur les archives"
+        ))
+
+    def _verifier_base_archives(self):
+        alias = getattr(settings, 'ARCHIVE_DATABASE_ALIAS', None)
+        if not alias:
+            raise CommandError("Aucune base d'archives configurée (ARCHIVE_DATABASE_ALIAS)")
+        if alias not in connections.databases:
+            raise CommandError(
+                f"ARCHIVE_DATABASE_ALIAS='{alias}' n'est pas déclaré dans DATABASES "
+                f"(en production: définir ARCHIVE_DATABASE_NAME)"
+            )
+        table = EcheancierPaiement._meta.db_table
+        if table not in connections[alias].introspection.table_names():
+            raise CommandError(f"La base d'archives n'a pas de schéma: python manage.py migrate --database {alias}")
+
+    def _passage(self, annee, suivante):
+        """Classes et grilles de `annee` vers `suivante`, sauf si la nouvelle année a déjà les siennes."""
+        with transaction.atomic():
+            deja = set(Classe.objects.filter(annee_scolaire=suivante).values_list('ecole_id', 'nom'))
+            classes = [pk for pk, ecole_id, nom in Classe.objects.filter(annee_scolaire=annee)
+                       .values_list('pk', 'ecole_id', 'nom') if (ecole_id, nom) not in deja]
+            deja = set(GrilleTarifaire.objects.filter(annee_scolaire=suivante).values_list('ecole_id', 'niveau'))
+            grilles = [pk for pk, ecole_id, niveau in GrilleTarifaire.objects.filter(annee_scolaire=annee)
+                       .values_list('pk', 'ecole_id', 'niveau') if (ecole_id, niveau) not in deja]
+            return {
+                'classes': Classe.objects.filter(pk__in=classes).update(annee_scolaire=suivante),
+                'grilles': GrilleTarifaire.objects.filter(pk__in=grilles).update(annee_scolaire=suivante),
+                # Les échéanciers des élèves partis restent sur leur année et seront archivés avec elle
+                'echeanciers': EcheancierPaiement.objects.filter(
+                    annee_scolaire=annee, eleve__statut='ACTIF'
+                ).update(annee_scolaire=suivante, date_modification=timezone.now()),
+            }
+
+    def _simuler(self, annee, suivante, sans_passage):
+        self.stdout.write(self.style.NOTICE(f"Simulation de la clôture {annee} (aucune modification)"))
+        if not sans_passage:
+            self.stdout.write(
+                f"Passage vers {suivante}: {Classe.objects.filter(annee_scolaire=annee).count()} classe(s), "
+                f"{GrilleTarifaire.objects.filter(annee_scolaire=annee).count()} grille(s), "
+                f"{EcheancierPaiement.objects.filter(annee_scolaire=annee, eleve__statut='ACTIF').count()} échéancier(s)"
+            )
+        self._afficher('ARCHIVAGE', archives.a_archiver(annee))
+        sans_annee = archives.a_archiver_sans_annee()
+        if any(sans_annee.values()):
+            self._afficher('ETIQUETAGE', sans_annee)
+
+    def _afficher(self, etape, compteurs):
+        libelle = dict(ClotureAnnee.ETAPE_CHOICES)[etape]
+        details = ", ".join(f"{cle}={valeur}" for cle, valeur in compteurs.items()) or "rien à faire"
+        self.stdout.write(f"{libelle}: {details}")
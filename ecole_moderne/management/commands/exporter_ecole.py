@@ -0,0 +1,48 @@
+"""
+Export d'une école entière vers un fichier NDJSON gzip (voir ecole_moderne/transfert_ecole.py).
+Usage: python manage.py exporter_ecole 12 [--sortie ecole-12.ndjson.gz] [--lot 2000]
+
+Le fichier se recharge sur une autre instance (ou la même, pour une copie de test)
+avec `manage.py importer_ecole`.
+"""
+import hashlib
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ecole_moderne import sauvegardes, transfert_ecole
+from eleves.models import Ecole
+
+
+class Command(BaseCommand):
+    help = ("Exporte une école (classes, élèves, responsables, paiements, remises, notes, salaires, bus) "
+            "en NDJSON gzip pour importer_ecole")
+
+    def add_arguments(self, parser):
+        parser.add_argument('ecole_id', type=int, help="Identifiant de l'école")
+        parser.add_argument('--sortie', help="Fichier produit (défaut: ecole-<id>-<date>.ndjson.gz)")
+        parser.add_argument('--lot', type=int, default=sauvegardes.TAILLE_LOT,
+                            help=f"Lignes lues par requête (défaut {sauvegardes.TAILLE_LOT})")
+
+    def handle(self, *args, **options):
+        try:
+            ecole = Ecole.objects.get(pk=options['ecole_id'])
+        except Ecole.DoesNotExist:
+            raise CommandError(f"École {options['ecole_id']} introuvable")
+        if options['lot'] < 1:
+            raise CommandError("--lot doit être positif")
+        sortie = options['sortie'] or f"ecole-{ecole.pk}-{timezone.localdate():%Y%m%d}.ndjson.gz"
+
+        tables, somme, octets = {}, hashlib.sha256(), 0
+        with open(sortie, 'wb') as f:
+            for morceau in transfert_ecole.exporter(ecole, taille_lot=options['lot'], resume=tables):
+                somme.update(morceau)
+                octets += len(morceau)
+                f.write(morceau)
+
+        for label, lignes in tables.items():
+            self.stdout.write(f"{label}: {lignes}")
+        self.stdout.write(self.style.SUCCESS(
+            f"École « {ecole.nom} » exportée dans {sortie}: {sum(tables.values())} ligne(s), "
+            f"{octets / 1024:.0f} Ko, sha256 {somme.hexdigest()}"
+        ))
@@ -0,0 +1,52 @@
+"""
+Import d'une école exportée par `manage.py exporter_ecole` (voir ecole_moderne/transfert_ecole.py).
+Usage: python manage.py importer_ecole ecole-12-20261019.ndjson.gz [--utilisateur admin] [--verifier]
+
+L'école est créée à neuf: nouvelles clés, matricules et numéros de reçu réalloués s'ils
+sont déjà pris sur cette instance. Tout est annulé en cas d'erreur.
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from ecole_moderne import sauvegardes, transfert_ecole
+
+
+class Command(BaseCommand):
+    help = "Importe une école exportée par exporter_ecole (clés remappées, matricules et reçus réalloués)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Fichier produit par exporter_ecole")
+        parser.add_argument('--utilisateur',
+                            help="Nom d'utilisateur auquel rattacher les « créé par » (défaut: vides)")
+        parser.add_argument('--verifier', action='store_true', help="Vérifier le fichier sans rien importer")
+        parser.add_argument('--lot', type=int, default=sauvegardes.TAILLE_LOT,
+                            help=f"Lignes insérées par lot (défaut {sauvegardes.TAILLE_LOT})")
+
+    def handle(self, *args, **options):
+        rapport = sauvegardes.verifier(options['fichier'])
+        if not rapport['valide']:
+            raise CommandError("; ".join(rapport['erreurs']))
+        self.stdout.write(f"{rapport['tables']} table(s), {rapport['lignes']} ligne(s), sommes de contrôle correctes")
+        if options['verifier']:
+            return
+
+        utilisateur = None
+        if options['utilisateur']:
+            try:
+                utilisateur = get_user_model().objects.get(username=options['utilisateur'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Utilisateur {options['utilisateur']} introuvable")
+        try:
+            importeur = transfert_ecole.importer(options['fichier'], utilisateur=utilisateur, taille_lot=options['lot'])
+        except (transfert_ecole.ErreurTransfert, sauvegardes.ErreurSauvegarde, DatabaseError) as e:
+            raise CommandError(f"Import annulé: {e}")
+
+        for label, lignes in importeur.resultat.items():
+            self.stdout.write(f"{label}: {lignes}")
+        for label, nombre in importeur.reallouees.items():
+            if nombre:
+                self.stdout.write(self.style.WARNING(f"{label}: {nombre} valeur(s) déjà prise(s), réallouée(s)"))
+        self.stdout.write(self.style.SUCCESS(
+            f"École importée (id {importeur.ecole_id}): {sum(importeur.resultat.values())} ligne(s)"
+        ))
@@ -0,0 +1,48 @@
+"""
+Temps d'import au démarrage (django.setup() + URLconf), avec budget pour la CI.
+Usage: python manage.py mesurer_imports --budget-ms 1500 --top 15 --json imports.json
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecole_moderne.benchmarks import imports
+
+
+class Command(BaseCommand):
+    help = ("Mesure dans un interpréteur neuf (python -X importtime) le coût de django.setup() et du "
+            "chargement des URLs, liste les modules les plus coûteux et échoue si le budget est dépassé")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help="Budget en ms (défaut: settings.IMPORT_BUDGET_MS)")
+        parser.add_argument('--top', type=int, default=15, help="Nombre de modules/paquets affichés (défaut 15)")
+        parser.add_argument('--repetitions', type=int, default=3,
+                            help="Mesures successives; la meilleure est retenue (défaut 3)")
+        parser.add_argument('--json', dest='chemin_json', help="Écrire la mesure complète dans ce fichier")
+
+    def handle(self, *args, **options):
+        mesures = [imports.mesurer() for _ in range(max(1, options['repetitions']))]
+        mesure = min(mesures, key=lambda m: m['total_ms'])
+
+        self.stdout.write(f"django.setup()   {mesure['setup_ms']:>8.1f} ms")
+        self.stdout.write(f"URLconf          {mesure['urls_ms']:>8.1f} ms")
+        self.stdout.write(f"Total            {mesure['total_ms']:>8.1f} ms")
+
+        top = options['top']
+        self.stdout.write(self.style.NOTICE("\nModules les plus coûteux (cumulé):"))
+        for e in sorted(mesure['modules'], key=lambda e: -e['cumul_us'])[:top]:
+            self.stdout.write(f"  {e['cumul_us'] / 1000:>8.1f} ms  {'  ' * e['profondeur']}{e['module']}")
+        self.stdout.write(self.style.NOTICE("\nPaquets (temps propre):"))
+        for paquet, ms in mesure['paquets'][:top]:
+            self.stdout.write(f"  {ms:>8.1f} ms  {paquet}")
+
+        if options.get('chemin_json'):
+            with open(options['chemin_json'], 'w', encoding='utf-8') as fh:
+                json.dump(mesure, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Mesure écrite: {options['chemin_json']}"))
+
+        erreurs = imports.depassements(mesure, options.get('budget_ms'))
+        if erreurs:
+            raise CommandError("\n".join(erreurs))
+        self.stdout.write(self.style.SUCCESS("Budget d'import respecté"))
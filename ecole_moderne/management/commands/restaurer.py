@@ -0,0 +1,70 @@
+"""
+Restauration d'une sauvegarde faite par `manage.py sauvegarder` (voir ecole_moderne/sauvegardes.py).
+Usage: python manage.py restaurer 0003-20261019-101500-incrementale.ndjson.gz [--verifier] [--seule]
+
+Une sauvegarde de l'index (nom) est rejouée avec sa chaîne: la complète dont elle
+dépend, puis chaque incrémentale jusqu'à elle. Les lignes de même clé sont remplacées,
+les autres lignes de la base ne sont pas touchées. Tout est annulé si une somme de
+contrôle est incorrecte. Un chemin de fichier hors index est restauré seul.
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecole_moderne import sauvegardes
+
+
+class Command(BaseCommand):
+    help = "Restaure une sauvegarde NDJSON gzip (chaîne complète + incrémentales), ou la vérifie seulement"
+
+    def add_arguments(self, parser):
+        parser.add_argument('sauvegarde', help="Nom dans l'index du dossier, ou chemin d'un fichier .ndjson.gz")
+        parser.add_argument('--dossier', help="Dossier des sauvegardes (défaut: SAUVEGARDES_DIR)")
+        parser.add_argument('--verifier', action='store_true',
+                            help="Vérifier les sommes de contrôle sans rien écrire en base")
+        parser.add_argument('--seule', action='store_true',
+                            help="Ne pas rejouer la chaîne d'une sauvegarde incrémentale")
+        parser.add_argument('--lot', type=int, default=sauvegardes.TAILLE_LOT,
+                            help=f"Lignes insérées par lot (défaut {sauvegardes.TAILLE_LOT})")
+
+    def handle(self, *args, **options):
+        dossier = options['dossier'] or sauvegardes.dossier_sauvegardes()
+        fichiers = self._fichiers(options['sauvegarde'], dossier, options['seule'])
+
+        for chemin, sha256 in fichiers:
+            rapport = sauvegardes.verifier(chemin, sha256)
+            if not rapport['valide']:
+                raise CommandError(f"{os.path.basename(chemin)}: " + "; ".join(rapport['erreurs']))
+            self.stdout.write(f"{os.path.basename(chemin)}: {rapport['tables']} table(s), "
+                              f"{rapport['lignes']} ligne(s), sommes de contrôle correctes")
+        if options['verifier']:
+            return
+
+        try:
+            resultat = sauvegardes.restaurer([chemin for chemin, _ in fichiers], taille_lot=options['lot'])
+        except sauvegardes.ErreurSauvegarde as e:
+            raise CommandError(f"Restauration annulée: {e}")
+        for label, lignes in resultat.items():
+            if lignes:
+                self.stdout.write(f"{label}: {lignes}")
+        self.stdout.write(self.style.SUCCESS(f"{sum(resultat.values())} ligne(s) restaurée(s)"))
+
+    def _fichiers(self, sauvegarde, dossier, seule):
+        """[(chemin, sha256 attendu ou None)] dans l'ordre de restauration."""
+        if any(e['nom'] == sauvegarde for e in sauvegardes.lire_index(dossier)):
+            try:
+                entrees = sauvegardes.chaine(sauvegarde, dossier)
+            except sauvegardes.ErreurSauvegarde as e:
+                raise CommandError(str(e))
+            if seule:
+                entrees = entrees[-1:]
+            return [(os.path.join(dossier, e['nom']), e['sha256']) for e in entrees]
+        if not os.path.isfile(sauvegarde):
+            raise CommandError(f"Sauvegarde introuvable: {sauvegarde}")
+        try:
+            mode = sauvegardes.entete(sauvegarde).get('mode')
+        except sauvegardes.ErreurSauvegarde as e:
+            raise CommandError(str(e))
+        if mode == 'incrementale':
+            self.stdout.write(self.style.WARNING("Sauvegarde incrémentale restaurée seule (hors index)"))
+        return [(sauvegarde, None)]
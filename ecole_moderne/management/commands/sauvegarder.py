@@ -0,0 +1,34 @@
+"""
+Sauvegarde de la base en NDJSON compressé (voir ecole_moderne/sauvegardes.py).
+Usage: python manage.py sauvegarder [--incrementale] [--dossier logs/sauvegardes] [--lot 2000]
+
+Une sauvegarde incrémentale ne contient que les lignes modifiées depuis la sauvegarde
+précédente du dossier; `manage.py restaurer` rejoue la chaîne complète + incrémentales.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from ecole_moderne import sauvegardes
+
+
+class Command(BaseCommand):
+    help = "Sauvegarde la base en flux (NDJSON gzip), complète ou incrémentale, avec sommes de contrôle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incrementale', action='store_true',
+                            help="Seulement les lignes modifiées depuis la sauvegarde précédente")
+        parser.add_argument('--dossier', help="Dossier des sauvegardes (défaut: SAUVEGARDES_DIR)")
+        parser.add_argument('--lot', type=int, default=sauvegardes.TAILLE_LOT,
+                            help=f"Lignes lues par requête (défaut {sauvegardes.TAILLE_LOT})")
+
+    def handle(self, *args, **options):
+        if options['lot'] < 1:
+            raise CommandError("--lot doit être positif")
+        entree = sauvegardes.sauvegarder(
+            incrementale=options['incrementale'], dossier=options['dossier'], taille_lot=options['lot'],
+        )
+        if options['incrementale'] and entree['mode'] == 'complete':
+            self.stdout.write(self.style.NOTICE("Aucune sauvegarde précédente: sauvegarde complète"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Sauvegarde {entree['mode']} {entree['nom']}: {entree['lignes']} ligne(s), "
+            f"{entree['octets'] / 1024:.0f} Ko, sha256 {entree['sha256']}"
+        ))
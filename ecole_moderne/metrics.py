@@ -0,0 +1,367 @@
+"""
+Métriques au format texte Prometheus
+
+- Registre en mémoire par processus (compteurs et histogrammes étiquetés).
+- Agrégation entre workers gunicorn: chaque processus écrit périodiquement son
+  instantané dans METRICS_DIR (un fichier JSON par processus); l'endpoint /metrics
+  additionne tous les fichiers. Le fichier d'un processus terminé (PID absent ou
+  fichier non mis à jour depuis METRICS_RETENTION_SECONDS) est ajouté à
+  `cumul.json` puis supprimé, sous verrou: les compteurs exportés ne diminuent
+  jamais quand un worker est recyclé.
+- MetricsMiddleware: latence, taille de réponse et temps SQL par vue résolue, PDF
+  rendus, en-tête Server-Timing (db, tpl, total).
+- LocMemCacheInstrumente: compte les hits / misses du cache.
+- `incrementer()` pour les compteurs métier (paiements validés, reçus, Twilio...).
+
+Activé par METRICS_ENABLED; l'endpoint exige METRICS_TOKEN dans l'en-tête
+`Authorization: Bearer <token>` (jamais dans l'URL, qui finit dans les journaux d'accès).
+"""
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_TAILLE = (1024, 10240, 102400, 1048576, 10485760)
+
+# nom -> (type, description, buckets)
+METRIQUES = {
+    'ecole_http_requetes_total': ('counter', "Requêtes HTTP par vue et classe de statut", None),
+    'ecole_http_duree_secondes': ('histogram', "Durée des requêtes HTTP par vue", BUCKETS_DUREE),
+    'ecole_http_sql_secondes': ('histogram', "Temps SQL par requête HTTP et par vue", BUCKETS_DUREE),
+    'ecole_http_reponse_octets': ('histogram', "Taille des réponses HTTP par vue", BUCKETS_TAILLE),
+    'ecole_cache_operations_total': ('counter', "Lectures de cache par alias et résultat (hit/miss)", None),
+    'ecole_pdf_generes_total': ('counter', "Réponses PDF rendues par vue", None),
+    'ecole_paiements_valides_total': ('counter', "Paiements passés au statut VALIDE", None),
+    'ecole_recus_generes_total': ('counter', "Reçus PDF générés par type", None),
+    'ecole_messages_twilio_total': ('counter', "Messages Twilio par canal et résultat", None),
+}
+
+
+def _cle(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registre:
+    """Compteurs et histogrammes d'un processus, protégés par un verrou."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._series = {}
+
+    def incrementer(self, nom, valeur=1, **labels):
+        with self._verrou:
+            cle = (nom, _cle(labels))
+            self._series[cle] = self._series.get(cle, 0) + valeur
+
+    def observer(self, nom, valeur, **labels):
+        buckets = METRIQUES[nom][2]
+        with self._verrou:
+            cle = (nom, _cle(labels))
+            serie = self._series.get(cle)
+            if serie is None:
+                serie = self._series[cle] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, borne in enumerate(buckets):
+                if valeur <= borne:
+                    serie['buckets'][i] += 1
+            serie['sum'] += valeur
+            serie['count'] += 1
+
+    def instantane(self):
+        """Copie sérialisable en JSON: [[nom, [[label, valeur], ...], valeur], ...]."""
+        with self._verrou:
+            return [
+                [nom, [list(l) for l in labels], json.loads(json.dumps(valeur))]
+                for (nom, labels), valeur in self._series.items()
+            ]
+
+    def reinitialiser(self):
+        with self._verrou:
+            self._series.clear()
+
+
+registre = Registre()
+
+
+def incrementer(nom, valeur=1, **labels):
+    """Incrémente un compteur métier (ne lève jamais d'exception)."""
+    try:
+        registre.incrementer(nom, valeur, **labels)
+    except Exception:
+        logger.debug("Métrique %s non enregistrée", nom, exc_info=True)
+
+
+# ----- Agrégation multi-processus -----
+
+_IDENTIFIANT_PROCESSUS = f"{os.getpid()}-{int(time.time())}"
+_dernier_flush = 0.0
+
+
+def _repertoire():
+    return str(getattr(settings, 'METRICS_DIR', os.path.join(settings.BASE_DIR, 'logs', 'metrics')))
+
+
+def ecrire_instantane(force=False):
+    """Écrit l'instantané du processus dans METRICS_DIR (au plus toutes les METRICS_FLUSH_SECONDS)."""
+    global _dernier_flush, _IDENTIFIANT_PROCESSUS
+    maintenant = time.monotonic()
+    if not force and maintenant - _dernier_flush < getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+        return
+    _dernier_flush = maintenant
+    if not _IDENTIFIANT_PROCESSUS.startswith(f"{os.getpid()}-"):
+        # Processus forké après l'import (workers gunicorn --preload)
+        _IDENTIFIANT_PROCESSUS = f"{os.getpid()}-{int(time.time())}"
+    repertoire = _repertoire()
+    try:
+        os.makedirs(repertoire, exist_ok=True)
+        chemin = os.path.join(repertoire, f"worker-{_IDENTIFIANT_PROCESSUS}.json")
+        with open(f"{chemin}.tmp", 'w', encoding='utf-8') as fh:
+            json.dump(registre.instantane(), fh)
+        os.replace(f"{chemin}.tmp", chemin)
+    except OSError:
+        logger.warning("Impossible d'écrire les métriques dans %s", repertoire, exc_info=True)
+
+
+def _processus_actif(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _perime(chemin):
+    """Fichier d'un worker terminé: PID disparu ou instantané plus écrit depuis la rétention."""
+    try:
+        pid = int(os.path.basename(chemin)[len('worker-'):].split('-', 1)[0])
+    except ValueError:
+        pid = None
+    try:
+        age = time.time() - os.path.getmtime(chemin)
+    except OSError:
+        return False
+    if age > getattr(settings, 'METRICS_RETENTION_SECONDS', 86400):
+        return True
+    return pid is not None and pid != os.getpid() and not _processus_actif(pid)
+
+
+def _lire(chemin):
+    try:
+        with open(chemin, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _additionner(series, lignes):
+    """Ajoute un instantané ([[nom, labels, valeur], ...]) à {(nom, labels): valeur}."""
+    for nom, labels, valeur in lignes:
+        cle = (nom, tuple(tuple(l) for l in labels))
+        actuel = series.get(cle)
+        if isinstance(valeur, dict):
+            if actuel is None:
+                series[cle] = {'buckets': list(valeur['buckets']), 'sum': valeur['sum'], 'count': valeur['count']}
+            else:
+                actuel['buckets'] = [a + b for a, b in zip(actuel['buckets'], valeur['buckets'])]
+                actuel['sum'] += valeur['sum']
+                actuel['count'] += valeur['count']
+        else:
+            series[cle] = (actuel or 0) + valeur
+    return series
+
+
+def collecter():
+    """Additionne le cumul des processus terminés et les instantanés des vivants: {(nom, labels): valeur}."""
+    ecrire_instantane(force=True)
+    repertoire = _repertoire()
+    chemin_cumul = os.path.join(repertoire, 'cumul.json')
+    with open(os.path.join(repertoire, 'cumul.lock'), 'a') as verrou:
+        if fcntl:
+            fcntl.flock(verrou, fcntl.LOCK_EX)
+        try:
+            cumul = _additionner({}, _lire(chemin_cumul) or [])
+            vivants = []
+            perimes = []
+            for chemin in glob.glob(os.path.join(repertoire, 'worker-*.json')):
+                lignes = _lire(chemin)
+                if lignes is None:
+                    continue
+                if _perime(chemin):
+                    _additionner(cumul, lignes)
+                    perimes.append(chemin)
+                else:
+                    vivants.append(lignes)
+            if perimes:
+                # Cumul écrit avant la suppression: un arrêt entre les deux ne perd aucune valeur
+                with open(f"{chemin_cumul}.tmp", 'w', encoding='utf-8') as fh:
+                    json.dump([[nom, [list(l) for l in labels], valeur] for (nom, labels), valeur in cumul.items()], fh)
+                os.replace(f"{chemin_cumul}.tmp", chemin_cumul)
+                for chemin in perimes:
+                    try:
+                        os.remove(chemin)
+                    except OSError:
+                        pass
+        finally:
+            if fcntl:
+                fcntl.flock(verrou, fcntl.LOCK_UN)
+    series = cumul
+    for lignes in vivants:
+        _additionner(series, lignes)
+    return series
+
+
+def _labels_texte(labels, extra=()):
+    paires = list(labels) + list(extra)
+    if not paires:
+        return ''
+    echappe = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{echappe(v)}"' for k, v in paires) + '}'
+
+
+def format_prometheus(series):
+    lignes = []
+    for nom, (type_metrique, description, buckets) in METRIQUES.items():
+        lignes.append(f"# HELP {nom} {description}")
+        lignes.append(f"# TYPE {nom} {type_metrique}")
+        for (nom_serie, labels), valeur in sorted(series.items()):
+            if nom_serie != nom:
+                continue
+            if type_metrique == 'histogram':
+                for borne, nb in zip(buckets, valeur['buckets']):
+                    lignes.append(f"{nom}_bucket{_labels_texte(labels, [('le', borne)])} {nb}")
+                lignes.append(f"{nom}_bucket{_labels_texte(labels, [('le', '+Inf')])} {valeur['count']}")
+                lignes.append(f"{nom}_sum{_labels_texte(labels)} {valeur['sum']}")
+                lignes.append(f"{nom}_count{_labels_texte(labels)} {valeur['count']}")
+            else:
+                lignes.append(f"{nom}{_labels_texte(labels)} {valeur}")
+    return "\n".join(lignes) + "\n"
+
+
+def metrics_view(request):
+    """Endpoint /metrics (texte Prometheus), protégé par METRICS_TOKEN."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        raise Http404()
+    entete = request.META.get('HTTP_AUTHORIZATION', '')
+    fourni = entete[len('Bearer '):] if entete.startswith('Bearer ') else ''
+    if not hmac.compare_digest(fourni.encode(), token.encode()):
+        return HttpResponseForbidden("Token invalide.")
+    return HttpResponse(format_prometheus(collecter()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ----- Instrumentation -----
+
+class LocMemCacheInstrumente(LocMemCache):
+    """LocMemCache qui compte les hits / misses de `get()` (étiquette cache = LOCATION)."""
+
+    _ABSENT = object()
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._alias = name
+
+    def get(self, key, default=None, version=None):
+        valeur = super().get(key, self._ABSENT, version)
+        resultat = 'miss' if valeur is self._ABSENT else 'hit'
+        incrementer('ecole_cache_operations_total', cache=self._alias, resultat=resultat)
+        return default if valeur is self._ABSENT else valeur
+
+
+_local = threading.local()
+_templates_instrumentes = False
+
+
+def instrumenter_templates():
+    """Mesure le temps de rendu des templates Django (rendu de premier niveau uniquement)."""
+    global _templates_instrumentes
+    if _templates_instrumentes:
+        return
+    from django.template.backends.django import Template
+
+    rendu_original = Template.render
+
+    def render(self, context=None, request=None):
+        if getattr(_local, 'profondeur', None) is None:
+            return rendu_original(self, context, request)
+        _local.profondeur += 1
+        debut = time.perf_counter()
+        try:
+            return rendu_original(self, context, request)
+        finally:
+            _local.profondeur -= 1
+            if _local.profondeur == 0:
+                _local.temps_templates += time.perf_counter() - debut
+
+    Template.render = render
+    _templates_instrumentes = True
+
+
+class _ChronoSQL:
+    def __init__(self):
+        self.temps = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.temps += time.perf_counter() - debut
+
+
+class MetricsMiddleware:
+    """Mesure chaque requête et ajoute l'en-tête Server-Timing."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        instrumenter_templates()
+
+    def __call__(self, request):
+        chrono_sql = _ChronoSQL()
+        _local.profondeur = 0
+        _local.temps_templates = 0.0
+        debut = time.perf_counter()
+        try:
+            with connections['default'].execute_wrapper(chrono_sql):
+                response = self.get_response(request)
+        finally:
+            temps_templates = _local.temps_templates
+            _local.profondeur = None
+        duree = time.perf_counter() - debut
+
+        match = getattr(request, 'resolver_match', None)
+        vue = (match.view_name or match._func_path) if match else '<non résolue>'
+        registre.incrementer('ecole_http_requetes_total', vue=vue, statut=f"{response.status_code // 100}xx")
+        registre.observer('ecole_http_duree_secondes', duree, vue=vue)
+        registre.observer('ecole_http_sql_secondes', chrono_sql.temps, vue=vue)
+        if not getattr(response, 'streaming', False):
+            registre.observer('ecole_http_reponse_octets', len(response.content), vue=vue)
+        if response.get('Content-Type', '').startswith('application/pdf'):
+            registre.incrementer('ecole_pdf_generes_total', vue=vue)
+
+        response['Server-Timing'] = (
+            f"db;desc=\"SQL\";dur={chrono_sql.temps * 1000:.1f}, "
+            f"tpl;desc=\"Templates\";dur={temps_templates * 1000:.1f}, "
+            f"total;dur={duree * 1000:.1f}"
+        )
+        ecrire_instantane()
+        return response
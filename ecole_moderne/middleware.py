@@ -6,6 +6,7 @@ from django.urls import reverse
 from django.contrib import messages
 from django.utils.deprecation import MiddlewareMixin
 from eleves.models import Ecole
+from ecole_moderne.fragments import ecoles_actives
 from utilisateurs.models import Profil
 
 
@@ -80,9 +81,7 @@ class EcoleContextMiddleware(MiddlewareMixin):
             
             # Ajouter la liste des écoles pour les super admins
             if request.user.is_authenticated and request.user.is_superuser:
-                response.context_data['ecoles_disponibles'] = Ecole.objects.filter(
-                    statut='ACTIVE'
-                ).order_by('nom')
+                response.context_data['ecoles_disponibles'] = ecoles_actives()
         
         return response
 
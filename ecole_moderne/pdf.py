@@ -0,0 +1,63 @@
+"""Façade ReportLab chargée au premier usage.
+
+ReportLab (surtout `platypus`) coûte une centaine de millisecondes à l'import.
+Les vues ne l'importent donc plus en tête de module mais au moment de générer
+un PDF, en passant par cette façade:
+
+    def ma_vue(request):
+        from ecole_moderne.pdf import A4, canvas, colors
+        ...
+
+Chaque nom est résolu à la première demande (import du sous-module ReportLab
+correspondant) puis conservé dans le module. `disponible()` indique si
+ReportLab est installé sans l'importer.
+"""
+import importlib
+import importlib.util
+
+# nom exposé -> (module ReportLab, attribut)
+NOMS = {
+    'canvas': ('reportlab.pdfgen', 'canvas'),
+    'A4': ('reportlab.lib.pagesizes', 'A4'),
+    'landscape': ('reportlab.lib.pagesizes', 'landscape'),
+    'colors': ('reportlab.lib', 'colors'),
+    'cm': ('reportlab.lib.units', 'cm'),
+    'mm': ('reportlab.lib.units', 'mm'),
+    'inch': ('reportlab.lib.units', 'inch'),
+    'ImageReader': ('reportlab.lib.utils', 'ImageReader'),
+    'getSampleStyleSheet': ('reportlab.lib.styles', 'getSampleStyleSheet'),
+    'ParagraphStyle': ('reportlab.lib.styles', 'ParagraphStyle'),
+    'pdfmetrics': ('reportlab.pdfbase', 'pdfmetrics'),
+    'TTFont': ('reportlab.pdfbase.ttfonts', 'TTFont'),
+    'SimpleDocTemplate': ('reportlab.platypus', 'SimpleDocTemplate'),
+    'Table': ('reportlab.platypus', 'Table'),
+    'TableStyle': ('reportlab.platypus', 'TableStyle'),
+    'Paragraph': ('reportlab.platypus', 'Paragraph'),
+    'Spacer': ('reportlab.platypus', 'Spacer'),
+    'Image': ('reportlab.platypus', 'Image'),
+}
+
+__all__ = sorted(NOMS) + ['disponible']
+
+
+def disponible():
+    """Vrai si ReportLab est installé (sans l'importer)."""
+    return importlib.util.find_spec('reportlab') is not None
+
+
+def __getattr__(nom):
+    try:
+        module, attribut = NOMS[nom]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {nom!r}") from None
+    paquet = importlib.import_module(module)
+    try:
+        valeur = getattr(paquet, attribut)
+    except AttributeError:  # sous-module (canvas, colors, pdfmetrics)
+        valeur = importlib.import_module(f"{module}.{attribut}")
+    globals()[nom] = valeur
+    return valeur
+
+
+def __dir__():
+    return __all__
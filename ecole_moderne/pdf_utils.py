@@ -1,10 +1,7 @@
 from django.contrib.staticfiles import finders
 
-try:
-    # ReportLab imports are optional to avoid import errors where not installed
-    from reportlab.lib.pagesizes import A4
-except Exception:  # pragma: no cover
-    A4 = (595.27, 841.89)
+# Dimensions A4 en points (reportlab.lib.pagesizes.A4), sans importer ReportLab
+A4 = (595.2755905511812, 841.8897637795277)
 
 
 def draw_logo_watermark(c, width=None, height=None, *, opacity=0.04, rotate=30, scale=1.5):
@@ -0,0 +1,103 @@
+"""Routage des lectures lourdes (rapports, exports, tableaux de bord) vers une réplique.
+
+Activation: définir REPLICA_DATABASE_NAME (second fichier SQLite, copie du premier)
+et/ou REPLICA_DATABASE_HOST (réplique PostgreSQL en streaming); voir settings.py.
+Sans réplique configurée, tout ce module est neutre.
+
+- `@lecture_replica` (vues) et `utiliser_replica()` (commandes, scripts) marquent un
+  travail en lecture seule: ses lectures partent sur l'alias `replica`.
+- Les écritures vont toujours sur `default`. Une écriture faite pendant un bloc
+  marqué renvoie les lectures suivantes du bloc sur `default`.
+- Protection contre le retard de réplication: toute requête d'écriture
+  (POST/PUT/PATCH/DELETE) pose un cookie de REPLICA_LAG_SECONDS secondes; tant
+  qu'il est présent, les vues de cet utilisateur lisent sur `default` et voient
+  donc ce qu'il vient d'enregistrer.
+"""
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from django.conf import settings
+
+COOKIE_ECRITURE = 'ecriture_recente'
+METHODES_LECTURE = ('GET', 'HEAD', 'OPTIONS')
+
+# None: hors bloc marqué; True: lectures sur la réplique; False: écriture faite, retour au primaire
+_replica = contextvars.ContextVar('lecture_replica', default=None)
+
+
+def alias_replica():
+    return getattr(settings, 'REPLICA_DATABASE_ALIAS', None)
+
+
+def lecture_sur_replica():
+    """Vrai si les lectures du contexte courant partent sur la réplique."""
+    return bool(_replica.get()) and bool(alias_replica())
+
+
+@contextmanager
+def utiliser_replica(actif=True):
+    """Envoie les lectures du bloc sur la réplique (si configurée et `actif`)."""
+    jeton = _replica.set(bool(actif and alias_replica()))
+    try:
+        yield
+    finally:
+        _replica.reset(jeton)
+
+
+def ecriture_recente(request):
+    """Vrai si l'utilisateur a écrit il y a moins de REPLICA_LAG_SECONDS secondes."""
+    return COOKIE_ECRITURE in request.COOKIES
+
+
+def lecture_replica(view_func):
+    """Décorateur de vue: lectures sur la réplique, sauf pour une requête d'écriture
+    ou juste après une écriture du même utilisateur."""
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        actif = request.method in METHODES_LECTURE and not ecriture_recente(request)
+        with utiliser_replica(actif):
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class RouteurReplica:
+    """Routeur Django: lectures marquées vers la réplique, tout le reste sur `default`."""
+
+    def db_for_read(self, model, **hints):
+        if lecture_sur_replica():
+            return alias_replica()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if _replica.get():
+            _replica.set(False)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {'default', alias_replica()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplique reçoit le schéma par réplication (ou copie du fichier SQLite)
+        if alias_replica() and db == alias_replica():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Pose le cookie d'écriture récente après chaque requête d'écriture."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in METHODES_LECTURE:
+            response.set_cookie(
+                COOKIE_ECRITURE, '1', max_age=getattr(settings, 'REPLICA_LAG_SECONDS', 10),
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
@@ -0,0 +1,291 @@
+"""
+Profilage à la demande de requêtes de production
+
+Deux déclencheurs, réservés aux superutilisateurs:
+- le paramètre `?_profiler=1` (piles échantillonnées) ou `?_profiler=cprofile`
+  profile la requête courante;
+- un armement (administration > Gestion des BDD) profile les N prochaines requêtes
+  d'une vue donnée pendant une durée limitée (TTL). L'armement est stocké dans
+  PROFILES_DIR/armement.json pour être partagé entre workers: chaque requête le lit
+  sous verrou partagé, le verrou exclusif n'est pris que pour décrémenter une cible.
+
+Une requête profilée produit dans PROFILES_DIR un seul fichier, selon le mode (les
+deux profileurs ne tournent jamais ensemble, chacun fausserait l'autre):
+- `<horodatage>-<vue>.collapsed`: piles échantillonnées (format « collapsed »,
+  directement utilisable par flamegraph.pl / speedscope);
+- `<horodatage>-<vue>.prof`: dump cProfile (pstats / snakeviz).
+
+Seuls les PROFILES_MAX_FILES profils les plus récents, et de moins de
+PROFILES_MAX_AGE_DAYS jours, sont conservés.
+"""
+import cProfile
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PARAMETRE_REQUETE = '_profiler'
+MODE_PILES = 'piles'
+MODE_CPROFILE = 'cprofile'
+MODES = (MODE_PILES, MODE_CPROFILE)
+FICHIER_ARMEMENT = 'armement.json'
+_RE_NOM_FICHIER = re.compile(r'^[\w.-]+\.(collapsed|prof)$')
+_RE_CARACTERES_INTERDITS = re.compile(r'[^\w.-]')
+
+
+def repertoire_profils():
+    return str(getattr(settings, 'PROFILES_DIR', os.path.join(settings.BASE_DIR, 'logs', 'profiles')))
+
+
+class EchantillonneurPiles:
+    """Échantillonne la pile d'un thread à intervalle régulier depuis un thread auxiliaire."""
+
+    def __init__(self, thread_id, intervalle=0.005):
+        self.thread_id = thread_id
+        self.intervalle = intervalle
+        self.piles = Counter()
+        self._arret = threading.Event()
+        self._thread = threading.Thread(target=self._boucle, daemon=True)
+
+    def _boucle(self):
+        while not self._arret.wait(self.intervalle):
+            frame = sys._current_frames().get(self.thread_id)
+            pile = []
+            while frame is not None:
+                code = frame.f_code
+                pile.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if pile:
+                self.piles[';'.join(reversed(pile))] += 1
+
+    def demarrer(self):
+        self._thread.start()
+
+    def arreter(self):
+        self._arret.set()
+        self._thread.join()
+
+    def format_collapsed(self):
+        return ''.join(f"{pile} {nb}\n" for pile, nb in self.piles.most_common())
+
+
+# ----- Armement partagé entre workers -----
+
+def _chemin_armement():
+    return os.path.join(repertoire_profils(), FICHIER_ARMEMENT)
+
+
+def _lire_cibles(fh):
+    fh.seek(0)
+    try:
+        cibles = json.loads(fh.read() or '[]')
+    except ValueError:
+        cibles = []
+    maintenant = time.time()
+    return [c for c in cibles if c['expire'] > maintenant and c['restant'] > 0]
+
+
+def _lire_armement():
+    """Cibles armées non expirées, lues sous verrou partagé (sans écriture)."""
+    try:
+        fh = open(_chemin_armement(), 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return []
+    with fh:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_SH)
+        try:
+            return _lire_cibles(fh)
+        finally:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _modifier_armement(fonction):
+    """Lit, modifie (fonction(cibles) -> cibles) et réécrit l'armement sous verrou exclusif."""
+    os.makedirs(repertoire_profils(), exist_ok=True)
+    with open(_chemin_armement(), 'a+', encoding='utf-8') as fh:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            cibles = _lire_cibles(fh)
+            resultat = fonction(cibles)
+            fh.seek(0)
+            fh.truncate()
+            json.dump(cibles, fh)
+            fh.flush()
+            # mtime = expiration la plus tardive: le middleware écarte un armement échu sur un stat()
+            expiration = max((c['expire'] for c in cibles), default=0)
+            os.utime(fh.fileno() if os.utime in os.supports_fd else _chemin_armement(), (expiration, expiration))
+            return resultat
+        finally:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def armer(vue, nombre, ttl_minutes, par=None, mode=MODE_PILES):
+    """Profile les `nombre` prochaines requêtes vers `vue` (nom d'URL) pendant `ttl_minutes`."""
+    def _ajouter(cibles):
+        cibles[:] = [c for c in cibles if c['vue'] != vue]
+        cibles.append({
+            'vue': vue, 'restant': int(nombre), 'expire': time.time() + ttl_minutes * 60,
+            'par': getattr(par, 'username', None), 'mode': mode if mode in MODES else MODE_PILES,
+        })
+    _modifier_armement(_ajouter)
+
+
+def desarmer(vue):
+    def _retirer(cibles):
+        cibles[:] = [c for c in cibles if c['vue'] != vue]
+    _modifier_armement(_retirer)
+
+
+def cibles_armees():
+    return [dict(c, expire=datetime.fromtimestamp(c['expire'])) for c in _lire_armement()]
+
+
+def _consommer(vue):
+    """Décrémente l'armement de `vue`; mode de profilage si cette requête doit être profilée, sinon None."""
+    if not any(c['vue'] == vue for c in _lire_armement()):
+        return None
+
+    def _prendre(cibles):
+        for cible in cibles:
+            if cible['vue'] == vue and cible['restant'] > 0:
+                cible['restant'] -= 1
+                return cible.get('mode', MODE_PILES)
+        return None
+    return _modifier_armement(_prendre)
+
+
+def purger_profils():
+    """Supprime les profils au-delà de PROFILES_MAX_FILES ou plus vieux que PROFILES_MAX_AGE_DAYS."""
+    maximum = getattr(settings, 'PROFILES_MAX_FILES', 200)
+    limite = datetime.fromtimestamp(time.time() - getattr(settings, 'PROFILES_MAX_AGE_DAYS', 7) * 86400)
+    for rang, profil in enumerate(profils_disponibles()):
+        if rang >= maximum or profil['date'] < limite:
+            try:
+                os.remove(os.path.join(repertoire_profils(), profil['nom']))
+            except OSError:
+                pass
+
+
+def profils_disponibles():
+    """Fichiers de profil (du plus récent au plus ancien): [{'nom', 'taille', 'date'}]."""
+    repertoire = repertoire_profils()
+    if not os.path.isdir(repertoire):
+        return []
+    fichiers = []
+    for nom in os.listdir(repertoire):
+        if not _RE_NOM_FICHIER.match(nom):
+            continue
+        stat = os.stat(os.path.join(repertoire, nom))
+        fichiers.append({'nom': nom, 'taille': stat.st_size, 'date': datetime.fromtimestamp(stat.st_mtime)})
+    return sorted(fichiers, key=lambda f: f['date'], reverse=True)
+
+
+def chemin_profil(nom):
+    """Chemin d'un fichier de profil, ou None si le nom est invalide ou absent."""
+    if not _RE_NOM_FICHIER.match(nom or ''):
+        return None
+    chemin = os.path.join(repertoire_profils(), nom)
+    return chemin if os.path.isfile(chemin) else None
+
+
+# ----- Middleware -----
+
+class RequestProfilerMiddleware:
+    """À placer après AuthenticationMiddleware (le paramètre `?_profiler=1` exige un superutilisateur)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.intervalle = getattr(settings, 'PROFILER_INTERVAL_MS', 5) / 1000
+
+    def _armement_actif(self):
+        # Un simple stat() par requête: le fichier n'est lu que s'il contient des cibles non
+        # expirées (son mtime est l'expiration la plus tardive, voir _modifier_armement)
+        try:
+            stat = os.stat(_chemin_armement())
+        except OSError:
+            return False
+        return stat.st_size > 2 and stat.st_mtime > time.time()
+
+    def _cible(self, request):
+        """(vue, mode) si l'armement vise la vue de cette requête."""
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None, None
+        vue = match.view_name or match._func_path
+        mode = _consommer(vue)
+        return (vue, mode) if mode else (None, None)
+
+    def __call__(self, request):
+        vue = mode = None
+        parametre = request.GET.get(PARAMETRE_REQUETE)
+        if parametre in ('1', *MODES) and getattr(request.user, 'is_superuser', False):
+            mode = MODE_CPROFILE if parametre == MODE_CPROFILE else MODE_PILES
+            try:
+                match = resolve(request.path_info)
+                vue = match.view_name or match._func_path
+            except Resolver404:
+                vue = 'non-resolue'
+        elif self._armement_actif():
+            try:
+                vue, mode = self._cible(request)
+            except OSError:
+                logger.warning("Armement du profilage illisible", exc_info=True)
+        if not vue:
+            return self.get_response(request)
+        return self._profiler(request, vue, mode)
+
+    def _profiler(self, request, vue, mode):
+        echantillonneur = profil = None
+        if mode == MODE_CPROFILE:
+            profil = cProfile.Profile()
+            try:
+                profil.enable()
+            except ValueError:
+                # Un autre profileur est déjà actif: on se rabat sur l'échantillonnage
+                profil = None
+        if profil is None:
+            echantillonneur = EchantillonneurPiles(threading.get_ident(), self.intervalle)
+            echantillonneur.demarrer()
+        debut = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            if profil:
+                profil.disable()
+            else:
+                echantillonneur.arreter()
+            duree_ms = (time.perf_counter() - debut) * 1000
+            try:
+                nom_vue = _RE_CARACTERES_INTERDITS.sub('_', vue)
+                base = os.path.join(repertoire_profils(), f"{datetime.now():%Y%m%d-%H%M%S-%f}-{nom_vue}")
+                os.makedirs(repertoire_profils(), exist_ok=True)
+                if profil:
+                    profil.dump_stats(f"{base}.prof")
+                else:
+                    with open(f"{base}.collapsed", 'w', encoding='utf-8') as fh:
+                        fh.write(echantillonneur.format_collapsed())
+                logger.info("Requête profilée: %s %s (%s) en %.0f ms -> %s",
+                            request.method, request.path, vue, duree_ms, os.path.basename(base))
+                purger_profils()
+            except OSError:
+                logger.exception("Impossible d'écrire le profil de %s", vue)
@@ -0,0 +1,420 @@
+"""Sauvegardes en flux (NDJSON compressé gzip), complètes ou incrémentales, et restauration.
+
+Format d'un fichier `.ndjson.gz`: une ligne JSON par enregistrement, tables dans
+l'ordre des dépendances (une table après celles qu'elle référence):
+
+    {"type": "entete", "version": 1, "mode": "complete", "debut": "...", "depuis": null}
+    {"type": "table", "modele": "eleves.Ecole", "champs": ["id", "nom", ...], "filtre": null}
+    [1, "Ecole A", ...]
+    {"type": "fin_table", "modele": "eleves.Ecole", "lignes": 1, "sha256": "..."}
+    ...
+    {"type": "fin", "tables": 42, "lignes": 1234, "sha256": "..."}
+
+- Écriture: chaque table est lue par `iterator(chunk_size=...)` et compressée au fil
+  de l'eau (un bloc gzip vidé par lot): mémoire constante, que le flux aille sur
+  disque (`sauvegarder`) ou dans une réponse HTTP (`flux`). Toutes les tables sont
+  lues dans une seule transaction (REPEATABLE READ sous PostgreSQL): le fichier
+  est un instantané cohérent même si l'application écrit pendant la sauvegarde.
+- Incrémentale: seules les lignes modifiées depuis le début de la sauvegarde
+  précédente (champ `auto_now`, `date_modification` le plus souvent); les tables
+  sans tel champ sont reprises en entier. Les suppressions ne sont pas reprises.
+  `update()` et `bulk_update()` ne renseignent pas `auto_now`: le code qui les
+  utilise sur ces tables doit affecter `date_modification` lui-même. Les migrations
+  de données ne le font pas: faire une sauvegarde complète après `migrate`.
+- Sommes de contrôle: SHA-256 des lignes de chaque table et de tout le fichier
+  (lignes), plus SHA-256 du fichier compressé dans l'index du dossier.
+  `verifier()` les recalcule; une sauvegarde tronquée n'a pas de ligne `fin`.
+- Restauration: insertions brutes par lots (ni save() ni auto_now) qui remplacent
+  les lignes de même clé; une incrémentale est rejouée après sa chaîne (complète
+  puis incrémentales), le tout dans une transaction.
+
+Les tables régénérées par `migrate` (types de contenu, permissions) et les
+sessions ne sont pas sauvegardées.
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.db.models import Max, Min
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+TAILLE_LOT = 2000
+EXCLUS = frozenset({'contenttypes.contenttype', 'auth.permission', 'sessions.session', 'admin.logentry'})
+INDEX = 'index.json'
+
+
+class ErreurSauvegarde(Exception):
+    pass
+
+
+def dossier_sauvegardes():
+    return getattr(settings, 'SAUVEGARDES_DIR', os.path.join(settings.BASE_DIR, 'logs', 'sauvegardes'))
+
+
+# Tables --------------------------------------------------------------------------------
+
+def modeles_sauvegardes(alias='default'):
+    """Modèles sauvegardés (tables m2m comprises), chaque modèle après ceux qu'il référence."""
+    modeles = sorted(
+        (m for m in apps.get_models(include_auto_created=True)
+         if m._meta.managed and not m._meta.proxy and m._meta.label_lower not in EXCLUS
+         and router.allow_migrate_model(alias, m)),
+        key=lambda m: m._meta.label,
+    )
+    restants = set(modeles)
+    ordre = []
+    while restants:
+        prets = [
+            m for m in modeles if m in restants and not any(
+                f.related_model in restants and f.related_model is not m
+                for f in m._meta.concrete_fields if f.many_to_one or f.one_to_one
+            )
+        ]
+        # Cycle de clés étrangères: les contraintes sont vérifiées à la validation de la transaction
+        ordre.extend(prets or [next(m for m in modeles if m in restants)])
+        restants.difference_update(ordre)
+    return ordre
+
+
+def champ_modification(modele):
+    """Nom du champ `auto_now` qui date la dernière modification d'une ligne, ou None."""
+    for champ in modele._meta.concrete_fields:
+        if getattr(champ, 'auto_now', False):
+            return champ.name
+    return None
+
+
+class _Encodeur(DjangoJSONEncoder):
+    """DjangoJSONEncoder sans troncature des microsecondes (restauration à l'identique)."""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+@contextmanager
+def _instantane(alias):
+    """Transaction de lecture: toutes les tables d'une sauvegarde voient le même état."""
+    connexion = connections[alias]
+    externe = connexion.in_atomic_block
+    with transaction.atomic(using=alias):
+        if not externe and connexion.vendor == 'postgresql':
+            with connexion.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+def _ligne(valeur):
+    return (json.dumps(valeur, cls=_Encodeur, ensure_ascii=False, separators=(',', ':')) + '\n').encode()
+
+
+# Écriture ------------------------------------------------------------------------------
+
+class _Gzip:
+    """Compression gzip en flux: `ecrire()` accumule, `vider()` rend les octets compressés disponibles."""
+
+    def __init__(self):
+        self.tampon = io.BytesIO()
+        self.gzip = gzip.GzipFile(fileobj=self.tampon, mode='wb', mtime=0)
+
+    def ecrire(self, octets):
+        self.gzip.write(octets)
+
+    def _lire(self):
+        octets = self.tampon.getvalue()
+        self.tampon.seek(0)
+        self.tampon.truncate()
+        return octets
+
+    def vider(self):
+        self.gzip.flush()
+        return self._lire()
+
+    def fermer(self):
+        self.gzip.close()
+        return self._lire()
+
+
+def flux(depuis=None, modeles=None, taille_lot=TAILLE_LOT, alias='default', debut=None, resume=None,
+         filtres=None, entete=None, bornes=False):
+    """Générateur des octets d'une sauvegarde (incrémentale si `depuis` est donné).
+
+    `resume`, s'il est fourni (dict), reçoit à la fin le nombre de lignes par table.
+    `filtres` ({modèle: Q}) restreint les lignes de certaines tables, `entete` complète
+    la ligne d'entête et `bornes` ajoute les clés min/max à l'entête de chaque table.
+    """
+    debut = debut or timezone.now()
+    modeles = modeles if modeles is not None else modeles_sauvegardes(alias)
+    gz = _Gzip()
+    total = hashlib.sha256()
+    lignes_total = 0
+
+    def ecrire(octets):
+        total.update(octets)
+        gz.ecrire(octets)
+
+    ecrire(_ligne({
+        'type': 'entete', 'version': VERSION, 'mode': 'incrementale' if depuis else 'complete',
+        'debut': debut, 'depuis': depuis, **(entete or {}),
+    }))
+    with _instantane(alias):
+        for modele in modeles:
+            champs = [f.attname for f in modele._meta.concrete_fields]
+            qs = modele._base_manager.using(alias).order_by('pk')
+            filtre = champ_modification(modele) if depuis else None
+            if filtre:
+                qs = qs.filter(**{f'{filtre}__gte': depuis})
+            if filtres and modele in filtres:
+                qs = qs.filter(filtres[modele])
+            table = {'type': 'table', 'modele': modele._meta.label, 'champs': champs, 'filtre': filtre}
+            if bornes:
+                table.update(qs.aggregate(pk_min=Min('pk'), pk_max=Max('pk')))
+            ecrire(_ligne(table))
+            somme, lignes = hashlib.sha256(), 0
+            for valeurs in qs.values_list(*champs).iterator(chunk_size=taille_lot):
+                octets = _ligne(valeurs)
+                somme.update(octets)
+                ecrire(octets)
+                lignes += 1
+                if lignes % taille_lot == 0:
+                    yield gz.vider()
+            ecrire(_ligne({'type': 'fin_table', 'modele': modele._meta.label, 'lignes': lignes,
+                           'sha256': somme.hexdigest()}))
+            yield gz.vider()
+            lignes_total += lignes
+            if resume is not None:
+                resume[modele._meta.label] = lignes
+    gz.ecrire(_ligne({'type': 'fin', 'tables': len(modeles), 'lignes': lignes_total, 'sha256': total.hexdigest()}))
+    yield gz.fermer()
+
+
+def lire_index(dossier=None):
+    chemin = os.path.join(dossier or dossier_sauvegardes(), INDEX)
+    if not os.path.exists(chemin):
+        return []
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _ecrire_index(entrees, dossier):
+    chemin = os.path.join(dossier, INDEX)
+    with open(chemin + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(entrees, f, ensure_ascii=False, indent=2)
+    os.replace(chemin + '.tmp', chemin)
+
+
+def sauvegarder(incrementale=False, dossier=None, taille_lot=TAILLE_LOT, alias='default'):
+    """Écrit une sauvegarde dans `dossier` et l'ajoute à l'index; retourne l'entrée d'index.
+
+    Une incrémentale sans sauvegarde précédente est faite complète.
+    """
+    dossier = dossier or dossier_sauvegardes()
+    os.makedirs(dossier, exist_ok=True)
+    index = lire_index(dossier)
+    precedente = index[-1] if incrementale and index else None
+    debut = timezone.now()
+    mode = 'incrementale' if precedente else 'complete'
+    nom = f"{len(index) + 1:04d}-{timezone.localtime(debut):%Y%m%d-%H%M%S}-{mode}.ndjson.gz"
+    chemin = os.path.join(dossier, nom)
+
+    somme, octets, tables = hashlib.sha256(), 0, {}
+    with open(chemin + '.tmp', 'wb') as f:
+        for morceau in flux(precedente['debut'] if precedente else None, taille_lot=taille_lot,
+                            alias=alias, debut=debut, resume=tables):
+            somme.update(morceau)
+            octets += len(morceau)
+            f.write(morceau)
+    os.replace(chemin + '.tmp', chemin)
+
+    entree = {
+        'nom': nom, 'mode': mode, 'debut': debut.isoformat(),
+        'depuis': precedente['debut'] if precedente else None,
+        'base': precedente['nom'] if precedente else None,
+        'lignes': sum(tables.values()), 'tables': tables, 'octets': octets, 'sha256': somme.hexdigest(),
+    }
+    _ecrire_index(index + [entree], dossier)
+    logger.info("Sauvegarde %s: %s lignes, %s octets", nom, entree['lignes'], octets)
+    return entree
+
+
+def sauvegarde_recente(minutes, dossier=None):
+    """Dernière sauvegarde de l'index si elle a commencé il y a moins de `minutes`, sinon None."""
+    index = lire_index(dossier)
+    if not index:
+        return None
+    derniere = index[-1]
+    if timezone.now() - datetime.fromisoformat(derniere['debut']) > timedelta(minutes=minutes):
+        return None
+    return derniere
+
+
+def chaine(nom, dossier=None):
+    """Entrées d'index à restaurer pour obtenir l'état de `nom`: sa complète puis les incrémentales."""
+    par_nom = {e['nom']: e for e in lire_index(dossier)}
+    if nom not in par_nom:
+        raise ErreurSauvegarde(f"Sauvegarde inconnue: {nom}")
+    entrees = [par_nom[nom]]
+    while entrees[0]['base']:
+        if entrees[0]['base'] not in par_nom:
+            raise ErreurSauvegarde(f"Sauvegarde de base manquante: {entrees[0]['base']}")
+        entrees.insert(0, par_nom[entrees[0]['base']])
+    return entrees
+
+
+# Lecture -------------------------------------------------------------------------------
+
+def lire(chemin):
+    """(entête, table, fin_table ou ligne) dans l'ordre du fichier, sommes de contrôle vérifiées."""
+    total = hashlib.sha256()
+    entete = table = somme = None
+    lignes = lignes_total = tables = 0
+    try:
+        with gzip.open(chemin, 'rb') as f:
+            for octets in f:
+                if not octets.startswith(b'['):
+                    objet = json.loads(octets)
+                    if objet.get('type') == 'fin':
+                        if (objet['sha256'], objet['lignes'], objet['tables']) != (
+                                total.hexdigest(), lignes_total, tables):
+                            raise ErreurSauvegarde("Somme de contrôle globale incorrecte")
+                        yield 'fin', objet
+                        return
+                    if objet.get('type') == 'entete':
+                        if objet.get('version') != VERSION:
+                            raise ErreurSauvegarde(f"Version de sauvegarde non prise en charge: {objet.get('version')}")
+                        entete = objet
+                    elif entete is None:
+                        raise ErreurSauvegarde("Entête de sauvegarde absente")
+                    elif objet['type'] == 'table':
+                        table, somme, lignes = objet, hashlib.sha256(), 0
+                    elif objet['type'] == 'fin_table':
+                        if table is None or (objet['sha256'], objet['lignes']) != (somme.hexdigest(), lignes):
+                            raise ErreurSauvegarde(f"Somme de contrôle incorrecte pour {objet['modele']}")
+                        table = None
+                        tables += 1
+                        lignes_total += lignes
+                    total.update(octets)
+                    yield objet['type'], objet
+                    continue
+                if table is None:
+                    raise ErreurSauvegarde("Ligne hors table")
+                total.update(octets)
+                somme.update(octets)
+                lignes += 1
+                yield 'ligne', json.loads(octets)
+    except (OSError, EOFError, ValueError) as e:
+        raise ErreurSauvegarde(f"Fichier illisible ou tronqué: {e}") from e
+    raise ErreurSauvegarde("Sauvegarde incomplète (pas de ligne de fin)")
+
+
+def verifier(chemin, sha256=None):
+    """Relit `chemin` sans rien écrire; retourne {'valide', 'erreurs', 'tables', 'lignes'}."""
+    erreurs, fin = [], None
+    if sha256:
+        somme = hashlib.sha256()
+        with open(chemin, 'rb') as f:
+            for bloc in iter(lambda: f.read(1 << 20), b''):
+                somme.update(bloc)
+        if somme.hexdigest() != sha256:
+            erreurs.append("SHA-256 du fichier différent de celui de l'index")
+    try:
+        for genre, objet in lire(chemin):
+            if genre == 'fin':
+                fin = objet
+    except ErreurSauvegarde as e:
+        erreurs.append(str(e))
+    return {
+        'valide': not erreurs, 'erreurs': erreurs,
+        'tables': fin['tables'] if fin else None, 'lignes': fin['lignes'] if fin else None,
+    }
+
+
+# Restauration --------------------------------------------------------------------------
+
+class _Chargeur:
+    """Insertions brutes d'une table par lots, remplaçant les lignes de même clé primaire."""
+
+    def __init__(self, entete_table, alias, taille_lot):
+        self.modele = apps.get_model(entete_table['modele'])
+        par_attname = {f.attname: f for f in self.modele._meta.concrete_fields}
+        inconnus = [c for c in entete_table['champs'] if c not in par_attname]
+        if inconnus:
+            raise ErreurSauvegarde(f"{entete_table['modele']}: champs absents du schéma: {', '.join(inconnus)}")
+        self.champs = [par_attname[c] for c in entete_table['champs']]
+        self.alias, self.taille_lot = alias, taille_lot
+        self.lot, self.lignes = [], 0
+        pk = self.modele._meta.pk
+        self.a_jour = [f for f in self.champs if f is not pk]
+        self.options = (
+            {'on_conflict': OnConflict.UPDATE, 'update_fields': self.a_jour, 'unique_fields': [pk]}
+            if self.a_jour else {'on_conflict': OnConflict.IGNORE}
+        )
+
+    def ajouter(self, valeurs):
+        self.lot.append(self.modele(**{
+            champ.attname: champ.to_python(valeur) for champ, valeur in zip(self.champs, valeurs)
+        }))
+        if len(self.lot) >= self.taille_lot:
+            self.vider()
+
+    def vider(self):
+        if not self.lot:
+            return
+        taille = connections[self.alias].ops.bulk_batch_size(self.champs, self.lot) or len(self.lot)
+        for i in range(0, len(self.lot), taille):
+            self.modele._base_manager._insert(self.lot[i:i + taille], fields=self.champs,
+                                              using=self.alias, raw=True, **self.options)
+        self.lignes += len(self.lot)
+        self.lot = []
+
+
+def restaurer(chemins, alias='default', taille_lot=TAILLE_LOT):
+    """Recharge les fichiers `chemins` dans l'ordre, en une transaction; retourne {modèle: lignes}.
+
+    Une somme de contrôle incorrecte annule toute la restauration.
+    """
+    resultat, modeles = {}, set()
+    with transaction.atomic(using=alias):
+        for chemin in chemins:
+            chargeur = None
+            for genre, objet in lire(chemin):
+                if genre == 'table':
+                    chargeur = _Chargeur(objet, alias, taille_lot)
+                elif genre == 'ligne':
+                    chargeur.ajouter(objet)
+                elif genre == 'fin_table':
+                    chargeur.vider()
+                    resultat[objet['modele']] = resultat.get(objet['modele'], 0) + chargeur.lignes
+                    modeles.add(chargeur.modele)
+        # Séquences des clés primaires après insertion de clés explicites (PostgreSQL)
+        connexion = connections[alias]
+        requetes = connexion.ops.sequence_reset_sql(no_style(), list(modeles))
+        if requetes:
+            with connexion.cursor() as cursor:
+                for sql in requetes:
+                    cursor.execute(sql)
+    return resultat
+
+
+def entete(chemin):
+    """Première ligne d'un fichier de sauvegarde (mode, début, depuis)."""
+    try:
+        with gzip.open(chemin, 'rb') as f:
+            return json.loads(f.readline())
+    except (OSError, EOFError, ValueError) as e:
+        raise ErreurSauvegarde(f"Fichier illisible: {e}") from e
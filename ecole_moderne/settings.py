@@ -153,6 +153,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ecole_moderne.request_profiler.RequestProfilerMiddleware',  # Profilage à la demande (superutilisateurs)
     'ecole_moderne.middleware.EcoleSelectionMiddleware',  # Sélection d'école multi-tenant
     'ecole_moderne.middleware.PermissionEcoleMiddleware',  # Permissions par école
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -168,6 +169,50 @@ if not DEBUG:
     MIDDLEWARE.insert(5, 'ecole_moderne.security_middleware.CSRFSecurityMiddleware')
     # CSP/headers de sécurité (en fin de chaîne pour setter les en-têtes)
     MIDDLEWARE.append('ecole_moderne.security_middleware.CSPMiddleware')
+    # Fichiers de STATIC_ROOT (collectstatic) servis par WhiteNoise, après les SecurityMiddleware
+    MIDDLEWARE.insert(2, 'whitenoise.middleware.WhiteNoiseMiddleware')
+
+# Profilage SQL par requête (opt-in, échantillonné): voir ecole_moderne/sql_profiler.py
+SQL_PROFILER_ENABLED = os.environ.get('SQL_PROFILER_ENABLED', 'false').lower() == 'true'
+SQL_PROFILER_SAMPLE_RATE = float(os.environ.get('SQL_PROFILER_SAMPLE_RATE', '0.1'))  # fraction des requêtes profilées
+SQL_PROFILER_N1_THRESHOLD = int(os.environ.get('SQL_PROFILER_N1_THRESHOLD', '10'))  # répétitions d'une même forme SQL
+SQL_PROFILER_SLOW_MS = int(os.environ.get('SQL_PROFILER_SLOW_MS', '500'))  # seuil de trace des requêtes lentes
+if SQL_PROFILER_ENABLED:
+    MIDDLEWARE.insert(0, 'ecole_moderne.sql_profiler.SQLProfilerMiddleware')
+
+# Métriques Prometheus (/metrics) et en-tête Server-Timing: voir ecole_moderne/metrics.py
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # endpoint /metrics désactivé si vide
+METRICS_DIR = os.environ.get('METRICS_DIR', str(BASE_DIR / 'logs' / 'metrics'))  # partagé entre workers
+METRICS_FLUSH_SECONDS = int(os.environ.get('METRICS_FLUSH_SECONDS', '5'))
+METRICS_RETENTION_SECONDS = int(os.environ.get('METRICS_RETENTION_SECONDS', '86400'))  # fichiers de workers morts
+# Compteurs hits / misses du cache uniquement quand les métriques sont actives
+CACHE_LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'ecole_moderne.metrics.MetricsMiddleware')
+    CACHE_LOCMEM_BACKEND = 'ecole_moderne.metrics.LocMemCacheInstrumente'
+
+# Profilage à la demande (?_profiler=1 ou armement depuis l'administration)
+PROFILES_DIR = os.environ.get('PROFILES_DIR', str(BASE_DIR / 'logs' / 'profiles'))
+PROFILER_INTERVAL_MS = int(os.environ.get('PROFILER_INTERVAL_MS', '5'))  # période d'échantillonnage des piles
+PROFILES_MAX_FILES = int(os.environ.get('PROFILES_MAX_FILES', '200'))  # profils conservés (les plus récents)
+PROFILES_MAX_AGE_DAYS = int(os.environ.get('PROFILES_MAX_AGE_DAYS', '7'))
+
+# Import en masse des élèves (fichiers déposés, état de progression, rapports d'erreurs)
+IMPORTS_DIR = os.environ.get('IMPORTS_DIR', str(BASE_DIR / 'logs' / 'imports'))
+IMPORTS_RETENTION_DAYS = int(os.environ.get('IMPORTS_RETENTION_DAYS', '7'))  # dépôts et rejets (données personnelles)
+IMPORTS_STALE_SECONDS = int(os.environ.get('IMPORTS_STALE_SECONDS', '900'))  # état non mis à jour: import interrompu
+
+# Reçus PDF validés, rendus une seule fois (hors MEDIA_ROOT: servis après contrôle d'accès)
+RECUS_DIR = os.environ.get('RECUS_DIR', str(BASE_DIR / 'logs' / 'recus'))
+
+# Sauvegardes NDJSON gzip (manage.py sauvegarder / restaurer, avant réinitialisation système)
+SAUVEGARDES_DIR = os.environ.get('SAUVEGARDES_DIR', str(BASE_DIR / 'logs' / 'sauvegardes'))
+# Âge maximal (minutes) de la dernière sauvegarde exigée avant une réinitialisation système
+SAUVEGARDE_RESET_MINUTES = int(os.environ.get('SAUVEGARDE_RESET_MINUTES', '60'))
+
+# Budget de démarrage (django.setup() + URLconf) vérifié par `manage.py mesurer_imports`
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', '1500'))
 
 ROOT_URLCONF = 'ecole_moderne.urls'
 
@@ -175,7 +220,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
@@ -183,11 +227,19 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'utilisateurs.context_processors.user_context',
             ],
+            # Templates compilés une seule fois par processus (rechargés par l'autoreloader en DEBUG)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'ecole_moderne.wsgi.application'
+ASGI_APPLICATION = 'ecole_moderne.asgi.application'
 
 
 # Database
@@ -228,6 +280,53 @@ else:
         }
     }
 
+# Réplique en lecture pour les rapports, exports et tableaux de bord (ecole_moderne/replica.py).
+# SQLite: REPLICA_DATABASE_NAME=/chemin/replica.sqlite3 (copie de db.sqlite3).
+# PostgreSQL: REPLICA_DATABASE_HOST (et au besoin NAME/PORT/USER/PASSWORD) de la réplique.
+REPLICA_DATABASE_ALIAS = None
+REPLICA_LAG_SECONDS = int(os.environ.get('REPLICA_LAG_SECONDS', '10'))  # lectures sur le primaire après une écriture
+# Réglages propres à la réplique, appliqués sur DATABASES['default'] (ici et dans settings_production)
+REPLICA_DATABASE_OVERRIDES = {
+    cle: os.environ[f'REPLICA_DATABASE_{cle}']
+    for cle in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD')
+    if os.environ.get(f'REPLICA_DATABASE_{cle}')
+}
+if REPLICA_DATABASE_OVERRIDES:
+    DATABASES['replica'] = {**DATABASES['default'], **REPLICA_DATABASE_OVERRIDES, 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASE_ALIAS = 'replica'
+    MIDDLEWARE.append('ecole_moderne.replica.ReplicaMiddleware')
+
+# Base d'archives des années scolaires clôturées (ecole_moderne/archives.py, manage.py cloturer_annee).
+# SQLite: archives.sqlite3 à côté de db.sqlite3; PostgreSQL: base <DATABASE_NAME>_archives.
+# ARCHIVE_DATABASE_NAME/HOST/PORT/USER/PASSWORD pour une autre base. Schéma à créer une fois:
+# python manage.py migrate --database archives
+ARCHIVE_DATABASE_ALIAS = 'archives'
+ARCHIVE_DATABASE_OVERRIDES = {
+    cle: os.environ[f'ARCHIVE_DATABASE_{cle}']
+    for cle in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD')
+    if os.environ.get(f'ARCHIVE_DATABASE_{cle}')
+}
+DATABASES['archives'] = {
+    **DATABASES['default'],
+    'NAME': (BASE_DIR / 'archives.sqlite3' if DATABASE_ENGINE != 'postgresql'
+             else f"{DATABASES['default']['NAME']}_archives"),
+    **ARCHIVE_DATABASE_OVERRIDES,
+}
+DATABASE_ROUTERS = ['ecole_moderne.archives.RouteurArchives', 'ecole_moderne.replica.RouteurReplica']
+
+# Points d'accès AJAX asynchrones (paiements/views_async.py, eleves/views_async.py), pour un
+# déploiement ASGI: gunicorn ecole_moderne.asgi:application -k uvicorn.workers.UvicornWorker
+# Sous ASGI chaque requête a son propre thread pour l'ORM: pas de connexions persistantes.
+AJAX_ASYNC = os.environ.get('AJAX_ASYNC', 'false').lower() == 'true'
+AJAX_CACHE_SECONDS = int(os.environ.get('AJAX_CACHE_SECONDS', '30'))  # statistiques et listes de classes
+if AJAX_ASYNC:
+    for _alias in DATABASES:
+        DATABASES[_alias]['CONN_MAX_AGE'] = 0
+
+# Explorateur de données (administration): âge maximal des comptages en cache avant rafraîchissement
+# en arrière-plan (SQLite); sous PostgreSQL les grandes tables utilisent pg_class.reltuples
+COMPTAGES_TTL = int(os.environ.get('COMPTAGES_TTL', '300'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -283,6 +382,7 @@ LOGOUT_REDIRECT_URL = '/utilisateurs/login/'  # Redirection après déconnexion
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.environ.get('STATIC_ROOT', str(BASE_DIR / 'staticfiles'))
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
@@ -293,13 +393,21 @@ STATICFILES_FINDERS = [
     'django.contrib.staticfiles.finders.AppDirectoriesFinder',
 ]
 
-# Cache pour les fichiers statiques (améliore les performances)
-STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+# collectstatic: variantes WebP/AVIF des images, noms hachés, copies .gz/.br (voir ecole_moderne/statiques.py)
+STATIC_MANIFEST = os.environ.get('STATIC_MANIFEST', str(not DEBUG)).lower() == 'true'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'ecole_moderne.statiques.StockageStatique' if STATIC_MANIFEST
+        else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+WHITENOISE_MAX_AGE = int(os.environ.get('WHITENOISE_MAX_AGE', '3600'))  # fichiers non hachés; hachés: 10 ans, immutable
 
 # Configuration du cache pour les images
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_LOCMEM_BACKEND,
         'LOCATION': 'unique-snowflake',
         'TIMEOUT': 300,  # 5 minutes
         'OPTIONS': {
@@ -307,7 +415,7 @@ CACHES = {
         }
     },
     'images': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_LOCMEM_BACKEND,
         'LOCATION': 'image-cache',
         'TIMEOUT': 3600,  # 1 heure pour les images
         'OPTIONS': {
@@ -347,6 +455,13 @@ LOGGING = {
             'filename': BASE_DIR / 'logs' / 'security.log',
             'formatter': 'security',
         },
+        'sql_profiler_file': {
+            'level': 'WARNING',
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'logs' / 'sql_profiler.log',
+            'formatter': 'verbose',
+            'delay': True,
+        },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
@@ -359,6 +474,11 @@ LOGGING = {
             'level': 'WARNING',
             'propagate': False,
         },
+        'ecole_moderne.sql_profiler': {
+            'handlers': ['sql_profiler_file'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
         'django.security': {
             'handlers': ['security_file'],
             'level': 'WARNING',
@@ -48,6 +48,21 @@ DATABASES = {
     }
 }
 
+# Réplique en lecture (REPLICA_DATABASE_*, voir settings.py): l'entrée définie sur la base de
+# développement a été remplacée ci-dessus, elle est reconstruite sur la base de production
+if REPLICA_DATABASE_ALIAS:
+    DATABASES[REPLICA_DATABASE_ALIAS] = {
+        **DATABASES['default'], **REPLICA_DATABASE_OVERRIDES, 'TEST': {'MIRROR': 'default'},
+    }
+
+# Archives des années clôturées: la base MySQL doit être créée dans la console PythonAnywhere
+# puis désignée par ARCHIVE_DATABASE_NAME (schéma: manage.py migrate --database archives).
+# Sans elle, l'archivage est désactivé et toutes les lectures restent sur `default`.
+if 'NAME' in ARCHIVE_DATABASE_OVERRIDES:
+    DATABASES['archives'] = {**DATABASES['default'], **ARCHIVE_DATABASE_OVERRIDES}
+else:
+    ARCHIVE_DATABASE_ALIAS = None
+
 # Configuration des fichiers statiques pour production
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -56,11 +71,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-# Middleware pour les fichiers statiques
-MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+# Middleware pour les fichiers statiques (déjà présent si settings.py a été chargé avec DJANGO_DEBUG=false)
+if 'whitenoise.middleware.WhiteNoiseMiddleware' not in MIDDLEWARE:
+    MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
-# Configuration de WhiteNoise pour les fichiers statiques
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Noms hachés, variantes d'images et copies compressées produits par collectstatic
+STORAGES['staticfiles']['BACKEND'] = 'ecole_moderne.statiques.StockageStatique'
 
 # Configuration de sécurité pour la production
 SECURE_BROWSER_XSS_FILTER = True
@@ -136,7 +152,7 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@myschoolgn.sp
 # Cache configuration pour améliorer les performances
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_LOCMEM_BACKEND,
         'LOCATION': 'unique-snowflake',
     }
 }
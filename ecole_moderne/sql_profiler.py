@@ -0,0 +1,181 @@
+"""
+Profilage SQL par requête HTTP (opt-in, échantillonné)
+
+Activé par SQL_PROFILER_ENABLED. Pour une fraction SQL_PROFILER_SAMPLE_RATE des
+requêtes, un `execute_wrapper` posé sur chaque base déclarée (default, réplique,
+archives) enregistre chaque requête SQL: nombre, temps base de données et
+« formes » normalisées (littéraux et listes IN retirés).
+Une forme répétée plus de SQL_PROFILER_N1_THRESHOLD fois signale un motif N+1.
+
+Les agrégats par vue sont conservés en mémoire du processus (fenêtre glissante des
+derniers échantillons) et affichés dans administration > Profilage SQL. Les
+requêtes lentes ou N+1 sont tracées dans logs/sql_profiler.log.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+FENETRE = 200  # échantillons conservés par vue pour médiane / p95
+
+_RE_CHAINE = re.compile(r"'(?:[^']|'')*'")
+_RE_NOMBRE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTE_IN = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?|\d+)\s*,?)+\)", re.IGNORECASE)
+_RE_ESPACES = re.compile(r"\s+")
+
+
+def normaliser_sql(sql):
+    """Forme canonique d'une requête: deux requêtes qui ne diffèrent que par leurs valeurs sont égales."""
+    sql = _RE_CHAINE.sub('?', sql)
+    sql = _RE_NOMBRE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _RE_LISTE_IN.sub('IN (...)', sql)
+    return _RE_ESPACES.sub(' ', sql).strip()
+
+
+def _parametre(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+
+class ProfilRequete:
+    """Enregistreur installé via `connection.execute_wrapper` le temps d'une requête HTTP."""
+
+    def __init__(self):
+        self.nb_requetes = 0
+        self.temps_sql = 0.0
+        self.formes = Counter()
+        self.durees_formes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = time.perf_counter() - debut
+            forme = normaliser_sql(sql)
+            self.nb_requetes += 1
+            self.temps_sql += duree
+            self.formes[forme] += 1
+            self.durees_formes[forme] += duree
+
+    def doublons(self, seuil):
+        """Formes répétées plus de `seuil` fois, de la plus fréquente à la moins fréquente."""
+        return [(forme, nb) for forme, nb in self.formes.most_common() if nb > seuil]
+
+
+class StatistiquesVues:
+    """Agrégats glissants par vue, partagés par les threads du processus."""
+
+    def __init__(self, fenetre=FENETRE):
+        self._verrou = threading.Lock()
+        self._fenetre = fenetre
+        self._vues = {}
+
+    def enregistrer(self, vue, duree_ms, nb_requetes, temps_sql_ms, doublons):
+        with self._verrou:
+            stats = self._vues.get(vue)
+            if stats is None:
+                stats = self._vues[vue] = {
+                    'nb': 0, 'nb_n1': 0, 'total_ms': 0.0, 'total_sql_ms': 0.0, 'total_requetes': 0,
+                    'max_ms': 0.0, 'max_requetes': 0,
+                    'durees': deque(maxlen=self._fenetre), 'formes_n1': Counter(),
+                }
+            stats['nb'] += 1
+            stats['total_ms'] += duree_ms
+            stats['total_sql_ms'] += temps_sql_ms
+            stats['total_requetes'] += nb_requetes
+            stats['max_ms'] = max(stats['max_ms'], duree_ms)
+            stats['max_requetes'] = max(stats['max_requetes'], nb_requetes)
+            stats['durees'].append(duree_ms)
+            if doublons:
+                stats['nb_n1'] += 1
+                for forme, nb in doublons:
+                    stats['formes_n1'][forme] = max(stats['formes_n1'][forme], nb)
+
+    def resume(self):
+        """Liste de dicts par vue, triée par temps SQL cumulé décroissant."""
+        with self._verrou:
+            lignes = []
+            for vue, stats in self._vues.items():
+                durees = sorted(stats['durees'])
+                nb = stats['nb']
+                lignes.append({
+                    'vue': vue,
+                    'nb': nb,
+                    'moyenne_ms': stats['total_ms'] / nb,
+                    'mediane_ms': durees[len(durees) // 2],
+                    'p95_ms': durees[min(len(durees) - 1, int(len(durees) * 0.95))],
+                    'max_ms': stats['max_ms'],
+                    'requetes_moyennes': stats['total_requetes'] / nb,
+                    'max_requetes': stats['max_requetes'],
+                    'sql_moyen_ms': stats['total_sql_ms'] / nb,
+                    'total_sql_ms': stats['total_sql_ms'],
+                    'nb_n1': stats['nb_n1'],
+                    'formes_n1': stats['formes_n1'].most_common(5),
+                })
+        return sorted(lignes, key=lambda ligne: ligne['total_sql_ms'], reverse=True)
+
+    def reinitialiser(self):
+        with self._verrou:
+            self._vues.clear()
+
+
+statistiques = StatistiquesVues()
+
+
+class SQLProfilerMiddleware:
+    """
+    Middleware de profilage SQL (à placer en tête de MIDDLEWARE pour couvrir
+    sessions et authentification).
+    """
+
+    def __init__(self, get_response):
+        if not _parametre('SQL_PROFILER_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.taux = float(_parametre('SQL_PROFILER_SAMPLE_RATE', 0.1))
+        self.seuil_n1 = int(_parametre('SQL_PROFILER_N1_THRESHOLD', 10))
+        self.seuil_lent_ms = float(_parametre('SQL_PROFILER_SLOW_MS', 500))
+
+    def __call__(self, request):
+        if self.taux < 1 and random.random() >= self.taux:
+            return self.get_response(request)
+
+        profil = ProfilRequete()
+        debut = time.perf_counter()
+        with ExitStack() as pile:
+            for alias in connections:
+                pile.enter_context(connections[alias].execute_wrapper(profil))
+            response = self.get_response(request)
+        duree_ms = (time.perf_counter() - debut) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        vue = (match.view_name or match._func_path) if match else '<non résolue>'
+        doublons = profil.doublons(self.seuil_n1)
+        statistiques.enregistrer(vue, duree_ms, profil.nb_requetes, profil.temps_sql * 1000, doublons)
+
+        if doublons or duree_ms >= self.seuil_lent_ms:
+            self._tracer(request, vue, response, duree_ms, profil, doublons)
+        return response
+
+    def _tracer(self, request, vue, response, duree_ms, profil, doublons):
+        lignes = [
+            f"{request.method} {request.path} | VUE: {vue} | STATUT: {response.status_code} | "
+            f"TEMPS: {duree_ms:.0f}ms | SQL: {profil.nb_requetes} requêtes / {profil.temps_sql * 1000:.0f}ms"
+            + (f" | N+1: {len(doublons)} forme(s)" if doublons else "")
+        ]
+        for forme, nb in doublons[:5]:
+            lignes.append(f"    x{nb} ({profil.durees_formes[forme] * 1000:.0f}ms) {forme[:300]}")
+        if not doublons:
+            for forme, duree in profil.durees_formes.most_common(3):
+                lignes.append(f"    {duree * 1000:.0f}ms x{profil.formes[forme]} {forme[:300]}")
+        logger.warning("\n".join(lignes))
@@ -0,0 +1,135 @@
+"""Fichiers statiques: variantes d'images générées par collectstatic, servies par WhiteNoise.
+
+`StockageStatique` (STORAGES['staticfiles'] hors DEBUG) ajoute au post-traitement
+de collectstatic, avant le hachage des noms:
+
+- pour chaque image JPEG/PNG des DOSSIERS_IMAGES, des variantes redimensionnées
+  (tailles de ImageOptimizer.SIZES, sans agrandissement) en WebP, et en AVIF si
+  Pillow le prend en charge: `images/ecole_optimized/ecole_small.webp`...;
+- le manifeste MANIFESTE_VARIANTES (source -> dimensions et variantes), lu une fois
+  par processus par `variantes()`: les balises de image_tags choisissent leurs
+  sources en mémoire, sans accès disque au rendu.
+
+Le reste vient de WhiteNoise (CompressedManifestStaticFilesStorage): noms hachés,
+copies .gz (et .br si le paquet Brotli est installé), et en-têtes de cache « immutable »
+d'un an et plus pour les fichiers hachés servis par WhiteNoiseMiddleware.
+"""
+import io
+import json
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+from ecole_moderne.image_optimization import ImageOptimizer
+
+logger = logging.getLogger(__name__)
+
+DOSSIERS_IMAGES = ('images/',)
+EXTENSIONS_IMAGES = ('.jpg', '.jpeg', '.png')
+TAILLES = ('thumbnail', 'small', 'medium', 'large')
+MANIFESTE_VARIANTES = 'images-variantes.json'
+
+
+def formats_disponibles():
+    """Formats de variantes, du plus compact au plus répandu (AVIF selon la version de Pillow)."""
+    from PIL import features
+
+    return tuple(f for f in ('avif', 'webp') if features.check(f))
+
+
+def chemin_variante(chemin, taille, extension):
+    """images/ecole.jpg -> images/ecole_optimized/ecole_small.webp (convention des balises d'image)."""
+    base = os.path.splitext(chemin)[0]
+    return f"{base}_optimized/{os.path.basename(base)}_{taille}.{extension}"
+
+
+def generer_variantes(contenu, chemin, enregistrer, formats=None):
+    """Variantes d'une image source (octets); `enregistrer(chemin, octets)` écrit chaque fichier.
+
+    Retourne l'entrée du manifeste: {'largeur', 'hauteur', 'variantes': {taille: {...}}}.
+    """
+    from PIL import Image
+
+    formats = formats_disponibles() if formats is None else formats
+    with Image.open(io.BytesIO(contenu)) as image:
+        image.load()
+        largeur, hauteur = image.size
+        if image.mode == 'P':
+            image = image.convert('RGBA')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        entree = {'largeur': largeur, 'hauteur': hauteur, 'variantes': {}}
+        precedente = None
+        for taille in TAILLES:
+            boite = ImageOptimizer.SIZES[taille]
+            copie = image.copy()
+            copie.thumbnail(boite, Image.Resampling.LANCZOS)
+            if copie.size == precedente:
+                break  # image plus petite que la boîte: pas de variante plus grande que l'original
+            precedente = copie.size
+            variante = {'largeur': copie.width, 'hauteur': copie.height}
+            for extension in formats:
+                tampon = io.BytesIO()
+                copie.save(tampon, extension.upper(), quality=ImageOptimizer.QUALITY[taille])
+                variante[extension] = chemin_variante(chemin, taille, extension)
+                enregistrer(variante[extension], tampon.getvalue())
+            entree['variantes'][taille] = variante
+    return entree
+
+
+class StockageStatique(CompressedManifestStaticFilesStorage):
+    """Stockage de collectstatic: variantes d'images + noms hachés + compression (WhiteNoise)."""
+
+    # Un fichier absent du manifeste est servi sous son nom d'origine plutôt qu'en erreur 500
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+        manifeste, formats = {}, formats_disponibles()
+        for chemin, (stockage, chemin_source) in list(paths.items()):
+            if not (chemin.startswith(DOSSIERS_IMAGES) and chemin.lower().endswith(EXTENSIONS_IMAGES)):
+                continue
+            if '_optimized/' in chemin:
+                continue
+            try:
+                with stockage.open(chemin_source) as f:
+                    manifeste[chemin] = generer_variantes(f.read(), chemin, self._enregistrer, formats)
+            except Exception as e:
+                logger.warning("Variantes non générées pour %s: %s", chemin, e)
+                continue
+            for variante in manifeste[chemin]['variantes'].values():
+                for extension in formats:
+                    paths[variante[extension]] = (self, variante[extension])
+        yield from super().post_process(paths, dry_run, **options)
+        if self.exists(MANIFESTE_VARIANTES):
+            self.delete(MANIFESTE_VARIANTES)
+        self._save(MANIFESTE_VARIANTES, ContentFile(json.dumps(manifeste, indent=1).encode()))
+
+    def _enregistrer(self, chemin, octets):
+        if self.exists(chemin):
+            self.delete(chemin)
+        self._save(chemin, ContentFile(octets))
+
+    def lire_variantes(self):
+        if not self.exists(MANIFESTE_VARIANTES):
+            return {}
+        with self.open(MANIFESTE_VARIANTES) as f:
+            return json.loads(f.read().decode())
+
+
+_variantes = (None, {})
+
+
+def variantes():
+    """Manifeste des variantes d'images du stockage statique courant, lu une seule fois."""
+    global _variantes
+    stockage = storages['staticfiles']
+    if _variantes[0] is not stockage:
+        contenu = stockage.lire_variantes() if isinstance(stockage, StockageStatique) else {}
+        _variantes = (stockage, contenu)
+    return _variantes[1]
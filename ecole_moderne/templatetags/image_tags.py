@@ -3,109 +3,74 @@ Template tags pour l'optimisation des images
 """
 from django import template
 from django.templatetags.static import static
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from django.core.cache import caches
 import os
 from django.conf import settings
 
+from ecole_moderne.statiques import variantes
+
 register = template.Library()
 
+TYPES_VARIANTES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def _picture(image_path, tailles, sizes, alt, css_class, loading):
+    """<picture> AVIF/WebP d'après le manifeste des variantes (en mémoire), repli sur l'original."""
+    entree = variantes().get(image_path)
+    fallback_src = static(image_path)
+    if not entree:
+        # Pas de variantes (DEBUG, image absente du manifeste): image d'origine seule
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            fallback_src, alt, css_class, loading,
+        )
+    retenues = [entree['variantes'][t] for t in tailles if t in entree['variantes']]
+    if not retenues:
+        # Image plus petite que les tailles demandées: la plus grande variante existante
+        retenues = list(entree['variantes'].values())[-1:]
+    sources = []
+    for extension, type_mime in TYPES_VARIANTES.items():
+        srcset = ', '.join(
+            f"{static(v[extension])} {v['largeur']}w" for v in retenues if extension in v
+        )
+        if srcset:
+            sources.append(format_html('<source type="{}" srcset="{}" sizes="{}">', type_mime, srcset, sizes))
+    largeur, hauteur = retenues[-1]['largeur'], retenues[-1]['hauteur']
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" class="{}" width="{}" height="{}" loading="{}" decoding="async"></picture>',
+        mark_safe(''.join(sources)), fallback_src, alt, css_class, largeur, hauteur, loading,
+    )
+
+
 @register.simple_tag
 def optimized_image(image_path, size='medium', alt='', css_class='', loading='lazy'):
     """
     Template tag pour afficher une image optimisée avec lazy loading
-    
+
+    Les variantes AVIF/WebP sont produites par collectstatic (ecole_moderne/statiques.py)
+    et choisies dans le manifeste chargé en mémoire: aucun accès disque au rendu.
+
     Usage:
     {% optimized_image 'images/ecole.jpg' size='large' alt='École' css_class='hero-image' %}
     """
-    # Cache pour éviter de recalculer les chemins
-    image_cache = caches['images']
-    cache_key = f"optimized_image_{image_path}_{size}"
-    
-    cached_result = image_cache.get(cache_key)
-    if cached_result:
-        return mark_safe(cached_result)
-    
-    # Construire le chemin vers l'image optimisée
-    base_name = os.path.splitext(image_path)[0]
-    optimized_path = f"{base_name}_optimized/{os.path.basename(base_name)}_{size}.webp"
-    
-    # Vérifier si l'image optimisée existe
-    full_optimized_path = os.path.join(settings.BASE_DIR, 'static', optimized_path)
-    
-    if os.path.exists(full_optimized_path):
-        # Utiliser l'image optimisée
-        src = static(optimized_path)
-        fallback_src = static(image_path)
-    else:
-        # Utiliser l'image originale si pas d'optimisée
-        src = static(image_path)
-        fallback_src = src
-    
-    # Construire le HTML avec support WebP et fallback
-    html = f'''
-    <picture>
-        <source srcset="{src}" type="image/webp">
-        <img src="{fallback_src}" 
-             alt="{alt}" 
-             class="{css_class}"
-             loading="{loading}"
-             decoding="async"
-             onerror="this.onerror=null;this.src='{fallback_src}';">
-    </picture>
-    '''
-    
-    # Mettre en cache le résultat
-    image_cache.set(cache_key, html, 3600)  # Cache 1 heure
-    
-    return mark_safe(html)
+    entree = variantes().get(image_path)
+    largeur = entree['variantes'][size]['largeur'] if entree and size in entree['variantes'] else None
+    return _picture(image_path, [size], f"{largeur}px" if largeur else '100vw', alt, css_class, loading)
+
 
 @register.simple_tag
-def responsive_image(image_path, alt='', css_class='', loading='lazy'):
+def responsive_image(image_path, alt='', css_class='', loading='lazy', sizes='100vw'):
     """
     Template tag pour une image responsive avec plusieurs tailles
-    
+
+    Le navigateur choisit dans le srcset (largeurs réelles des variantes) selon `sizes`.
+
     Usage:
-    {% responsive_image 'images/carte1.jpg' alt='Carte 1' css_class='card-img-top' %}
+    {% responsive_image 'images/carte1.jpg' alt='Carte 1' css_class='card-img-top' sizes='(max-width: 576px) 100vw, 33vw' %}
     """
-    base_name = os.path.splitext(image_path)[0]
-    
-    # Construire les sources pour différentes tailles
-    sources = []
-    sizes = ['small', 'medium', 'large']
-    
-    for size in sizes:
-        optimized_path = f"{base_name}_optimized/{os.path.basename(base_name)}_{size}.webp"
-        full_path = os.path.join(settings.BASE_DIR, 'static', optimized_path)
-        
-        if os.path.exists(full_path):
-            src = static(optimized_path)
-            
-            # Définir les media queries selon la taille
-            if size == 'small':
-                media = '(max-width: 576px)'
-            elif size == 'medium':
-                media = '(max-width: 992px)'
-            else:
-                media = '(min-width: 993px)'
-            
-            sources.append(f'<source media="{media}" srcset="{src}" type="image/webp">')
-    
-    # Image de fallback
-    fallback_src = static(image_path)
-    
-    html = f'''
-    <picture>
-        {''.join(sources)}
-        <img src="{fallback_src}" 
-             alt="{alt}" 
-             class="{css_class}"
-             loading="{loading}"
-             decoding="async">
-    </picture>
-    '''
-    
-    return mark_safe(html)
+    return _picture(image_path, ['small', 'medium', 'large'], sizes, alt, css_class, loading)
+
 
 @register.simple_tag
 def eleve_photo(eleve, size='small', css_class=''):
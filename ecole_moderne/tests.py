@@ -0,0 +1,784 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.template import Context, Template
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from administration import explorateur
+from bus.models import AbonnementBus
+from depenses.models import BudgetAnnuel, CategorieDepense, ConsommationBudget, Depense
+from ecole_moderne.benchmarks import imports, suite
+from ecole_moderne import (
+    archives, exports, fragments, metrics, pdf, replica, request_profiler, sauvegardes, statiques, transfert_ecole,
+    xlsx,
+)
+from ecole_moderne.benchmarks.donnees import creer_superutilisateur, generer_donnees
+from ecole_moderne.sql_profiler import ProfilRequete, SQLProfilerMiddleware, normaliser_sql, statistiques
+from eleves.models import Ecole, Eleve
+from notes.models import Evaluation, Note
+from paiements.models import EcheancierPaiement, Paiement, PaiementRemise, TypePaiement
+from utilisateurs.models import ClotureAnnee, Profil
+
+
+class BenchmarkTests(TestCase):
+    def test_generateur_et_suite(self):
+        resume = generer_donnees(nb_ecoles=1, nb_classes=2, nb_eleves=4, seed=1)
+        self.assertEqual(resume['eleves'], Eleve.objects.count())
+        self.assertEqual(Eleve.objects.count(), 8)
+        self.assertEqual(Paiement.objects.count(), 16)
+        self.assertEqual(EcheancierPaiement.objects.count(), 8)
+        self.assertEqual(Note.objects.count(), 2 * 4 * 4)  # classes × matières × élèves
+        self.assertFalse(AbonnementBus.objects.filter(date_alerte__isnull=True).exists())
+
+        contexte = suite.preparer_contexte(creer_superutilisateur())
+        resultats = suite.executer_suite(contexte, repetitions=1, noms=['paiements.liste', 'rapports.journalier'])
+        self.assertEqual(set(resultats), {'paiements.liste', 'rapports.journalier'})
+        self.assertGreater(resultats['paiements.liste']['requetes'], 0)
+
+    def test_comparer_baseline(self):
+        baseline = {'a': {'ms': 100.0, 'requetes': 10}, 'b': {'ms': 1.0, 'requetes': 3}}
+        resultats = {'a': {'ms': 130.0, 'requetes': 10}, 'b': {'ms': 2.0, 'requetes': 4}, 'c': {'ms': 1.0, 'requetes': 1}}
+        regressions = suite.comparer(resultats, baseline, seuil=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('a:'))
+        self.assertIn('4 requêtes', regressions[1])
+
+
+@override_settings(
+    SQL_PROFILER_ENABLED=True, SQL_PROFILER_SAMPLE_RATE=1, SQL_PROFILER_N1_THRESHOLD=2, SQL_PROFILER_SLOW_MS=10 ** 6,
+    MIDDLEWARE=['ecole_moderne.sql_profiler.SQLProfilerMiddleware'] + settings.MIDDLEWARE,
+)
+class SQLProfilerTests(TestCase):
+    databases = {'default', 'archives'}
+
+    def setUp(self):
+        statistiques.reinitialiser()
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        Profil.objects.create(user=self.admin, role='ADMIN', telephone='+224620999999')
+        self.client.force_login(self.admin)
+
+    def test_normalisation_et_doublons(self):
+        self.assertEqual(
+            normaliser_sql('SELECT * FROM t WHERE id IN (1, 2, 3) AND nom = \'x\'  AND a = %s'),
+            'SELECT * FROM t WHERE id IN (...) AND nom = ? AND a = ?',
+        )
+        profil = ProfilRequete()
+        with connection.execute_wrapper(profil):
+            for i in range(3):
+                list(User.objects.filter(id=i))
+        self.assertEqual(profil.nb_requetes, 3)
+        self.assertEqual(len(profil.doublons(2)), 1)
+
+    def test_statistiques_par_vue_et_tableau_de_bord(self):
+        self.client.get(reverse('administration:database_management'))
+        vues = {ligne['vue']: ligne for ligne in statistiques.resume()}
+        self.assertIn('administration:database_management', vues)
+        self.assertGreater(vues['administration:database_management']['requetes_moyennes'], 0)
+
+        response = self.client.get(reverse('administration:sql_profiler_dashboard'))
+        self.assertContains(response, 'administration:database_management')
+        self.client.post(reverse('administration:sql_profiler_dashboard'))
+        self.assertEqual([l['vue'] for l in statistiques.resume()], ['administration:sql_profiler_dashboard'])
+
+    def test_requetes_de_toutes_les_bases(self):
+        def vue(request):
+            list(User.objects.all())
+            with connections['archives'].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return HttpResponse()
+
+        statistiques.reinitialiser()
+        SQLProfilerMiddleware(vue)(RequestFactory().get('/'))
+        self.assertEqual(statistiques.resume()[0]['requetes_moyennes'], 2)
+
+
+@override_settings(
+    METRICS_ENABLED=True, METRICS_TOKEN='jeton-test', METRICS_DIR=tempfile.mkdtemp(), METRICS_FLUSH_SECONDS=0,
+    MIDDLEWARE=['ecole_moderne.metrics.MetricsMiddleware'] + settings.MIDDLEWARE,
+)
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registre.reinitialiser()
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        Profil.objects.create(user=self.admin, role='ADMIN', telephone='+224620999999')
+        self.client.force_login(self.admin)
+
+    def test_server_timing_et_endpoint_protege(self):
+        response = self.client.get(reverse('administration:database_management'))
+        self.assertIn('db;desc="SQL";dur=', response['Server-Timing'])
+        self.assertIn('tpl;desc="Templates";dur=', response['Server-Timing'])
+        metrics.incrementer('ecole_paiements_valides_total')
+
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer faux').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', {'token': 'jeton-test'}).status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer jeton-test')
+        texte = response.content.decode()
+        self.assertIn('ecole_http_duree_secondes_count{vue="administration:database_management"} 1', texte)
+        self.assertIn('ecole_http_requetes_total{statut="2xx",vue="administration:database_management"} 1', texte)
+        self.assertIn('ecole_paiements_valides_total 1', texte)
+
+    def test_fichiers_des_workers_termines_cumules(self):
+        repertoire = tempfile.mkdtemp()
+        mort = os.path.join(repertoire, 'worker-999999999-1.json')
+        ancien = os.path.join(repertoire, f'worker-{os.getppid()}-1.json')
+        histogramme = {'buckets': [1] + [2] * 10, 'sum': 0.5, 'count': 2}
+        for chemin in (mort, ancien):
+            with open(chemin, 'w', encoding='utf-8') as fh:
+                json.dump([
+                    ['ecole_paiements_valides_total', [], 7],
+                    ['ecole_http_duree_secondes', [['vue', 'v']], histogramme],
+                ], fh)
+        os.utime(ancien, (0, 0))
+        with self.settings(METRICS_DIR=repertoire):
+            metrics.incrementer('ecole_paiements_valides_total')
+            series = metrics.collecter()
+            self.assertFalse(os.path.exists(mort))
+            self.assertFalse(os.path.exists(ancien))
+            # Les valeurs des workers terminés restent comptées: les compteurs ne diminuent pas
+            self.assertEqual(series[('ecole_paiements_valides_total', ())], 15)
+            self.assertEqual(series[('ecole_http_duree_secondes', (('vue', 'v'),))]['count'], 4)
+            self.assertEqual(metrics.collecter()[('ecole_paiements_valides_total', ())], 15)
+
+    def test_compteurs_cache(self):
+        cache = metrics.LocMemCacheInstrumente('test-metrics', {})
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b', 'defaut'), 'defaut')
+        series = {
+            dict(labels)['resultat']: valeur
+            for nom, labels, valeur in metrics.registre.instantane() if nom == 'ecole_cache_operations_total'
+        }
+        self.assertEqual(series, {'hit': 1, 'miss': 1})
+
+
+class RequestProfilerTests(TestCase):
+    def setUp(self):
+        self.repertoire = tempfile.mkdtemp()
+        reglages = self.settings(PROFILES_DIR=self.repertoire)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        Profil.objects.create(user=self.admin, role='ADMIN', telephone='+224620999999')
+        self.client.force_login(self.admin)
+
+    def test_armement_limite_aux_n_prochaines_requetes(self):
+        self.client.post(reverse('administration:armer_profilage'), {'vue': 'administration:sql_profiler_dashboard', 'nombre': 1, 'ttl': 5})
+        self.client.get(reverse('administration:sql_profiler_dashboard'))
+        self.client.get(reverse('administration:sql_profiler_dashboard'))
+        noms = [p['nom'] for p in request_profiler.profils_disponibles()]
+        self.assertEqual(len(noms), 1)
+        self.assertTrue(noms[0].endswith('administration_sql_profiler_dashboard.collapsed'))
+        self.assertEqual(request_profiler.cibles_armees(), [])
+
+        response = self.client.get(reverse('administration:database_management'))
+        self.assertContains(response, noms[0])
+        response = self.client.get(reverse('administration:telecharger_profil', args=[noms[0]]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('administration:telecharger_profil', args=['..secret.prof'])).status_code, 404)
+
+    def test_armement_cprofile_seul(self):
+        request_profiler.armer('administration:sql_profiler_dashboard', 1, 5, mode='cprofile')
+        self.client.get(reverse('administration:sql_profiler_dashboard'))
+        noms = [p['nom'] for p in request_profiler.profils_disponibles()]
+        self.assertEqual(len(noms), 1)
+        self.assertTrue(noms[0].endswith('.prof'))
+
+    def test_armement_expire_ecarte_sans_ouvrir_le_fichier(self):
+        request_profiler.armer('administration:sql_profiler_dashboard', 5, 5)
+        middleware = request_profiler.RequestProfilerMiddleware(lambda request: HttpResponse())
+        self.assertTrue(middleware._armement_actif())
+        plus_tard = time.time() + 6 * 60
+        with mock.patch.object(request_profiler.time, 'time', return_value=plus_tard), \
+                mock.patch('builtins.open', side_effect=AssertionError("armement.json ouvert")):
+            self.assertFalse(middleware._armement_actif())
+            middleware(RequestFactory().get(reverse('administration:sql_profiler_dashboard')))
+
+    def test_parametre_de_requete_reserve_aux_superutilisateurs(self):
+        self.client.get(reverse('administration:sql_profiler_dashboard'), {'_profiler': '1'})
+        self.assertEqual(len(request_profiler.profils_disponibles()), 1)
+        self.client.logout()
+        self.client.get(reverse('utilisateurs:login'), {'_profiler': '1'})
+        self.assertEqual(len(request_profiler.profils_disponibles()), 1)
+
+    def test_retention_des_profils(self):
+        for i in range(3):
+            chemin = os.path.join(self.repertoire, f'2024010{i}-000000-000000-vue.collapsed')
+            with open(chemin, 'w', encoding='utf-8') as fh:
+                fh.write('a;b 1\n')
+            os.utime(chemin, (1_700_000_000 + i, 1_700_000_000 + i))
+        with self.settings(PROFILES_MAX_FILES=2, PROFILES_MAX_AGE_DAYS=100000):
+            request_profiler.purger_profils()
+        self.assertEqual(
+            [p['nom'] for p in request_profiler.profils_disponibles()],
+            ['20240102-000000-000000-vue.collapsed', '20240101-000000-000000-vue.collapsed'],
+        )
+        with self.settings(PROFILES_MAX_AGE_DAYS=7):
+            request_profiler.purger_profils()
+        self.assertEqual(request_profiler.profils_disponibles(), [])
+
+
+class NavigationFragmentsTests(TestCase):
+    def setUp(self):
+        self.ecole = Ecole.objects.create(nom="Ecole A", adresse="Adresse A", telephone="+224620000001", directeur="Dir A", statut='ACTIVE')
+
+    def test_ecoles_actives_en_cache_et_invalidees(self):
+        self.assertEqual([e['nom'] for e in fragments.ecoles_actives()], ["Ecole A"])
+        with self.assertNumQueries(0):
+            fragments.ecoles_actives()
+        version = fragments.version_navigation()
+        self.ecole.nom = "Ecole B"
+        self.ecole.save()
+        self.assertGreater(fragments.version_navigation(), version)
+        self.assertEqual([e['nom'] for e in fragments.ecoles_actives()], ["Ecole B"])
+
+    def test_cle_de_navigation_par_role_et_permissions(self):
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        comptable = User.objects.create_user('compta', password='pass-12345')
+        profil = Profil.objects.create(user=comptable, role='COMPTABLE', ecole=self.ecole, telephone='+224620999998')
+        cle = fragments.cle_navigation(comptable, 'COMPTABLE', {'a': True, 'b': False}, self.ecole.id)
+        self.assertNotEqual(cle, fragments.cle_navigation(admin, 'ADMIN', {'a': True, 'b': False}, self.ecole.id))
+        self.assertNotEqual(cle, fragments.cle_navigation(comptable, 'COMPTABLE', {'a': True, 'b': True}, self.ecole.id))
+        # Changer les permissions du profil invalide toutes les clés
+        profil.peut_supprimer_paiements = True
+        profil.save()
+        self.assertNotEqual(cle, fragments.cle_navigation(comptable, 'COMPTABLE', {'a': True, 'b': False}, self.ecole.id))
+
+        self.client.force_login(admin)
+        Profil.objects.create(user=admin, role='ADMIN', telephone='+224620999999')
+        response = self.client.get(reverse('administration:sql_profiler_dashboard'))
+        self.assertContains(response, 'Réinitialiser le système')
+        response = self.client.get(reverse('administration:sql_profiler_dashboard'))
+        self.assertContains(response, 'Réinitialiser le système')
+
+
+@override_settings(REPLICA_DATABASE_ALIAS='replica')
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.routeur = replica.RouteurReplica()
+        self.factory = RequestFactory()
+
+    def _vue(self):
+        @replica.lecture_replica
+        def vue(request):
+            lecture = self.routeur.db_for_read(Eleve)
+            return HttpResponse(lecture or 'default')
+        return vue
+
+    def test_lectures_marquees_sur_la_replique(self):
+        self.assertIsNone(self.routeur.db_for_read(Eleve))
+        with replica.utiliser_replica():
+            self.assertEqual(self.routeur.db_for_read(Eleve), 'replica')
+            # Une écriture dans le bloc renvoie les lectures suivantes sur le primaire
+            self.assertEqual(self.routeur.db_for_write(Eleve), 'default')
+            self.assertIsNone(self.routeur.db_for_read(Eleve))
+        self.assertIsNone(self.routeur.db_for_read(Eleve))
+        self.assertFalse(self.routeur.allow_migrate('replica', 'eleves'))
+        self.assertIsNone(self.routeur.allow_migrate('default', 'eleves'))
+
+    def test_vue_et_protection_contre_le_retard(self):
+        vue = self._vue()
+        self.assertEqual(vue(self.factory.get('/rapports/')).content, b'replica')
+        self.assertEqual(vue(self.factory.post('/rapports/')).content, b'default')
+        requete = self.factory.get('/rapports/')
+        requete.COOKIES[replica.COOKIE_ECRITURE] = '1'
+        self.assertEqual(vue(requete).content, b'default')
+
+        middleware = replica.ReplicaMiddleware(lambda request: HttpResponse())
+        self.assertIn(replica.COOKIE_ECRITURE, middleware(self.factory.post('/paiements/ajouter/')).cookies)
+        self.assertNotIn(replica.COOKIE_ECRITURE, middleware(self.factory.get('/')).cookies)
+
+    @override_settings(REPLICA_DATABASE_ALIAS=None)
+    def test_sans_replique_tout_reste_sur_le_primaire(self):
+        self.assertEqual(self._vue()(self.factory.get('/rapports/')).content, b'default')
+
+
+class ExportEngineTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.colonnes = [
+            exports.Colonne('Élève', 'nom', largeur=20),
+            exports.Colonne('Montant', 'montant', format='montant', total=True),
+        ]
+        self.lignes = [{'nom': 'Awa', 'montant': Decimal('1500')}, {'nom': 'Sékou', 'montant': Decimal('2500.50')}]
+
+    def _export(self, fmt):
+        request = self.factory.get('/', {'format': fmt})
+        return exports.exporter(request, self.lignes, self.colonnes, nom_fichier='test', titre_feuille='Test')
+
+    def test_csv_et_ndjson_en_flux(self):
+        response = self._export('csv')
+        self.assertTrue(response.streaming)
+        contenu = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(contenu.startswith('\ufeffÉlève;Montant'))
+        self.assertIn('Sékou;2500.5', contenu)
+        self.assertIn('Total:;4000.5', contenu)
+
+        response = self._export('ndjson')
+        lignes = [json.loads(l) for l in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(lignes[0], {'eleve': 'Awa', 'montant': 1500})
+        self.assertIn('test.ndjson', response['Content-Disposition'])
+
+    @override_settings(REPLICA_DATABASE_ALIAS='replica')
+    def test_flux_lu_sur_la_base_de_la_vue(self):
+        # Le flux est consommé après la sortie du bloc lecture_replica
+        with replica.utiliser_replica():
+            response = exports.reponse_export(
+                [exports.Feuille('Élèves', self.colonnes, Eleve.objects.all())], nom_fichier='test', format='csv',
+            )
+        bases = []
+        with mock.patch.object(exports, '_parcourir', side_effect=lambda lignes: bases.append(lignes.db) or iter(())):
+            b''.join(response.streaming_content)
+        self.assertEqual(bases, ['replica'])
+
+    def test_xlsx_styles_nommes_et_totaux(self):
+        from openpyxl import load_workbook
+
+        response = self._export('xlsx')
+        ws = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual([c.value for c in ws[1]], ['Élève', 'Montant'])
+        self.assertEqual(ws['A1'].style, f'export_entete_{exports.COULEUR_ENTETE}')
+        self.assertEqual(ws['B3'].value, 2500.5)
+        self.assertEqual(ws['B3'].number_format, '#,##0')
+        self.assertEqual((ws['A4'].value, ws['B4'].value), ('Total:', '=SUM(B2:B3)'))
+
+    def test_memoire_constante_en_flux(self):
+        lignes = ({'nom': f'Élève {i}', 'montant': i} for i in range(100000))
+        feuille = exports.Feuille('Gros', self.colonnes, lignes)
+        tracemalloc.start()
+        try:
+            for _ in exports._flux_csv([feuille], ';'):
+                pass
+            _, pic = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(pic, 2 * 1024 * 1024)
+
+
+class ImportsParesseuxTests(TestCase):
+    def test_facades_resolvent_tous_les_noms(self):
+        for facade in (pdf, xlsx):
+            for nom in facade.NOMS:
+                self.assertIsNotNone(getattr(facade, nom), f"{facade.__name__}.{nom}")
+        with self.assertRaises(AttributeError):
+            pdf.inexistant
+
+    def test_analyse_importtime(self):
+        texte = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     reportlab.lib\n"
+            "import time:       300 |        420 |   reportlab\n"
+            "import time:        50 |        470 | rapports.utils\n"
+        )
+        entrees = imports.analyser_importtime(texte)
+        self.assertEqual([e['module'] for e in entrees], ['reportlab.lib', 'reportlab', 'rapports.utils'])
+        self.assertEqual([e['profondeur'] for e in entrees], [2, 1, 0])
+        self.assertEqual(imports.par_paquet(entrees), [('reportlab', 0.42), ('rapports', 0.05)])
+
+    def test_demarrage_sans_bibliotheques_lourdes(self):
+        mesure = imports.mesurer()
+        self.assertEqual(mesure['lourds'], [])
+        self.assertTrue(any(e['module'] == 'paiements.views' for e in mesure['modules']))
+        self.assertEqual(imports.depassements(mesure, budget=1e9), [])
+        self.assertEqual(len(imports.depassements({'total_ms': 10, 'lourds': ['reportlab']}, budget=5)), 2)
+
+
+class ArchivageTests(TestCase):
+    databases = {'default', 'archives'}
+
+    def setUp(self):
+        archives.invalider_limite()
+        self.addCleanup(archives.invalider_limite)
+        generer_donnees(nb_ecoles=1, nb_classes=2, nb_eleves=3, seed=3)  # année 2024-2025, créée en masse
+        ancien = Paiement.objects.first()
+        self.recent = Paiement.objects.create(
+            eleve=ancien.eleve, type_paiement=ancien.type_paiement, mode_paiement=ancien.mode_paiement,
+            montant=Decimal('5000'), date_paiement=date(2025, 10, 2), statut='VALIDE',
+        )
+
+    def test_annee_scolaire_et_etiquetage(self):
+        self.assertEqual(archives.annee_scolaire_de(date(2025, 8, 31)), '2024-2025')
+        self.assertEqual(archives.annee_scolaire_de(date(2025, 9, 1)), '2025-2026')
+        self.assertEqual(self.recent.annee_scolaire, '2025-2026')
+        self.assertFalse(Paiement.objects.filter(annee_scolaire='2024-2025').exists())
+        archives.etiqueter()
+        self.assertEqual(Paiement.objects.filter(annee_scolaire='2024-2025').count(), Paiement.objects.count() - 1)
+        self.assertFalse(Note.objects.exclude(annee_scolaire='2024-2025').exists())
+
+    def test_cloture_archive_les_annees_anciennes_et_reprend(self):
+        from rapports.utils import collecter_donnees_periode
+
+        debut = timezone.make_aware(datetime(2024, 9, 1))
+        fin = timezone.make_aware(datetime(2025, 6, 30, 23, 59))
+        avant = json.dumps(collecter_donnees_periode(debut, fin, 'ANNUEL'), default=str, sort_keys=True)
+        nb = {m: m.objects.count() for m in (Paiement, PaiementRemise, Note, Evaluation, EcheancierPaiement)}
+
+        # Interruption simulée entre la copie d'un lot et sa suppression
+        archives.etiqueter()
+        archives.Copieur().copier(Paiement, list(Paiement.objects.filter(annee_scolaire='2024-2025')[:3]))
+
+        call_command('cloturer_annee', '2025-2026', lot=7, stdout=io.StringIO())
+        cloture = ClotureAnnee.objects.get(annee_scolaire='2025-2026')
+        self.assertEqual(cloture.etape, 'TERMINEE')
+        self.assertEqual(list(Paiement.objects.all()), [self.recent])
+        for modele in (PaiementRemise, Note, Evaluation, EcheancierPaiement):
+            self.assertEqual(modele.objects.count(), 0, modele)
+        self.assertEqual(Paiement.objects.using('archives').count(), nb[Paiement] - 1)
+        for modele in (PaiementRemise, Note, Evaluation, EcheancierPaiement):
+            self.assertEqual(modele.objects.using('archives').count(), nb[modele], modele)
+
+        # Les rapports d'une année archivée sont lus sur les archives, sans changement
+        self.assertTrue(archives.periode_archivee(debut, fin))
+        self.assertFalse(archives.periode_archivee(date(2025, 10, 1)))
+        apres = json.dumps(collecter_donnees_periode(debut, fin, 'ANNUEL'), default=str, sort_keys=True)
+        self.assertEqual(apres, avant)
+
+        sortie = io.StringIO()
+        call_command('cloturer_annee', '2025-2026', stdout=sortie)
+        self.assertIn('déjà clôturée', sortie.getvalue())
+
+    def test_routeur_et_simulation(self):
+        routeur = archives.RouteurArchives()
+        self.assertIsNone(routeur.db_for_read(Paiement))
+        with archives.utiliser_archives():
+            self.assertEqual(routeur.db_for_read(Paiement), 'archives')
+            self.assertIsNone(routeur.db_for_read(AbonnementBus))  # table non archivée
+        sortie = io.StringIO()
+        call_command('cloturer_annee', '2025-2026', simulation=True, stdout=sortie)
+        self.assertIn('paiements.Paiement=0', sortie.getvalue())
+        self.assertFalse(ClotureAnnee.objects.exists())
+        self.assertFalse(Paiement.objects.using('archives').exists())
+
+    @override_settings(ARCHIVE_DATABASE_ALIAS='archives_absente')
+    def test_alias_non_declare_dans_databases(self):
+        with archives.utiliser_archives():
+            self.assertIsNone(archives.RouteurArchives().db_for_read(Paiement))
+        with self.assertRaisesMessage(CommandError, "n'est pas déclaré dans DATABASES"):
+            call_command('cloturer_annee', '2025-2026', stdout=io.StringIO())
+        self.assertFalse(ClotureAnnee.objects.exists())
+
+
+class ExplorateurTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ecoles = [
+            Ecole.objects.create(nom=f"Ecole {i:02d}", adresse="A", telephone=f"+2246200001{i:02d}", directeur="Dir")
+            for i in range(30)
+        ]
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+
+    def test_comptages_en_cache_et_rafraichis(self):
+        self.assertEqual(explorateur.compter_modeles([Ecole])[Ecole], (30, False))
+        Ecole.objects.create(nom="Nouvelle", adresse="A", telephone="+224620000999", directeur="Dir")
+        with self.assertNumQueries(0):
+            self.assertEqual(explorateur.compter_modeles([Ecole])[Ecole], (30, True))
+        explorateur.ajuster({'eleves.Ecole': 5})
+        self.assertEqual(explorateur.compter_modeles([Ecole])[Ecole], (25, True))
+        explorateur.rafraichir([Ecole])
+        self.assertEqual(explorateur.compter_modeles([Ecole])[Ecole], (31, True))
+
+    def test_pagination_par_cle(self):
+        qs = Ecole.objects.all()
+        attendus = sorted((e.pk for e in self.ecoles), reverse=True)
+        page1, precedent, suivant = explorateur.page_par_cle(qs, taille=12)
+        self.assertEqual(([e.pk for e in page1], precedent), (attendus[:12], None))
+        page2, precedent, suivant = explorateur.page_par_cle(qs, apres=suivant, taille=12)
+        self.assertEqual([e.pk for e in page2], attendus[12:24])
+        page3, _, fin = explorateur.page_par_cle(qs, apres=suivant, taille=12)
+        self.assertEqual(([e.pk for e in page3], fin), (attendus[24:], None))
+        retour, precedent, _ = explorateur.page_par_cle(qs, avant=page2[0].pk, taille=12)
+        self.assertEqual(([e.pk for e in retour], precedent), (attendus[:12], None))
+
+    def test_recherche_sur_colonnes_indexees(self):
+        self.assertIn('matricule', explorateur.champs_recherche(Eleve))
+        self.assertNotIn('lieu_naissance', explorateur.champs_recherche(Eleve))
+        self.assertNotIn('nom', explorateur.champs_recherche(Ecole))
+        qs = explorateur.filtrer_recherche(Ecole.objects.all(), str(self.ecoles[3].pk))
+        self.assertEqual(list(qs), [self.ecoles[3]])
+        self.assertEqual(explorateur.compter_resultats(Ecole.objects.all(), limite=10), (10, True))
+
+        self.client.force_login(self.admin)
+        reponse = self.client.get(reverse('administration:model_list', args=['eleves', 'ecole']))
+        self.assertEqual(len(reponse.context['page_obj']), explorateur.TAILLE_PAGE)
+        self.assertContains(reponse, f"?apres={reponse.context['suivant']}")
+
+    def test_suppression_en_masse_par_lots(self):
+        ids = [e.pk for e in self.ecoles[:5]]
+        with CaptureQueriesContext(connection) as requetes:
+            total, detail = explorateur.supprimer_par_lots(Ecole.objects.all(), ids[:3], taille=1)
+        self.assertEqual((total, detail['eleves.Ecole']), (3, 3))
+        # Une transaction par lot
+        self.assertEqual(sum(q['sql'].startswith('RELEASE SAVEPOINT') for q in requetes.captured_queries), 3)
+
+        self.client.force_login(self.admin)
+        reponse = self.client.post(
+            reverse('administration:model_bulk_delete', args=['eleves', 'ecole']),
+            {'ids[]': ids[3:]}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertTrue(reponse.json()['success'])
+        self.assertEqual(Ecole.objects.count(), 25)
+
+
+class SauvegardeTests(TestCase):
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        generer_donnees(nb_ecoles=1, nb_classes=2, nb_eleves=4, seed=5)
+
+    def _etat(self):
+        return {
+            m._meta.label: list(m._base_manager.order_by('pk').values_list())
+            for m in sauvegardes.modeles_sauvegardes()
+        }
+
+    def test_ordre_des_dependances(self):
+        ordre = sauvegardes.modeles_sauvegardes()
+        labels = [m._meta.label for m in ordre]
+        self.assertLess(labels.index('eleves.Ecole'), labels.index('eleves.Classe'))
+        self.assertLess(labels.index('eleves.Eleve'), labels.index('paiements.Paiement'))
+        self.assertLess(labels.index('auth.Group'), labels.index('auth.User_groups'))
+        self.assertNotIn('contenttypes.ContentType', labels)
+
+    def test_complete_incrementale_et_restauration(self):
+        complete = sauvegardes.sauvegarder(dossier=self.dossier, taille_lot=3)
+        self.assertEqual(complete['tables']['eleves.Eleve'], Eleve.objects.count())
+        eleve = Eleve.objects.order_by('pk').first()
+        eleve.nom = "Modifié"
+        eleve.save()
+        incrementale = sauvegardes.sauvegarder(incrementale=True, dossier=self.dossier)
+        self.assertEqual((incrementale['mode'], incrementale['base']), ('incrementale', complete['nom']))
+        self.assertEqual(incrementale['tables']['eleves.Eleve'], 1)
+        self.assertEqual(incrementale['tables']['eleves.Ecole'], 1)  # pas de date de modification: reprise entière
+        attendu = self._etat()
+
+        Paiement.objects.all().delete()
+        Eleve.objects.all().delete()
+        sortie = io.StringIO()
+        call_command('restaurer', incrementale['nom'], dossier=self.dossier, stdout=sortie)
+        self.assertEqual(self._etat(), attendu)
+        self.assertEqual(Eleve.objects.get(pk=eleve.pk).nom, "Modifié")
+
+    def test_compteurs_mis_a_jour_par_update_dans_l_incrementale(self):
+        categorie = CategorieDepense.objects.create(nom="Fournitures", code="FOUR")
+        budget = BudgetAnnuel.objects.create(annee=2025, categorie=categorie, budget_prevu=1000000)
+        ecole = Ecole.objects.order_by('pk').first()
+        depense = Depense(ecole=ecole, categorie=categorie, date_facture=date(2025, 3, 1),
+                          montant_ttc=Decimal('50000'), statut='VALIDEE')
+        ConsommationBudget.enregistrer_changement(None, depense)
+        sauvegardes.sauvegarder(dossier=self.dossier)
+
+        ConsommationBudget.enregistrer_changement(None, depense)  # F() via update(), sans save()
+        incrementale = sauvegardes.sauvegarder(incrementale=True, dossier=self.dossier)
+        self.assertEqual(incrementale['tables']['depenses.ConsommationBudget'], 1)
+        self.assertEqual(incrementale['tables']['depenses.BudgetAnnuel'], 1)
+        attendu = self._etat()
+
+        ConsommationBudget.objects.all().delete()
+        BudgetAnnuel.objects.filter(pk=budget.pk).update(budget_engage=0)
+        call_command('restaurer', incrementale['nom'], dossier=self.dossier, stdout=io.StringIO())
+        self.assertEqual(self._etat(), attendu)
+        self.assertEqual(ConsommationBudget.objects.get().nb_validees, 2)
+
+    def test_etiquetage_et_passage_d_annee_dans_l_incrementale(self):
+        from ecole_moderne.management.commands.cloturer_annee import Command as Cloture
+
+        Paiement.objects.update(annee_scolaire=None)
+        annee = EcheancierPaiement.objects.values_list('annee_scolaire', flat=True).first()
+        echeanciers = EcheancierPaiement.objects.filter(annee_scolaire=annee, eleve__statut='ACTIF').count()
+        self.assertGreater(echeanciers, 0)
+        sauvegardes.sauvegarder(dossier=self.dossier)
+
+        archives.etiqueter()
+        Cloture()._passage(annee, archives.decaler(annee, 1))
+        incrementale = sauvegardes.sauvegarder(incrementale=True, dossier=self.dossier)
+        self.assertEqual(incrementale['tables']['paiements.Paiement'], Paiement.objects.count())
+        self.assertEqual(incrementale['tables']['paiements.EcheancierPaiement'], echeanciers)
+
+    def test_reinitialisation_exige_une_sauvegarde_recente(self):
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        self.client.force_login(admin)
+        donnees = {'confirmation_text': 'SUPPRIMER TOUTES LES DONNÉES', 'admin_password': 'pass-12345'}
+        url = reverse('administration:confirm_system_reset')
+        eleves = Eleve.objects.count()
+        with override_settings(SAUVEGARDES_DIR=self.dossier):
+            with mock.patch.object(sauvegardes, 'sauvegarder') as sauvegarder:
+                reponse = self.client.post(url, donnees, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+            sauvegarder.assert_not_called()
+            self.assertFalse(reponse['success'])
+            self.assertIn('python manage.py sauvegarder', reponse['error'])
+            self.assertEqual(Eleve.objects.count(), eleves)
+
+            entree = sauvegardes.sauvegarder()
+            self.assertEqual(sauvegardes.sauvegarde_recente(60)['nom'], entree['nom'])
+            with mock.patch.object(timezone, 'now', return_value=timezone.now() + timedelta(hours=2)):
+                self.assertIsNone(sauvegardes.sauvegarde_recente(60))
+            page = self.client.get(reverse('administration:system_reset_dashboard'))
+            self.assertEqual(page.context['derniere_sauvegarde']['nom'], entree['nom'])
+
+    def test_verification_detecte_corruption_et_troncature(self):
+        entree = sauvegardes.sauvegarder(dossier=self.dossier)
+        chemin = f"{self.dossier}/{entree['nom']}"
+        self.assertTrue(sauvegardes.verifier(chemin, entree['sha256'])['valide'])
+
+        with gzip.open(chemin, 'rb') as f:
+            lignes = f.read().splitlines(keepends=True)
+        modifiee = [l.replace(b'Ecole Bench', b'Ecole Pirate') for l in lignes]
+        with gzip.open(chemin, 'wb') as f:
+            f.writelines(modifiee)
+        rapport = sauvegardes.verifier(chemin, entree['sha256'])
+        self.assertFalse(rapport['valide'])
+        self.assertEqual(len(rapport['erreurs']), 2)
+        with gzip.open(chemin, 'wb') as f:
+            f.writelines(lignes[:-1])
+        self.assertIn('incomplète', sauvegardes.verifier(chemin)['erreurs'][0])
+        with self.assertRaises(sauvegardes.ErreurSauvegarde):
+            sauvegardes.restaurer([chemin])
+
+    def test_telechargement_en_flux(self):
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        self.client.force_login(admin)
+        reponse = self.client.get(reverse('administration:backup_before_reset'), {'telecharger': 1})
+        self.assertTrue(reponse.streaming)
+        chemin = f"{self.dossier}/telechargee.ndjson.gz"
+        with open(chemin, 'wb') as f:
+            f.writelines(reponse.streaming_content)
+        rapport = sauvegardes.verifier(chemin)
+        self.assertTrue(rapport['valide'], rapport['erreurs'])
+        self.assertGreater(rapport['lignes'], 0)
+
+
+class TransfertEcoleTests(TestCase):
+    def setUp(self):
+        generer_donnees(nb_ecoles=2, nb_classes=2, nb_eleves=4, seed=6)
+        self.ecole = Ecole.objects.order_by('pk').first()
+        self.chemin = f"{tempfile.mkdtemp()}/ecole.ndjson.gz"
+
+    def _exporter(self):
+        call_command('exporter_ecole', self.ecole.pk, sortie=self.chemin, stdout=io.StringIO())
+
+    def _comptes(self, ecole):
+        return {
+            'eleves': Eleve.objects.filter(classe__ecole=ecole).count(),
+            'paiements': Paiement.objects.filter(eleve__classe__ecole=ecole).count(),
+            'remises': PaiementRemise.objects.filter(paiement__eleve__classe__ecole=ecole).count(),
+            'notes': Note.objects.filter(ecole=ecole).count(),
+            'bus': AbonnementBus.objects.filter(eleve__classe__ecole=ecole).count(),
+            'echeanciers': EcheancierPaiement.objects.filter(eleve__classe__ecole=ecole).count(),
+        }
+
+    def test_copie_sur_la_meme_instance(self):
+        attendu = self._comptes(self.ecole)
+        self.assertTrue(all(attendu.values()), attendu)
+        self._exporter()
+        types = TypePaiement.objects.count()
+        importeur = transfert_ecole.importer(self.chemin, taille_lot=5)
+
+        copie = Ecole.objects.get(pk=importeur.ecole_id)
+        self.assertNotEqual(copie.slug, self.ecole.slug)
+        self.assertEqual(self._comptes(copie), attendu)
+        self.assertEqual(TypePaiement.objects.count(), types)  # référentiels retrouvés par nom
+        # Matricules et reçus déjà pris: réalloués dans leur séquence
+        self.assertEqual(importeur.reallouees, {'eleves.Eleve': attendu['eleves'], 'paiements.Paiement': attendu['paiements']})
+        matricules = list(Eleve.objects.values_list('matricule', flat=True))
+        self.assertEqual(len(matricules), len(set(matricules)))
+        recus = list(Paiement.objects.values_list('numero_recu', flat=True))
+        self.assertEqual(len(recus), len(set(recus)))
+        # Données de test au format BN06000000001: même préfixe, numéros suivants
+        self.assertTrue(all(r.startswith('BN06') and len(r) == 13
+                            for r in Paiement.objects.filter(eleve__classe__ecole=copie).values_list('numero_recu', flat=True)))
+        # Les notes de la copie pointent vers les élèves et évaluations de la copie
+        self.assertFalse(Note.objects.filter(ecole=copie).exclude(eleve__classe__ecole=copie).exists())
+        self.assertFalse(Note.objects.filter(ecole=copie).exclude(evaluation__ecole=copie).exists())
+
+    def test_demenagement_garde_matricules_et_recus(self):
+        self._exporter()
+        matricules = set(Eleve.objects.filter(classe__ecole=self.ecole).values_list('matricule', flat=True))
+        recus = set(Paiement.objects.filter(eleve__classe__ecole=self.ecole).values_list('numero_recu', flat=True))
+        Paiement.objects.filter(eleve__classe__ecole=self.ecole).delete()
+        self.ecole.delete()
+
+        sortie = io.StringIO()
+        call_command('importer_ecole', self.chemin, stdout=sortie)
+        ecole = Ecole.objects.get(slug__startswith=self.ecole.slug)
+        self.assertEqual(set(Eleve.objects.filter(classe__ecole=ecole).values_list('matricule', flat=True)), matricules)
+        self.assertEqual(set(Paiement.objects.filter(eleve__classe__ecole=ecole).values_list('numero_recu', flat=True)), recus)
+        self.assertNotIn('réallouée', sortie.getvalue())
+
+    def test_import_refuse_une_sauvegarde_complete(self):
+        dossier = tempfile.mkdtemp()
+        entree = sauvegardes.sauvegarder(dossier=dossier)
+        with self.assertRaises(transfert_ecole.ErreurTransfert):
+            transfert_ecole.importer(f"{dossier}/{entree['nom']}")
+
+
+class StatiquesTests(TestCase):
+    def setUp(self):
+        from PIL import Image
+
+        self.source, self.cible = tempfile.mkdtemp(), tempfile.mkdtemp()
+        os.makedirs(f"{self.source}/images")
+        os.makedirs(f"{self.source}/css")
+        Image.new('RGB', (1000, 600), (30, 90, 160)).save(f"{self.source}/images/ecole.png")
+        with open(f"{self.source}/css/site.css", 'w') as f:
+            f.write("body { background: url('../images/ecole.png'); }\n" * 50)
+        statiques._variantes = (None, {})
+        self.addCleanup(setattr, statiques, '_variantes', (None, {}))
+        reglages = override_settings(
+            STATIC_ROOT=self.cible,
+            STATICFILES_DIRS=[self.source],
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'ecole_moderne.statiques.StockageStatique'}},
+        )
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def test_collectstatic_variantes_hachage_et_compression(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        with open(f"{self.cible}/{statiques.MANIFESTE_VARIANTES}") as f:
+            entree = json.load(f)['images/ecole.png']
+        self.assertEqual((entree['largeur'], entree['hauteur']), (1000, 600))
+        self.assertEqual(list(entree['variantes']), list(statiques.TAILLES))
+        # « large » (1200 px) plafonnée à la largeur d'origine, sans agrandissement
+        self.assertEqual(entree['variantes']['large']['largeur'], 1000)
+        self.assertEqual(entree['variantes']['small']['largeur'], 300)
+        self.assertEqual(entree['variantes']['small']['webp'], 'images/ecole_optimized/ecole_small.webp')
+        with open(f"{self.cible}/staticfiles.json") as f:
+            hachés = json.load(f)['paths']
+        self.assertIn('images/ecole_optimized/ecole_small.webp', hachés)
+        self.assertTrue(os.path.exists(f"{self.cible}/{hachés['css/site.css']}.gz"))
+
+        rendu = Template(
+            "{% load image_tags %}{% responsive_image 'images/ecole.png' alt='École' sizes='50vw' %}"
+        ).render(Context())
+        self.assertIn('type="image/webp"', rendu)
+        self.assertIn(f"/static/{hachés['images/ecole_optimized/ecole_medium.webp']} 600w", rendu)
+        self.assertIn('sizes="50vw"', rendu)
+        self.assertIn('width="1000" height="600"', rendu)
+        self.assertIn(f"/static/{hachés['images/ecole.png']}", rendu)
+
+    def test_rendu_sans_acces_disque(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        statiques.variantes()  # chargé une fois par processus
+
+        with mock.patch('os.path.exists', side_effect=AssertionError), \
+                mock.patch('builtins.open', side_effect=AssertionError):
+            rendu = Template(
+                "{% load image_tags %}{% optimized_image 'images/ecole.png' size='small' %}"
+            ).render(Context())
+        self.assertIn('ecole_small', rendu)
+        self.assertIn('sizes="300px"', rendu)
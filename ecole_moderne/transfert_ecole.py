@@ -0,0 +1,321 @@
+"""Export et import d'une école entière entre instances (déménagement, copie de test).
+
+L'export est un fichier de sauvegarde (voir sauvegardes.py: NDJSON gzip en flux,
+sommes de contrôle) restreint au PERIMETRE d'une école: classes, grilles, élèves
+et responsables, échéanciers, paiements et remises, relances, notes, salaires, bus.
+Les types et modes de paiement et les remises utilisés sont joints pour être
+retrouvés à l'import (REFERENTIELS).
+
+L'import insère tout par lots bruts (ni save() ni auto_now), en une transaction:
+- clés primaires décalées: pour chaque table, une plage de clés libres de la taille
+  de la plage exportée est réservée (séquence PostgreSQL avancée d'autant) et
+  chaque clé, étrangère comprise, est translatée; aucune table de correspondance
+  n'est gardée en mémoire;
+- référentiels retrouvés par leur clé naturelle (nom...), créés s'ils manquent;
+- matricules et numéros de reçu conservés s'ils sont libres, sinon réalloués dans
+  la même séquence (même préfixe, numéro suivant le plus grand existant);
+- références aux utilisateurs remplacées par l'utilisateur d'import (ou vidées):
+  les comptes et profils ne sont pas transférés, ni les fichiers (logo, photos).
+"""
+import logging
+import re
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from ecole_moderne import sauvegardes
+
+logger = logging.getLogger(__name__)
+
+# Tables de l'école: chemin vers l'école pour filtrer leurs lignes
+PERIMETRE = {
+    'eleves.Ecole': 'pk',
+    'eleves.Classe': 'ecole',
+    'eleves.GrilleTarifaire': 'ecole',
+    'eleves.Responsable': None,  # voir _filtres(): responsables des élèves de l'école
+    'eleves.Eleve': 'classe__ecole',
+    'eleves.HistoriqueEleve': 'eleve__classe__ecole',
+    'paiements.EcheancierPaiement': 'eleve__classe__ecole',
+    'paiements.Paiement': 'eleve__classe__ecole',
+    'paiements.PaiementRemise': 'paiement__eleve__classe__ecole',
+    'paiements.Relance': 'eleve__classe__ecole',
+    'notes.MatiereClasse': 'ecole',
+    'notes.Evaluation': 'ecole',
+    'notes.Note': 'ecole',
+    'notes.BaremeMatiere': 'ecole',
+    'notes.BaremeAppreciation': 'ecole',
+    'notes.SeuilAppreciation': 'bareme__ecole',
+    'salaires.Enseignant': 'ecole',
+    'salaires.AffectationClasse': 'enseignant__ecole',
+    'salaires.PeriodeSalaire': 'ecole',
+    'salaires.EtatSalaire': 'periode__ecole',
+    'salaires.DetailHeuresClasse': 'etat_salaire__periode__ecole',
+    'bus.AbonnementBus': 'eleve__classe__ecole',
+    'inscription_ecoles.ConfigurationEcole': 'ecole',
+    'inscription_ecoles.TemplateDocument': 'ecole',
+}
+
+# Tables partagées entre écoles: clé naturelle, et lignes de l'école qui les référencent
+REFERENTIELS = {
+    'paiements.TypePaiement': (('nom',), 'paiements.Paiement', 'type_paiement_id'),
+    'paiements.ModePaiement': (('nom',), 'paiements.Paiement', 'mode_paiement_id'),
+    'paiements.RemiseReduction': (
+        ('nom', 'type_remise', 'valeur', 'motif', 'date_debut', 'date_fin'),
+        'paiements.PaiementRemise', 'remise_id',
+    ),
+}
+
+# Valeurs uniques réallouées en cas de collision: {modèle: (champ, motif PREFIXE + numéro)}
+SEQUENCES = {
+    'eleves.Eleve': ('matricule', r'^(.*-)(\d+)$'),                # CODE-001 (Eleve.save)
+    'paiements.Paiement': ('numero_recu', r'^(REC\d{4})(\d+)$'),  # REC + année + 0001 (Paiement.save)
+}
+
+
+class ErreurTransfert(Exception):
+    pass
+
+
+def _filtres(ecole_id):
+    Eleve = apps.get_model('eleves.Eleve')
+    filtres = {}
+    for label, chemin in PERIMETRE.items():
+        if chemin:
+            filtres[apps.get_model(label)] = Q(**{chemin: ecole_id})
+    eleves = Eleve._base_manager.filter(classe__ecole=ecole_id)
+    filtres[apps.get_model('eleves.Responsable')] = (
+        Q(pk__in=eleves.values('responsable_principal_id'))
+        | Q(pk__in=eleves.filter(responsable_secondaire__isnull=False).values('responsable_secondaire_id'))
+    )
+    for label, (_, source, champ) in REFERENTIELS.items():
+        lignes = apps.get_model(source)._base_manager.filter(filtres[apps.get_model(source)])
+        filtres[apps.get_model(label)] = Q(pk__in=lignes.values(champ))
+    return filtres
+
+
+def modeles_exportes():
+    labels = set(PERIMETRE) | set(REFERENTIELS)
+    return [m for m in sauvegardes.modeles_sauvegardes() if m._meta.label in labels]
+
+
+def exporter(ecole, taille_lot=sauvegardes.TAILLE_LOT, resume=None):
+    """Générateur des octets de l'export de `ecole` (fichier de sauvegarde restreint)."""
+    return sauvegardes.flux(
+        modeles=modeles_exportes(), filtres=_filtres(ecole.pk), taille_lot=taille_lot, resume=resume,
+        entete={'mode': 'ecole', 'ecole': {'id': ecole.pk, 'nom': ecole.nom, 'slug': ecole.slug}}, bornes=True,
+    )
+
+
+# Import --------------------------------------------------------------------------------
+
+class Sequences:
+    """Réallocation des valeurs uniques « PREFIXE + numéro » déjà prises (matricules, numéros de reçu).
+
+    Les valeurs hors du format de l'application (imports, données de test) sont découpées
+    au dernier groupe de chiffres.
+    """
+
+    GENERIQUE = re.compile(r'^(.*?)(\d+)$')
+
+    def __init__(self, modele, champ, motif, alias):
+        self.modele, self.champ, self.alias = modele, champ, alias
+        self.motifs = (re.compile(motif), self.GENERIQUE)
+        self.prochains = {}  # (préfixe, motif) -> prochain numéro libre
+
+    def _decouper(self, valeur):
+        for motif in self.motifs:
+            m = motif.match(valeur)
+            if m:
+                return (m.group(1), motif), int(m.group(2)), len(m.group(2))
+        return (f"{valeur or 'X'}-", self.GENERIQUE), 0, 3
+
+    def _prochain(self, cle):
+        if cle not in self.prochains:
+            prefixe, motif = cle
+            existants = (self.modele._base_manager.using(self.alias)
+                         .filter(**{f'{self.champ}__startswith': prefixe}).values_list(self.champ, flat=True))
+            self.prochains[cle] = 1 + max(
+                (int(m.group(2)) for m in map(motif.match, existants) if m and m.group(1) == prefixe),
+                default=0,
+            )
+        return self.prochains[cle]
+
+    def attribuer(self, valeurs):
+        """Valeurs du lot, celles déjà prises (en base ou plus haut dans le lot) remplacées par
+        la suivante de leur séquence. Retourne (valeurs, nombre de réallouées)."""
+        pris = set(self.modele._base_manager.using(self.alias)
+                   .filter(**{f'{self.champ}__in': [v for v in valeurs if v]}).values_list(self.champ, flat=True))
+        gardees = []
+        for valeur in valeurs:
+            garder = bool(valeur) and valeur not in pris
+            gardees.append(garder)
+            if garder:
+                pris.add(valeur)
+                cle, numero, _ = self._decouper(valeur)
+                if cle in self.prochains:
+                    self.prochains[cle] = max(self.prochains[cle], numero + 1)
+
+        resultat = []
+        for valeur, garder in zip(valeurs, gardees):
+            if garder:
+                resultat.append(valeur)
+                continue
+            cle, _, largeur = self._decouper(valeur or '')
+            numero = self._prochain(cle)
+            while f"{cle[0]}{numero:0{largeur}d}" in pris:
+                numero += 1
+            self.prochains[cle] = numero + 1
+            resultat.append(f"{cle[0]}{numero:0{largeur}d}")
+            pris.add(resultat[-1])
+        return resultat, gardees.count(False)
+
+
+def _reserver(modele, etendue, alias):
+    """Première clé d'une plage de `etendue` clés libres pour `modele` (séquence avancée sous PostgreSQL)."""
+    connexion = connections[alias]
+    maximum = modele._base_manager.using(alias).aggregate(m=Max('pk'))['m'] or 0
+    if connexion.vendor != 'postgresql':
+        return maximum + 1
+    table, colonne = modele._meta.db_table, modele._meta.pk.column
+    with connexion.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [connexion.ops.quote_name(table), colonne])
+        sequence = cursor.fetchone()[0]
+        cursor.execute("SELECT nextval(%s)", [sequence])
+        base = max(cursor.fetchone()[0], maximum + 1)
+        cursor.execute("SELECT setval(%s, %s)", [sequence, base + etendue - 1])
+    return base
+
+
+class Importeur:
+    """Import d'un export d'école; `importer()` retourne {modèle: lignes} et la nouvelle école."""
+
+    def __init__(self, chemin, utilisateur=None, alias='default', taille_lot=sauvegardes.TAILLE_LOT):
+        self.chemin, self.alias, self.taille_lot = chemin, alias, taille_lot
+        self.utilisateur_id = utilisateur.pk if utilisateur else None
+        self.decalages = {}       # modèle -> décalage des clés primaires
+        self.correspondances = {}  # référentiel -> {ancienne clé: nouvelle clé}
+        self.sequences = {}
+        self.resultat = {}
+        self.reallouees = {}
+        self.ecole_id = None
+
+    def importer(self):
+        with transaction.atomic(using=self.alias):
+            table, lot = None, []
+            for genre, objet in sauvegardes.lire(self.chemin):
+                if genre == 'entete':
+                    if objet.get('mode') != 'ecole':
+                        raise ErreurTransfert("Ce fichier n'est pas un export d'école (manage.py exporter_ecole)")
+                elif genre == 'table':
+                    table, lot = self._ouvrir(objet), []
+                elif genre == 'ligne':
+                    lot.append(objet)
+                    if len(lot) >= self.taille_lot:
+                        self._inserer(table, lot)
+                        lot = []
+                elif genre == 'fin_table':
+                    self._inserer(table, lot)
+                    lot = []
+        return self.resultat
+
+    def _ouvrir(self, entete):
+        modele = apps.get_model(entete['modele'])
+        label = modele._meta.label
+        par_attname = {f.attname: f for f in modele._meta.concrete_fields}
+        inconnus = [c for c in entete['champs'] if c not in par_attname]
+        if inconnus:
+            raise ErreurTransfert(f"{label}: champs absents du schéma: {', '.join(inconnus)}")
+        champs = [par_attname[c] for c in entete['champs']]
+        if label in PERIMETRE and entete.get('pk_min') is not None:
+            self.decalages[modele] = _reserver(modele, entete['pk_max'] - entete['pk_min'] + 1, self.alias) - entete['pk_min']
+        elif label in REFERENTIELS:
+            self.correspondances[modele] = {}
+        if label in SEQUENCES:
+            self.sequences[modele] = Sequences(modele, *SEQUENCES[label], self.alias)
+        self.resultat[label] = 0
+        return modele, champs
+
+    def _cle(self, champ, valeur):
+        """Nouvelle valeur d'une clé étrangère."""
+        if valeur is None:
+            return None
+        cible = champ.related_model
+        if cible in self.decalages:
+            return valeur + self.decalages[cible]
+        if cible in self.correspondances:
+            return self.correspondances[cible][valeur]
+        if cible is get_user_model() and (self.utilisateur_id or champ.null):
+            return self.utilisateur_id
+        if champ.null:
+            return None
+        raise ErreurTransfert(f"{champ.model._meta.label}.{champ.name}: référence hors de l'export ({cible._meta.label})")
+
+    def _inserer(self, table, lignes):
+        if not lignes:
+            return
+        modele, champs = table
+        objets = []
+        for valeurs in lignes:
+            donnees = {}
+            for champ, valeur in zip(champs, valeurs):
+                valeur = champ.to_python(valeur)
+                if champ.primary_key and modele in self.decalages:
+                    valeur += self.decalages[modele]
+                elif champ.many_to_one or champ.one_to_one:
+                    valeur = self._cle(champ, valeur)
+                donnees[champ.attname] = valeur
+            objets.append(modele(**donnees))
+
+        if modele in self.correspondances:
+            self._referentiel(modele, objets)
+            return
+        if modele._meta.label == 'eleves.Ecole':
+            self._ecole(objets[0])
+        if modele in self.sequences:
+            sequence = self.sequences[modele]
+            valeurs, reallouees = sequence.attribuer([getattr(o, sequence.champ) for o in objets])
+            for objet, valeur in zip(objets, valeurs):
+                setattr(objet, sequence.champ, valeur)
+            self.reallouees[modele._meta.label] = self.reallouees.get(modele._meta.label, 0) + reallouees
+
+        taille = connections[self.alias].ops.bulk_batch_size(champs, objets) or len(objets)
+        for i in range(0, len(objets), taille):
+            modele._base_manager._insert(objets[i:i + taille], fields=champs, using=self.alias, raw=True)
+        self.resultat[modele._meta.label] += len(objets)
+
+    def _ecole(self, ecole):
+        """Nouvelle école, au slug rendu unique."""
+        self.ecole_id = ecole.pk
+        Ecole = type(ecole)
+        base, n = ecole.slug, 1
+        while Ecole._base_manager.using(self.alias).filter(slug=ecole.slug).exists():
+            n += 1
+            ecole.slug = f"{base}-{n}"
+
+    def _referentiel(self, modele, objets):
+        """Référentiels retrouvés par clé naturelle, créés s'ils manquent."""
+        cle, _, _ = REFERENTIELS[modele._meta.label]
+        correspondance = self.correspondances[modele]
+        for objet in objets:
+            ancienne = objet.pk
+            existant = (modele._base_manager.using(self.alias)
+                        .filter(**{c: getattr(objet, c) for c in cle}).values_list('pk', flat=True).first())
+            if existant is None:
+                objet.pk = None
+                objet.save(using=self.alias, force_insert=True)
+                existant = objet.pk
+                self.resultat[modele._meta.label] += 1
+            correspondance[ancienne] = existant
+
+
+def importer(chemin, utilisateur=None, alias='default', taille_lot=sauvegardes.TAILLE_LOT):
+    """Importe l'export `chemin`; retourne l'Importeur (résultat, école créée, valeurs réallouées)."""
+    debut = timezone.now()
+    importeur = Importeur(chemin, utilisateur=utilisateur, alias=alias, taille_lot=taille_lot)
+    importeur.importer()
+    logger.info("Import d'école %s: %s lignes en %s", chemin, sum(importeur.resultat.values()),
+                timezone.now() - debut)
+    return importeur
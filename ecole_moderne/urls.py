@@ -21,6 +21,7 @@ from django.conf.urls.static import static
 from django.views.generic import TemplateView
 from django.http import HttpResponse
 from django.views.decorators.cache import cache_control
+from ecole_moderne.metrics import metrics_view
 
 # Fonction pour servir le favicon
 @cache_control(max_age=60 * 60 * 24, immutable=True, public=True)
@@ -33,6 +34,7 @@ urlpatterns = [
     path('index/', TemplateView.as_view(template_name='home.html'), name='index'),
     path('favicon.ico', favicon_view, name='favicon'),
     path('robots.txt', TemplateView.as_view(template_name='robots.txt', content_type='text/plain'), name='robots'),
+    path('metrics', metrics_view, name='metrics'),
     
     # Inscription et gestion multi-tenant des écoles
     path('ecole/', include('inscription_ecoles.urls')),
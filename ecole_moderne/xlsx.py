@@ -0,0 +1,41 @@
+"""Façade openpyxl chargée au premier usage (même principe que `ecole_moderne.pdf`).
+
+    from ecole_moderne.xlsx import Workbook, get_column_letter
+"""
+import importlib
+import importlib.util
+
+# nom exposé -> (module openpyxl, attribut)
+NOMS = {
+    'Workbook': ('openpyxl', 'Workbook'),
+    'load_workbook': ('openpyxl', 'load_workbook'),
+    'WriteOnlyCell': ('openpyxl.cell', 'WriteOnlyCell'),
+    'get_column_letter': ('openpyxl.utils', 'get_column_letter'),
+    'Alignment': ('openpyxl.styles', 'Alignment'),
+    'Border': ('openpyxl.styles', 'Border'),
+    'Font': ('openpyxl.styles', 'Font'),
+    'NamedStyle': ('openpyxl.styles', 'NamedStyle'),
+    'PatternFill': ('openpyxl.styles', 'PatternFill'),
+    'Side': ('openpyxl.styles', 'Side'),
+}
+
+__all__ = sorted(NOMS) + ['disponible']
+
+
+def disponible():
+    """Vrai si openpyxl est installé (sans l'importer)."""
+    return importlib.util.find_spec('openpyxl') is not None
+
+
+def __getattr__(nom):
+    try:
+        module, attribut = NOMS[nom]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {nom!r}") from None
+    valeur = getattr(importlib.import_module(module), attribut)
+    globals()[nom] = valeur
+    return valeur
+
+
+def __dir__():
+    return __all__
@@ -0,0 +1,569 @@
+"""
+Import en masse des élèves depuis un fichier Excel (.xlsx) ou CSV
+
+Le fichier est lu en flux (openpyxl en lecture seule, csv ligne à ligne) et traité
+par lots de `taille_lot` lignes. Pour chaque lot:
+- validation des lignes en mémoire (classe de l'école, dates, sexe, téléphone);
+- responsables dédoublonnés par téléphone normalisé (une requête par lot sur
+  `telephone_e164` pour retrouver ceux déjà en base, les nouveaux sont créés une
+  seule fois);
+- matricules pré-alloués par code de classe (un compteur mémoire par code, initialisé
+  depuis la base), sans le scan par élève de `Eleve.save()`;
+- `bulk_create` des responsables, élèves, historiques et échéanciers dans une
+  transaction par lot.
+
+L'état (compteurs, dernière ligne validée) est écrit dans IMPORTS_DIR/<id>.json
+après chaque lot: il alimente l'endpoint de progression et permet de reprendre un
+import interrompu. Les élèves déjà inscrits (même classe, nom, prénom et date de
+naissance) sont ignorés, ce qui rend une reprise idempotente. Les lignes rejetées
+sont écrites dans IMPORTS_DIR/<id>.erreurs.csv.
+
+Un import lancé depuis l'interface dont le processus a disparu (worker recyclé) est
+marqué ECHEC à la lecture de son état et peut être repris. Le fichier déposé est
+supprimé dès la fin de l'import; les fichiers de IMPORTS_DIR (dépôts, rejets,
+états) plus anciens que IMPORTS_RETENTION_DAYS sont purgés.
+"""
+import csv
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from paiements.echeanciers import IndexGrilles, construire_echeancier
+from paiements.models import EcheancierPaiement
+from .models import Classe, Eleve, HistoriqueEleve, Responsable, _code_classe_from_nom_ou_niveau
+
+logger = logging.getLogger(__name__)
+
+# Colonnes reconnues (en-têtes normalisés -> champ)
+ALIAS_COLONNES = {
+    'matricule': 'matricule',
+    'prenom': 'prenom', 'prenoms': 'prenom',
+    'nom': 'nom',
+    'sexe': 'sexe', 'genre': 'sexe',
+    'date_naissance': 'date_naissance', 'date_de_naissance': 'date_naissance', 'ne_le': 'date_naissance',
+    'lieu_naissance': 'lieu_naissance', 'lieu_de_naissance': 'lieu_naissance', 'ne_a': 'lieu_naissance',
+    'classe': 'classe',
+    'date_inscription': 'date_inscription', 'date_d_inscription': 'date_inscription',
+    'responsable_prenom': 'responsable_prenom', 'resp_prenom': 'responsable_prenom',
+    'responsable_nom': 'responsable_nom', 'resp_nom': 'responsable_nom',
+    'responsable_relation': 'responsable_relation', 'relation': 'responsable_relation',
+    'responsable_telephone': 'responsable_telephone', 'resp_telephone': 'responsable_telephone',
+    'telephone': 'responsable_telephone',
+    'responsable_email': 'responsable_email', 'email': 'responsable_email',
+    'responsable_adresse': 'responsable_adresse', 'adresse': 'responsable_adresse',
+    'responsable_profession': 'responsable_profession', 'profession': 'responsable_profession',
+}
+COLONNES = list(dict.fromkeys(ALIAS_COLONNES.values()))
+CHAMPS_OBLIGATOIRES = ('prenom', 'nom', 'sexe', 'date_naissance', 'classe',
+                       'responsable_prenom', 'responsable_nom', 'responsable_telephone')
+
+_RE_IDENTIFIANT = re.compile(r'^[\w-]+$')
+_RELATIONS = {}
+for _code, _libelle in Responsable.RELATION_CHOICES:
+    _RELATIONS[_code.lower()] = _code
+    _RELATIONS[slugify(_libelle).replace('-', '_')] = _code
+
+
+class ErreurImport(Exception):
+    """Fichier illisible ou sans les colonnes obligatoires."""
+
+
+def repertoire_imports():
+    return str(getattr(settings, 'IMPORTS_DIR', os.path.join(settings.BASE_DIR, 'logs', 'imports')))
+
+
+def chemin_etat(import_id):
+    if not _RE_IDENTIFIANT.match(import_id or ''):
+        raise ValueError(f"Identifiant d'import invalide: {import_id!r}")
+    return os.path.join(repertoire_imports(), f"{import_id}.json")
+
+
+def chemin_erreurs(import_id):
+    return chemin_etat(import_id)[:-len('.json')] + '.erreurs.csv'
+
+
+def _processus_actif(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _interrompu(etat, chemin):
+    """Import en cours dont le processus a disparu, ou dont l'état n'est plus mis à jour."""
+    if etat.get('statut') not in ('EN_ATTENTE', 'EN_COURS'):
+        return False
+    if etat.get('hote') == socket.gethostname() and etat.get('pid') and not _processus_actif(etat['pid']):
+        return True
+    try:
+        return time.time() - os.path.getmtime(chemin) > getattr(settings, 'IMPORTS_STALE_SECONDS', 900)
+    except OSError:
+        return False
+
+
+def lire_etat(import_id):
+    """État d'un import ({} si inconnu); un import interrompu est marqué ECHEC."""
+    chemin = chemin_etat(import_id)
+    try:
+        with open(chemin, 'r', encoding='utf-8') as fh:
+            etat = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if _interrompu(etat, chemin):
+        etat.update(
+            statut='ECHEC', fin=timezone.now().isoformat(),
+            message=f"Import interrompu après la ligne {etat.get('derniere_ligne')}: relancez-le pour reprendre.",
+        )
+        _ecrire_etat(etat)
+    return etat
+
+
+def _ecrire_etat(etat):
+    chemin = chemin_etat(etat['id'])
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    etat.update(pid=os.getpid(), hote=socket.gethostname())
+    with open(f"{chemin}.tmp", 'w', encoding='utf-8') as fh:
+        json.dump(etat, fh)
+    os.replace(f"{chemin}.tmp", chemin)
+
+
+def fichier_depose(etat):
+    """Fichier déposé par l'interface pour cet import (None s'il n'existe plus)."""
+    nom = os.path.basename(etat.get('fichier') or '')
+    chemin = os.path.join(repertoire_imports(), nom)
+    return chemin if nom.startswith(f"{etat.get('id')}.") and os.path.isfile(chemin) else None
+
+
+def purger_imports():
+    """Supprime les fichiers de IMPORTS_DIR plus anciens que IMPORTS_RETENTION_DAYS (données personnelles)."""
+    repertoire = repertoire_imports()
+    if not os.path.isdir(repertoire):
+        return
+    limite = time.time() - getattr(settings, 'IMPORTS_RETENTION_DAYS', 7) * 86400
+    for nom in os.listdir(repertoire):
+        chemin = os.path.join(repertoire, nom)
+        try:
+            if os.path.isfile(chemin) and os.path.getmtime(chemin) < limite:
+                os.remove(chemin)
+        except OSError:
+            logger.warning("Impossible de purger %s", chemin, exc_info=True)
+
+
+# ----- Lecture en flux -----
+
+def _entete(valeur):
+    return slugify(str(valeur or '')).replace('-', '_')
+
+
+def texte_cellule(valeur):
+    """Valeur de cellule en texte (les entiers lus comme 620112233.0 perdent leur « .0 »)."""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, float) and valeur.is_integer():
+        valeur = int(valeur)
+    return str(valeur).strip()
+
+
+def _lignes_xlsx(chemin):
+    from ecole_moderne.xlsx import load_workbook
+
+    classeur = load_workbook(chemin, read_only=True, data_only=True)
+    try:
+        yield from classeur.active.iter_rows(values_only=True)
+    finally:
+        classeur.close()
+
+
+def _lignes_csv(chemin):
+    with open(chemin, 'r', encoding='utf-8-sig', newline='') as fh:
+        echantillon = fh.read(4096)
+        fh.seek(0)
+        try:
+            dialecte = csv.Sniffer().sniff(echantillon, delimiters=',;\t')
+        except csv.Error:
+            dialecte = csv.excel
+        yield from csv.reader(fh, dialecte)
+
+
+def lire_lignes(chemin, alias=ALIAS_COLONNES, obligatoires=CHAMPS_OBLIGATOIRES):
+    """Itère sur (numéro de ligne, {champ: valeur}) sans charger le fichier en mémoire.
+
+    `alias` associe les en-têtes normalisés aux champs; les colonnes inconnues sont
+    ignorées. Le numéro de ligne est celui du fichier (l'en-tête est la ligne 1).
+    """
+    extension = os.path.splitext(chemin)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        lignes = _lignes_xlsx(chemin)
+    elif extension in ('.csv', '.txt'):
+        lignes = _lignes_csv(chemin)
+    else:
+        raise ErreurImport("Format non supporté (attendu: .xlsx ou .csv).")
+    try:
+        entete = next(lignes)
+    except StopIteration:
+        raise ErreurImport("Le fichier est vide.")
+    colonnes = [alias.get(_entete(v)) for v in entete]
+    manquantes = [c for c in obligatoires if c not in colonnes]
+    if manquantes:
+        raise ErreurImport(f"Colonnes obligatoires manquantes: {', '.join(manquantes)}")
+    for numero, valeurs in enumerate(lignes, start=2):
+        ligne = {champ: valeur for champ, valeur in zip(colonnes, valeurs) if champ}
+        if any(texte_cellule(v) for v in ligne.values()):
+            yield numero, ligne
+
+
+def compter_lignes(chemin):
+    """Nombre approximatif de lignes de données (pour la barre de progression)."""
+    try:
+        if chemin.lower().endswith(('.xlsx', '.xlsm')):
+            from ecole_moderne.xlsx import load_workbook
+
+            classeur = load_workbook(chemin, read_only=True)
+            try:
+                return max(0, (classeur.active.max_row or 1) - 1)
+            finally:
+                classeur.close()
+        with open(chemin, 'rb') as fh:
+            return max(0, sum(1 for _ in fh) - 1)
+    except Exception:
+        return None
+
+
+# ----- Normalisation -----
+
+def normaliser_telephone(valeur):
+    """Même règle que ResponsableForm.clean_telephone: +224 suivi de 8 ou 9 chiffres, sinon None."""
+    chiffres = re.sub(r'\D+', '', texte_cellule(valeur))
+    if chiffres.startswith('224') and len(chiffres) in (11, 12):
+        chiffres = chiffres[3:]
+    if len(chiffres) not in (8, 9):
+        return None
+    return f"+224{chiffres}"
+
+
+def date_cellule(valeur):
+    """Date d'une cellule (date Excel ou texte AAAA-MM-JJ / JJ/MM/AAAA), sinon None."""
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    texte = texte_cellule(valeur)
+    for format_date in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(texte, format_date).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _sexe(valeur):
+    texte = texte_cellule(valeur).upper()
+    if texte in ('M', 'MASCULIN', 'G', 'GARCON', 'GARÇON', 'H'):
+        return 'M'
+    if texte in ('F', 'FEMININ', 'FÉMININ', 'FILLE'):
+        return 'F'
+    return None
+
+
+# ----- Import -----
+
+class ImportEleves:
+    """Import d'un fichier d'élèves dans une école, par lots et avec reprise."""
+
+    def __init__(self, ecole, chemin, *, import_id, utilisateur=None, dry_run=False,
+                 taille_lot=1000, reprendre=True, today=None):
+        self.ecole = ecole
+        self.chemin = chemin
+        self.import_id = import_id
+        self.utilisateur = utilisateur if getattr(utilisateur, 'is_authenticated', False) else None
+        self.dry_run = dry_run
+        self.taille_lot = max(1, taille_lot)
+        self.today = today or timezone.localdate()
+
+        etat = lire_etat(import_id) if reprendre and not dry_run else {}
+        self.etat = etat or {
+            'id': import_id,
+            'ecole_id': ecole.id,
+            'fichier': os.path.basename(chemin),
+            'utilisateur_id': getattr(self.utilisateur, 'id', None),
+            'dry_run': dry_run,
+            'statut': 'EN_ATTENTE',
+            'total_lignes': None,
+            'derniere_ligne': 1,
+            'lignes_lues': 0,
+            'eleves_crees': 0,
+            'responsables_crees': 0,
+            'responsables_reutilises': 0,
+            'deja_inscrits': 0,
+            'erreurs': 0,
+            'message': '',
+            'debut': None,
+            'fin': None,
+        }
+        if not etat and os.path.exists(chemin_erreurs(import_id)):
+            os.remove(chemin_erreurs(import_id))
+
+        # Classes de l'école par nom et par code matricule (l'année la plus récente l'emporte)
+        self.classes = {}
+        for classe in Classe.objects.filter(ecole=ecole).order_by('annee_scolaire', 'id'):
+            self.classes[classe.nom.strip().lower()] = classe
+            if classe.code_matricule:
+                self.classes[classe.code_matricule.strip().lower()] = classe
+        self.grilles = IndexGrilles.charger(ecole_ids=[ecole.id])
+        self.responsables = {}      # téléphone -> id (None: à créer, en simulation)
+        self.prochains_numeros = {}  # code matricule -> prochain numéro libre
+        self.matricules_vus = set()
+
+    # -- Matricules --
+
+    def _code(self, classe):
+        return _code_classe_from_nom_ou_niveau(classe) or f"CL{classe.id}"
+
+    def _allouer_matricule(self, classe):
+        code = self._code(classe)
+        numero = self.prochains_numeros.get(code)
+        if numero is None:
+            motif = re.compile(r'^' + re.escape(code) + r'-(\d+)$')
+            existants = Eleve.objects.filter(matricule__startswith=f"{code}-").values_list('matricule', flat=True)
+            numero = 1 + max((int(m.group(1)) for m in map(motif.match, existants) if m), default=0)
+        while f"{code}-{numero:03d}" in self.matricules_vus:
+            numero += 1
+        self.prochains_numeros[code] = numero + 1
+        return f"{code}-{numero:03d}"
+
+    # -- Validation --
+
+    def _valider(self, ligne):
+        """Retourne (données nettoyées, None) ou (None, message d'erreur)."""
+        manquants = [c for c in CHAMPS_OBLIGATOIRES if not texte_cellule(ligne.get(c))]
+        if manquants:
+            return None, f"Champs obligatoires vides: {', '.join(manquants)}"
+        classe = self.classes.get(texte_cellule(ligne['classe']).lower())
+        if classe is None:
+            return None, f"Classe inconnue dans cette école: {texte_cellule(ligne['classe'])}"
+        sexe = _sexe(ligne['sexe'])
+        if sexe is None:
+            return None, f"Sexe invalide: {texte_cellule(ligne['sexe'])} (attendu M ou F)"
+        date_naissance = date_cellule(ligne['date_naissance'])
+        if date_naissance is None or date_naissance >= self.today:
+            return None, f"Date de naissance invalide: {texte_cellule(ligne['date_naissance'])}"
+        date_inscription = self.today
+        if texte_cellule(ligne.get('date_inscription')):
+            date_inscription = date_cellule(ligne['date_inscription'])
+            if date_inscription is None:
+                return None, f"Date d'inscription invalide: {texte_cellule(ligne['date_inscription'])}"
+        telephone = normaliser_telephone(ligne['responsable_telephone'])
+        if telephone is None:
+            return None, f"Téléphone du responsable invalide: {texte_cellule(ligne['responsable_telephone'])}"
+        relation = 'AUTRE'
+        if texte_cellule(ligne.get('responsable_relation')):
+            relation = _RELATIONS.get(_entete(ligne['responsable_relation']))
+            if relation is None:
+                return None, f"Relation inconnue: {texte_cellule(ligne['responsable_relation'])}"
+        matricule = texte_cellule(ligne.get('matricule'))
+        if matricule:
+            if len(matricule) > 20:
+                return None, f"Matricule trop long: {matricule}"
+            if matricule in self.matricules_vus:
+                return None, f"Matricule en double dans le fichier: {matricule}"
+        return {
+            'matricule': matricule,
+            'prenom': texte_cellule(ligne['prenom'])[:100],
+            'nom': texte_cellule(ligne['nom'])[:100],
+            'sexe': sexe,
+            'date_naissance': date_naissance,
+            'lieu_naissance': texte_cellule(ligne.get('lieu_naissance'))[:100] or '-',
+            'classe': classe,
+            'date_inscription': date_inscription,
+            'responsable': {
+                'prenom': texte_cellule(ligne['responsable_prenom'])[:100],
+                'nom': texte_cellule(ligne['responsable_nom'])[:100],
+                'relation': relation,
+                'telephone': telephone,
+                'email': texte_cellule(ligne.get('responsable_email')) or None,
+                'adresse': texte_cellule(ligne.get('responsable_adresse')),
+                'profession': texte_cellule(ligne.get('responsable_profession'))[:100] or None,
+            },
+        }, None
+
+    # -- Traitement d'un lot --
+
+    def _traiter_lot(self, lot):
+        valides, rejets = [], []
+        for numero, ligne in lot:
+            donnees, erreur = self._valider(ligne)
+            if erreur:
+                rejets.append((numero, ligne, erreur))
+            else:
+                valides.append((numero, ligne, donnees))
+                if donnees['matricule']:
+                    self.matricules_vus.add(donnees['matricule'])
+
+        # Matricules fournis déjà attribués en base
+        fournis = [d['matricule'] for _, _, d in valides if d['matricule']]
+        pris = set(Eleve.objects.filter(matricule__in=fournis).values_list('matricule', flat=True)) if fournis else set()
+        # Élèves déjà inscrits (reprise ou fichier importé deux fois)
+        existants = set(
+            Eleve.objects.filter(
+                classe_id__in={d['classe'].id for _, _, d in valides},
+                nom__in={d['nom'] for _, _, d in valides},
+            ).values_list('classe_id', 'nom', 'prenom', 'date_naissance')
+        ) if valides else set()
+
+        nb_erreurs = len(rejets)
+        retenus = []
+        for numero, ligne, donnees in valides:
+            cle = (donnees['classe'].id, donnees['nom'], donnees['prenom'], donnees['date_naissance'])
+            if cle in existants:
+                self.etat['deja_inscrits'] += 1
+                rejets.append((numero, ligne, "Élève déjà inscrit (ignoré)"))
+            elif donnees['matricule'] in pris:
+                nb_erreurs += 1
+                rejets.append((numero, ligne, f"Matricule déjà utilisé: {donnees['matricule']}"))
+            else:
+                existants.add(cle)
+                retenus.append(donnees)
+
+        # Responsables: ceux déjà connus (fichier ou base) sont réutilisés
+        inconnus = {d['responsable']['telephone'] for d in retenus} - self.responsables.keys()
+        if inconnus:
+            for telephone, responsable_id in (
+                Responsable.objects.filter(telephone_e164__in=inconnus).order_by('-id').values_list('telephone_e164', 'id')
+            ):
+                self.responsables[telephone] = responsable_id
+        nouveaux = {}
+        for donnees in retenus:
+            telephone = donnees['responsable']['telephone']
+            if telephone in self.responsables or telephone in nouveaux:
+                self.etat['responsables_reutilises'] += 1
+            else:
+                nouveaux[telephone] = Responsable(**donnees['responsable'], telephone_e164=telephone)
+
+        for donnees in retenus:
+            if not donnees['matricule']:
+                donnees['matricule'] = self._allouer_matricule(donnees['classe'])
+            self.matricules_vus.add(donnees['matricule'])
+
+        if not self.dry_run and retenus:
+            with transaction.atomic():
+                Responsable.objects.bulk_create(nouveaux.values(), batch_size=500)
+                for telephone, responsable in nouveaux.items():
+                    self.responsables[telephone] = responsable.id
+                eleves = [
+                    Eleve(
+                        matricule=d['matricule'], prenom=d['prenom'], nom=d['nom'], sexe=d['sexe'],
+                        date_naissance=d['date_naissance'], lieu_naissance=d['lieu_naissance'],
+                        classe=d['classe'], date_inscription=d['date_inscription'],
+                        responsable_principal_id=self.responsables[d['responsable']['telephone']],
+                        cree_par=self.utilisateur,
+                    )
+                    for d in retenus
+                ]
+                Eleve.objects.bulk_create(eleves, batch_size=500)
+                HistoriqueEleve.objects.bulk_create([
+                    HistoriqueEleve(
+                        eleve=eleve, action='CREATION', utilisateur=self.utilisateur,
+                        description=f"Création du profil de {eleve.prenom} {eleve.nom} (import {self.etat['fichier']})",
+                    )
+                    for eleve in eleves
+                ], batch_size=500)
+                EcheancierPaiement.objects.bulk_create([
+                    construire_echeancier(eleve, grilles=self.grilles, created_by=self.utilisateur, today=self.today)
+                    for eleve in eleves
+                ], batch_size=500)
+        else:
+            for telephone in nouveaux:
+                self.responsables[telephone] = None
+
+        self.etat['eleves_crees'] += len(retenus)
+        self.etat['responsables_crees'] += len(nouveaux)
+        self.etat['erreurs'] += nb_erreurs
+        self._ecrire_rejets(rejets)
+
+    def _ecrire_rejets(self, rejets):
+        if not rejets:
+            return
+        chemin = chemin_erreurs(self.import_id)
+        nouveau = not os.path.exists(chemin)
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        with open(chemin, 'a', encoding='utf-8', newline='') as fh:
+            ecrivain = csv.writer(fh, delimiter=';')
+            if nouveau:
+                ecrivain.writerow(['ligne', 'erreur'] + COLONNES)
+            for numero, ligne, erreur in sorted(rejets, key=lambda r: r[0]):
+                ecrivain.writerow([numero, erreur] + [texte_cellule(ligne.get(c)) for c in COLONNES])
+
+    # -- Exécution --
+
+    def executer(self):
+        """Traite le fichier (ou la partie restante) et retourne l'état final."""
+        etat = self.etat
+        if etat['statut'] == 'TERMINE':
+            return etat
+        etat.update(statut='EN_COURS', message='', fin=None)
+        etat['debut'] = etat['debut'] or timezone.now().isoformat()
+        if etat['total_lignes'] is None:
+            etat['total_lignes'] = compter_lignes(self.chemin)
+        _ecrire_etat(etat)
+        try:
+            lot = []
+            for numero, ligne in lire_lignes(self.chemin):
+                if numero <= etat['derniere_ligne']:
+                    continue
+                lot.append((numero, ligne))
+                if len(lot) >= self.taille_lot:
+                    self._terminer_lot(lot)
+                    lot = []
+            if lot:
+                self._terminer_lot(lot)
+        except Exception as ex:
+            etat.update(statut='ECHEC', message=str(ex), fin=timezone.now().isoformat())
+            _ecrire_etat(etat)
+            raise
+        etat.update(statut='TERMINE', fin=timezone.now().isoformat())
+        _ecrire_etat(etat)
+        return etat
+
+    def _terminer_lot(self, lot):
+        self._traiter_lot(lot)
+        self.etat['lignes_lues'] += len(lot)
+        self.etat['derniere_ligne'] = lot[-1][0]
+        _ecrire_etat(self.etat)
+
+
+def lancer_import_async(ecole, chemin, *, import_id, utilisateur=None, taille_lot=1000):
+    """Exécute l'import dans un thread (la progression se lit via `lire_etat`).
+
+    L'état initial est écrit avant le démarrage du thread: la page de suivi le trouve
+    dès la redirection. Le fichier déposé `chemin` est supprimé quand l'import se
+    termine; en cas d'échec il est conservé pour la reprise (jusqu'à la purge).
+    """
+    purger_imports()
+    importeur = ImportEleves(ecole, chemin, import_id=import_id, utilisateur=utilisateur, taille_lot=taille_lot)
+    _ecrire_etat(importeur.etat)
+
+    def _worker():
+        try:
+            importeur.executer()
+            os.remove(chemin)
+        except Exception:
+            logger.exception("Import d'élèves %s en échec", import_id)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=_worker, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,67 @@
+import hashlib
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from eleves.importation import ErreurImport, ImportEleves, chemin_erreurs, chemin_etat, purger_imports
+from eleves.models import Ecole
+
+
+class Command(BaseCommand):
+    help = "Importe en masse des élèves depuis un fichier .xlsx ou .csv (par lots, avec reprise)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Fichier .xlsx ou .csv (une ligne d'en-tête)")
+        parser.add_argument('--ecole-id', type=int, required=True, help="École de destination")
+        parser.add_argument('--dry-run', action='store_true', help="Valider seulement, sans écrire en base")
+        parser.add_argument('--taille-lot', type=int, default=1000, help="Lignes par transaction (défaut 1000)")
+        parser.add_argument('--id', dest='import_id', help="Identifiant de l'import (défaut: dérivé du fichier)")
+        parser.add_argument('--utilisateur', help="Nom d'utilisateur enregistré comme créateur")
+        parser.add_argument('--reset', action='store_true', help="Ignorer l'état d'une exécution précédente")
+
+    def handle(self, *args, **options):
+        fichier = os.path.abspath(options['fichier'])
+        if not os.path.isfile(fichier):
+            raise CommandError(f"Fichier introuvable: {fichier}")
+        try:
+            ecole = Ecole.objects.get(pk=options['ecole_id'])
+        except Ecole.DoesNotExist:
+            raise CommandError(f"École introuvable: {options['ecole_id']}")
+        utilisateur = None
+        if options.get('utilisateur'):
+            utilisateur = User.objects.filter(username=options['utilisateur']).first()
+            if utilisateur is None:
+                raise CommandError(f"Utilisateur introuvable: {options['utilisateur']}")
+
+        dry_run = bool(options.get('dry_run'))
+        import_id = options.get('import_id')
+        if not import_id:
+            empreinte = hashlib.md5(f"{fichier}|{os.path.getsize(fichier)}|{ecole.id}".encode(), usedforsecurity=False)
+            import_id = f"cli-{empreinte.hexdigest()[:12]}" + ('-simulation' if dry_run else '')
+        try:
+            chemin_etat(import_id)
+        except ValueError as ex:
+            raise CommandError(str(ex))
+
+        purger_imports()
+        debut = time.monotonic()
+        try:
+            etat = ImportEleves(
+                ecole, fichier, import_id=import_id, utilisateur=utilisateur, dry_run=dry_run,
+                taille_lot=options.get('taille_lot') or 1000, reprendre=not options.get('reset'),
+            ).executer()
+        except ErreurImport as ex:
+            raise CommandError(str(ex))
+        duree = time.monotonic() - debut
+
+        verbe = "à créer" if dry_run else "créés"
+        self.stdout.write(self.style.SUCCESS(
+            f"Import {import_id} ({'simulation' if dry_run else 'réel'}) en {duree:.1f}s: "
+            f"{etat['lignes_lues']} lignes, élèves {verbe}: {etat['eleves_crees']}, "
+            f"responsables {verbe}: {etat['responsables_crees']} (réutilisés: {etat['responsables_reutilises']}), "
+            f"déjà inscrits: {etat['deja_inscrits']}, erreurs: {etat['erreurs']}"
+        ))
+        if os.path.exists(chemin_erreurs(import_id)):
+            self.stdout.write(f"Lignes rejetées: {chemin_erreurs(import_id)}")
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:16
+
+from django.db import migrations, models
+
+
+def remplir_telephone_e164(apps, schema_editor):
+    """Renseigne telephone_e164 pour les responsables existants, par lots."""
+    from eleves.models import normaliser_telephone_e164
+
+    Responsable = apps.get_model('eleves', 'Responsable')
+    lot = []
+    for responsable in Responsable.objects.only('id', 'telephone').order_by('id').iterator(chunk_size=2000):
+        responsable.telephone_e164 = normaliser_telephone_e164(responsable.telephone)
+        lot.append(responsable)
+        if len(lot) >= 2000:
+            Responsable.objects.bulk_update(lot, ['telephone_e164'])
+            lot = []
+    if lot:
+        Responsable.objects.bulk_update(lot, ['telephone_e164'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eleves', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='responsable',
+            name='telephone_e164',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20, verbose_name='Téléphone (E.164)'),
+        ),
+        migrations.RunPython(remplir_telephone_e164, migrations.RunPython.noop),
+    ]
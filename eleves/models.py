@@ -1,7 +1,10 @@
+import re
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 from decimal import Decimal
+from ecole_moderne.fragments import invalider_navigation
 
 class Ecole(models.Model):
     """Modèle pour représenter une école dans un système multi-tenant"""
@@ -109,6 +112,13 @@ class Ecole(models.Model):
         if not self.prefecture:
             self.prefecture = "Conakry"
         super().save(*args, **kwargs)
+        # Nom / statut affichés dans les menus et le sélecteur d'école en cache
+        invalider_navigation()
+
+    def delete(self, *args, **kwargs):
+        resultat = super().delete(*args, **kwargs)
+        invalider_navigation()
+        return resultat
     
     @property
     def nom_affichage(self):
@@ -232,6 +242,26 @@ def _code_classe_from_nom_ou_niveau(classe: "Classe") -> str:
     }
     return fallback_niveau.get(niveau, "")
 
+def normaliser_telephone_e164(numero, indicatif: str = '224') -> str:
+    """Numéro au format E.164 ('+224620112233'), ou '' s'il est illisible.
+
+    Accepte les formes saisies ou reçues de Twilio: 'whatsapp:+224 620-11-22-33',
+    '00224620112233', '224620112233' ou un numéro local de 8 à 9 chiffres.
+    """
+    texte = str(numero or '').strip()
+    if texte.lower().startswith('whatsapp:'):
+        texte = texte[len('whatsapp:'):]
+    chiffres = re.sub(r'\D+', '', texte)
+    if not chiffres:
+        return ''
+    if texte.startswith('+'):
+        return f"+{chiffres}"
+    if chiffres.startswith('00'):
+        return f"+{chiffres[2:]}"
+    if len(chiffres) in (8, 9):
+        return f"+{indicatif}{chiffres}"
+    return f"+{chiffres}"
+
 class Responsable(models.Model):
     """Modèle pour représenter un responsable d'élève"""
     RELATION_CHOICES = [
@@ -257,6 +287,11 @@ class Responsable(models.Model):
     email = models.EmailField(blank=True, null=True, verbose_name="Email")
     adresse = models.TextField(verbose_name="Adresse")
     profession = models.CharField(max_length=100, blank=True, null=True, verbose_name="Profession")
+    # Forme normalisée de `telephone`, indexée pour retrouver l'expéditeur d'un message entrant
+    telephone_e164 = models.CharField(
+        max_length=20, blank=True, default='', db_index=True, editable=False,
+        verbose_name="Téléphone (E.164)"
+    )
     
     class Meta:
         verbose_name = "Responsable"
@@ -265,6 +300,13 @@ class Responsable(models.Model):
     def __str__(self):
         return f"{self.prenom} {self.nom} ({self.get_relation_display()})"
 
+    def save(self, *args, **kwargs):
+        self.telephone_e164 = normaliser_telephone_e164(self.telephone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'telephone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'telephone_e164'}
+        super().save(*args, **kwargs)
+
     @property
     def nom_complet(self) -> str:
         """Retourne le nom complet du responsable (Prénom Nom)."""
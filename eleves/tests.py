@@ -1,3 +1,172 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import socket
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from paiements.models import EcheancierPaiement
+from utilisateurs.models import Profil
+from .importation import ImportEleves, chemin_erreurs, lire_etat, purger_imports
+from .models import Classe, Ecole, Eleve, GrilleTarifaire, Responsable
+
+ENTETE = "prenom;nom;sexe;date_naissance;classe;responsable_prenom;responsable_nom;responsable_relation;telephone\n"
+
+
+class ImportElevesTests(TestCase):
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        reglages = override_settings(IMPORTS_DIR=os.path.join(self.dossier, 'imports'))
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+
+        self.ecole = Ecole.objects.create(nom="Ecole Import", adresse="A", telephone="+224620000001", directeur="D")
+        self.classe = Classe.objects.create(ecole=self.ecole, nom="1ère année", niveau="PRIMAIRE_1",
+                                            code_matricule="PN1", annee_scolaire="2024-2025")
+        GrilleTarifaire.objects.create(ecole=self.ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025",
+                                       frais_inscription=Decimal('50000'), tranche_1=Decimal('100000'))
+        parent = Responsable.objects.create(prenom="Ancien", nom="Parent", relation="PERE",
+                                            telephone="+224622000000", adresse="X")
+        Eleve.objects.create(matricule="PN1-007", prenom="Deja", nom="La", sexe="M", date_naissance=date(2016, 1, 1),
+                             lieu_naissance="Conakry", classe=self.classe, date_inscription=date(2024, 9, 1),
+                             responsable_principal=parent)
+
+    def _fichier(self, lignes, nom='eleves.csv'):
+        chemin = os.path.join(self.dossier, nom)
+        with open(chemin, 'w', encoding='utf-8') as fh:
+            fh.write(ENTETE + ''.join(lignes))
+        return chemin
+
+    def _lignes(self):
+        return [
+            "Awa;Camara;F;2017-03-02;1ère année;Sekou;Camara;Père;620 11 22 33\n",
+            "Ibrahima;Camara;M;12/05/2015;PN1;Sekou;Camara;PERE;+224620112233\n",
+            "Mariama;Bah;F;2016-01-20;1ère année;Fatou;Bah;Mère;622000000\n",
+            "Moussa;Diallo;M;2016-02-01;CM2;Alpha;Diallo;PERE;620445566\n",
+            "Kadiatou;Sow;F;pas une date;1ère année;Alpha;Sow;PERE;620778899\n",
+        ]
+
+    def test_import_regroupe_les_responsables_et_cree_les_echeanciers(self):
+        etat = ImportEleves(self.ecole, self._fichier(self._lignes()), import_id='t1', taille_lot=2).executer()
+
+        self.assertEqual(etat['statut'], 'TERMINE')
+        self.assertEqual((etat['eleves_crees'], etat['responsables_crees'], etat['responsables_reutilises']), (3, 1, 2))
+        self.assertEqual(etat['erreurs'], 2)
+        freres = Eleve.objects.filter(nom='Camara')
+        self.assertEqual(len({e.responsable_principal_id for e in freres}), 1)
+        # Responsable existant réutilisé par téléphone
+        self.assertEqual(Eleve.objects.get(prenom='Mariama').responsable_principal.prenom, "Ancien")
+        self.assertEqual(sorted(freres.values_list('matricule', flat=True)), ['PN1-008', 'PN1-009'])
+        echeancier = EcheancierPaiement.objects.get(eleve__prenom='Awa')
+        self.assertEqual(echeancier.tranche_1_due, Decimal('100000'))
+        with open(chemin_erreurs('t1'), encoding='utf-8') as fh:
+            rejets = fh.read()
+        self.assertIn('Classe inconnue', rejets)
+        self.assertIn('Date de naissance invalide', rejets)
+
+        # Réimport du même fichier: rien n'est créé en double
+        etat = ImportEleves(self.ecole, self._fichier(self._lignes()), import_id='t2').executer()
+        self.assertEqual((etat['eleves_crees'], etat['deja_inscrits']), (0, 3))
+        self.assertEqual(Eleve.objects.count(), 4)
+
+    def test_simulation_sans_ecriture(self):
+        etat = ImportEleves(self.ecole, self._fichier(self._lignes()), import_id='sim', dry_run=True).executer()
+        self.assertEqual(etat['eleves_crees'], 3)
+        self.assertEqual(Eleve.objects.count(), 1)
+        self.assertEqual(Responsable.objects.count(), 1)
+
+    def test_reprise_apres_interruption(self):
+        chemin = self._fichier(self._lignes())
+        ImportEleves(self.ecole, chemin, import_id='rep', taille_lot=1).executer()
+        etat = lire_etat('rep')
+        etat.update(statut='ECHEC', derniere_ligne=3)
+        with open(os.path.join(self.dossier, 'imports', 'rep.json'), 'w', encoding='utf-8') as fh:
+            json.dump(etat, fh)
+        etat = ImportEleves(self.ecole, chemin, import_id='rep').executer()
+        self.assertEqual(etat['statut'], 'TERMINE')
+        self.assertEqual(etat['deja_inscrits'], 1)  # seule la ligne 4 était déjà inscrite
+        self.assertEqual(Eleve.objects.count(), 4)
+
+    def test_import_interrompu_marque_en_echec_puis_repris(self):
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        self.client.force_login(admin)
+        os.makedirs(os.path.join(self.dossier, 'imports'))
+        chemin = os.path.join(self.dossier, 'imports', 'abc.csv')
+        with open(chemin, 'w', encoding='utf-8') as fh:
+            fh.write(ENTETE + ''.join(self._lignes()))
+        importeur = ImportEleves(self.ecole, chemin, import_id='abc')
+        # Worker recyclé pendant l'import: l'état reste EN_COURS, le processus n'existe plus
+        etat = dict(importeur.etat, statut='EN_COURS')
+        with open(os.path.join(self.dossier, 'imports', 'abc.json'), 'w', encoding='utf-8') as fh:
+            json.dump(dict(etat, pid=999999999, hote=socket.gethostname()), fh)
+
+        self.assertEqual(lire_etat('abc')['statut'], 'ECHEC')
+        response = self.client.get(reverse('eleves:suivi_import', args=['abc']))
+        self.assertTrue(response.context['reprise_possible'])
+        with mock.patch('eleves.importation.threading.Thread') as thread:
+            self.client.post(reverse('eleves:reprendre_import', args=['abc']))
+        thread.return_value.start.assert_called_once()
+        with mock.patch('eleves.importation.connections.close_all'):
+            thread.call_args.kwargs['target']()
+        self.assertEqual(lire_etat('abc')['statut'], 'TERMINE')
+        self.assertEqual(Eleve.objects.count(), 4)
+        self.assertFalse(os.path.exists(chemin))  # fichier déposé supprimé à la fin
+
+    def test_purge_des_fichiers_anciens(self):
+        os.makedirs(os.path.join(self.dossier, 'imports'))
+        ancien = os.path.join(self.dossier, 'imports', 'vieux.csv')
+        recent = os.path.join(self.dossier, 'imports', 'recent.csv')
+        for chemin in (ancien, recent):
+            open(chemin, 'w').close()
+        os.utime(ancien, (0, 0))
+        purger_imports()
+        self.assertFalse(os.path.exists(ancien))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_import_xlsx_et_commande(self):
+        from openpyxl import Workbook
+
+        classeur = Workbook()
+        feuille = classeur.active
+        feuille.append(ENTETE.strip().split(';'))
+        feuille.append(["Awa", "Camara", "F", date(2017, 3, 2), "1ère année", "Sekou", "Camara", "PERE", 620112233])
+        chemin = os.path.join(self.dossier, 'eleves.xlsx')
+        classeur.save(chemin)
+
+        call_command('importer_eleves', chemin, ecole_id=self.ecole.id, stdout=open(os.devnull, 'w'))
+        eleve = Eleve.objects.get(prenom='Awa')
+        self.assertEqual(eleve.responsable_principal.telephone, '+224620112233')
+        self.assertEqual(eleve.date_naissance, date(2017, 3, 2))
+
+    def test_vues_simulation_et_acces_a_la_progression(self):
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        self.client.force_login(admin)
+        fichier = SimpleUploadedFile('eleves.csv', (ENTETE + ''.join(self._lignes())).encode('utf-8'))
+        response = self.client.post(reverse('eleves:importer_eleves'),
+                                    {'ecole': self.ecole.id, 'simulation': 'on', 'fichier': fichier})
+        self.assertEqual(response.status_code, 200)
+        rapport = response.context['rapport']
+        self.assertTrue(rapport['dry_run'])
+        self.assertEqual(rapport['eleves_crees'], 3)
+        self.assertEqual(Eleve.objects.count(), 1)
+
+        response = self.client.get(reverse('eleves:progression_import', args=[rapport['id']]))
+        self.assertEqual(response.json()['statut'], 'TERMINE')
+        response = self.client.get(reverse('eleves:erreurs_import', args=[rapport['id']]))
+        self.assertEqual(response.status_code, 200)
+
+        autre_ecole = Ecole.objects.create(nom="Autre", adresse="B", telephone="+224620000002", directeur="E")
+        utilisateur = User.objects.create_user('secretaire', password='pass-12345')
+        Profil.objects.create(user=utilisateur, role='SECRETAIRE', ecole=autre_ecole, telephone='+224620999990')
+        self.client.force_login(utilisateur)
+        response = self.client.get(reverse('eleves:progression_import', args=[rapport['id']]))
+        self.assertEqual(response.status_code, 404)
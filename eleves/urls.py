@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_async
 
 app_name = 'eleves'
 
+# Points d'accès AJAX: version asynchrone sous ASGI (AJAX_ASYNC), synchrone sinon
+ajax = views_async if settings.AJAX_ASYNC else views
+
 urlpatterns = [
     # Liste et recherche des élèves
     path('', views.liste_eleves, name='liste_eleves'),
@@ -16,6 +20,13 @@ urlpatterns = [
     path('<int:eleve_id>/modifier/', views.modifier_eleve, name='modifier_eleve'),
     path('<int:eleve_id>/supprimer/', views.supprimer_eleve, name='supprimer_eleve'),
     
+    # Import en masse (Excel/CSV)
+    path('importer/', views.importer_eleves, name='importer_eleves'),
+    path('importer/<str:import_id>/', views.suivi_import, name='suivi_import'),
+    path('importer/<str:import_id>/progression/', views.progression_import, name='progression_import'),
+    path('importer/<str:import_id>/reprendre/', views.reprendre_import, name='reprendre_import'),
+    path('importer/<str:import_id>/erreurs/', views.erreurs_import, name='erreurs_import'),
+    
     # Gestion des classes
     path('classes/', views.gestion_classes, name='gestion_classes'),
     
@@ -34,7 +45,9 @@ urlpatterns = [
     path('export/tous/excel/', views.export_tous_eleves_excel, name='export_tous_eleves_excel'),
     
     # AJAX
-    path('ajax/classes-par-ecole/<int:ecole_id>/', views.ajax_classes_par_ecole, name='ajax_classes_par_ecole'),
-    path('ajax/statistiques/', views.ajax_statistiques_eleves, name='ajax_statistiques_eleves'),
+    path('ajax/classes-par-ecole/<int:ecole_id>/', ajax.ajax_classes_par_ecole, name='ajax_classes_par_ecole'),
+    path('ajax/statistiques/', ajax.ajax_statistiques_eleves, name='ajax_statistiques_eleves'),
+    path('ajax/async/classes-par-ecole/<int:ecole_id>/', views_async.ajax_classes_par_ecole, name='ajax_classes_par_ecole_async'),
+    path('ajax/async/statistiques/', views_async.ajax_statistiques_eleves, name='ajax_statistiques_eleves_async'),
 ]
 
@@ -3,39 +3,32 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.db.models import Q, Count
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_http_methods
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
+from django.views.decorators.http import require_http_methods, require_POST
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import slugify
 from datetime import date
 import os
+import uuid
 from .models import Eleve, Responsable, Classe, Ecole, HistoriqueEleve
 from .forms import EleveForm, ResponsableForm, RechercheEleveForm, ClasseForm
+from .importation import (
+    CHAMPS_OBLIGATOIRES, ErreurImport, ImportEleves, fichier_depose, lancer_import_async, repertoire_imports,
+    chemin_erreurs as chemin_erreurs_import, lire_etat as lire_etat_import,
+)
 from utilisateurs.models import JournalActivite
 from utilisateurs.utils import user_is_admin, filter_by_user_school, user_school
 from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_cookie
 
 # ReportLab pour génération PDF
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 
 # Utilitaire PDF partagé (filigrane)
 from ecole_moderne.pdf_utils import draw_logo_watermark
 from ecole_moderne.security_decorators import delete_permission_required
-
-# Excel
-try:
-    from openpyxl import Workbook
-    from openpyxl.utils import get_column_letter
-except ImportError:
-    Workbook = None
-    get_column_letter = None
+from ecole_moderne.exports import Colonne, exporter
+from ecole_moderne.replica import lecture_replica
 
 @login_required
 def liste_eleves(request):
@@ -412,8 +405,10 @@ def _get_classe_or_403(request, classe_id):
 @login_required
 @vary_on_cookie
 @cache_page(60 * 10)
+@lecture_replica
 def export_eleves_classe_pdf(request, classe_id):
     """Exporte la liste des élèves d'une classe en PDF."""
+    from ecole_moderne.pdf import A4, canvas, cm, colors, landscape, pdfmetrics, TTFont
     classe = _get_classe_or_403(request, classe_id)
     eleves = Eleve.objects.select_related('classe', 'responsable_principal').filter(classe=classe).order_by('nom', 'prenom')
 
@@ -533,11 +528,9 @@ def export_eleves_classe_pdf(request, classe_id):
     return response
 
 @login_required
+@lecture_replica
 def export_eleves_classe_excel(request, classe_id):
     """Exporte la liste des élèves d'une classe en Excel (.xlsx)."""
-    if Workbook is None or get_column_letter is None:
-        return HttpResponse("Erreur: openpyxl n'est pas installé sur le serveur.", status=500)
-
     classe = _get_classe_or_403(request, classe_id)
     eleves = Eleve.objects.select_related('classe', 'responsable_principal').filter(classe=classe).order_by('nom', 'prenom')
 
@@ -551,55 +544,24 @@ def export_eleves_classe_excel(request, classe_id):
         user_agent=request.META.get('HTTP_USER_AGENT', '')
     )
 
-    try:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Élèves"
-
-        # En-têtes avec style
-        headers = ["Matricule", "Nom complet", "Sexe", "Date de naissance", "Responsable principal", "Téléphone"]
-        ws.append(headers)
-        
-        # Style pour les en-têtes
-        from openpyxl.styles import Font, PatternFill
-        header_font = Font(bold=True)
-        header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        for cell in ws[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-
-        # Données des élèves
-        for e in eleves:
-            ws.append([
-                e.matricule or '',
-                f"{e.nom} {e.prenom}",
-                e.get_sexe_display() if hasattr(e, 'get_sexe_display') else getattr(e, 'sexe', ''),
-                e.date_naissance.strftime('%d/%m/%Y') if getattr(e, 'date_naissance', None) else '',
-                e.responsable_principal.nom_complet if e.responsable_principal else '',
-                e.responsable_principal.telephone if e.responsable_principal else '',
-            ])
-
-        # Largeur des colonnes optimisée
-        widths = [15, 30, 10, 18, 30, 18]
-        for idx, w in enumerate(widths, start=1):
-            ws.column_dimensions[get_column_letter(idx)].width = w
-
-        # Réponse HTTP
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        filename = f"eleves_{slugify(classe.ecole.nom)}_{slugify(classe.nom)}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        wb.save(response)
-        return response
-        
-    except Exception as e:
-        return HttpResponse(f"Erreur lors de la génération du fichier Excel: {str(e)}", status=500)
+    colonnes = [
+        Colonne("Matricule", 'matricule'),
+        Colonne("Nom complet", lambda e: f"{e.nom} {e.prenom}", largeur=30),
+        Colonne("Sexe", 'get_sexe_display', largeur=10),
+        Colonne("Date de naissance", 'date_naissance', format='date', largeur=18),
+        Colonne("Responsable principal", 'responsable_principal.nom_complet', largeur=30),
+        Colonne("Téléphone", 'responsable_principal.telephone', largeur=18),
+    ]
+    return exporter(request, eleves, colonnes, nom_fichier=f"eleves_{slugify(classe.ecole.nom)}_{slugify(classe.nom)}",
+                    titre_feuille="Élèves")
 
 @login_required
 @vary_on_cookie
 @cache_page(60 * 10)
+@lecture_replica
 def export_tous_eleves_pdf(request):
     """Exporte la liste de tous les élèves en PDF."""
+    from ecole_moderne.pdf import A4, canvas, cm, colors, landscape, pdfmetrics, TTFont
     # Filtrer selon les permissions
     if user_is_admin(request.user):
         eleves = Eleve.objects.select_related('classe', 'classe__ecole', 'responsable_principal').all()
@@ -751,11 +713,9 @@ def export_tous_eleves_pdf(request):
         return HttpResponse(f"Erreur lors de la génération du PDF: {str(e)}", status=500)
 
 @login_required
+@lecture_replica
 def export_tous_eleves_excel(request):
     """Exporte la liste de tous les élèves en Excel (.xlsx)."""
-    if Workbook is None or get_column_letter is None:
-        return HttpResponse("Erreur: openpyxl n'est pas installé sur le serveur.", status=500)
-
     # Filtrer selon les permissions
     if user_is_admin(request.user):
         eleves = Eleve.objects.select_related('classe', 'classe__ecole', 'responsable_principal').all()
@@ -776,53 +736,17 @@ def export_tous_eleves_excel(request):
         user_agent=request.META.get('HTTP_USER_AGENT', '')
     )
 
-    try:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Tous les élèves"
-
-        # En-têtes avec style
-        headers = ["École", "Classe", "Matricule", "Nom complet", "Sexe", "Date de naissance", "Responsable principal", "Téléphone"]
-        ws.append(headers)
-        
-        # Style pour les en-têtes
-        from openpyxl.styles import Font, PatternFill, Alignment
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal="center")
-        
-        for cell in ws[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-
-        # Données des élèves
-        for eleve in eleves:
-            ws.append([
-                eleve.classe.ecole.nom,
-                eleve.classe.nom,
-                eleve.matricule or '',
-                f"{eleve.nom} {eleve.prenom}",
-                eleve.get_sexe_display() if hasattr(eleve, 'get_sexe_display') else getattr(eleve, 'sexe', ''),
-                eleve.date_naissance.strftime('%d/%m/%Y') if getattr(eleve, 'date_naissance', None) else '',
-                eleve.responsable_principal.nom_complet if eleve.responsable_principal else '',
-                eleve.responsable_principal.telephone if eleve.responsable_principal else '',
-            ])
-
-        # Largeur des colonnes optimisée
-        widths = [20, 15, 15, 25, 10, 15, 25, 15]
-        for idx, w in enumerate(widths, start=1):
-            ws.column_dimensions[get_column_letter(idx)].width = w
-
-        # Réponse HTTP
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        filename = "tous_les_eleves.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        wb.save(response)
-        return response
-        
-    except Exception as e:
-        return HttpResponse(f"Erreur lors de la génération du fichier Excel: {str(e)}", status=500)
+    colonnes = [
+        Colonne("École", 'classe.ecole.nom', largeur=20),
+        Colonne("Classe", 'classe.nom'),
+        Colonne("Matricule", 'matricule'),
+        Colonne("Nom complet", lambda e: f"{e.nom} {e.prenom}", largeur=25),
+        Colonne("Sexe", 'get_sexe_display', largeur=10),
+        Colonne("Date de naissance", 'date_naissance', format='date'),
+        Colonne("Responsable principal", 'responsable_principal.nom_complet', largeur=25),
+        Colonne("Téléphone", 'responsable_principal.telephone'),
+    ]
+    return exporter(request, eleves, colonnes, nom_fichier="tous_les_eleves", titre_feuille="Tous les élèves")
 
 @login_required
 @delete_permission_required()
@@ -945,7 +869,118 @@ def ajax_statistiques_eleves(request):
             'error': str(e)
         })
 
+def _ecole_import(request):
+    """École de destination d'un import: celle de l'utilisateur, au choix pour un superutilisateur."""
+    if request.user.is_superuser:
+        ecole_id = request.POST.get('ecole') or getattr(getattr(request, 'ecole_courante', None), 'id', None)
+        return Ecole.objects.filter(id=ecole_id).first() if ecole_id else None
+    return user_school(request.user)
+
+def _etat_import_ou_404(request, import_id):
+    try:
+        etat = lire_etat_import(import_id)
+    except ValueError:
+        etat = {}
+    if not etat:
+        raise Http404("Import introuvable")
+    if not request.user.is_superuser:
+        ecole = user_school(request.user)
+        if ecole is None or etat.get('ecole_id') != ecole.id:
+            raise Http404("Import introuvable")
+    return etat
+
+@login_required
+def importer_eleves(request):
+    """Import en masse d'élèves depuis un fichier Excel/CSV (simulation ou import réel en tâche de fond)"""
+    if not request.user.is_superuser and user_school(request.user) is None:
+        return render(request, 'utilisateurs/acces_refuse_ecole.html', status=403)
+
+    rapport = None
+    if request.method == 'POST':
+        ecole = _ecole_import(request)
+        fichier = request.FILES.get('fichier')
+        extension = os.path.splitext(getattr(fichier, 'name', ''))[1].lower()
+        if ecole is None:
+            messages.error(request, "Veuillez choisir l'école de destination.")
+        elif fichier is None or extension not in ('.xlsx', '.csv'):
+            messages.error(request, "Veuillez fournir un fichier .xlsx ou .csv.")
+        else:
+            simulation = request.POST.get('simulation') == 'on'
+            import_id = uuid.uuid4().hex + ('-simulation' if simulation else '')
+            chemin = os.path.join(repertoire_imports(), f"{import_id}{extension}")
+            os.makedirs(repertoire_imports(), exist_ok=True)
+            with open(chemin, 'wb') as destination:
+                for morceau in fichier.chunks():
+                    destination.write(morceau)
+
+            if simulation:
+                try:
+                    rapport = ImportEleves(ecole, chemin, import_id=import_id, utilisateur=request.user, dry_run=True).executer()
+                except ErreurImport as ex:
+                    messages.error(request, str(ex))
+                finally:
+                    os.remove(chemin)
+            else:
+                lancer_import_async(ecole, chemin, import_id=import_id, utilisateur=request.user)
+                JournalActivite.objects.create(
+                    user=request.user,
+                    action='CREATION',
+                    type_objet='ELEVE',
+                    description=f"Import en masse d'élèves ({fichier.name}) pour {ecole.nom}",
+                    adresse_ip=request.META.get('REMOTE_ADDR', ''),
+                    user_agent=request.META.get('HTTP_USER_AGENT', '')
+                )
+                return redirect('eleves:suivi_import', import_id=import_id)
+
+    context = {
+        'rapport': rapport,
+        'colonnes_obligatoires': CHAMPS_OBLIGATOIRES,
+        'ecoles': Ecole.objects.filter(statut='ACTIVE').order_by('nom') if request.user.is_superuser else None,
+        'titre_page': 'Importer des élèves',
+    }
+    return render(request, 'eleves/importer_eleves.html', context)
+
+@login_required
+def suivi_import(request, import_id):
+    """Page de suivi d'un import (la progression est rafraîchie par progression_import)"""
+    rapport = _etat_import_ou_404(request, import_id)
+    context = {
+        'rapport': rapport,
+        'reprise_possible': rapport['statut'] == 'ECHEC' and fichier_depose(rapport) is not None,
+        'titre_page': 'Importer des élèves',
+    }
+    return render(request, 'eleves/importer_eleves.html', context)
+
+@login_required
+@require_POST
+def reprendre_import(request, import_id):
+    """Relance un import en échec (worker interrompu) à partir de la dernière ligne validée"""
+    etat = _etat_import_ou_404(request, import_id)
+    chemin = fichier_depose(etat)
+    if etat['statut'] != 'ECHEC' or chemin is None:
+        messages.error(request, "Cet import ne peut pas être repris.")
+    else:
+        ecole = get_object_or_404(Ecole, id=etat['ecole_id'])
+        lancer_import_async(ecole, chemin, import_id=import_id, utilisateur=request.user)
+    return redirect('eleves:suivi_import', import_id=import_id)
+
+@login_required
+def progression_import(request, import_id):
+    """Vue AJAX: état courant d'un import (compteurs, statut)"""
+    return JsonResponse(_etat_import_ou_404(request, import_id))
+
+@login_required
+def erreurs_import(request, import_id):
+    """Téléchargement des lignes rejetées d'un import (CSV)"""
+    _etat_import_ou_404(request, import_id)
+    chemin = chemin_erreurs_import(import_id)
+    if not os.path.exists(chemin):
+        raise Http404("Aucune ligne rejetée")
+    return FileResponse(open(chemin, 'rb'), as_attachment=True, filename=f"erreurs-import-{import_id}.csv",
+                        content_type='text/csv')
+
 @login_required
+@lecture_replica
 def statistiques_eleves(request):
     """Vue pour afficher les statistiques complètes des élèves"""
     from django.db.models import Sum, Avg, Max, Min
@@ -1175,6 +1210,7 @@ def statistiques_eleves(request):
 @login_required
 def fiche_inscription_pdf(request, eleve_id):
     """Génère la fiche d'inscription d'un élève en PDF"""
+    from ecole_moderne.pdf import A4, canvas, cm, pdfmetrics, TTFont
     qs = Eleve.objects.select_related(
         'classe', 'classe__ecole', 'responsable_principal', 'responsable_secondaire'
     )
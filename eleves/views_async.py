@@ -0,0 +1,42 @@
+"""Versions asynchrones des points d'accès AJAX des élèves (voir paiements/views_async.py)."""
+from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Q
+from django.http import JsonResponse
+
+from ecole_moderne.asynchrone import en_cache_async, portee_async
+from .models import Classe, Ecole, Eleve
+
+
+@login_required
+async def ajax_classes_par_ecole(request, ecole_id):
+    """Classes d'une école (un non-admin ne peut demander que la sienne)."""
+    portee = await portee_async(request)
+    if not portee.est_admin and portee.ecole_id != ecole_id:
+        return JsonResponse({'success': False, 'error': "Accès non autorisé à cette école."}, status=403)
+
+    async def calcul():
+        if not await Ecole.objects.filter(id=ecole_id).aexists():
+            return None
+        return [c async for c in Classe.objects.filter(ecole_id=ecole_id).values('id', 'nom')]
+
+    classes = await en_cache_async(f"ajax:eleves:classes:{ecole_id}", calcul)
+    if classes is None:
+        return JsonResponse({'success': False, 'error': "École introuvable."}, status=404)
+    return JsonResponse({'success': True, 'classes': classes})
+
+
+@login_required
+async def ajax_statistiques_eleves(request):
+    """Effectifs (total, actifs, exclus) en une seule requête."""
+    portee = await portee_async(request)
+    eleves = Eleve.objects.all() if portee.est_admin else Eleve.objects.filter(classe__ecole_id=portee.ecole_id)
+
+    async def calcul():
+        return await eleves.aaggregate(
+            total_eleves=Count('id'),
+            eleves_actifs=Count('id', filter=Q(statut='ACTIF')),
+            eleves_exclus=Count('id', filter=Q(statut='EXCLU')),
+        )
+
+    cle = f"ajax:eleves:statistiques:{'tout' if portee.est_admin else portee.cle}"
+    return JsonResponse({'success': True, 'stats': await en_cache_async(cle, calcul)})
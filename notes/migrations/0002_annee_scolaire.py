@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:53
+
+from django.db import migrations, models
+
+
+def etiqueter(apps, schema_editor):
+    Classe = apps.get_model('eleves', 'Classe')
+    Evaluation = apps.get_model('notes', 'Evaluation')
+    Note = apps.get_model('notes', 'Note')
+    sans_annee = models.Q(annee_scolaire__isnull=True) | models.Q(annee_scolaire='')
+    Evaluation.objects.filter(sans_annee).update(annee_scolaire=models.Subquery(
+        Classe.objects.filter(pk=models.OuterRef('classe_id')).values('annee_scolaire')[:1]
+    ))
+    Note.objects.update(annee_scolaire=models.Subquery(
+        Evaluation.objects.filter(pk=models.OuterRef('evaluation_id')).values('annee_scolaire')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='annee_scolaire',
+            field=models.CharField(blank=True, db_index=True, max_length=9, null=True),
+        ),
+        migrations.RunPython(etiqueter, migrations.RunPython.noop),
+    ]
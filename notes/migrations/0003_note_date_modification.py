@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_annee_scolaire'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
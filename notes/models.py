@@ -106,6 +106,11 @@ class Evaluation(models.Model):
             models.Index(fields=['annee_scolaire']),
         ]
 
+    def save(self, *args, **kwargs):
+        if not self.annee_scolaire:
+            self.annee_scolaire = self.classe.annee_scolaire
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.titre} — {self.classe} / {self.matiere.nom}"
 
@@ -123,7 +128,11 @@ class Note(models.Model):
     note = models.DecimalField(max_digits=5, decimal_places=2, validators=[MinValueValidator(0), MaxValueValidator(20)])
     observation = models.CharField(max_length=255, blank=True, null=True)
     date_saisie = models.DateTimeField(auto_now_add=True)
+    # Version des statistiques de l'évaluation (notes/statistiques.py) et sauvegardes incrémentales
+    date_modification = models.DateTimeField(auto_now=True)
     saisie_par = models.ForeignKey('auth.User', on_delete=models.SET_NULL, blank=True, null=True, related_name='notes_saisies')
+    # Année scolaire de l'évaluation (archivage, voir ecole_moderne/archives.py)
+    annee_scolaire = models.CharField(max_length=9, blank=True, null=True, db_index=True)
 
     class Meta:
         verbose_name = 'Note'
@@ -135,6 +144,11 @@ class Note(models.Model):
             models.Index(fields=['matricule']),
         ]
 
+    def save(self, *args, **kwargs):
+        if not self.annee_scolaire:
+            self.annee_scolaire = self.evaluation.annee_scolaire or self.classe.annee_scolaire
+        super().save(*args, **kwargs)
+
     def get_appreciation_automatique(self):
         """Retourne l'appréciation automatique selon le barème de l'école."""
         # Chercher d'abord un barème spécifique à l'école
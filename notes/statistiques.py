@@ -0,0 +1,149 @@
+"""Statistiques par évaluation (moyenne, médiane, écart-type, min/max, taux de réussite, histogramme).
+
+Les notes de toutes les évaluations demandées sont lues en une seule requête,
+triées par évaluation puis par note: chaque groupe est déjà ordonné, la médiane
+et les extrêmes se lisent directement et le reste se calcule en une passe.
+
+Les résultats sont mis en cache par évaluation et par version
+(`notes:stats:<id>:<version>`). La version est lue en base à chaque appel, pour
+toutes les évaluations en une requête groupée: nombre de notes, plus grand id et
+dernière `date_modification`. Un autre worker, une suppression en cascade (élève,
+archivage, explorateur) ou une restauration changent donc la version: un bulletin
+n'imprime jamais une moyenne de classe périmée. Seules les écritures par
+`update()` qui ne renseignent pas `date_modification` échappent à la version.
+La somme exacte (Decimal) et l'effectif sont conservés pour que les moyennes de
+classe pondérées des bulletins restent identiques au calcul note par note.
+"""
+import hashlib
+import math
+from decimal import Decimal
+from itertools import groupby
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+SEUIL_REUSSITE = Decimal('10')
+LARGEUR_CLASSE = 2  # histogramme: [0-2[, [2-4[, ..., [18-20]
+NB_CLASSES = 10
+TIMEOUT = 24 * 3600
+
+
+def versions_evaluations(ids):
+    """{evaluation_id: empreinte de (nombre de notes, plus grand id, dernière modification)}, en une requête."""
+    from .models import Note
+
+    lignes = (
+        Note.objects.filter(evaluation_id__in=ids)
+        .values('evaluation_id')
+        .annotate(nombre=Count('pk'), pk_max=Max('pk'), modification=Max('date_modification'))
+        .order_by()
+    )
+    signatures = {l['evaluation_id']: (l['nombre'], l['pk_max'], l['modification']) for l in lignes}
+    return {
+        i: hashlib.sha1(repr(signatures.get(i, (0, None, None))).encode()).hexdigest()[:12]
+        for i in ids
+    }
+
+
+def cle_statistiques(evaluation_id, version):
+    return f"notes:stats:{int(evaluation_id)}:{version}"
+
+
+def _vides(evaluation_id):
+    return {
+        'evaluation_id': evaluation_id, 'effectif': 0, 'somme': Decimal('0'),
+        'moyenne': None, 'mediane': None, 'ecart_type': None, 'min': None, 'max': None,
+        'reussis': 0, 'taux_reussite': None, 'histogramme': [0] * NB_CLASSES,
+    }
+
+
+def calculer(evaluation_id, notes):
+    """Statistiques d'une évaluation à partir de ses notes triées par ordre croissant."""
+    stats = _vides(evaluation_id)
+    n = len(notes)
+    if not n:
+        return stats
+    somme = sum(notes, Decimal('0'))
+    moyenne = somme / n
+    # Écart-type de population, calculé en float (affichage à 2 décimales)
+    m = float(moyenne)
+    variance = sum((float(x) - m) ** 2 for x in notes) / n
+    milieu = n // 2
+    mediane = notes[milieu] if n % 2 else (notes[milieu - 1] + notes[milieu]) / 2
+    histogramme = [0] * NB_CLASSES
+    reussis = 0
+    for x in notes:
+        histogramme[min(int(x) // LARGEUR_CLASSE, NB_CLASSES - 1)] += 1
+        if x >= SEUIL_REUSSITE:
+            reussis += 1
+    stats.update({
+        'effectif': n,
+        'somme': somme,
+        'moyenne': round(m, 2),
+        'mediane': round(float(mediane), 2),
+        'ecart_type': round(math.sqrt(variance), 2),
+        'min': float(notes[0]),
+        'max': float(notes[-1]),
+        'reussis': reussis,
+        'taux_reussite': round(100 * reussis / n, 1),
+        'histogramme': histogramme,
+    })
+    return stats
+
+
+def statistiques_evaluations(evaluation_ids):
+    """{evaluation_id: statistiques} pour les évaluations données.
+
+    Une requête pour les versions, puis une requête groupée pour les évaluations
+    absentes du cache à leur version courante.
+    """
+    from .models import Note
+
+    ids = list(dict.fromkeys(int(i) for i in evaluation_ids))
+    if not ids:
+        return {}
+    cles = {i: cle_statistiques(i, v) for i, v in versions_evaluations(ids).items()}
+    en_cache = cache.get_many(list(cles.values()))
+    resultats = {i: en_cache[cles[i]] for i in ids if cles[i] in en_cache}
+    manquants = [i for i in ids if i not in resultats]
+    if manquants:
+        lignes = (
+            Note.objects.filter(evaluation_id__in=manquants, note__isnull=False)
+            .order_by('evaluation_id', 'note')
+            .values_list('evaluation_id', 'note')
+        )
+        calcules = {i: _vides(i) for i in manquants}
+        for evaluation_id, groupe in groupby(lignes.iterator(), key=lambda t: t[0]):
+            calcules[evaluation_id] = calculer(evaluation_id, [note for _, note in groupe])
+        cache.set_many({cles[i]: s for i, s in calcules.items()}, TIMEOUT)
+        resultats.update(calcules)
+    return resultats
+
+
+def moyenne_ponderee(evaluations, stats):
+    """Moyenne de classe sur des évaluations, pondérée par leur coefficient (Decimal à 0,01 près)."""
+    num = Decimal('0')
+    den = Decimal('0')
+    for ev in evaluations:
+        s = stats.get(ev.id)
+        if not s or not s['effectif']:
+            continue
+        coef = Decimal(ev.coefficient or 1)
+        num += s['somme'] * coef
+        den += s['effectif'] * coef
+    return (num / den).quantize(Decimal('0.01')) if den > 0 else None
+
+
+def moyennes_classe_par_matiere(evals_by_matiere):
+    """{matiere_id: moyenne de classe} à partir de {matiere_id: [évaluations]} (deux requêtes au plus)."""
+    stats = statistiques_evaluations(ev.id for evals in evals_by_matiere.values() for ev in evals)
+    return {mat_id: moyenne_ponderee(evals, stats) for mat_id, evals in evals_by_matiere.items()}
+
+
+def serialiser(stats):
+    """Version JSON (graphiques): la somme exacte est retirée, les libellés d'histogramme ajoutés."""
+    donnees = {k: v for k, v in stats.items() if k != 'somme'}
+    donnees['classes_histogramme'] = [
+        f"{i * LARGEUR_CLASSE}-{(i + 1) * LARGEUR_CLASSE}" for i in range(NB_CLASSES)
+    ]
+    return donnees
@@ -0,0 +1,96 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from eleves.models import Classe, Ecole, Eleve, Responsable
+from notes import statistiques
+from notes.models import Evaluation, MatiereClasse, Note
+
+
+class StatistiquesEvaluationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ecole = Ecole.objects.create(nom="Ecole A", adresse="A", telephone="+224620000001", directeur="D")
+        self.classe = Classe.objects.create(nom="C1", ecole=self.ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        resp = Responsable.objects.create(prenom="P", nom="R", relation="PERE", telephone="+224620000011", adresse="A")
+        self.matiere = MatiereClasse.objects.create(ecole=self.ecole, classe=self.classe, nom="Maths", coefficient=2)
+        self.devoir = self._evaluation("Devoir 1", 1)
+        self.compo = self._evaluation("Composition", 2)
+        self.vide = self._evaluation("Vide", 1)
+        self.eleves = [
+            Eleve.objects.create(
+                nom="Nom", prenom=f"E{i}", matricule=f"E-{i}", classe=self.classe, sexe='M',
+                date_naissance=date(2015, 1, 1), lieu_naissance="Conakry",
+                date_inscription=date(2024, 9, 1), responsable_principal=resp,
+            )
+            for i in range(4)
+        ]
+        for eleve, note in zip(self.eleves, ('8', '12.5', '15', '19.75')):
+            self._note(self.devoir, eleve, note)
+        for eleve, note in zip(self.eleves[:3], ('10', '4', '20')):
+            self._note(self.compo, eleve, note)
+
+    def _evaluation(self, titre, coefficient):
+        return Evaluation.objects.create(ecole=self.ecole, classe=self.classe, matiere=self.matiere,
+                                         titre=titre, trimestre='T1', coefficient=coefficient)
+
+    def _note(self, evaluation, eleve, valeur):
+        return Note.objects.create(ecole=self.ecole, classe=self.classe, matiere=self.matiere, evaluation=evaluation,
+                                   eleve=eleve, matricule=eleve.matricule, note=Decimal(valeur))
+
+    def test_statistiques_en_une_requete_puis_cache(self):
+        with self.assertNumQueries(2):  # versions + notes
+            stats = statistiques.statistiques_evaluations([self.devoir.id, self.compo.id, self.vide.id])
+        devoir = stats[self.devoir.id]
+        self.assertEqual(devoir['effectif'], 4)
+        self.assertEqual(devoir['moyenne'], 13.81)
+        self.assertEqual(devoir['mediane'], 13.75)
+        self.assertEqual((devoir['min'], devoir['max']), (8.0, 19.75))
+        self.assertEqual(devoir['ecart_type'], 4.25)
+        self.assertEqual(devoir['taux_reussite'], 75.0)
+        self.assertEqual(devoir['histogramme'], [0, 0, 0, 0, 1, 0, 1, 1, 0, 1])
+        self.assertEqual(stats[self.compo.id]['histogramme'][-1], 1)  # 20 dans la dernière classe
+        self.assertEqual(stats[self.vide.id]['effectif'], 0)
+        self.assertIsNone(stats[self.vide.id]['moyenne'])
+
+        with self.assertNumQueries(1):  # versions seulement
+            statistiques.statistiques_evaluations([self.devoir.id, self.compo.id, self.vide.id])
+
+    def test_invalidation_a_la_modification_des_notes(self):
+        statistiques.statistiques_evaluations([self.compo.id])
+        note = self._note(self.compo, self.eleves[3], '16')
+        self.assertEqual(statistiques.statistiques_evaluations([self.compo.id])[self.compo.id]['effectif'], 4)
+        note.delete()
+        self.assertEqual(statistiques.statistiques_evaluations([self.compo.id])[self.compo.id]['effectif'], 3)
+
+    def test_version_lue_en_base(self):
+        # Écritures sans Note.save()/delete() (autre worker, cascade, restauration): la version change quand même
+        statistiques.statistiques_evaluations([self.devoir.id])
+        Note.objects.filter(evaluation=self.devoir, eleve=self.eleves[0]).update(
+            note=Decimal('20'), date_modification=timezone.now(),
+        )
+        self.assertEqual(statistiques.statistiques_evaluations([self.devoir.id])[self.devoir.id]['min'], 12.5)
+        self.eleves[3].delete()
+        self.assertEqual(statistiques.statistiques_evaluations([self.devoir.id])[self.devoir.id]['effectif'], 3)
+
+    def test_moyenne_de_classe_identique_au_calcul_note_par_note(self):
+        # (8 + 12.5 + 15 + 19.75) * 1 + (10 + 4 + 20) * 2 = 123.25 sur 10: 12.325 arrondi comme avant (au pair)
+        moyennes = statistiques.moyennes_classe_par_matiere({self.matiere.id: [self.devoir, self.compo, self.vide]})
+        self.assertEqual(moyennes[self.matiere.id], Decimal('12.32'))
+
+    def test_vues_json_et_detail(self):
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('notes:statistiques_evaluation_json', args=[self.devoir.id]))
+        self.assertEqual(response.json()['moyenne'], 13.81)
+        self.assertNotIn('somme', response.json())
+        response = self.client.get(reverse('notes:statistiques_classe_json', args=[self.classe.id]), {'trimestre': 'T1'})
+        self.assertEqual([e['titre'] for e in response.json()['evaluations']], ['Devoir 1', 'Composition', 'Vide'])
+        response = self.client.get(reverse('notes:evaluation_detail', args=[self.devoir.id]))
+        self.assertContains(response, 'Médiane')
+        self.assertEqual(response.context['stats']['effectif'], 4)
@@ -17,6 +17,8 @@ urlpatterns = [
     path('classes/<int:classe_id>/matieres/<int:matiere_id>/evaluations/', views.evaluations_matiere, name='evaluations_matiere'),
     path('evaluations/<int:evaluation_id>/saisie/', views.saisie_notes, name='saisie_notes'),
     path('evaluations/<int:evaluation_id>/', views.evaluation_detail, name='evaluation_detail'),
+    path('evaluations/<int:evaluation_id>/statistiques/', views.statistiques_evaluation_json, name='statistiques_evaluation_json'),
+    path('classes/<int:classe_id>/statistiques/', views.statistiques_classe_json, name='statistiques_classe_json'),
     # Bulletin PDF
     path('classes/<int:classe_id>/eleves/<int:eleve_id>/bulletin/<str:trimestre>/', views.bulletin_pdf, name='bulletin_pdf'),
     path('classes/<int:classe_id>/bulletins/<str:trimestre>/', views.bulletins_classe_pdf, name='bulletins_classe_pdf'),
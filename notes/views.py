@@ -6,11 +6,14 @@ from django.urls import reverse
 from eleves.models import Classe
 from utilisateurs.utils import filter_by_user_school, user_school
 from ecole_moderne.security_decorators import admin_required, require_school_object
+from ecole_moderne.exports import Colonne, exporter
+from ecole_moderne.replica import lecture_replica
 from .forms import ClasseNotesForm, MatiereClasseForm, EvaluationForm, NotesBulkForm
+from . import statistiques
 from .models import MatiereClasse, Evaluation, Note
 from eleves.models import Eleve
 from decimal import Decimal
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 import os
 from datetime import datetime
 
@@ -30,7 +33,7 @@ LYCEE = {
 def _draw_school_header(c, ecole, *, y_start, margin, page_width):
     """Dessine un en-tête officiel (centré) avec logo, nom en MAJUSCULES, coordonnées et encadré.
     Retourne la nouvelle coordonnée y après dessin."""
-    from reportlab.lib import colors
+    from ecole_moderne.pdf import colors
     y = y_start
     # En-tête national
     center_x = page_width / 2
@@ -39,8 +42,7 @@ def _draw_school_header(c, ecole, *, y_start, margin, page_width):
     y -= 12
     c.setFont('Helvetica-Oblique', 10)
     # Dessiner la devise avec couleurs par mot: Travail (rouge), Justice (jaune), Solidarité (vert)
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.lib import colors
+    from ecole_moderne.pdf import pdfmetrics, colors
     parts = [
         ("Travail", colors.red),
         (" - ", colors.black),
@@ -102,7 +104,7 @@ def _draw_school_header(c, ecole, *, y_start, margin, page_width):
     directeur = getattr(ecole, 'directeur', None) or ''
 
     # Helper: wrap centered text within available width
-    from reportlab.pdfbase import pdfmetrics
+    from ecole_moderne.pdf import pdfmetrics
     def draw_wrapped_centered(text, y_pos, max_width, line_height=12):
         words = text.split()
         lines = []
@@ -380,10 +382,13 @@ def evaluations_matiere(request, classe_id, matiere_id):
     """Liste des évaluations d'une matière pour une classe, avec accès rapide à la saisie et à l'affichage des notes."""
     classe = get_object_or_404(filter_by_user_school(Classe.objects.all(), request.user, 'ecole'), pk=classe_id)
     matiere = get_object_or_404(MatiereClasse.objects.filter(classe=classe, ecole=classe.ecole), pk=matiere_id)
-    evaluations = (
+    evaluations = list(
         Evaluation.objects.filter(classe=classe, matiere=matiere)
         .order_by('-date', '-id')
     )
+    stats = statistiques.statistiques_evaluations(e.id for e in evaluations)
+    for e in evaluations:
+        e.stats = stats.get(e.id)
     return render(request, 'notes/evaluations_matiere.html', {
         'classe': classe,
         'matiere': matiere,
@@ -412,9 +417,51 @@ def evaluation_detail(request, evaluation_id):
             'note': getattr(n, 'note', None),
             'observation': getattr(n, 'observation', ''),
         })
+    stats = statistiques.statistiques_evaluations([evaluation.id])[evaluation.id]
     return render(request, 'notes/evaluation_detail.html', {
         'evaluation': evaluation,
         'rows': rows,
+        'stats': stats,
+        'histogramme': _histogramme(stats),
+    })
+
+
+def _histogramme(stats):
+    """Classes de l'histogramme avec la hauteur de barre en pixels (70 pour la plus haute)."""
+    maximum = max(stats['histogramme']) or 1
+    libelles = statistiques.serialiser(stats)['classes_histogramme']
+    return [
+        {'libelle': libelle, 'effectif': effectif, 'hauteur': round(70 * effectif / maximum)}
+        for libelle, effectif in zip(libelles, stats['histogramme'])
+    ]
+
+
+@admin_required
+def statistiques_evaluation_json(request, evaluation_id):
+    """Statistiques d'une évaluation au format JSON (graphiques)."""
+    evaluation = get_object_or_404(filter_by_user_school(Evaluation.objects.all(), request.user, 'ecole'), pk=evaluation_id)
+    stats = statistiques.statistiques_evaluations([evaluation.id])[evaluation.id]
+    return JsonResponse(statistiques.serialiser(stats))
+
+
+@admin_required
+def statistiques_classe_json(request, classe_id):
+    """Statistiques de toutes les évaluations d'une classe (filtre optionnel ?trimestre=T1), en une requête."""
+    classe = get_object_or_404(filter_by_user_school(Classe.objects.all(), request.user, 'ecole'), pk=classe_id)
+    evaluations = Evaluation.objects.filter(classe=classe).select_related('matiere').order_by('matiere__nom', 'date', 'id')
+    trimestre = (request.GET.get('trimestre') or '').strip()
+    if trimestre:
+        evaluations = evaluations.filter(trimestre=trimestre)
+    evaluations = list(evaluations)
+    stats = statistiques.statistiques_evaluations(e.id for e in evaluations)
+    return JsonResponse({
+        'classe_id': classe.id,
+        'trimestre': trimestre or None,
+        'evaluations': [
+            dict(statistiques.serialiser(stats[e.id]), titre=e.titre, matiere=e.matiere.nom,
+                 trimestre=e.trimestre, coefficient=e.coefficient)
+            for e in evaluations
+        ],
     })
 
 
@@ -476,19 +523,9 @@ def bulletin_pdf(request, classe_id: int, eleve_id: int, trimestre: str = "T1"):
         moyenne_generale = (somme_moyennes_coef / somme_coef_matieres).quantize(Decimal('0.01'))
 
     # Moyennes de classe par matière (pondérées par coeffs d'évaluations)
-    moyennes_classe_par_matiere: dict[int, Decimal | None] = {}
-    for mat in matieres:
-        evals = evals_by_matiere.get(mat.id, [])
-        total_num = Decimal('0'); total_den = Decimal('0')
-        for ev in evals:
-            # toutes les notes de l'évaluation pour la classe
-            for n in Note.objects.filter(evaluation=ev).only('note'):
-                if n.note is None:
-                    continue
-                cc = Decimal(ev.coefficient or 1)
-                total_num += Decimal(n.note) * cc
-                total_den += cc
-        moyennes_classe_par_matiere[mat.id] = (total_num / total_den).quantize(Decimal('0.01')) if total_den > 0 else None
+    moyennes_classe_par_matiere = statistiques.moyennes_classe_par_matiere(
+        {mat.id: evals_by_matiere.get(mat.id, []) for mat in matieres}
+    )
 
     # Classement (rang): calculer la moyenne générale de tous les élèves
     eleves_classe = Eleve.objects.filter(classe=classe).only('id')
@@ -543,10 +580,7 @@ def bulletin_pdf(request, classe_id: int, eleve_id: int, trimestre: str = "T1"):
 
     # Génération PDF
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
+        from ecole_moderne.pdf import A4, canvas, colors, cm
     except Exception:
         return HttpResponse("ReportLab requis (pip install reportlab)", status=500)
 
@@ -672,10 +706,7 @@ def bulletins_classe_pdf(request, classe_id: int, trimestre: str = "T1"):
 
     # Init PDF
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
+        from ecole_moderne.pdf import A4, canvas, colors, cm
     except Exception:
         return HttpResponse("ReportLab requis (pip install reportlab)", status=500)
 
@@ -687,18 +718,9 @@ def bulletins_classe_pdf(request, classe_id: int, trimestre: str = "T1"):
     width, height = A4
 
     # Pré-calcul des moyennes de classe par matière
-    moyennes_classe_par_matiere: dict[int, Decimal | None] = {}
-    for mat in matieres:
-        evals = evals_by_matiere.get(mat.id, [])
-        total_num = Decimal('0'); total_den = Decimal('0')
-        for ev in evals:
-            for n in Note.objects.filter(evaluation=ev).only('note'):
-                if n.note is None:
-                    continue
-                cc = Decimal(ev.coefficient or 1)
-                total_num += Decimal(n.note) * cc
-                total_den += cc
-        moyennes_classe_par_matiere[mat.id] = (total_num / total_den).quantize(Decimal('0.01')) if total_den > 0 else None
+    moyennes_classe_par_matiere = statistiques.moyennes_classe_par_matiere(
+        {mat.id: evals_by_matiere.get(mat.id, []) for mat in matieres}
+    )
 
     # Pré-calcul des moyennes générales par élève (pour classement/rang)
     moyenne_generale_map: dict[int, Decimal] = {}
@@ -862,6 +884,7 @@ def bulletins_classe_pdf(request, classe_id: int, trimestre: str = "T1"):
 
 
 @admin_required
+@lecture_replica
 def export_notes_excel(request, classe_id: int, matiere_id: int, trimestre: str = "T1"):
     """Export Excel des notes d'une classe pour une matière et un trimestre.
     Colonnes: Matricule, Élève, [colonnes de chaque évaluation], Moyenne matière.
@@ -879,49 +902,32 @@ def export_notes_excel(request, classe_id: int, matiere_id: int, trimestre: str
     notes = Note.objects.filter(evaluation__in=evaluations, eleve__in=eleves)
     notes_map = {(n.eleve_id, n.evaluation_id): n for n in notes}
 
-    try:
-        import openpyxl
-        from openpyxl.utils import get_column_letter
-    except Exception:
-        return HttpResponse("openpyxl requis (pip install openpyxl)", status=500)
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"{matiere.nom} {trimestre}"
-
-    # En-tête
-    headers = ["Matricule", "Élève"] + [ev.titre or f"Eval {i+1}" for i, ev in enumerate(evaluations)] + ["Moyenne /20"]
-    ws.append(headers)
-
-    # Lignes
-    from decimal import Decimal as D
-    for e in eleves:
-        row = [e.matricule, f"{e.nom} {e.prenom}"]
-        num = D('0'); den = D('0')
-        for ev in evaluations:
-            n = notes_map.get((e.id, ev.id))
-            if n and n.note is not None:
-                row.append(float(n.note))
-                c = D(ev.coefficient or 1)
-                num += D(n.note) * c
-                den += c
-            else:
-                row.append(None)
-        moy = float((num/den)) if den > 0 else None
-        row.append(moy)
-        ws.append(row)
-
-    # Styles simples: largeur colonnes
-    for col in range(1, len(headers) + 1):
-        ws.column_dimensions[get_column_letter(col)].width = 18 if col <= 2 else 12
-
-    # Réponse
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    filename = f"notes_{classe.nom}_{matiere.nom}_{trimestre}.xlsx".replace(' ', '_')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
+    # Base de lecture figée ici: en CSV/NDJSON le générateur est consommé après le retour de la vue
+    eleves_lus = eleves.using(eleves.db)
 
+    def lignes():
+        for e in eleves_lus.iterator():
+            ligne = {'matricule': e.matricule, 'eleve': f"{e.nom} {e.prenom}"}
+            num = Decimal('0'); den = Decimal('0')
+            for ev in evaluations:
+                n = notes_map.get((e.id, ev.id))
+                ligne[ev.id] = n.note if n and n.note is not None else None
+                if ligne[ev.id] is not None:
+                    c = Decimal(ev.coefficient or 1)
+                    num += Decimal(n.note) * c
+                    den += c
+            ligne['moyenne'] = (num / den).quantize(Decimal('0.01')) if den > 0 else None
+            yield ligne
+
+    colonnes = (
+        [Colonne("Matricule", 'matricule', largeur=18), Colonne("Élève", 'eleve', largeur=18)]
+        + [Colonne(ev.titre or f"Eval {i+1}", (lambda ligne, cle=ev.id: ligne[cle]), largeur=12, format='decimal',
+                   cle=f"evaluation_{ev.id}")
+           for i, ev in enumerate(evaluations)]
+        + [Colonne("Moyenne /20", 'moyenne', largeur=12, format='decimal')]
+    )
+    filename = f"notes_{classe.nom}_{matiere.nom}_{trimestre}".replace(' ', '_')
+    return exporter(request, lignes(), colonnes, nom_fichier=filename, titre_feuille=f"{matiere.nom} {trimestre}")
 
 def _collect_evals_all_trimestres(classe, matieres):
     """Retourne un dict {matiere_id: [evaluations sur T1+T2+T3]} triées par date."""
@@ -963,18 +969,9 @@ def bulletin_annuel_pdf(request, classe_id: int, eleve_id: int):
     moyenne_generale = (somme_moyennes_coef / somme_coef_matieres).quantize(Decimal('0.01')) if somme_coef_matieres > 0 else None
 
     # Moyennes de classe par matière
-    moyennes_classe_par_matiere: dict[int, Decimal | None] = {}
-    for mat in matieres:
-        evals = evals_by_matiere.get(mat.id, [])
-        tnum = Decimal('0'); tden = Decimal('0')
-        for ev in evals:
-            for n in Note.objects.filter(evaluation=ev).only('note'):
-                if n.note is None:
-                    continue
-                cc = Decimal(ev.coefficient or 1)
-                tnum += Decimal(n.note) * cc
-                tden += cc
-        moyennes_classe_par_matiere[mat.id] = (tnum/tden).quantize(Decimal('0.01')) if tden > 0 else None
+    moyennes_classe_par_matiere = statistiques.moyennes_classe_par_matiere(
+        {mat.id: evals_by_matiere.get(mat.id, []) for mat in matieres}
+    )
 
     # Classement annuel
     eleves = filter_by_user_school(Eleve.objects.filter(classe=classe), request.user, 'classe__ecole')
@@ -1015,10 +1012,7 @@ def bulletin_annuel_pdf(request, classe_id: int, eleve_id: int):
 
     # PDF
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
+        from ecole_moderne.pdf import A4, canvas, colors, cm
     except Exception:
         return HttpResponse("ReportLab requis (pip install reportlab)", status=500)
 
@@ -1100,10 +1094,7 @@ def bulletins_annuels_classe_pdf(request, classe_id: int):
     evals_by_matiere = _collect_evals_all_trimestres(classe, matieres)
 
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
+        from ecole_moderne.pdf import A4, canvas, colors, cm
     except Exception:
         return HttpResponse("ReportLab requis (pip install reportlab)", status=500)
 
@@ -1114,18 +1105,9 @@ def bulletins_annuels_classe_pdf(request, classe_id: int):
     width, height = A4
 
     # Pré-calcul moyennes classe par matière
-    moyennes_classe_par_matiere: dict[int, Decimal | None] = {}
-    for mat in matieres:
-        evals = evals_by_matiere.get(mat.id, [])
-        tnum = Decimal('0'); tden = Decimal('0')
-        for ev in evals:
-            for n in Note.objects.filter(evaluation=ev).only('note'):
-                if n.note is None:
-                    continue
-                cc = Decimal(ev.coefficient or 1)
-                tnum += Decimal(n.note) * cc
-                tden += cc
-        moyennes_classe_par_matiere[mat.id] = (tnum/tden).quantize(Decimal('0.01')) if tden > 0 else None
+    moyennes_classe_par_matiere = statistiques.moyennes_classe_par_matiere(
+        {mat.id: evals_by_matiere.get(mat.id, []) for mat in matieres}
+    )
 
     # Classement annuel
     moyenne_generale_map: dict[int, Decimal] = {}
@@ -1306,6 +1288,7 @@ def classement_classe(request, classe_id: int, trimestre: str = "T1"):
 @admin_required
 def classement_classe_pdf(request, classe_id: int, trimestre: str = "T1"):
     """Export PDF du classement d'une classe."""
+    from ecole_moderne.pdf import A4, canvas, cm, colors
     classe = get_object_or_404(filter_by_user_school(Classe.objects.all(), request.user, 'ecole'), pk=classe_id)
     
     # Récupérer le classement (même logique que la vue HTML)
@@ -1437,10 +1420,6 @@ def classement_classe_pdf(request, classe_id: int, trimestre: str = "T1"):
 @admin_required
 def classement_classe_excel(request, classe_id: int, trimestre: str = "T1"):
     """Export Excel du classement d'une classe."""
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill
-    from django.http import HttpResponse
-    
     classe = get_object_or_404(filter_by_user_school(Classe.objects.all(), request.user, 'ecole'), pk=classe_id)
     
     # Récupérer le classement (même logique que les autres vues)
@@ -1488,54 +1467,18 @@ def classement_classe_excel(request, classe_id: int, trimestre: str = "T1"):
     # Trier par moyenne décroissante
     classement.sort(key=lambda x: x['moyenne'], reverse=True)
     
-    # Créer le fichier Excel
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"Classement {classe.nom} {trimestre}"
-    
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    center_alignment = Alignment(horizontal="center")
-    
-    # En-têtes
-    headers = ["Rang", "Nom", "Prénom", "Matricule", "Moyenne", "Mention"]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center_alignment
-    
-    # Données
-    for row, item in enumerate(classement, 2):
-        ws.cell(row=row, column=1, value=row-1)  # Rang
-        ws.cell(row=row, column=2, value=item['eleve'].nom)
-        ws.cell(row=row, column=3, value=item['eleve'].prenom)
-        ws.cell(row=row, column=4, value=item['eleve'].matricule or '-')
-        ws.cell(row=row, column=5, value=float(item['moyenne']))
-        ws.cell(row=row, column=6, value=item['mention'] or '-')
-    
-    # Ajuster la largeur des colonnes
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column].width = adjusted_width
-    
-    # Réponse HTTP
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="classement_{classe.nom}_{trimestre}.xlsx"'
-    
-    wb.save(response)
-    return response
+    colonnes = [
+        Colonne("Rang", 'rang', format='entier', largeur=8),
+        Colonne("Nom", 'eleve.nom', largeur=20),
+        Colonne("Prénom", 'eleve.prenom', largeur=20),
+        Colonne("Matricule", lambda item: item['eleve'].matricule or '-'),
+        Colonne("Moyenne", 'moyenne', format='decimal', largeur=10),
+        Colonne("Mention", lambda item: item['mention'] or '-'),
+    ]
+    for rang, item in enumerate(classement, 1):
+        item['rang'] = rang
+    return exporter(request, classement, colonnes, nom_fichier=f"classement_{classe.nom}_{trimestre}",
+                    titre_feuille=f"Classement {classe.nom} {trimestre}")
 
 
 @login_required
@@ -1577,10 +1520,7 @@ def cartes_scolaires_pdf(request, classe_id):
             return redirect('notes:tableau_bord')
     
     try:
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
+        from ecole_moderne.pdf import canvas, A4, colors, cm
         import io
     except ImportError:
         messages.error(request, "ReportLab requis pour générer le PDF")
@@ -1762,7 +1702,7 @@ def cartes_scolaires_pdf(request, classe_id):
         if eleve.photo and hasattr(eleve.photo, 'path'):
             try:
                 import os
-                from reportlab.lib.utils import ImageReader
+                from ecole_moderne.pdf import ImageReader
                 from PIL import Image
                 
                 # Vérifier que le fichier photo existe
@@ -1865,6 +1805,7 @@ def cartes_scolaires_pdf(request, classe_id):
 def carte_eleve_pdf(request, matricule):
     """Génère la carte scolaire d'un élève spécifique par son matricule"""
     from django.contrib import messages
+    from ecole_moderne.pdf import A4, canvas, cm, colors
     from eleves.models import Eleve
     
     # Récupérer l'élève par matricule
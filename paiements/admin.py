@@ -26,7 +26,7 @@ class PaiementAdmin(admin.ModelAdmin):
 
 @admin.register(RemiseReduction)
 class RemiseReductionAdmin(admin.ModelAdmin):
-    list_display = ("nom", "type_remise", "valeur", "motif", "actif")
+    list_display = ("nom", "type_remise", "valeur", "motif", "rang_fratrie", "actif")
     search_fields = ("nom",)
     list_filter = ("type_remise", "motif", "actif")
 
@@ -0,0 +1,249 @@
+"""Création et synchronisation des échéanciers de paiement.
+
+- Création: un échéancier est pré-rempli depuis la grille tarifaire de l'école,
+  trouvée dans un index mémoire `IndexGrilles` (une requête pour toutes les grilles).
+- Synchronisation: les mêmes règles d'allocation (inscription -> T1 -> T2 -> T3) et
+  de statut sont appliquées à un seul élève ou à une école entière: les montants
+  couverts (paiements VALIDÉS + remises appliquées) sont chargés par requêtes
+  groupées, les règles tournent en mémoire et seules les lignes modifiées sont
+  réécrites avec `bulk_update`.
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from ecole_moderne.archives import annee_scolaire_de
+from eleves.models import GrilleTarifaire
+from .models import EcheancierPaiement, Paiement, PaiementRemise
+
+# (champ dû, champ payé, champ date d'échéance) dans l'ordre d'allocation
+TRANCHES = (
+    ('frais_inscription_du', 'frais_inscription_paye', 'date_echeance_inscription'),
+    ('tranche_1_due', 'tranche_1_payee', 'date_echeance_tranche_1'),
+    ('tranche_2_due', 'tranche_2_payee', 'date_echeance_tranche_2'),
+    ('tranche_3_due', 'tranche_3_payee', 'date_echeance_tranche_3'),
+)
+
+CHAMPS_SYNCHRONISES = [paye for _, paye, _ in TRANCHES] + ['statut', 'date_modification']
+
+
+def annee_scolaire_par_defaut(today: date) -> str:
+    """Année scolaire en cours, la rentrée étant en septembre (ex: '2024-2025')."""
+    return annee_scolaire_de(today)
+
+
+class IndexGrilles:
+    """Index mémoire des grilles tarifaires par (ecole_id, niveau, annee_scolaire)."""
+
+    def __init__(self, grilles: Iterable[GrilleTarifaire]):
+        self.exactes = {}
+        self.recentes = {}
+        for grille in grilles:
+            self.exactes[(grille.ecole_id, grille.niveau, grille.annee_scolaire)] = grille
+            cle = (grille.ecole_id, grille.niveau)
+            actuelle = self.recentes.get(cle)
+            if actuelle is None or grille.annee_scolaire > actuelle.annee_scolaire:
+                self.recentes[cle] = grille
+
+    @classmethod
+    def charger(cls, ecole_ids=None, niveau=None) -> "IndexGrilles":
+        qs = GrilleTarifaire.objects.all()
+        if ecole_ids is not None:
+            qs = qs.filter(ecole_id__in=list(ecole_ids))
+        if niveau is not None:
+            qs = qs.filter(niveau=niveau)
+        return cls(qs)
+
+    def trouver(self, ecole_id, niveau, annee_classe=None, annee_defaut=None) -> Optional[GrilleTarifaire]:
+        """Grille de l'année de la classe, sinon de l'année par défaut, sinon la plus récente."""
+        if not ecole_id or not niveau:
+            return None
+        for annee in (annee_classe, annee_defaut):
+            if annee:
+                grille = self.exactes.get((ecole_id, niveau, annee))
+                if grille is not None:
+                    return grille
+        return self.recentes.get((ecole_id, niveau))
+
+
+def construire_echeancier(eleve, *, grilles: Optional[IndexGrilles] = None, created_by=None,
+                          today: Optional[date] = None) -> EcheancierPaiement:
+    """Construit (sans l'enregistrer) l'échéancier d'un élève à partir de sa grille tarifaire.
+
+    Dates d'échéance par défaut: inscription=today, T1=15/01, T2=15/03, T3=15/05.
+    Sans index fourni, les grilles de l'école et du niveau sont chargées en une requête.
+    """
+    today = today or date.today()
+    classe = getattr(eleve, 'classe', None)
+    niveau = getattr(classe, 'niveau', None)
+    ecole_id = getattr(classe, 'ecole_id', None)
+    annee_classe = getattr(classe, 'annee_scolaire', None)
+    annee_defaut = annee_scolaire_par_defaut(today)
+
+    if grilles is None and ecole_id and niveau:
+        grilles = IndexGrilles.charger(ecole_ids=[ecole_id], niveau=niveau)
+    grille = grilles.trouver(ecole_id, niveau, annee_classe, annee_defaut) if grilles else None
+
+    if grille:
+        annee_scol = grille.annee_scolaire
+        montants = (grille.frais_inscription or 0, grille.tranche_1 or 0, grille.tranche_2 or 0, grille.tranche_3 or 0)
+    else:
+        annee_scol = annee_classe or annee_defaut
+        montants = (0, 0, 0, 0)
+
+    try:
+        annee_fin = int(str(annee_scol).split('-')[0]) + 1
+    except (TypeError, ValueError):
+        annee_fin = int(annee_defaut.split('-')[1])
+
+    return EcheancierPaiement(
+        eleve=eleve,
+        annee_scolaire=annee_scol,
+        frais_inscription_du=montants[0],
+        tranche_1_due=montants[1],
+        tranche_2_due=montants[2],
+        tranche_3_due=montants[3],
+        date_echeance_inscription=today,
+        date_echeance_tranche_1=date(annee_fin, 1, 15),
+        date_echeance_tranche_2=date(annee_fin, 3, 15),
+        date_echeance_tranche_3=date(annee_fin, 5, 15),
+        cree_par=created_by if created_by and getattr(created_by, 'is_authenticated', False) else None,
+    )
+
+
+def couvertures_par_eleve(**filtre_eleve) -> Dict[int, int]:
+    """Retourne {eleve_id: paiements validés + remises} pour les élèves filtrés.
+
+    `filtre_eleve` s'exprime sur le modèle Eleve (ex: classe__ecole=ecole, id__in=[...]).
+    Deux requêtes groupées, quel que soit le nombre d'élèves.
+    """
+    couvertures = defaultdict(int)
+    paiements = (
+        Paiement.objects
+        .filter(statut='VALIDE', **{f'eleve__{k}': v for k, v in filtre_eleve.items()})
+        .values('eleve_id')
+        .annotate(total=Sum('montant'))
+        .order_by()
+    )
+    for row in paiements:
+        couvertures[row['eleve_id']] += int(row['total'] or 0)
+    remises = (
+        PaiementRemise.objects
+        .filter(paiement__statut='VALIDE', **{f'paiement__eleve__{k}': v for k, v in filtre_eleve.items()})
+        .values('paiement__eleve_id')
+        .annotate(total=Sum('montant_remise'))
+        .order_by()
+    )
+    for row in remises:
+        couvertures[row['paiement__eleve_id']] += int(row['total'] or 0)
+    return couvertures
+
+
+def appliquer_regles(echeancier: EcheancierPaiement, couverture: int, today: date) -> bool:
+    """Met à jour en mémoire les montants payés et le statut d'un échéancier.
+
+    Règles conservatrices:
+    - l'incrément (couverture - déjà payé) est réparti inscription -> T1 -> T2 -> T3
+      sans jamais réduire l'existant;
+    - PAYE_COMPLET si la couverture atteint le total dû (montants payés alignés sur les dus),
+      EN_RETARD si l'exigible à date n'est pas couvert, sinon A_PAYER / PAYE_PARTIEL.
+
+    Retourne True si l'échéancier a été modifié.
+    """
+    couverture = max(0, int(couverture or 0))
+    dus = [int(getattr(echeancier, du) or 0) for du, _, _ in TRANCHES]
+    payes = [int(getattr(echeancier, paye) or 0) for _, paye, _ in TRANCHES]
+    total_du = sum(dus)
+
+    # Exigible: sommes dont la date d'échéance est passée ou aujourd'hui
+    exigible = 0
+    for (_, _, date_champ), du in zip(TRANCHES, dus):
+        echeance = getattr(echeancier, date_champ)
+        if echeance and echeance <= today:
+            exigible += du
+
+    changed = False
+    remaining = max(0, couverture - max(0, sum(payes)))
+    if remaining > 0:
+        for (_, paye_champ, _), du, paye in zip(TRANCHES, dus, payes):
+            take = min(max(0, du - paye), remaining)
+            if take:
+                setattr(echeancier, paye_champ, paye + take)
+                remaining -= take
+                changed = True
+
+    paye_effectif = min(couverture, total_du)
+    if total_du <= 0 or paye_effectif >= total_du:
+        new_statut = 'PAYE_COMPLET'
+    elif exigible > 0 and paye_effectif < exigible:
+        new_statut = 'EN_RETARD'
+    elif paye_effectif <= 0:
+        new_statut = 'A_PAYER'
+    else:
+        new_statut = 'PAYE_PARTIEL'
+
+    if echeancier.statut != new_statut:
+        echeancier.statut = new_statut
+        changed = True
+    if new_statut == 'PAYE_COMPLET':
+        # Aligner les montants payés pour refléter le soldé complet
+        for du_champ, paye_champ, _ in TRANCHES:
+            if getattr(echeancier, paye_champ) != getattr(echeancier, du_champ):
+                setattr(echeancier, paye_champ, getattr(echeancier, du_champ))
+                changed = True
+    return changed
+
+
+def _synchroniser(echeanciers: Iterable[EcheancierPaiement], couvertures: Dict[int, int],
+                  today: date, batch_size: int) -> int:
+    modifies = []
+    total = 0
+    now = timezone.now()
+    for ech in echeanciers:
+        if appliquer_regles(ech, couvertures.get(ech.eleve_id, 0), today):
+            # bulk_update ne déclenche pas auto_now
+            ech.date_modification = now
+            modifies.append(ech)
+        if len(modifies) >= batch_size:
+            EcheancierPaiement.objects.bulk_update(modifies, CHAMPS_SYNCHRONISES)
+            total += len(modifies)
+            modifies = []
+    if modifies:
+        EcheancierPaiement.objects.bulk_update(modifies, CHAMPS_SYNCHRONISES)
+        total += len(modifies)
+    return total
+
+
+def synchroniser_echeanciers(echeanciers: Iterable[EcheancierPaiement], *, today: Optional[date] = None,
+                             batch_size: int = 500) -> int:
+    """Synchronise une liste d'échéanciers déjà chargés (instances modifiées sur place).
+
+    Retourne le nombre d'échéanciers réécrits en base.
+    """
+    echeanciers = list(echeanciers)
+    if not echeanciers:
+        return 0
+    today = today or timezone.localdate()
+    eleve_ids = [e.eleve_id for e in echeanciers]
+    couvertures = {}
+    for i in range(0, len(eleve_ids), batch_size):
+        couvertures.update(couvertures_par_eleve(id__in=eleve_ids[i:i + batch_size]))
+    with transaction.atomic():
+        return _synchroniser(echeanciers, couvertures, today, batch_size)
+
+
+def synchroniser_echeanciers_ecole(ecole, *, today: Optional[date] = None, batch_size: int = 500) -> int:
+    """Synchronise tous les échéanciers d'une école (instance ou identifiant).
+
+    Une requête pour les échéanciers (lus par lots), deux requêtes groupées pour les
+    couvertures, puis des `bulk_update` limités aux lignes modifiées.
+    """
+    today = today or timezone.localdate()
+    couvertures = couvertures_par_eleve(classe__ecole=ecole)
+    qs = EcheancierPaiement.objects.filter(eleve__classe__ecole=ecole).order_by('id')
+    with transaction.atomic():
+        return _synchroniser(qs.iterator(chunk_size=batch_size), couvertures, today, batch_size)
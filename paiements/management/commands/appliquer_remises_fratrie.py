@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eleves.models import Ecole
+from paiements.remises import appliquer_fratrie_ecole
+
+
+def _gnf(montant):
+    return f"{montant:,} GNF".replace(',', ' ')
+
+
+class Command(BaseCommand):
+    help = "Détecte les fratries (responsable principal) et recalcule les remises FRATRIE des paiements en attente."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ecole-id', type=int, help="Limiter à une école")
+        parser.add_argument('--dry-run', action='store_true', help="Ne pas écrire en base, seulement simuler")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Taille des lots bulk_create (défaut 500)")
+
+    def handle(self, *args, **options):
+        dry_run = bool(options.get('dry_run'))
+        chunk_size = max(1, options.get('chunk_size') or 500)
+        ecoles = Ecole.objects.order_by('id')
+        if options.get('ecole_id'):
+            ecoles = ecoles.filter(id=options['ecole_id'])
+            if not ecoles.exists():
+                raise CommandError(f"École {options['ecole_id']} introuvable")
+
+        debut = time.monotonic()
+        paiements = montant = 0
+        for ecole in ecoles.only('id', 'nom'):
+            resultat = appliquer_fratrie_ecole(ecole, simuler=dry_run, batch_size=chunk_size)
+            paiements += resultat['paiements']
+            montant += resultat['montant']
+            rangs = '; '.join(f"rang {r}: {n}" for r, n in resultat['par_rang'].items()) or '-'
+            self.stdout.write(
+                f"{ecole.nom}: élèves éligibles={resultat['eleves_eligibles']}, "
+                f"paiements remisés={resultat['paiements']} ({rangs}), montant={_gnf(resultat['montant'])}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé en {time.monotonic() - debut:.1f}s. Paiements remisés={paiements}, "
+            f"montant total={_gnf(montant)}{' (simulation)' if dry_run else ''}."
+        ))
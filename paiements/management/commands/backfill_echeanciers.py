@@ -1,54 +1,197 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from django.utils import timezone
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
 
 from paiements.models import EcheancierPaiement
-from eleves.models import Eleve
+from paiements.echeanciers import IndexGrilles, construire_echeancier, synchroniser_echeanciers_ecole
+from eleves.models import Eleve, Ecole
+
+
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR, 'logs', 'backfill_echeanciers.checkpoint.json')
+
+
+def _chemin_checkpoint(path, ecole_id=None):
+    """Fichier de reprise: une exécution limitée à une école (--ecole-id) a le sien."""
+    if ecole_id is None:
+        return path
+    racine, extension = os.path.splitext(path)
+    return f"{racine}.ecole-{ecole_id}{extension}"
+
+
+def _lire_checkpoint(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return set(json.load(fh).get('ecoles_terminees', []))
+    except (OSError, ValueError):
+        return set()
+
+
+def _supprimer_checkpoint(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _ecrire_checkpoint(path, ecoles_terminees):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump({'ecoles_terminees': sorted(ecoles_terminees)}, fh)
+    os.replace(tmp, path)
+
+
+def backfill_ecole(ecole_id, *, chunk_size=1000, dry_run=False, limit=0, grilles=None):
+    """Crée les échéanciers manquants d'une école par lots puis synchronise leurs statuts.
 
-# Nous réutilisons la logique centralisée dans les vues pour garantir une cohérence unique
-from paiements.views import ensure_echeancier_for_eleve, _auto_validate_echeancier_for_eleve
+    Seuls les élèves sans échéancier sont lus: une exécution interrompue reprend
+    naturellement là où elle s'était arrêtée.
+    Retourne (lignes_ecrites, echeanciers_crees, echeanciers_synchronises); les élèves
+    ignorés (échéancier créé entre-temps par un autre processus) ne sont pas comptés.
+    """
+    if grilles is None:
+        grilles = IndexGrilles.charger(ecole_ids=[ecole_id])
+    qs = (
+        Eleve.objects.filter(classe__ecole_id=ecole_id, echeancier__isnull=True)
+        .select_related('classe')
+        .order_by('id')
+    )
+    created = 0
+    dernier_id = 0
+    while True:
+        taille = chunk_size if not limit else min(chunk_size, limit - created)
+        if taille <= 0:
+            break
+        lot = list(qs.filter(id__gt=dernier_id)[:taille])
+        if not lot:
+            break
+        dernier_id = lot[-1].id
+        echeanciers = [construire_echeancier(eleve, grilles=grilles) for eleve in lot]
+        if dry_run:
+            created += len(echeanciers)
+            continue
+        with transaction.atomic():
+            existants = EcheancierPaiement.objects.filter(eleve_id__in=[e.id for e in lot])
+            avant = existants.count()
+            EcheancierPaiement.objects.bulk_create(echeanciers, ignore_conflicts=True)
+            created += existants.count() - avant
+
+    updated = 0
+    if not dry_run:
+        updated = synchroniser_echeanciers_ecole(ecole_id, batch_size=chunk_size)
+    return created + updated, created, updated
+
+
+def _init_worker():
+    # Chaque processus ouvre ses propres connexions (ne pas réutiliser celles héritées du parent)
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _backfill_ecole_worker(ecole_id, chunk_size, dry_run):
+    try:
+        return ecole_id, backfill_ecole(ecole_id, chunk_size=chunk_size, dry_run=dry_run), None
+    except Exception as ex:
+        return ecole_id, (0, 0, 0), str(ex)
+    finally:
+        connections.close_all()
 
 
 class Command(BaseCommand):
     help = "Crée les échéanciers manquants pour tous les élèves et synchronise le statut (incl. EN_RETARD)."
 
     def add_arguments(self, parser):
-        parser.add_argument('--limit', type=int, default=0, help='Limiter le nombre d\'élèves traités (0 = tous)')
+        parser.add_argument('--limit', type=int, default=0, help='Limiter le nombre d\'échéanciers créés (0 = tous)')
         parser.add_argument('--dry-run', action='store_true', help="Ne pas écrire en base, seulement simuler")
+        parser.add_argument('--ecole-id', type=int, help="Limiter à une école")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Taille des lots bulk_create/bulk_update (défaut 1000)")
+        parser.add_argument('--workers', type=int, default=1, help="Nombre de processus, un lot = une école (défaut 1)")
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                            help="Fichier de reprise d'une exécution interrompue (supprimé à la fin d'une exécution "
+                                 "complète; suffixé .ecole-<id> avec --ecole-id)")
+        parser.add_argument('--reset', action='store_true', help="Ignorer le fichier de reprise et tout retraiter")
 
     def handle(self, *args, **options):
         limit = options.get('limit') or 0
         dry_run = bool(options.get('dry_run'))
+        chunk_size = max(1, options.get('chunk_size') or 1000)
+        workers = max(1, options.get('workers') or 1)
+        checkpoint = _chemin_checkpoint(options.get('checkpoint'), options.get('ecole_id'))
+        if limit and workers > 1:
+            raise CommandError("--limit n'est pas compatible avec --workers > 1")
+
+        ecoles = Ecole.objects.order_by('id')
+        if options.get('ecole_id'):
+            ecoles = ecoles.filter(id=options['ecole_id'])
+        ecole_ids = list(ecoles.values_list('id', flat=True))
+
+        terminees = set() if options.get('reset') or dry_run else _lire_checkpoint(checkpoint)
+        a_traiter = [eid for eid in ecole_ids if eid not in terminees]
+
+        self.stdout.write(self.style.NOTICE(
+            f"Écoles à traiter: {len(a_traiter)} (déjà terminées: {len(ecole_ids) - len(a_traiter)}). "
+            f"Workers={workers}, lots={chunk_size}, dry-run={dry_run}"
+        ))
+
+        debut = time.monotonic()
+        processed = created = updated = 0
+
+        def _terminer(ecole_id, resultat, complet=True):
+            nonlocal processed, created, updated
+            p, c, u = resultat
+            processed += p
+            created += c
+            updated += u
+            if complet and not dry_run:
+                terminees.add(ecole_id)
+                _ecrire_checkpoint(checkpoint, terminees)
+            ecoule = max(time.monotonic() - debut, 1e-6)
+            self.stdout.write(
+                f"École {ecole_id}: lignes écrites={p}, créés={c}, synchronisés={u} "
+                f"({processed / ecoule:.0f} lignes/s cumulées)"
+            )
+
+        if workers == 1:
+            # Une seule requête pour toutes les grilles tarifaires
+            grilles = IndexGrilles.charger(ecole_ids=a_traiter)
+            restant = limit
+            for ecole_id in a_traiter:
+                try:
+                    resultat = backfill_ecole(
+                        ecole_id, chunk_size=chunk_size, dry_run=dry_run, limit=restant, grilles=grilles,
+                    )
+                except Exception as ex:
+                    self.stderr.write(self.style.ERROR(f"Erreur pour l'école {ecole_id}: {ex}"))
+                    continue
+                # Une école interrompue par --limit n'est pas marquée comme terminée
+                _terminer(ecole_id, resultat, complet=not limit or resultat[1] < restant)
+                if limit:
+                    restant -= resultat[1]
+                    if restant <= 0:
+                        break
+        else:
+            # Les processus enfants ouvrent leurs propres connexions
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(_backfill_ecole_worker, eid, chunk_size, dry_run) for eid in a_traiter]
+                for future in as_completed(futures):
+                    ecole_id, resultat, erreur = future.result()
+                    if erreur:
+                        self.stderr.write(self.style.ERROR(f"Erreur pour l'école {ecole_id}: {erreur}"))
+                        continue
+                    _terminer(ecole_id, resultat)
 
-        qs = Eleve.objects.select_related('classe', 'classe__ecole').all().order_by('id')
-        total = qs.count()
-        if limit > 0:
-            qs = qs[:limit]
-        processed = 0
-        created = 0
-        updated = 0
-
-        self.stdout.write(self.style.NOTICE(f"Traitement de {qs.count()} élèves (sur {total}). Dry-run={dry_run}"))
-
-        for eleve in qs:
-            try:
-                with transaction.atomic():
-                    ech = getattr(eleve, 'echeancier', None)
-                    if ech is None:
-                        if dry_run:
-                            created += 1
-                        else:
-                            ech = ensure_echeancier_for_eleve(eleve)
-                            created += 1
-                    # Synchroniser statut (PAYE_COMPLET / PAYE_PARTIEL / A_PAYER / EN_RETARD)
-                    if not dry_run:
-                        _auto_validate_echeancier_for_eleve(eleve)
-                        updated += 1
-                processed += 1
-            except Exception as ex:
-                self.stderr.write(self.style.ERROR(f"Erreur pour élève {getattr(eleve, 'matricule', eleve.id)}: {ex}"))
-                continue
+        # Exécution complète: la prochaine repart de toutes les écoles (élèves inscrits depuis)
+        if not dry_run and terminees.issuperset(a_traiter):
+            _supprimer_checkpoint(checkpoint)
 
+        duree = max(time.monotonic() - debut, 1e-6)
         self.stdout.write(self.style.SUCCESS(
-            f"Terminé. Élèves traités={processed}, échéanciers créés={created}, statuts synchronisés={updated}."
+            f"Terminé en {duree:.1f}s. Lignes écrites={processed}, échéanciers créés={created}, "
+            f"statuts synchronisés={updated}, débit={processed / duree:.0f} lignes/s."
         ))
@@ -26,6 +26,7 @@ class Command(BaseCommand):
                 'type_remise': 'POURCENTAGE',
                 'valeur': Decimal('10.00'),
                 'motif': 'FRATRIE',
+                'rang_fratrie': 2,
                 'description': 'Réduction de 10% pour le deuxième enfant de la même famille',
                 'date_debut': debut_annee,
                 'date_fin': fin_annee,
@@ -36,6 +37,7 @@ class Command(BaseCommand):
                 'type_remise': 'POURCENTAGE',
                 'valeur': Decimal('15.00'),
                 'motif': 'FRATRIE',
+                'rang_fratrie': 3,
                 'description': 'Réduction de 15% à partir du troisième enfant de la même famille',
                 'date_debut': debut_annee,
                 'date_fin': fin_annee,
@@ -0,0 +1,68 @@
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from eleves.importation import ErreurImport
+from eleves.models import Ecole
+from paiements.models import ModePaiement, TypePaiement
+from paiements.rapprochement import EXCEPTIONS, appliquer, lire_releve, rapprocher
+
+
+class Command(BaseCommand):
+    help = "Rapproche un relevé Mobile Money / bancaire (.xlsx ou .csv) avec les paiements et valide ceux trouvés."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Relevé avec les colonnes reference, montant, date (matricule facultatif)")
+        parser.add_argument('--ecole-id', type=int, help="Limiter aux paiements d'une école")
+        parser.add_argument('--fenetre', type=int, default=3, help="Écart toléré en jours entre relevé et paiement (défaut 3)")
+        parser.add_argument('--creer', action='store_true', help="Créer les paiements manquants des lignes avec matricule")
+        parser.add_argument('--type-paiement', help="Type des paiements créés (nom exact)")
+        parser.add_argument('--mode-paiement', help="Mode des paiements créés (nom exact, ex: Orange Money)")
+        parser.add_argument('--utilisateur', help="Nom d'utilisateur enregistré comme validateur")
+        parser.add_argument('--exceptions', help="Fichier CSV où écrire les lignes non rapprochées")
+        parser.add_argument('--dry-run', action='store_true', help="Ne rien écrire en base")
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options['fichier']):
+            raise CommandError(f"Fichier introuvable: {options['fichier']}")
+        ecole = None
+        if options.get('ecole_id'):
+            ecole = Ecole.objects.filter(pk=options['ecole_id']).first()
+            if ecole is None:
+                raise CommandError(f"École introuvable: {options['ecole_id']}")
+        type_paiement = mode_paiement = utilisateur = None
+        if options.get('creer'):
+            type_paiement = TypePaiement.objects.filter(nom=options.get('type_paiement') or '').first()
+            mode_paiement = ModePaiement.objects.filter(nom=options.get('mode_paiement') or '').first()
+            if type_paiement is None or mode_paiement is None:
+                raise CommandError("--creer exige --type-paiement et --mode-paiement existants.")
+        if options.get('utilisateur'):
+            utilisateur = User.objects.filter(username=options['utilisateur']).first()
+            if utilisateur is None:
+                raise CommandError(f"Utilisateur introuvable: {options['utilisateur']}")
+
+        debut = time.monotonic()
+        try:
+            lignes = lire_releve(options['fichier'])
+        except ErreurImport as ex:
+            raise CommandError(str(ex))
+        resultat = rapprocher(lignes, ecole=ecole, fenetre_jours=options['fenetre'], creer_manquants=options.get('creer'))
+        if not options.get('dry_run'):
+            appliquer(resultat, utilisateur=utilisateur, type_paiement=type_paiement, mode_paiement=mode_paiement)
+
+        compteurs = resultat.compteurs
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(lignes)} lignes rapprochées en {time.monotonic() - debut:.1f}s"
+            f"{' (simulation)' if options.get('dry_run') else ''}: "
+            f"à valider {compteurs['A_VALIDER']}, déjà validés {compteurs['DEJA_VALIDE']}, "
+            f"à créer {compteurs['A_CREER']}, exceptions {len(resultat.exceptions)}"
+        ))
+        for code, libelle in EXCEPTIONS.items():
+            if compteurs[code]:
+                self.stdout.write(f"  {libelle}: {compteurs[code]}")
+        if options.get('exceptions'):
+            with open(options['exceptions'], 'w', encoding='utf-8', newline='') as fh:
+                resultat.ecrire_exceptions(fh)
+            self.stdout.write(f"Exceptions: {options['exceptions']}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from paiements.messagerie import traiter_en_attente
+
+
+class Command(BaseCommand):
+    help = "Traite les messages WhatsApp/SMS entrants restés en attente (ex: après un redémarrage)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=500, help="Nombre maximum de messages traités (défaut 500)")
+
+    def handle(self, *args, **options):
+        traites = traiter_en_attente(limite=max(1, options['limite']))
+        self.stdout.write(self.style.SUCCESS(f"Messages traités: {traites}"))
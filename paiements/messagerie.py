@@ -0,0 +1,153 @@
+"""Traitement des messages entrants WhatsApp / SMS.
+
+Le webhook `twilio_inbound` enregistre le message puis le confie à une file en
+mémoire servie par un thread unique: la réponse HTTP part immédiatement, loin du
+délai de 15 s imposé par Twilio. Le thread:
+- reconnaît l'expéditeur par une recherche indexée sur `Responsable.telephone_e164`;
+- interprète la commande (SOLDE [matricule], AIDE);
+- calcule la réponse à partir des échéanciers (montants déjà synchronisés, aucun
+  recalcul des paiements);
+- envoie la réponse par Twilio et marque le message comme traité.
+
+Les messages restés non traités (redémarrage du serveur) sont repris par la
+commande `traiter_messages_entrants`.
+"""
+import logging
+import queue
+import threading
+
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from eleves.models import Eleve, Responsable, normaliser_telephone_e164
+from .models import EcheancierPaiement, TwilioInboundMessage
+from .twilio_utils import send_message
+
+logger = logging.getLogger(__name__)
+
+TEXTE_AIDE = (
+    "Commandes disponibles:\n"
+    "SOLDE - solde de tous vos enfants\n"
+    "SOLDE <matricule> - solde d'un élève"
+)
+
+
+def _montant(valeur) -> str:
+    return f"{int(valeur or 0):,}".replace(",", " ") + " GNF"
+
+
+def analyser_commande(texte):
+    """('SOLDE', 'PN3-012') pour 'solde pn3-012'; ('', '') pour un message vide."""
+    mots = (texte or '').strip().split()
+    if not mots:
+        return '', ''
+    return mots[0].upper(), ' '.join(mots[1:]).upper()
+
+
+def responsables_par_numero(numero):
+    """Identifiants des responsables enregistrés avec ce numéro (recherche indexée)."""
+    e164 = normaliser_telephone_e164(numero)
+    if not e164:
+        return []
+    return list(Responsable.objects.filter(telephone_e164=e164).order_by('id').values_list('id', flat=True))
+
+
+def reponse_solde(responsable_ids, matricule=''):
+    """Solde des enfants des responsables (ou du seul élève `matricule` s'il en fait partie)."""
+    eleves = Eleve.objects.filter(
+        Q(responsable_principal_id__in=responsable_ids) | Q(responsable_secondaire_id__in=responsable_ids)
+    )
+    if matricule:
+        eleves = eleves.filter(matricule__iexact=matricule)
+    echeanciers = {
+        e.eleve_id: e for e in EcheancierPaiement.objects.filter(eleve__in=eleves)
+    }
+    lignes = []
+    for eleve in eleves.order_by('prenom'):
+        echeancier = echeanciers.get(eleve.id)
+        if echeancier is None:
+            lignes.append(f"{eleve.prenom} {eleve.nom} ({eleve.matricule}): échéancier non disponible")
+        else:
+            lignes.append(
+                f"{eleve.prenom} {eleve.nom} ({eleve.matricule}): payé {_montant(echeancier.total_paye)}, "
+                f"reste {_montant(echeancier.solde_restant)}"
+            )
+    if not lignes:
+        if matricule:
+            return f"Aucun élève {matricule} n'est rattaché à ce numéro."
+        return "Aucun élève n'est rattaché à ce numéro."
+    return "Solde de scolarité\n" + "\n".join(lignes)
+
+
+def traiter_message(message):
+    """Traite un message entrant une seule fois et retourne la réponse envoyée, ou None."""
+    # Réservation atomique: ni la file ni la commande de reprise ne répondent deux fois
+    maintenant = timezone.now()
+    if not TwilioInboundMessage.objects.filter(pk=message.pk, traite_le__isnull=True).update(traite_le=maintenant):
+        return None
+    commande, argument = analyser_commande(message.body)
+    responsable_ids = responsables_par_numero(message.from_number)
+
+    # Numéro inconnu: pas de réponse (ni coût, ni fuite d'information)
+    reponse = None
+    if responsable_ids:
+        reponse = reponse_solde(responsable_ids, argument) if commande == 'SOLDE' else TEXTE_AIDE
+
+    if reponse:
+        canal = 'whatsapp' if message.channel == 'WHATSAPP' else 'sms'
+        ok, detail = send_message(normaliser_telephone_e164(message.from_number), reponse, channel=canal)
+        if not ok:
+            niveau = logging.INFO if detail == 'TWILIO_DISABLED' else logging.WARNING
+            logger.log(niveau, "Réponse au message %s non envoyée: %s", message.pk, detail)
+
+    message.responsable_id = responsable_ids[0] if responsable_ids else None
+    message.commande = commande[:20]
+    message.reponse = reponse
+    message.traite_le = maintenant
+    message.save(update_fields=['responsable', 'commande', 'reponse'])
+    return reponse
+
+
+def traiter_en_attente(limite=500):
+    """Traite les messages non encore traités (du plus ancien au plus récent)."""
+    traites = 0
+    for message in TwilioInboundMessage.objects.filter(traite_le__isnull=True).order_by('received_at')[:limite]:
+        try:
+            traiter_message(message)
+            traites += 1
+        except Exception:
+            logger.exception("Échec du traitement du message entrant %s", message.pk)
+    return traites
+
+
+# ----- File de traitement en arrière-plan -----
+
+_file = queue.Queue()
+_verrou = threading.Lock()
+_thread = None
+
+
+def _boucle():
+    while True:
+        message_id = _file.get()
+        try:
+            close_old_connections()
+            message = TwilioInboundMessage.objects.filter(pk=message_id).first()
+            if message is not None:
+                traiter_message(message)
+        except Exception:
+            logger.exception("Échec du traitement du message entrant %s", message_id)
+        finally:
+            close_old_connections()
+            _file.task_done()
+
+
+def planifier_traitement(message_id):
+    """Ajoute un message à la file de traitement (démarre le thread au premier appel)."""
+    global _thread
+    with _verrou:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_boucle, name='messagerie-entrante', daemon=True)
+            _thread.start()
+    _file.put(message_id)
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eleves', '0001_initial'),
+        ('paiements', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paiement',
+            index=models.Index(fields=['reference_externe'], name='paiements_p_referen_d444c0_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eleves', '0002_responsable_telephone_e164'),
+        ('paiements', '0002_paiement_reference_externe_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='twilioinboundmessage',
+            name='commande',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='twilioinboundmessage',
+            name='reponse',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='twilioinboundmessage',
+            name='responsable',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='messages_entrants', to='eleves.responsable'),
+        ),
+        migrations.AddField(
+            model_name='twilioinboundmessage',
+            name='traite_le',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
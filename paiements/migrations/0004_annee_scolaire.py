@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:53
+
+from django.db import migrations, models
+
+from ecole_moderne.archives import etiqueter_par_dates
+
+
+def etiqueter(apps, schema_editor):
+    etiqueter_par_dates(apps.get_model('paiements', 'Paiement').objects.all(), 'date_paiement')
+    etiqueter_par_dates(apps.get_model('paiements', 'Relance').objects.all(), 'date_creation')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paiements', '0003_twiliomessage_traitement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paiement',
+            name='annee_scolaire',
+            field=models.CharField(blank=True, db_index=True, max_length=9, null=True, verbose_name='Année scolaire'),
+        ),
+        migrations.AddField(
+            model_name='relance',
+            name='annee_scolaire',
+            field=models.CharField(blank=True, db_index=True, max_length=9, null=True, verbose_name='Année scolaire'),
+        ),
+        migrations.AlterField(
+            model_name='echeancierpaiement',
+            name='annee_scolaire',
+            field=models.CharField(db_index=True, max_length=9, verbose_name='Année scolaire'),
+        ),
+        migrations.RunPython(etiqueter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:20
+
+import re
+
+from django.db import migrations, models
+
+
+def rang_depuis_nom(nom):
+    """'Réduction fratrie - 3ème enfant et plus' -> 3 (copie figée de paiements.remises.rang_depuis_nom)."""
+    m = re.search(r'(\d+)\s*(?:e|è|ème|eme)\b', str(nom or ''), re.IGNORECASE)
+    return int(m.group(1)) if m else None
+
+
+def renseigner_rangs(apps, schema_editor):
+    RemiseReduction = apps.get_model('paiements', 'RemiseReduction')
+    for remise in RemiseReduction.objects.filter(motif='FRATRIE', rang_fratrie__isnull=True):
+        rang = rang_depuis_nom(remise.nom)
+        if rang and rang >= 2:
+            RemiseReduction.objects.filter(pk=remise.pk).update(rang_fratrie=rang)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paiements', '0004_annee_scolaire'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remisereduction',
+            name='rang_fratrie',
+            field=models.PositiveSmallIntegerField(blank=True, help_text="Motif fratrie: s'applique à partir de cet enfant (2 = deuxième enfant, par défaut)", null=True, verbose_name='Rang fratrie minimal'),
+        ),
+        migrations.RunPython(renseigner_rangs, migrations.RunPython.noop),
+    ]
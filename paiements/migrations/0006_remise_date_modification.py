@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paiements', '0005_remise_rang_fratrie'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remisereduction',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
 from eleves.models import Eleve
+from ecole_moderne.archives import annee_scolaire_de
 
 class TypePaiement(models.Model):
     """Modèle pour les types de paiements"""
@@ -55,6 +57,8 @@ class Paiement(models.Model):
     )
     date_paiement = models.DateField(verbose_name="Date de paiement", db_index=True)
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='EN_ATTENTE', verbose_name="Statut", db_index=True)
+    # Année scolaire de la date de paiement (archivage, voir ecole_moderne/archives.py)
+    annee_scolaire = models.CharField(max_length=9, blank=True, null=True, db_index=True, verbose_name="Année scolaire")
     
     # Informations complémentaires
     reference_externe = models.CharField(
@@ -85,6 +89,7 @@ class Paiement(models.Model):
             models.Index(fields=['eleve', 'date_paiement']),
             models.Index(fields=['eleve', 'statut']),
             models.Index(fields=['statut', 'date_paiement']),
+            models.Index(fields=['reference_externe']),
         ]
     
     def __str__(self):
@@ -92,6 +97,8 @@ class Paiement(models.Model):
     
     def save(self, *args, **kwargs):
         """Génère automatiquement un numéro de reçu si non défini"""
+        if not self.annee_scolaire and hasattr(self.date_paiement, 'month'):
+            self.annee_scolaire = annee_scolaire_de(self.date_paiement)
         if not self.numero_recu:
             from django.utils import timezone
             from django.db import transaction, IntegrityError
@@ -142,7 +149,7 @@ class EcheancierPaiement(models.Model):
     ]
     
     eleve = models.OneToOneField(Eleve, on_delete=models.CASCADE, related_name='echeancier')
-    annee_scolaire = models.CharField(max_length=9, verbose_name="Année scolaire")
+    annee_scolaire = models.CharField(max_length=9, db_index=True, verbose_name="Année scolaire")
     
     # Montants dus
     frais_inscription_du = models.DecimalField(
@@ -247,9 +254,15 @@ class RemiseReduction(models.Model):
     date_debut = models.DateField(verbose_name="Date de début")
     date_fin = models.DateField(verbose_name="Date de fin")
     actif = models.BooleanField(default=True, verbose_name="Actif")
+    rang_fratrie = models.PositiveSmallIntegerField(
+        blank=True, null=True,
+        verbose_name="Rang fratrie minimal",
+        help_text="Motif fratrie: s'applique à partir de cet enfant (2 = deuxième enfant, par défaut)"
+    )
     
     # Métadonnées
     date_creation = models.DateTimeField(auto_now_add=True)
+    date_modification = models.DateTimeField(auto_now=True)
     cree_par = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     
     class Meta:
@@ -261,6 +274,20 @@ class RemiseReduction(models.Model):
             return f"{self.nom} - {self.valeur}%"
         else:
             return f"{self.nom} - {self.valeur:,.0f} GNF"
+
+    def save(self, *args, **kwargs):
+        from .remises import invalider_remises
+
+        super().save(*args, **kwargs)
+        # Index mémoire des règles actives (aperçus et moteur fratrie)
+        invalider_remises()
+
+    def delete(self, *args, **kwargs):
+        from .remises import invalider_remises
+
+        resultat = super().delete(*args, **kwargs)
+        invalider_remises()
+        return resultat
     
     def calculer_remise(self, montant_base):
         """Calcule le montant de la remise sur un montant de base"""
@@ -312,6 +339,7 @@ class Relance(models.Model):
     date_creation = models.DateTimeField(auto_now_add=True)
     cree_par = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='relances_creees')
     date_envoi = models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi")
+    annee_scolaire = models.CharField(max_length=9, blank=True, null=True, db_index=True, verbose_name="Année scolaire")
 
     class Meta:
         verbose_name = "Relance"
@@ -322,6 +350,11 @@ class Relance(models.Model):
             models.Index(fields=['-date_creation']),
         ]
 
+    def save(self, *args, **kwargs):
+        if not self.annee_scolaire:
+            self.annee_scolaire = annee_scolaire_de(self.date_creation or timezone.now())
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Relance {self.eleve.nom_complet} - {self.canal} - {self.statut}"
 
@@ -355,6 +388,15 @@ class TwilioInboundMessage(models.Model):
     # Horodatage
     received_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    # Traitement (voir paiements.messagerie): expéditeur reconnu, commande et réponse envoyée
+    responsable = models.ForeignKey(
+        'eleves.Responsable', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='messages_entrants'
+    )
+    commande = models.CharField(max_length=20, blank=True, default='')
+    reponse = models.TextField(blank=True, null=True)
+    traite_le = models.DateTimeField(blank=True, null=True, db_index=True)
+
     class Meta:
         verbose_name = "Message entrant Twilio"
         verbose_name_plural = "Messages entrants Twilio"
@@ -25,6 +25,13 @@ def _safe_phone(number: Optional[str]) -> Optional[str]:
     return num
 
 
+def _telephone_responsable(responsable) -> Optional[str]:
+    """Numéro du responsable: forme E.164 précalculée, sinon normalisation à la volée."""
+    if responsable is None:
+        return None
+    return getattr(responsable, "telephone_e164", None) or _safe_phone(getattr(responsable, "telephone", None))
+
+
 # -----------------------------
 # Message builders
 # -----------------------------
@@ -96,7 +103,7 @@ def send_payment_receipt(eleve: Eleve, paiement: Paiement) -> None:
     """Envoie le reçu de paiement par WhatsApp (par défaut) et un SMS court.
     Utilise les vars d'env TWILIO_ENABLED/TWILIO_CHANNEL.
     """
-    tel = _safe_phone(getattr(eleve.responsable_principal, "telephone", None))
+    tel = _telephone_responsable(eleve.responsable_principal)
     if not tel:
         return
     body = build_payment_receipt_message(paiement)
@@ -111,7 +118,7 @@ def send_payment_receipt(eleve: Eleve, paiement: Paiement) -> None:
 
 
 def send_enrollment_confirmation(eleve: Eleve, paiement: Optional[Paiement] = None) -> None:
-    tel = _safe_phone(getattr(eleve.responsable_principal, "telephone", None))
+    tel = _telephone_responsable(eleve.responsable_principal)
     if not tel:
         return
     body = build_enrollment_receipt_message(eleve, paiement=paiement)
@@ -122,7 +129,7 @@ def send_enrollment_confirmation(eleve: Eleve, paiement: Optional[Paiement] = No
 
 def send_relance_notification(relance: Relance, to_number: Optional[str] = None) -> None:
     eleve = relance.eleve
-    tel = _safe_phone(to_number) if to_number else _safe_phone(getattr(eleve.responsable_principal, "telephone", None))
+    tel = _safe_phone(to_number) if to_number else _telephone_responsable(eleve.responsable_principal)
     if not tel:
         return
     body = build_relance_message(relance)
@@ -135,7 +142,7 @@ def send_relance_notification(relance: Relance, to_number: Optional[str] = None)
 
 
 def send_retard_notification(eleve: Eleve, solde_restant) -> None:
-    tel = _safe_phone(getattr(eleve.responsable_principal, "telephone", None))
+    tel = _telephone_responsable(eleve.responsable_principal)
     if not tel:
         return
     body = build_retard_message(eleve, solde_restant)
@@ -0,0 +1,306 @@
+"""Rapprochement des relevés Mobile Money / bancaires avec les paiements.
+
+Un relevé (.xlsx ou .csv: référence, montant, date, matricule facultatif) est lu en
+flux puis rapproché en une passe:
+- les paiements EN_ATTENTE et VALIDÉS de la fenêtre de dates du relevé (et ceux dont
+  la référence brute figure au relevé, via l'index sur `reference_externe`) sont
+  chargés en une requête et indexés en mémoire par référence normalisée;
+- chaque ligne est cherchée par référence (dictionnaire), puis, à défaut, parmi les
+  paiements en attente sans référence de l'élève indiqué (même montant, fenêtre de
+  dates);
+- les paiements trouvés sont validés par `bulk_update`, les lignes sans paiement
+  (avec matricule) peuvent être créées par `bulk_create`, puis les échéanciers des
+  élèves concernés sont resynchronisés.
+Les lignes non rapprochées forment le rapport d'exceptions.
+"""
+import csv
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from typing import List, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ecole_moderne.archives import annee_scolaire_de
+from ecole_moderne.metrics import incrementer
+from eleves.importation import date_cellule, lire_lignes, texte_cellule
+from eleves.models import Eleve
+from .echeanciers import synchroniser_echeanciers
+from .models import EcheancierPaiement, Paiement
+
+ALIAS_COLONNES = {
+    'reference': 'reference', 'ref': 'reference', 'reference_externe': 'reference',
+    'id_transaction': 'reference', 'transaction_id': 'reference', 'numero_transaction': 'reference',
+    'montant': 'montant', 'amount': 'montant', 'credit': 'montant',
+    'date': 'date', 'date_operation': 'date', 'date_transaction': 'date', 'date_paiement': 'date',
+    'matricule': 'matricule',
+    'libelle': 'libelle', 'description': 'libelle',
+}
+CHAMPS_OBLIGATOIRES = ('reference', 'montant', 'date')
+
+# Résultats d'une ligne de relevé
+A_VALIDER = 'A_VALIDER'
+DEJA_VALIDE = 'DEJA_VALIDE'
+A_CREER = 'A_CREER'
+EXCEPTIONS = {
+    'LIGNE_INVALIDE': "Ligne invalide",
+    'REFERENCE_EN_DOUBLE': "Référence présente plusieurs fois dans le relevé",
+    'ECART_MONTANT': "Référence trouvée mais montant différent",
+    'HORS_FENETRE': "Référence trouvée mais date hors fenêtre",
+    'NON_TROUVE': "Aucun paiement correspondant",
+    'ELEVE_INCONNU': "Matricule inconnu",
+}
+
+
+def normaliser_reference(valeur) -> str:
+    """Référence comparable: majuscules, sans espaces ni ponctuation ('mp-2401 55' -> 'MP240155')."""
+    return re.sub(r'[^0-9A-Z]', '', texte_cellule(valeur).upper())
+
+
+def montant_cellule(valeur) -> Optional[Decimal]:
+    """Montant en GNF (entier) depuis un nombre ou un texte ('150 000', '150,000', '150000.00')."""
+    if isinstance(valeur, (int, float, Decimal)):
+        montant = Decimal(str(valeur))
+    else:
+        texte = re.sub(r'\s|GNF', '', texte_cellule(valeur), flags=re.IGNORECASE)
+        if re.fullmatch(r'\d{1,3}([,.]\d{3})+', texte):
+            texte = re.sub(r'[,.]', '', texte)
+        try:
+            montant = Decimal(texte.replace(',', '.'))
+        except InvalidOperation:
+            return None
+    if montant <= 0:
+        return None
+    return montant.quantize(Decimal('1'))
+
+
+@dataclass
+class LigneReleve:
+    numero: int
+    reference: str
+    reference_brute: str
+    montant: Optional[Decimal]
+    date: Optional[object]
+    matricule: str = ''
+    libelle: str = ''
+    resultat: str = ''
+    detail: str = ''
+    paiement_id: Optional[int] = None
+    eleve_id: Optional[int] = None
+
+
+@dataclass
+class Rapprochement:
+    """Résultat d'un rapprochement: lignes classées et compteurs."""
+    lignes: List[LigneReleve] = field(default_factory=list)
+    valides: int = 0
+    crees: int = 0
+
+    @property
+    def compteurs(self):
+        return Counter(ligne.resultat for ligne in self.lignes)
+
+    @property
+    def exceptions(self):
+        return [ligne for ligne in self.lignes if ligne.resultat in EXCEPTIONS]
+
+    def ecrire_exceptions(self, flux):
+        ecrivain = csv.writer(flux, delimiter=';')
+        ecrivain.writerow(['ligne', 'exception', 'detail', 'reference', 'montant', 'date', 'matricule', 'libelle'])
+        for ligne in self.exceptions:
+            ecrivain.writerow([
+                ligne.numero, EXCEPTIONS[ligne.resultat], ligne.detail, ligne.reference_brute,
+                ligne.montant if ligne.montant is not None else '', ligne.date or '', ligne.matricule, ligne.libelle,
+            ])
+
+
+def lire_releve(chemin) -> List[LigneReleve]:
+    lignes = []
+    for numero, valeurs in lire_lignes(chemin, ALIAS_COLONNES, CHAMPS_OBLIGATOIRES):
+        ligne = LigneReleve(
+            numero=numero,
+            reference=normaliser_reference(valeurs.get('reference')),
+            reference_brute=texte_cellule(valeurs.get('reference')),
+            montant=montant_cellule(valeurs.get('montant')),
+            date=date_cellule(valeurs.get('date')),
+            matricule=texte_cellule(valeurs.get('matricule')),
+            libelle=texte_cellule(valeurs.get('libelle'))[:200],
+        )
+        if not ligne.reference or ligne.montant is None or ligne.date is None:
+            ligne.resultat = 'LIGNE_INVALIDE'
+            ligne.detail = "Référence, montant ou date illisible"
+        lignes.append(ligne)
+    return lignes
+
+
+def rapprocher(lignes: List[LigneReleve], *, ecole=None, fenetre_jours: int = 3,
+               creer_manquants: bool = False) -> Rapprochement:
+    """Classe chaque ligne (sans rien écrire): A_VALIDER, DEJA_VALIDE, A_CREER ou une exception."""
+    resultat = Rapprochement(lignes=lignes)
+    exploitables = [l for l in lignes if not l.resultat]
+    vues = set()
+    for ligne in exploitables:
+        if ligne.reference in vues:
+            ligne.resultat = 'REFERENCE_EN_DOUBLE'
+        vues.add(ligne.reference)
+    exploitables = [l for l in exploitables if not l.resultat]
+    if not exploitables:
+        return resultat
+
+    fenetre = timedelta(days=fenetre_jours)
+    debut = min(l.date for l in exploitables) - fenetre
+    fin = max(l.date for l in exploitables) + fenetre
+    candidats = Paiement.objects.filter(statut__in=['EN_ATTENTE', 'VALIDE']).filter(
+        Q(date_paiement__range=(debut, fin))
+        | Q(reference_externe__in={l.reference_brute for l in exploitables})
+    )
+    if ecole is not None:
+        candidats = candidats.filter(eleve__classe__ecole=ecole)
+
+    par_reference = defaultdict(list)
+    sans_reference = defaultdict(list)  # (eleve_id, montant) -> paiements en attente sans référence
+    for p in candidats.values('id', 'eleve_id', 'reference_externe', 'montant', 'date_paiement', 'statut'):
+        reference = normaliser_reference(p['reference_externe'])
+        if reference:
+            par_reference[reference].append(p)
+        elif p['statut'] == 'EN_ATTENTE':
+            sans_reference[(p['eleve_id'], p['montant'])].append(p)
+
+    eleves = {}
+    matricules = {l.matricule for l in exploitables if l.matricule}
+    if matricules:
+        qs = Eleve.objects.filter(matricule__in=matricules)
+        if ecole is not None:
+            qs = qs.filter(classe__ecole=ecole)
+        eleves = dict(qs.values_list('matricule', 'id'))
+
+    utilises = set()
+    dans_fenetre = lambda p, l: abs((p['date_paiement'] - l.date).days) <= fenetre_jours
+    for ligne in exploitables:
+        trouves = [p for p in par_reference.get(ligne.reference, ()) if p['id'] not in utilises]
+        if trouves:
+            bons = [p for p in trouves if p['montant'] == ligne.montant]
+            if not bons:
+                ligne.resultat = 'ECART_MONTANT'
+                ligne.detail = ', '.join(f"{p['montant']:.0f} GNF" for p in trouves)
+                continue
+            bons_dates = [p for p in bons if dans_fenetre(p, ligne)]
+            if not bons_dates:
+                ligne.resultat = 'HORS_FENETRE'
+                ligne.detail = ', '.join(p['date_paiement'].isoformat() for p in bons)
+                continue
+            paiement = min(bons_dates, key=lambda p: (p['statut'] != 'EN_ATTENTE', abs((p['date_paiement'] - ligne.date).days)))
+            ligne.resultat = A_VALIDER if paiement['statut'] == 'EN_ATTENTE' else DEJA_VALIDE
+            ligne.paiement_id, ligne.eleve_id = paiement['id'], paiement['eleve_id']
+            utilises.add(paiement['id'])
+            continue
+
+        if not ligne.matricule:
+            ligne.resultat = 'NON_TROUVE'
+            continue
+        eleve_id = eleves.get(ligne.matricule)
+        if eleve_id is None:
+            ligne.resultat = 'ELEVE_INCONNU'
+            ligne.detail = ligne.matricule
+            continue
+        attente = [p for p in sans_reference.get((eleve_id, ligne.montant), ())
+                   if p['id'] not in utilises and dans_fenetre(p, ligne)]
+        if attente:
+            paiement = min(attente, key=lambda p: abs((p['date_paiement'] - ligne.date).days))
+            ligne.resultat = A_VALIDER
+            ligne.paiement_id = paiement['id']
+            ligne.detail = "Rapproché par élève, montant et date"
+            utilises.add(paiement['id'])
+        elif creer_manquants:
+            ligne.resultat = A_CREER
+        else:
+            ligne.resultat = 'NON_TROUVE'
+        ligne.eleve_id = eleve_id
+    return resultat
+
+
+def _numeros_recus(nombre):
+    """Réserve `nombre` numéros de reçu consécutifs (même format que Paiement.save())."""
+    prefixe = f"REC{timezone.now().year}"
+    dernier = (
+        Paiement.objects.filter(numero_recu__startswith=prefixe)
+        .order_by('-numero_recu').values_list('numero_recu', flat=True).first()
+    )
+    try:
+        suivant = int(dernier[-4:]) + 1 if dernier else 1
+    except ValueError:
+        suivant = 1
+    return [f"{prefixe}{suivant + i:04d}" for i in range(nombre)]
+
+
+def _creer_paiements(nouveaux, batch_size):
+    """`bulk_create` des paiements numérotés par `_numeros_recus`.
+
+    Un `Paiement.save()` concurrent peut prendre l'un des numéros réservés: le lot est
+    alors annulé (savepoint), renuméroté et réinséré, comme le fait `Paiement.save()`.
+    """
+    if not nouveaux:
+        return nouveaux
+    for _ in range(10):
+        for paiement, numero in zip(nouveaux, _numeros_recus(len(nouveaux))):
+            paiement.pk = None
+            paiement.numero_recu = numero
+        try:
+            with transaction.atomic():
+                return Paiement.objects.bulk_create(nouveaux, batch_size=batch_size)
+        except IntegrityError:
+            continue
+    raise ValueError("Impossible de générer des numéros de reçu uniques après 10 tentatives")
+
+
+def appliquer(rapprochement: Rapprochement, *, utilisateur=None, type_paiement=None, mode_paiement=None,
+              batch_size: int = 500) -> Rapprochement:
+    """Valide les paiements rapprochés et crée les manquants, en une transaction."""
+    utilisateur = utilisateur if getattr(utilisateur, 'is_authenticated', False) else None
+    a_valider = {l.paiement_id: l for l in rapprochement.lignes if l.resultat == A_VALIDER}
+    a_creer = [l for l in rapprochement.lignes if l.resultat == A_CREER]
+    if a_creer and (type_paiement is None or mode_paiement is None):
+        raise ValueError("Type et mode de paiement requis pour créer les paiements manquants.")
+
+    maintenant = timezone.now()
+    with transaction.atomic():
+        paiements = list(Paiement.objects.select_for_update().filter(id__in=a_valider, statut='EN_ATTENTE'))
+        for paiement in paiements:
+            ligne = a_valider[paiement.id]
+            paiement.statut = 'VALIDE'
+            paiement.valide_par = utilisateur
+            paiement.date_validation = maintenant
+            paiement.date_modification = maintenant
+            paiement.reference_externe = paiement.reference_externe or ligne.reference_brute
+            ligne.eleve_id = paiement.eleve_id
+        Paiement.objects.bulk_update(
+            paiements, ['statut', 'valide_par', 'date_validation', 'date_modification', 'reference_externe'],
+            batch_size=batch_size,
+        )
+
+        nouveaux = [
+            Paiement(
+                eleve_id=ligne.eleve_id, type_paiement=type_paiement, mode_paiement=mode_paiement,
+                montant=ligne.montant, date_paiement=ligne.date, statut='VALIDE',
+                annee_scolaire=annee_scolaire_de(ligne.date),
+                reference_externe=ligne.reference_brute[:100],
+                observations=f"Créé par rapprochement de relevé{f' ({ligne.libelle})' if ligne.libelle else ''}",
+                cree_par=utilisateur, valide_par=utilisateur, date_validation=maintenant,
+            )
+            for ligne in a_creer
+        ]
+        _creer_paiements(nouveaux, batch_size)
+
+        eleve_ids = {p.eleve_id for p in paiements} | {p.eleve_id for p in nouveaux}
+        if eleve_ids:
+            synchroniser_echeanciers(EcheancierPaiement.objects.filter(eleve_id__in=eleve_ids), batch_size=batch_size)
+
+    rapprochement.valides = len(paiements)
+    rapprochement.crees = len(nouveaux)
+    if paiements or nouveaux:
+        incrementer('ecole_paiements_valides_total', len(paiements) + len(nouveaux))
+    return rapprochement
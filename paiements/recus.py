@@ -0,0 +1,521 @@
+"""Reçus de paiement PDF: rendu, cache par version et impression par lot.
+
+Un reçu est rendu une seule fois par version puis conservé sous
+`RECUS_DIR/<shard>/<paiement_id>-<version>.pdf`. La version est une empreinte de
+tout ce que la page imprime: le paiement (numéro, montant, date, type, mode,
+référence, observations, remises), l'identité de l'élève (nom, matricule, photo,
+classe, école) mais aussi son échéancier et ses paiements validés, dont dépendent
+l'affectation, le solde global et les restes à payer. Un nouveau paiement de
+l'élève change donc la version (et l'ETag) de ses reçus précédents; tant que rien
+ne change, le fichier est servi sans resynchroniser l'échéancier ni redessiner la
+page.
+
+L'impression par lot (`imprimer_lot`) concatène les reçus en cache avec pypdf et
+ne rend que les manquants, qui sont mis en cache au passage. Sans pypdf, tous les
+reçus sont dessinés dans un seul canvas ReportLab (`rendre_recus`).
+"""
+import hashlib
+import importlib.util
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from ecole_moderne import pdf
+from ecole_moderne.pdf_utils import draw_logo_watermark
+
+from .echeanciers import TRANCHES
+from eleves.models import Eleve
+
+from .models import EcheancierPaiement, Paiement
+
+# À incrémenter quand la mise en page change: les anciens fichiers ne sont plus servis
+VERSION_RENDU = 2
+
+
+def repertoire_recus():
+    return str(getattr(settings, 'RECUS_DIR', os.path.join(settings.BASE_DIR, 'logs', 'recus')))
+
+
+def _repertoire_paiement(paiement_id):
+    return os.path.join(repertoire_recus(), f"{int(paiement_id) % 1000:03d}")
+
+
+def _identite_eleve(eleve_id):
+    """Nom, matricule, photo (nom et date du fichier), classe et école imprimés sur le reçu."""
+    identite = list(
+        Eleve.objects.filter(pk=eleve_id).values_list(
+            'nom', 'prenom', 'matricule', 'photo',
+            'classe__nom', 'classe__niveau', 'classe__annee_scolaire', 'classe__ecole__nom',
+        )
+    )
+    photo = identite[0][3] if identite else None
+    if photo:
+        try:
+            identite.append(os.path.getmtime(os.path.join(settings.MEDIA_ROOT, photo)))
+        except OSError:
+            pass
+    return identite
+
+
+def _situation_eleve(eleve_id):
+    """Échéancier (dus, payés) et paiements validés de l'élève, tels que les imprime le reçu."""
+    echeancier = list(
+        EcheancierPaiement.objects.filter(eleve_id=eleve_id)
+        .values_list(*(champ for tranche in TRANCHES for champ in tranche[:2]))
+    )
+    valides = list(
+        Paiement.objects.filter(eleve_id=eleve_id, statut='VALIDE')
+        .annotate(total_remises=Sum('remises__montant_remise'))
+        .order_by('id').values_list('id', 'montant', 'date_paiement', 'total_remises')
+    )
+    return echeancier, valides
+
+
+def version_recu(paiement, remises=None):
+    """Empreinte du contenu imprimé d'un reçu.
+
+    Change si le paiement, ses remises, l'identité de l'élève, son échéancier ou
+    ses autres paiements validés changent.
+    """
+    if remises is None:
+        remises = paiement.remises.order_by('id').values_list('id', 'remise_id', 'montant_remise')
+    elements = [
+        VERSION_RENDU, paiement.pk, paiement.numero_recu, paiement.montant, paiement.date_paiement,
+        paiement.statut, paiement.type_paiement_id, paiement.mode_paiement_id,
+        paiement.reference_externe or '', paiement.observations or '', paiement.eleve_id,
+        [tuple(r) for r in remises], _identite_eleve(paiement.eleve_id), _situation_eleve(paiement.eleve_id),
+    ]
+    return hashlib.sha1(repr(elements).encode('utf-8')).hexdigest()[:16]
+
+
+def chemin_recu(paiement_id, version):
+    return os.path.join(_repertoire_paiement(paiement_id), f"{int(paiement_id)}-{version}.pdf")
+
+
+def invalider_recu(paiement_id):
+    """Supprime toutes les versions en cache du reçu d'un paiement."""
+    dossier = _repertoire_paiement(paiement_id)
+    prefixe = f"{int(paiement_id)}-"
+    try:
+        noms = os.listdir(dossier)
+    except FileNotFoundError:
+        return 0
+    supprimes = 0
+    for nom in noms:
+        if nom.startswith(prefixe) and nom.endswith('.pdf'):
+            try:
+                os.remove(os.path.join(dossier, nom))
+                supprimes += 1
+            except FileNotFoundError:
+                pass
+    return supprimes
+
+
+def rendre_recu(paiement):
+    """Rend le reçu d'un paiement et retourne le contenu PDF."""
+    buffer = BytesIO()
+    rendre_recus([paiement], buffer)
+    return buffer.getvalue()
+
+
+def rendre_recus(paiements, flux, preparer=None):
+    """Dessine les reçus de `paiements` dans `flux` (binaire), une page par reçu, dans l'ordre."""
+    c = pdf.canvas.Canvas(flux, pagesize=pdf.A4)
+    for paiement in paiements:
+        if preparer is not None:
+            preparer(paiement)
+        dessiner_recu(c, paiement)
+    c.save()
+    return len(paiements)
+
+
+def fusion_disponible():
+    """Vrai si pypdf est installé (concaténation des reçus en cache)."""
+    return importlib.util.find_spec('pypdf') is not None
+
+
+def imprimer_lot(paiements, flux, preparer=None):
+    """Écrit dans `flux` (binaire) les reçus de `paiements` en un seul PDF, dans l'ordre.
+
+    Avec pypdf, les fichiers en cache sont concaténés sans être redessinés et les
+    reçus manquants sont rendus puis mis en cache (`obtenir_recu`). Sans pypdf, tous
+    les reçus sont dessinés dans un seul canvas. Retourne le nombre de reçus rendus.
+    """
+    if not fusion_disponible():
+        return rendre_recus(paiements, flux, preparer=preparer)
+    from pypdf import PdfWriter
+
+    document = PdfWriter()
+    rendus = 0
+    for paiement in paiements:
+        chemin, _, rendu = obtenir_recu(paiement, preparer=preparer)
+        try:
+            document.append(chemin)
+        except FileNotFoundError:
+            # Version remplacée entre-temps par un autre processus
+            chemin, _, rendu = obtenir_recu(paiement, preparer=preparer)
+            document.append(chemin)
+        rendus += rendu
+    document.write(flux)
+    return rendus
+
+
+def obtenir_recu(paiement, preparer=None):
+    """Chemin du reçu en cache, rendu au premier appel seulement.
+
+    `preparer(paiement)` est appelé avant un rendu (jamais lors d'un succès de cache),
+    par exemple pour resynchroniser l'échéancier de l'élève.
+    Retourne (chemin, version, rendu) où `rendu` indique si le PDF vient d'être produit.
+    """
+    version = version_recu(paiement)
+    chemin = chemin_recu(paiement.pk, version)
+    if os.path.exists(chemin):
+        return chemin, version, False
+    if preparer is not None:
+        preparer(paiement)
+        # La resynchronisation peut modifier l'échéancier imprimé
+        version = version_recu(paiement)
+        chemin = chemin_recu(paiement.pk, version)
+    contenu = rendre_recu(paiement)
+    invalider_recu(paiement.pk)
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    tmp = f"{chemin}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as fh:
+        fh.write(contenu)
+    os.replace(tmp, chemin)
+    return chemin, version, True
+
+
+# ----- Rendu -----
+
+def dessiner_recu(c, paiement):
+    """Dessine le reçu d'un paiement validé sur une page du canvas `c`.
+
+    - Ajoute un filigrane via `ecole_moderne/pdf_utils.draw_logo_watermark`
+    - Inclut les informations clés du paiement et de l'élève
+    - Liste les remises appliquées et affiche le total des remises
+    """
+    # Calcul total remises
+    from ecole_moderne.pdf import A4, ImageReader
+
+    remises_total = paiement.remises.aggregate(total=Sum('montant_remise')).get('total') or 0
+
+    width, height = A4
+
+    # Filigrane: toujours actif pour les reçus PDF (opacité optimisée définie dans pdf_utils)
+    try:
+        draw_logo_watermark(c, width, height)
+    except Exception:
+        pass
+
+    # Mise en page simple
+    left = 40
+    top = height - 40
+    line_h = 18
+
+    def draw_line(text, x=left, y=None, bold=False):
+        nonlocal top
+        if y is None:
+            y = top
+        font_name = 'Helvetica-Bold' if bold else 'Helvetica'
+        c.setFont(font_name, 11)
+        c.drawString(x, y, text)
+        top = y - line_h
+
+    # Logo en en-tête (côté gauche)
+    try:
+        from django.contrib.staticfiles import finders
+        logo_path = finders.find('logos/logo.png')
+        
+        if logo_path:
+            try:
+                logo_img = ImageReader(logo_path)
+                logo_w, logo_h = 80, 80
+                c.drawImage(logo_img, left, top - logo_h, width=logo_w, height=logo_h, preserveAspectRatio=True, mask='auto')
+                
+                # Titre à côté du logo
+                c.setFont('Helvetica-Bold', 18)
+                c.drawString(left + logo_w + 20, top - 25, "REÇU DE PAIEMENT")
+                
+                # Nom de l'école sous le titre
+                c.setFont('Helvetica-Bold', 12)
+                ecole_nom = paiement.eleve.classe.ecole.nom if getattr(paiement.eleve.classe, 'ecole', None) else ""
+                c.drawString(left + logo_w + 20, top - 45, ecole_nom)
+                
+                top -= (logo_h + 20)
+            except Exception:
+                # Fallback sans logo
+                c.setFont('Helvetica-Bold', 18)
+                c.drawString(left, top, "REÇU DE PAIEMENT")
+                top -= 15
+                c.setFont('Helvetica-Bold', 12)
+                c.drawString(left, top, (paiement.eleve.classe.ecole.nom if getattr(paiement.eleve.classe, 'ecole', None) else ""))
+                top -= 25
+        else:
+            # Fallback sans logo
+            c.setFont('Helvetica-Bold', 18)
+            c.drawString(left, top, "REÇU DE PAIEMENT")
+            top -= 15
+            c.setFont('Helvetica-Bold', 12)
+            c.drawString(left, top, (paiement.eleve.classe.ecole.nom if getattr(paiement.eleve.classe, 'ecole', None) else ""))
+            top -= 25
+    except Exception:
+        # Fallback en cas d'erreur
+        c.setFont('Helvetica-Bold', 18)
+        c.drawString(left, top, "REÇU DE PAIEMENT")
+        top -= 15
+        c.setFont('Helvetica-Bold', 12)
+        c.drawString(left, top, (paiement.eleve.classe.ecole.nom if getattr(paiement.eleve.classe, 'ecole', None) else ""))
+        top -= 25
+
+    # Photo élève (en haut à droite si disponible) ou placeholder avec initiales si absente
+    try:
+        img_drawn = False
+        img_w, img_h = 100, 100
+        x_img = width - 40 - img_w
+        y_img = height - 40 - img_h
+        photo_path = getattr(getattr(paiement.eleve, 'photo', None), 'path', None)
+        if photo_path and os.path.exists(photo_path):
+            try:
+                img = ImageReader(photo_path)
+                c.drawImage(img, x_img, y_img, width=img_w, height=img_h, preserveAspectRatio=True, mask='auto')
+                img_drawn = True
+            except Exception:
+                img_drawn = False
+        if not img_drawn:
+            # Dessiner un placeholder avec initiales
+            nom_complet = str(getattr(paiement.eleve, 'nom_complet', '') or '').strip()
+            initiales = ''.join([p[0].upper() for p in nom_complet.split()[:2]]) or 'E'
+            c.setLineWidth(1)
+            try:
+                c.roundRect(x_img, y_img, img_w, img_h, 8)
+            except Exception:
+                c.rect(x_img, y_img, img_w, img_h)
+            c.setFont('Helvetica-Bold', 24)
+            c.drawCentredString(x_img + img_w/2, y_img + img_h/2 - 8, initiales)
+            c.setFont('Helvetica', 8)
+            c.drawCentredString(x_img + img_w/2, y_img + 6, "Pas de photo")
+        # Afficher le nom de l'élève sous l'image/placeholder
+        try:
+            nom_aff = str(getattr(paiement.eleve, 'nom_complet', '') or '').strip()
+            if nom_aff:
+                c.setFont('Helvetica', 9)
+                c.drawCentredString(x_img + img_w/2, y_img - 12, nom_aff)
+        except Exception:
+            pass
+    except Exception:
+        # En cas de problème avec le rendu de la photo/placeholder, ne pas bloquer la génération du reçu
+        pass
+
+    # Informations paiement
+    draw_line(f"Numéro de reçu : {paiement.numero_recu}", bold=True)
+    draw_line(f"Date de paiement : {paiement.date_paiement.strftime('%d/%m/%Y')}")
+    draw_line(f"Type de paiement : {paiement.type_paiement.nom}")
+    draw_line(f"Mode de paiement : {paiement.mode_paiement.nom}")
+    if getattr(paiement, 'reference_externe', None):
+        draw_line(f"Référence externe : {paiement.reference_externe}")
+    if getattr(paiement, 'observations', None):
+        # Limiter l'observation à une ligne raisonnable pour le reçu
+        obs = str(paiement.observations).strip()
+        if obs:
+            draw_line(f"Observations : {obs}")
+    draw_line(f"Montant : {str(f'{paiement.montant:,.0f}').replace(',', ' ')} GNF", bold=True)
+
+    if remises_total and int(remises_total) > 0:
+        draw_line(f"Total remises : -{str(f'{int(remises_total):,}').replace(',', ' ')} GNF")
+    # Montant net (jamais négatif)
+    montant_net = max(0, int(paiement.montant - (remises_total or 0)))
+    draw_line(f"Montant net à payer : {str(f'{montant_net:,}').replace(',', ' ')} GNF", bold=True)
+
+    # Affectation du paiement courant sur les tranches (simulation déterministe)
+    # Objectif: montrer, pour CE reçu, quelle partie couvre Inscription/T1/T2/T3
+    try:
+        echeancier_for_alloc = getattr(paiement.eleve, 'echeancier', None)
+    except Exception:
+        echeancier_for_alloc = None
+    if echeancier_for_alloc:
+        try:
+            # Restants initiaux égaux aux dus de l'échéancier
+            rest_insc = int(echeancier_for_alloc.frais_inscription_du or 0)
+            rest_t1 = int(echeancier_for_alloc.tranche_1_due or 0)
+            rest_t2 = int(echeancier_for_alloc.tranche_2_due or 0)
+            rest_t3 = int(echeancier_for_alloc.tranche_3_due or 0)
+
+            # Parcourir tous les paiements validés (y compris celui-ci) dans l'ordre
+            paiements_valides = (
+                Paiement.objects
+                .filter(eleve=paiement.eleve, statut='VALIDE')
+                .order_by('date_paiement', 'date_creation', 'id')
+            )
+
+            allocations = {}
+            for p in paiements_valides.iterator():
+                # Couverture de ce paiement = montant + remises sur CE paiement
+                try:
+                    rem_p = p.remises.aggregate(total=Sum('montant_remise')).get('total') or 0
+                except Exception:
+                    rem_p = 0
+                reste_a_repartir = max(0, int(p.montant) + int(rem_p))
+
+                a_insc = a_t1 = a_t2 = a_t3 = 0
+                if reste_a_repartir and rest_insc > 0:
+                    a = min(rest_insc, reste_a_repartir)
+                    a_insc = a
+                    rest_insc -= a
+                    reste_a_repartir -= a
+                if reste_a_repartir and rest_t1 > 0:
+                    a = min(rest_t1, reste_a_repartir)
+                    a_t1 = a
+                    rest_t1 -= a
+                    reste_a_repartir -= a
+                if reste_a_repartir and rest_t2 > 0:
+                    a = min(rest_t2, reste_a_repartir)
+                    a_t2 = a
+                    rest_t2 -= a
+                    reste_a_repartir -= a
+                if reste_a_repartir and rest_t3 > 0:
+                    a = min(rest_t3, reste_a_repartir)
+                    a_t3 = a
+                    rest_t3 -= a
+                    reste_a_repartir -= a
+
+                allocations[p.id] = (a_insc, a_t1, a_t2, a_t3)
+
+            if allocations.get(paiement.id):
+                top -= 6
+                draw_line("Affectation du paiement", bold=True)
+                a_insc, a_t1, a_t2, a_t3 = allocations[paiement.id]
+                draw_line(f"Inscription: {str(f'{int(a_insc):,}').replace(',', ' ')} GNF")
+                draw_line(f"1ère tranche: {str(f'{int(a_t1):,}').replace(',', ' ')} GNF")
+                draw_line(f"2ème tranche: {str(f'{int(a_t2):,}').replace(',', ' ')} GNF")
+                draw_line(f"3ème tranche: {str(f'{int(a_t3):,}').replace(',', ' ')} GNF")
+        except Exception:
+            pass
+
+    # Élève
+    top -= 6
+    draw_line("Informations de l'élève", bold=True)
+    draw_line(f"Nom : {paiement.eleve.nom_complet}")
+    if getattr(paiement.eleve, 'matricule', None):
+        draw_line(f"Matricule : {paiement.eleve.matricule}")
+    if getattr(paiement.eleve, 'classe', None):
+        draw_line(f"Classe : {paiement.eleve.classe}")
+
+    # Échéances (si disponibles sur l'échéancier de l'élève)
+    try:
+        echeancier = getattr(paiement.eleve, 'echeancier', None)
+    except Exception:
+        echeancier = None
+    if echeancier:
+        top -= 6
+        draw_line("Échéances", bold=True)
+        try:
+            def _fmt_amount(v):
+                try:
+                    return str(f"{int(v or 0):,}").replace(',', ' ')
+                except Exception:
+                    return str(v or 0)
+            def _fmt_date(d):
+                try:
+                    return d.strftime('%d/%m/%Y') if d else ''
+                except Exception:
+                    return str(d) if d else ''
+            # Inscription
+            draw_line(f"Inscription: {_fmt_amount(echeancier.frais_inscription_du)} GNF - Échéance: {_fmt_date(echeancier.date_echeance_inscription)}")
+            # Tranches
+            draw_line(f"1ère tranche: {_fmt_amount(echeancier.tranche_1_due)} GNF - Échéance: {_fmt_date(echeancier.date_echeance_tranche_1)}")
+            draw_line(f"2ème tranche: {_fmt_amount(echeancier.tranche_2_due)} GNF - Échéance: {_fmt_date(echeancier.date_echeance_tranche_2)}")
+            draw_line(f"3ème tranche: {_fmt_amount(echeancier.tranche_3_due)} GNF - Échéance: {_fmt_date(echeancier.date_echeance_tranche_3)}")
+        except Exception:
+            pass
+
+        # Restes à payer par tranche
+        try:
+            def _reste(due, paye):
+                try:
+                    return max(0, int((due or 0) - (paye or 0)))
+                except Exception:
+                    return 0
+            # Calcul global basé sur les paiements validés: somme(montants) - somme(remises)
+            try:
+                total_du = int((echeancier.frais_inscription_du or 0) + (echeancier.tranche_1_due or 0) + (echeancier.tranche_2_due or 0) + (echeancier.tranche_3_due or 0))
+            except Exception:
+                total_du = 0
+
+            try:
+                aggs = (
+                    Paiement.objects
+                    .filter(eleve=paiement.eleve, statut='VALIDE')
+                    .aggregate(sum_montant=Sum('montant'), sum_remises=Sum('remises__montant_remise'))
+                )
+                sum_montant = int(aggs.get('sum_montant') or 0)
+                sum_remises = int(aggs.get('sum_remises') or 0)
+            except Exception:
+                sum_montant = 0
+                sum_remises = 0
+
+            # Calcul de la couverture: montants payés + remises validées (les remises couvrent une partie du dû)
+            couverture_validee = max(0, int(sum_montant) + int(sum_remises))
+            # Inclure le paiement courant s'il n'est pas encore validé (montant + remises sur ce reçu)
+            try:
+                couverture_courante = max(0, int(paiement.montant) + int(remises_total or 0))
+            except Exception:
+                couverture_courante = 0
+            couverture_effective = couverture_validee + (couverture_courante if paiement.statut != 'VALIDE' else 0)
+            tout_solde = (total_du <= couverture_effective)
+            solde_global = max(0, int(total_du - couverture_effective))
+
+            top -= 6
+            # Solde global restant
+            draw_line(f"Solde global restant : {str(f'{solde_global:,}').replace(',', ' ')} GNF", bold=True)
+            draw_line("Restes à payer par tranche", bold=True)
+            if tout_solde:
+                r_insc = r_t1 = r_t2 = r_t3 = 0
+            else:
+                r_insc = _reste(echeancier.frais_inscription_du, echeancier.frais_inscription_paye)
+                r_t1 = _reste(echeancier.tranche_1_due, echeancier.tranche_1_payee)
+                r_t2 = _reste(echeancier.tranche_2_due, echeancier.tranche_2_payee)
+                r_t3 = _reste(echeancier.tranche_3_due, echeancier.tranche_3_payee)
+            draw_line(f"Inscription: {str(f'{r_insc:,}').replace(',', ' ')} GNF")
+            draw_line(f"1ère tranche: {str(f'{r_t1:,}').replace(',', ' ')} GNF")
+            draw_line(f"2ème tranche: {str(f'{r_t2:,}').replace(',', ' ')} GNF")
+            draw_line(f"3ème tranche: {str(f'{r_t3:,}').replace(',', ' ')} GNF")
+        except Exception:
+            pass
+
+    # Remises détaillées
+    if remises_total and int(remises_total) > 0:
+        top -= 6
+        draw_line("Remises appliquées", bold=True)
+        for pr in paiement.remises.select_related('remise').all():
+            nom = getattr(pr.remise, 'nom', 'Remise')
+            montant = str(f"{int(pr.montant_remise):,}").replace(',', ' ')
+            draw_line(f"- {nom} : -{montant} GNF")
+
+    # Bloc signatures
+    top -= 20
+    c.setFont('Helvetica-Bold', 11)
+    c.drawString(left, top, "Signatures")
+    top -= 16
+    # Lignes de signature (caissier et responsable)
+    sig_line_y = top
+    c.setLineWidth(0.8)
+    # Caissier à gauche
+    c.line(left, sig_line_y, left + 200, sig_line_y)
+    c.setFont('Helvetica', 10)
+    c.drawString(left, sig_line_y - 14, "Caissier(e)")
+    # Responsable à droite
+    right_x = left + 260
+    c.setLineWidth(0.8)
+    c.line(right_x, sig_line_y, right_x + 200, sig_line_y)
+    c.setFont('Helvetica', 10)
+    c.drawString(right_x, sig_line_y - 14, "Responsable")
+
+    # Pied de page
+    c.setFont('Helvetica', 9)
+    c.drawRightString(width - 40, 30, f"Généré le {timezone.now().strftime('%d/%m/%Y %H:%M')}")
+
+    c.showPage()
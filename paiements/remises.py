@@ -0,0 +1,254 @@
+"""Remises: index mémoire des règles actives et moteur de réduction fratrie.
+
+- Règles: `IndexRemises` charge en une requête les `RemiseReduction` actives et les
+  range par motif; l'éligibilité à une date se décide en mémoire (période
+  date_debut..date_fin). L'index est conservé par processus. Sa version est une
+  signature lue en base (nombre de remises, plus grand id, dernière
+  `date_modification`), recontrôlée au plus toutes les `VERIFICATION_SECONDES`:
+  une remise modifiée dans un autre processus y est visible après ce délai, et
+  immédiatement dans le processus qui l'a enregistrée (`invalider_remises()`).
+- Fratrie: les élèves actifs d'une école sont regroupés par famille en une requête,
+  la clé étant le téléphone normalisé du responsable principal (à défaut son nom
+  normalisé). Dans une famille, l'aîné est au rang 1; un enfant de rang r reçoit la
+  règle FRATRIE de plus grand `rang_fratrie` <= r.
+- Application: les remises fratrie des paiements en attente sont recalculées pour
+  toute l'école et réécrites avec `bulk_create`, par lots.
+"""
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from eleves.models import Eleve, normaliser_telephone_e164
+from .models import Paiement, PaiementRemise, RemiseReduction
+
+RANG_FRATRIE_DEFAUT = 2  # règle FRATRIE sans rang: à partir du 2e enfant
+VERIFICATION_SECONDES = 30  # délai maximal avant de voir une remise modifiée par un autre processus
+
+
+def version_remises():
+    """Signature des remises en base: (nombre, plus grand id, dernière modification)."""
+    signature = RemiseReduction.objects.aggregate(
+        nombre=Count('pk'), pk_max=Max('pk'), modification=Max('date_modification'),
+    )
+    return signature['nombre'], signature['pk_max'], signature['modification']
+
+
+def invalider_remises():
+    """Recontrôle la version au prochain `index_remises()` de ce processus."""
+    global _verifie_a
+    _verifie_a = None
+
+
+def rang_depuis_nom(nom) -> Optional[int]:
+    """'Réduction fratrie - 3ème enfant et plus' -> 3 (remises créées avant le champ rang_fratrie)."""
+    m = re.search(r'(\d+)\s*(?:e|è|ème|eme)\b', str(nom or ''), re.IGNORECASE)
+    return int(m.group(1)) if m else None
+
+
+def _normaliser_nom(*parties) -> str:
+    texte = unicodedata.normalize('NFKD', ' '.join(p or '' for p in parties))
+    texte = ''.join(c for c in texte if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', texte.lower()).split())
+
+
+def cle_famille(telephone_e164, telephone, nom, prenom) -> str:
+    """Clé de regroupement des frères et sœurs: téléphone E.164 du responsable, sinon son nom."""
+    numero = telephone_e164 or normaliser_telephone_e164(telephone)
+    if numero:
+        return f"tel:{numero}"
+    return f"nom:{_normaliser_nom(nom, prenom)}"
+
+
+class IndexRemises:
+    """Index mémoire des remises actives, par motif."""
+
+    def __init__(self, remises):
+        self.par_id = {}
+        self.par_motif = defaultdict(list)
+        for remise in remises:
+            self.par_id[remise.pk] = remise
+            self.par_motif[remise.motif].append(remise)
+        # Règles fratrie de la plus spécifique (rang le plus élevé) à la plus générale
+        self.par_motif['FRATRIE'].sort(key=lambda r: (-self.rang(r), r.pk))
+
+    @classmethod
+    def charger(cls) -> "IndexRemises":
+        return cls(RemiseReduction.objects.filter(actif=True).order_by('pk'))
+
+    @staticmethod
+    def rang(remise) -> int:
+        return remise.rang_fratrie or RANG_FRATRIE_DEFAUT
+
+    @staticmethod
+    def valide(remise, jour: date) -> bool:
+        return remise.date_debut <= jour <= remise.date_fin
+
+    def trouver(self, remise_id, jour: date) -> Optional[RemiseReduction]:
+        """Remise active et valide à `jour`, ou None."""
+        remise = self.par_id.get(remise_id)
+        return remise if remise is not None and self.valide(remise, jour) else None
+
+    def actives(self, jour: date, motif=None) -> List[RemiseReduction]:
+        remises = self.par_motif.get(motif, []) if motif else self.par_id.values()
+        return [r for r in remises if self.valide(r, jour)]
+
+    def fratrie(self, rang: int, jour: date) -> Optional[RemiseReduction]:
+        """Règle FRATRIE applicable à l'enfant de rang `rang` (1 = aîné, jamais remisé)."""
+        if rang < 2:
+            return None
+        for remise in self.par_motif.get('FRATRIE', []):
+            if self.rang(remise) <= rang and self.valide(remise, jour):
+                return remise
+        return None
+
+
+_index = (None, None)
+_verifie_a = None  # time.monotonic() du dernier contrôle de version
+
+
+def index_remises() -> IndexRemises:
+    """Index des remises actives, chargé une fois par processus et par version."""
+    global _index, _verifie_a
+    maintenant = time.monotonic()
+    if _verifie_a is None or maintenant - _verifie_a >= VERIFICATION_SECONDES:
+        version = version_remises()
+        if _index[0] != version:
+            _index = (version, IndexRemises.charger())
+        _verifie_a = maintenant
+    return _index[1]
+
+
+@dataclass
+class Fratrie:
+    cle: str
+    rang: int
+    taille: int
+
+
+def fratries_ecole(ecole, **filtre_eleve) -> Dict[int, Fratrie]:
+    """{eleve_id: Fratrie} pour les élèves actifs d'une école, en une requête.
+
+    `filtre_eleve` restreint le calcul (ex: une classe) mais les rangs sont alors
+    calculés dans ce seul périmètre.
+    """
+    lignes = (
+        Eleve.objects
+        .filter(classe__ecole=ecole, statut='ACTIF', **filtre_eleve)
+        .values_list(
+            'id', 'date_naissance',
+            'responsable_principal__telephone_e164', 'responsable_principal__telephone',
+            'responsable_principal__nom', 'responsable_principal__prenom',
+        )
+        .order_by()
+    )
+    familles = defaultdict(list)
+    for eleve_id, naissance, tel_e164, tel, nom, prenom in lignes:
+        familles[cle_famille(tel_e164, tel, nom, prenom)].append((naissance, eleve_id))
+    resultat = {}
+    for cle, enfants in familles.items():
+        enfants.sort()
+        for rang, (_, eleve_id) in enumerate(enfants, start=1):
+            resultat[eleve_id] = Fratrie(cle, rang, len(enfants))
+    return resultat
+
+
+def fratrie_eleve(eleve) -> Fratrie:
+    """Rang d'un seul élève dans sa famille (mêmes règles que `fratries_ecole`)."""
+    responsable = eleve.responsable_principal
+    numero = responsable.telephone_e164 or normaliser_telephone_e164(responsable.telephone)
+    qs = Eleve.objects.filter(classe__ecole_id=eleve.classe.ecole_id, statut='ACTIF')
+    if numero:
+        qs = qs.filter(responsable_principal__telephone_e164=numero)
+    else:
+        qs = qs.filter(responsable_principal__nom__iexact=responsable.nom,
+                       responsable_principal__prenom__iexact=responsable.prenom)
+    fratries = fratries_ecole(eleve.classe.ecole_id, id__in=list(qs.values_list('id', flat=True)) + [eleve.pk])
+    return fratries.get(eleve.pk) or Fratrie(cle_famille(numero, '', responsable.nom, responsable.prenom), 1, 1)
+
+
+def montant_remise(remise, montant) -> Decimal:
+    """Montant arrondi au franc, jamais supérieur au montant de base."""
+    montant = Decimal(montant or 0)
+    return min(Decimal(remise.calculer_remise(montant)), montant).quantize(Decimal('1'))
+
+
+def appliquer_fratrie_ecole(ecole, *, jour: Optional[date] = None, simuler=False, batch_size=500):
+    """Recalcule les remises FRATRIE des paiements en attente d'une école.
+
+    Une requête pour les familles, une pour les paiements, une suppression groupée
+    des remises fratrie existantes puis des `bulk_create` par lots. La règle retenue
+    est celle valide à la date de chaque paiement (ou à `jour` s'il est fourni).
+    Retourne {'eleves_eligibles', 'paiements', 'montant', 'par_rang'}.
+    """
+    from .recus import invalider_recu
+
+    index = index_remises()
+    fratries = fratries_ecole(ecole)
+    eligibles = {eid: f for eid, f in fratries.items() if f.rang >= 2}
+    paiements = (
+        Paiement.objects
+        .filter(eleve__classe__ecole=ecole, eleve__statut='ACTIF', statut='EN_ATTENTE')
+        .values_list('id', 'eleve_id', 'montant', 'date_paiement')
+        .order_by('id')
+    )
+    a_creer, traites = [], []
+    par_rang = defaultdict(int)
+    total = Decimal('0')
+    for paiement_id, eleve_id, montant, date_paiement in paiements:
+        traites.append(paiement_id)
+        fratrie = eligibles.get(eleve_id)
+        if fratrie is None:
+            continue
+        remise = index.fratrie(fratrie.rang, jour or date_paiement)
+        if remise is None:
+            continue
+        valeur = montant_remise(remise, montant)
+        if valeur <= 0:
+            continue
+        a_creer.append(PaiementRemise(paiement_id=paiement_id, remise=remise, montant_remise=valeur))
+        par_rang[fratrie.rang] += 1
+        total += valeur
+    resultat = {
+        'eleves_eligibles': len(eligibles),
+        'paiements': len(a_creer),
+        'montant': int(total),
+        'par_rang': dict(sorted(par_rang.items())),
+    }
+    if simuler:
+        return resultat
+    with transaction.atomic():
+        for i in range(0, len(traites), batch_size):
+            PaiementRemise.objects.filter(
+                paiement_id__in=traites[i:i + batch_size], remise__motif='FRATRIE',
+            ).delete()
+        PaiementRemise.objects.bulk_create(a_creer, batch_size=batch_size)
+        modifies = {r.paiement_id for r in a_creer}
+        transaction.on_commit(lambda: [invalider_recu(pid) for pid in modifies])
+    return resultat
+
+
+def apercu(montant, *, remise_id=None, eleve=None, jour: Optional[date] = None):
+    """Aperçu d'une remise sans écriture: règle choisie, ou règle fratrie de l'élève.
+
+    Retourne (détails, fratrie): détails = [{'remise', 'montant'}], vide si aucune
+    règle ne s'applique à `jour`.
+    """
+    jour = jour or timezone.localdate()
+    index = index_remises()
+    fratrie = fratrie_eleve(eleve) if eleve is not None else None
+    if remise_id:
+        remise = index.trouver(remise_id, jour)
+    else:
+        remise = index.fratrie(fratrie.rang, jour) if fratrie else None
+    if remise is None:
+        return [], fratrie
+    return [{'remise': remise, 'montant': montant_remise(remise, montant)}], fratrie
@@ -0,0 +1,79 @@
+"""Statistiques du tableau de bord des paiements (cartes et rafraîchissement AJAX).
+
+Les requêtes sont construites par `requetes_tableau_bord(filtrer)` puis évaluées
+avec l'ORM synchrone (`statistiques_tableau_bord`, vues classiques) ou asynchrone
+(`astatistiques_tableau_bord`, vues ASGI): les deux chemins renvoient les mêmes
+chiffres. `filtrer(qs, field_path)` applique la restriction par école
+(`filter_by_user_school` ou `Portee.filtrer`).
+"""
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+
+from .models import EcheancierPaiement, Paiement
+
+COMPTES = ('nombre_paiements_mois', 'eleves_en_retard', 'paiements_en_attente')
+
+
+def requetes_tableau_bord(filtrer, today=None):
+    """{'total_paiements_mois': qs à sommer, puis un qs à compter par clé de COMPTES}."""
+    today = today or timezone.localdate()
+    month_start = today.replace(day=1)
+
+    def exigible(echeance, montant):
+        return Case(
+            When(**{f'{echeance}__lte': today}, then=F(montant)),
+            default=Value(0),
+            output_field=DecimalField(max_digits=10, decimal_places=0),
+        )
+
+    # Élèves en retard: montants exigibles (échéances dépassées) > payés + remises
+    exigible_expr = (
+        exigible('date_echeance_inscription', 'frais_inscription_du')
+        + exigible('date_echeance_tranche_1', 'tranche_1_due')
+        + exigible('date_echeance_tranche_2', 'tranche_2_due')
+        + exigible('date_echeance_tranche_3', 'tranche_3_due')
+    )
+    remises_expr = Coalesce(
+        Sum('eleve__paiements__remises__montant_remise', filter=Q(eleve__paiements__statut='VALIDE')),
+        Value(0),
+        output_field=DecimalField(max_digits=10, decimal_places=0),
+    )
+    # Les remises ne doivent compenser que le montant exigible à date (pas les échéances futures)
+    remises_applicables = Least(remises_expr, exigible_expr)
+    paye_effectif_expr = (
+        F('frais_inscription_paye') + F('tranche_1_payee') + F('tranche_2_payee') + F('tranche_3_payee')
+        + remises_applicables
+    )
+    retard_expr = ExpressionWrapper(exigible_expr - paye_effectif_expr,
+                                    output_field=DecimalField(max_digits=10, decimal_places=0))
+
+    mois = Paiement.objects.filter(date_paiement__gte=month_start, date_paiement__lte=today)
+    return {
+        # Somme des paiements validés sur le mois (DateField -> filtre inclusif par bornes)
+        'total_paiements_mois': filtrer(mois.filter(statut='VALIDE'), 'eleve__classe__ecole'),
+        # Nombre de paiements (tous statuts) ce mois
+        'nombre_paiements_mois': filtrer(mois, 'eleve__classe__ecole'),
+        'eleves_en_retard': filtrer(
+            EcheancierPaiement.objects.annotate(retard=retard_expr).filter(retard__gt=0), 'eleve__classe__ecole'
+        ),
+        'paiements_en_attente': filtrer(Paiement.objects.filter(statut='EN_ATTENTE'), 'eleve__classe__ecole'),
+    }
+
+
+def _resultat(total, comptes):
+    return {'total_paiements_mois': int(total or 0), **{cle: int(n or 0) for cle, n in zip(COMPTES, comptes)}}
+
+
+def statistiques_tableau_bord(filtrer, today=None):
+    """Dict: total_paiements_mois, nombre_paiements_mois, eleves_en_retard, paiements_en_attente."""
+    requetes = requetes_tableau_bord(filtrer, today)
+    total = requetes['total_paiements_mois'].aggregate(total=Sum('montant'))['total']
+    return _resultat(total, [requetes[cle].count() for cle in COMPTES])
+
+
+async def astatistiques_tableau_bord(filtrer, today=None):
+    """Version ORM asynchrone de `statistiques_tableau_bord`."""
+    requetes = requetes_tableau_bord(filtrer, today)
+    total = (await requetes['total_paiements_mois'].aaggregate(total=Sum('montant')))['total']
+    return _resultat(total, [await requetes[cle].acount() for cle in COMPTES])
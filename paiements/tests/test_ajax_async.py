@@ -0,0 +1,103 @@
+import asyncio
+from datetime import date
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ecole_moderne.benchmarks import charge
+from eleves.models import Ecole, Classe, Eleve, Responsable
+from paiements.models import Paiement, TypePaiement, ModePaiement
+from utilisateurs.models import Profil
+
+
+class AjaxAsyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ecole1 = Ecole.objects.create(nom="Ecole A", adresse="A", telephone="+224620000001", directeur="Dir A")
+        self.ecole2 = Ecole.objects.create(nom="Ecole B", adresse="B", telephone="+224620000002", directeur="Dir B")
+        self.classe1 = Classe.objects.create(nom="C1", ecole=self.ecole1, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        self.classe2 = Classe.objects.create(nom="C2", ecole=self.ecole2, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        resp = Responsable.objects.create(prenom="P", nom="R", relation="PERE", telephone="+224620000011", adresse="Adr")
+        self.eleve1 = Eleve.objects.create(
+            nom="Alpha", prenom="A", matricule="A-001", classe=self.classe1, sexe='M',
+            date_naissance=date(2015, 1, 1), lieu_naissance="Conakry", date_inscription=date(2024, 9, 1),
+            responsable_principal=resp,
+        )
+        self.eleve2 = Eleve.objects.create(
+            nom="Bravo", prenom="B", matricule="B-001", classe=self.classe2, sexe='F',
+            date_naissance=date(2015, 2, 2), lieu_naissance="Conakry", date_inscription=date(2024, 9, 1),
+            responsable_principal=resp, statut='EXCLU',
+        )
+        type_paiement = TypePaiement.objects.create(nom="Frais d'inscription")
+        mode = ModePaiement.objects.create(nom="Espèces")
+        for eleve, statut in ((self.eleve1, 'VALIDE'), (self.eleve2, 'EN_ATTENTE')):
+            Paiement.objects.create(eleve=eleve, type_paiement=type_paiement, mode_paiement=mode, montant=30000,
+                                    statut=statut, date_paiement=timezone.localdate())
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(username="admin", password="pass12345")
+        self.user1 = User.objects.create_user(username="u1", password="pass12345")
+        Profil.objects.create(user=self.user1, role='COMPTABLE', ecole=self.ecole1, telephone="+224620000021")
+
+    def _urls(self):
+        return [
+            (reverse(sync), reverse(asynchrone))
+            for sync, asynchrone in (
+                ('paiements:ajax_statistiques_paiements', 'paiements:ajax_statistiques_paiements_async'),
+                ('paiements:ajax_classes_par_ecole', 'paiements:ajax_classes_par_ecole_async'),
+                ('eleves:ajax_statistiques_eleves', 'eleves:ajax_statistiques_eleves_async'),
+            )
+        ] + [
+            (reverse('paiements:ajax_eleve_info') + '?matricule=a-001',
+             reverse('paiements:ajax_eleve_info_async') + '?matricule=a-001'),
+            (reverse('eleves:ajax_classes_par_ecole', args=[self.ecole1.id]),
+             reverse('eleves:ajax_classes_par_ecole_async', args=[self.ecole1.id])),
+        ]
+
+    async def _comparer(self, user):
+        await sync_to_async(self.client.force_login)(user)
+        await self.async_client.aforce_login(user)
+        for url_sync, url_async in self._urls():
+            attendu = await sync_to_async(self.client.get)(url_sync)
+            obtenu = await self.async_client.get(url_async)
+            self.assertEqual(obtenu.status_code, attendu.status_code, url_async)
+            self.assertEqual(obtenu.json(), attendu.json(), url_async)
+
+    def test_memes_reponses_que_les_vues_synchrones(self):
+        async_to_sync(self._comparer)(self.admin)
+        cache.clear()
+        async_to_sync(self._comparer)(self.user1)
+
+    async def test_restriction_par_ecole(self):
+        await self.async_client.aforce_login(self.user1)
+        r = await self.async_client.get(reverse('paiements:ajax_eleve_info_async'), {'matricule': 'B-001'})
+        self.assertEqual(r.status_code, 404)
+        r = await self.async_client.get(reverse('eleves:ajax_classes_par_ecole_async', args=[self.ecole2.id]))
+        self.assertEqual(r.status_code, 403)
+        r = await self.async_client.get(reverse('paiements:ajax_statistiques_paiements_async'))
+        data = r.json()
+        self.assertEqual((data['total'], data['stats']['paiements_en_attente']), (1, 0))
+        r = await self.async_client.get(reverse('paiements:ajax_classes_par_ecole_async'))
+        self.assertEqual([c['nom'] for c in r.json()['classes']], ['C1'])
+
+    async def test_statistiques_mises_en_cache(self):
+        await self.async_client.aforce_login(self.admin)
+        url = reverse('eleves:ajax_statistiques_eleves_async')
+        avant = (await self.async_client.get(url)).json()['stats']
+        self.assertEqual(avant, {'total_eleves': 2, 'eleves_actifs': 1, 'eleves_exclus': 1})
+        await Eleve.objects.filter(pk=self.eleve2.pk).aupdate(statut='ACTIF')
+        self.assertEqual((await self.async_client.get(url)).json()['stats'], avant)
+
+    def test_charger_mesure_debit_et_erreurs(self):
+        async def envoyer(chemin):
+            await asyncio.sleep(0.001)
+            return 200 if chemin == '/ok/' else 500
+
+        resultat = asyncio.run(charge.charger(envoyer, ['/ok/', '/ko/'], requetes=10, concurrence=5))
+        self.assertEqual((resultat['requetes'], resultat['erreurs']), (10, 5))
+        self.assertGreater(resultat['req_par_s'], 0)
+        self.assertLessEqual(resultat['p50_ms'], resultat['p95_ms'])
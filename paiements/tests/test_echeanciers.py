@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from eleves.models import Ecole, Classe, Eleve, GrilleTarifaire, Responsable
+from paiements.echeanciers import IndexGrilles, synchroniser_echeanciers_ecole
+from paiements.models import (
+    EcheancierPaiement, ModePaiement, Paiement, PaiementRemise, RemiseReduction, TypePaiement,
+)
+from paiements.views import _auto_validate_echeancier_for_eleve
+
+
+class SynchronisationEcheanciersTests(TestCase):
+    def setUp(self):
+        self.ecole = Ecole.objects.create(nom="Ecole A", adresse="Adresse A", telephone="+224620000001", directeur="Dir A")
+        self.classe = Classe.objects.create(nom="C1", ecole=self.ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        self.resp = Responsable.objects.create(prenom="P1", nom="R1", relation="PERE", telephone="+224620000011", adresse="Adr1")
+        self.type = TypePaiement.objects.create(nom="Scolarité")
+        self.mode = ModePaiement.objects.create(nom="Espèces")
+        self.remise = RemiseReduction.objects.create(
+            nom="Fratrie", type_remise='MONTANT_FIXE', valeur=10000, motif='FRATRIE',
+            date_debut=date(2024, 9, 1), date_fin=date(2025, 7, 1),
+        )
+
+    def _eleve(self, matricule):
+        eleve = Eleve.objects.create(
+            nom="Nom", prenom=matricule, matricule=matricule, classe=self.classe, sexe='M',
+            date_naissance=date(2015, 1, 1), lieu_naissance="Conakry",
+            date_inscription=date(2024, 9, 1), responsable_principal=self.resp,
+        )
+        EcheancierPaiement.objects.create(
+            eleve=eleve, annee_scolaire="2024-2025",
+            frais_inscription_du=50000, tranche_1_due=100000, tranche_2_due=100000, tranche_3_due=100000,
+            date_echeance_inscription=date(2024, 9, 1), date_echeance_tranche_1=date(2025, 1, 15),
+            date_echeance_tranche_2=date(2025, 3, 15), date_echeance_tranche_3=date(2025, 5, 15),
+        )
+        return eleve
+
+    def _payer(self, eleve, montant, statut='VALIDE', remise=None):
+        paiement = Paiement.objects.create(
+            eleve=eleve, type_paiement=self.type, mode_paiement=self.mode,
+            montant=montant, statut=statut, date_paiement=date(2024, 10, 1),
+        )
+        if remise:
+            PaiementRemise.objects.create(paiement=paiement, remise=self.remise, montant_remise=remise)
+        return paiement
+
+    def test_allocation_et_statuts_pour_toute_une_ecole(self):
+        partiel = self._eleve("E-1")
+        complet = self._eleve("E-2")
+        retard = self._eleve("E-3")
+        self._payer(partiel, 120000, remise=10000)
+        self._payer(partiel, 90000, statut='EN_ATTENTE')
+        self._payer(complet, 350000)
+
+        nb = synchroniser_echeanciers_ecole(self.ecole, today=date(2024, 12, 1))
+        self.assertEqual(nb, 3)
+
+        ech = EcheancierPaiement.objects.get(eleve=partiel)
+        self.assertEqual((ech.frais_inscription_paye, ech.tranche_1_payee, ech.tranche_2_payee), (50000, 80000, 0))
+        self.assertEqual(ech.statut, 'PAYE_PARTIEL')
+        self.assertEqual(EcheancierPaiement.objects.get(eleve=complet).statut, 'PAYE_COMPLET')
+        self.assertEqual(EcheancierPaiement.objects.get(eleve=retard).statut, 'EN_RETARD')
+
+        # Deuxième passage: rien n'a changé, aucune écriture
+        self.assertEqual(synchroniser_echeanciers_ecole(self.ecole, today=date(2024, 12, 1)), 0)
+
+    def test_enveloppe_mono_eleve_met_a_jour_l_instance(self):
+        eleve = self._eleve("E-1")
+        self._payer(eleve, 50000)
+        eleve = Eleve.objects.select_related('echeancier').get(pk=eleve.pk)
+        _auto_validate_echeancier_for_eleve(eleve)
+        self.assertEqual(eleve.echeancier.frais_inscription_paye, 50000)
+        self.assertEqual(EcheancierPaiement.objects.get(eleve=eleve).frais_inscription_paye, 50000)
+
+
+class BackfillEcheanciersTests(TestCase):
+    def setUp(self):
+        self.ecole = Ecole.objects.create(nom="Ecole A", adresse="Adresse A", telephone="+224620000001", directeur="Dir A")
+        self.classe = Classe.objects.create(nom="C1", ecole=self.ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        resp = Responsable.objects.create(prenom="P1", nom="R1", relation="PERE", telephone="+224620000011", adresse="Adr1")
+        for i in range(5):
+            Eleve.objects.create(
+                nom="Nom", prenom=str(i), matricule=f"E-{i}", classe=self.classe, sexe='M',
+                date_naissance=date(2015, 1, 1), lieu_naissance="Conakry",
+                date_inscription=date(2024, 9, 1), responsable_principal=resp,
+            )
+        GrilleTarifaire.objects.create(ecole=self.ecole, niveau="PRIMAIRE_1", annee_scolaire="2023-2024", tranche_1=1)
+        GrilleTarifaire.objects.create(
+            ecole=self.ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025",
+            frais_inscription=50000, tranche_1=100000, tranche_2=100000, tranche_3=100000,
+        )
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+
+    def test_index_grilles_prefere_l_annee_de_la_classe(self):
+        index = IndexGrilles.charger()
+        self.assertEqual(index.trouver(self.ecole.id, "PRIMAIRE_1", "2024-2025").annee_scolaire, "2024-2025")
+        self.assertEqual(index.trouver(self.ecole.id, "PRIMAIRE_1", "1999-2000").annee_scolaire, "2024-2025")
+        self.assertIsNone(index.trouver(self.ecole.id, "LYCEE_11", "2024-2025"))
+
+    def test_backfill_par_lots_et_reprise(self):
+        out = StringIO()
+        call_command('backfill_echeanciers', '--chunk-size', '2', '--limit', '3', '--checkpoint', self.checkpoint, stdout=out)
+        self.assertEqual(EcheancierPaiement.objects.count(), 3)
+        # L'école n'est pas terminée: la reprise complète les élèves restants
+        call_command('backfill_echeanciers', '--chunk-size', '2', '--checkpoint', self.checkpoint, stdout=out)
+        self.assertEqual(EcheancierPaiement.objects.count(), 5)
+        ech = EcheancierPaiement.objects.first()
+        self.assertEqual((ech.annee_scolaire, ech.tranche_1_due), ("2024-2025", 100000))
+        self.assertEqual(ech.date_echeance_tranche_1, date(2025, 1, 15))
+        self.assertIn("lignes/s", out.getvalue())
+        # Exécution complète: le fichier de reprise est supprimé
+        self.assertFalse(os.path.exists(self.checkpoint))
+        # Un élève inscrit depuis reçoit son échéancier à l'exécution suivante
+        Eleve.objects.create(
+            nom="Nom", prenom="Nouveau", matricule="E-9", classe=self.classe, sexe='F',
+            date_naissance=date(2015, 1, 1), lieu_naissance="Conakry", date_inscription=date(2025, 1, 6),
+            responsable_principal=Responsable.objects.first(),
+        )
+        out = StringIO()
+        call_command('backfill_echeanciers', '--checkpoint', self.checkpoint, stdout=out)
+        self.assertIn("Écoles à traiter: 1", out.getvalue())
+        self.assertTrue(EcheancierPaiement.objects.filter(eleve__matricule="E-9").exists())
+
+    def test_reprise_par_ecole_independante(self):
+        autre = Ecole.objects.create(nom="Ecole B", adresse="B", telephone="+224620000002", directeur="Dir B")
+        with open(self.checkpoint, 'w', encoding='utf-8') as fh:
+            json.dump({'ecoles_terminees': [autre.id]}, fh)
+        out = StringIO()
+        call_command('backfill_echeanciers', '--ecole-id', str(self.ecole.id), '--checkpoint', self.checkpoint, stdout=out)
+        # Le fichier de reprise de l'exécution globale n'est pas touché
+        with open(self.checkpoint, encoding='utf-8') as fh:
+            self.assertEqual(json.load(fh), {'ecoles_terminees': [autre.id]})
+        self.assertIn("Lignes écrites=10, échéanciers créés=5", out.getvalue())
+
+        # Tout est déjà créé et synchronisé: aucune ligne écrite
+        out = StringIO()
+        call_command('backfill_echeanciers', '--ecole-id', str(self.ecole.id), '--checkpoint', self.checkpoint, stdout=out)
+        self.assertIn("Lignes écrites=0, échéanciers créés=0", out.getvalue())
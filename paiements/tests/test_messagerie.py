@@ -0,0 +1,90 @@
+import os
+from datetime import date
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from eleves.models import Classe, Ecole, Eleve, Responsable, normaliser_telephone_e164
+from paiements.messagerie import analyser_commande, traiter_en_attente, traiter_message
+from paiements.models import EcheancierPaiement, TwilioInboundMessage
+
+
+class MessagerieEntranteTests(TestCase):
+    def setUp(self):
+        ecole = Ecole.objects.create(nom="Ecole A", adresse="A", telephone="+224620000001", directeur="D")
+        classe = Classe.objects.create(nom="C1", ecole=ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        self.parent = Responsable.objects.create(prenom="Sekou", nom="Camara", relation="PERE",
+                                                 telephone="+224620112233", adresse="A")
+        for matricule, paye in (("PN1-001", 150000), ("PN1-002", 0)):
+            eleve = Eleve.objects.create(
+                nom="Camara", prenom=matricule, matricule=matricule, classe=classe, sexe='M',
+                date_naissance=date(2015, 1, 1), lieu_naissance="Conakry",
+                date_inscription=date(2024, 9, 1), responsable_principal=self.parent,
+            )
+            EcheancierPaiement.objects.create(
+                eleve=eleve, annee_scolaire="2024-2025", frais_inscription_du=50000, tranche_1_due=100000,
+                tranche_2_due=100000, tranche_3_due=100000, frais_inscription_paye=min(paye, 50000),
+                tranche_1_payee=max(0, paye - 50000),
+                date_echeance_inscription=date(2024, 9, 1), date_echeance_tranche_1=date(2025, 1, 15),
+                date_echeance_tranche_2=date(2025, 3, 15), date_echeance_tranche_3=date(2025, 5, 15),
+            )
+
+    def _message(self, expediteur, texte, sid):
+        return TwilioInboundMessage.objects.create(
+            channel='WHATSAPP', from_number=expediteur, to_number='whatsapp:+14155238886', body=texte, message_sid=sid,
+        )
+
+    def test_normalisation_et_colonne_indexee(self):
+        for numero in ('whatsapp:+224 620-11-22-33', '00224620112233', '224620112233', '620112233'):
+            self.assertEqual(normaliser_telephone_e164(numero), '+224620112233')
+        self.assertEqual(normaliser_telephone_e164(''), '')
+        self.assertEqual(self.parent.telephone_e164, '+224620112233')
+        self.assertEqual(analyser_commande('  solde pn1-001 '), ('SOLDE', 'PN1-001'))
+
+    def test_commande_solde(self):
+        message = self._message('whatsapp:+224620112233', 'solde PN1-001', 'SM1')
+        with self.assertNumQueries(5):
+            reponse = traiter_message(message)
+        self.assertIn('PN1-001', reponse)
+        self.assertIn('payé 150 000 GNF, reste 200 000 GNF', reponse)
+        self.assertNotIn('PN1-002', reponse)
+        message.refresh_from_db()
+        self.assertEqual((message.responsable, message.commande), (self.parent, 'SOLDE'))
+        self.assertIsNotNone(message.traite_le)
+        # Déjà traité: aucune seconde réponse
+        self.assertIsNone(traiter_message(message))
+
+        tous = traiter_message(self._message('+224620112233', 'SOLDE', 'SM2'))
+        self.assertIn('PN1-002', tous)
+        self.assertIn("n'est rattaché", traiter_message(self._message('+224620112233', 'SOLDE XX-999', 'SM3')))
+        self.assertIn('Commandes disponibles', traiter_message(self._message('+224620112233', 'bonjour', 'SM4')))
+
+    def test_numero_inconnu_sans_reponse(self):
+        message = self._message('whatsapp:+224699999999', 'SOLDE', 'SM5')
+        self.assertIsNone(traiter_message(message))
+        message.refresh_from_db()
+        self.assertIsNone(message.responsable)
+        self.assertIsNotNone(message.traite_le)
+
+    def test_webhook_planifie_le_traitement(self):
+        with mock.patch.dict(os.environ, {'TWILIO_VALIDATE_SIGNATURE': 'false'}):
+            with self.captureOnCommitCallbacks() as rappels:
+                response = self.client.post(reverse('paiements:twilio_inbound'), {
+                    'From': 'whatsapp:+224620112233', 'To': 'whatsapp:+14155238886',
+                    'Body': 'SOLDE', 'MessageSid': 'SM6',
+                })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(rappels), 1)
+        message = TwilioInboundMessage.objects.get(message_sid='SM6')
+        self.assertIsNone(message.traite_le)
+        # Reprise par la commande (équivalent du thread de traitement)
+        self.assertEqual(traiter_en_attente(), 1)
+        message.refresh_from_db()
+        self.assertIn('PN1-002', message.reponse)
+
+    def test_webhook_refuse_sans_signature(self):
+        with mock.patch.dict(os.environ, {'TWILIO_VALIDATE_SIGNATURE': 'true', 'TWILIO_AUTH_TOKEN': ''}):
+            with self.assertLogs('paiements.twilio_utils', 'WARNING'):
+                response = self.client.post(reverse('paiements:twilio_inbound'), {'From': '+224620112233', 'Body': 'SOLDE'})
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,152 @@
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from eleves.models import Classe, Ecole, Eleve, Responsable
+from paiements.models import EcheancierPaiement, ModePaiement, Paiement, TypePaiement
+from paiements import rapprochement
+from paiements.rapprochement import appliquer, lire_releve, montant_cellule, normaliser_reference, rapprocher
+
+RELEVE = (
+    "Reference;Montant;Date;Matricule;Libelle\n"
+    "om-2410.0001;150 000;02/10/2024;;Paiement OM\n"   # référence + montant: à valider
+    "OM24100002;100000;2024-10-03;;\n"                 # déjà validé
+    "OM24100003;90000;2024-10-03;;\n"                  # écart de montant
+    "OM24100004;50000;2024-10-04;E-2;\n"               # sans référence en base: élève + montant
+    "OM24100005;75000;2024-10-05;E-2;\n"               # à créer (si demandé)
+    "OM24100006;20000;2024-10-05;;\n"                  # non trouvé
+    "OM24100006;20000;2024-10-05;;\n"                  # référence en double
+    "OM24100007;abc;2024-10-05;;\n"                    # ligne invalide
+)
+
+
+class RapprochementTests(TestCase):
+    def setUp(self):
+        self.ecole = Ecole.objects.create(nom="Ecole A", adresse="A", telephone="+224620000001", directeur="D")
+        classe = Classe.objects.create(nom="C1", ecole=self.ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        resp = Responsable.objects.create(prenom="P", nom="R", relation="PERE", telephone="+224620000011", adresse="A")
+        self.type = TypePaiement.objects.create(nom="Scolarité")
+        self.mode = ModePaiement.objects.create(nom="Orange Money")
+        self.eleves = []
+        for matricule in ("E-1", "E-2"):
+            eleve = Eleve.objects.create(
+                nom="Nom", prenom=matricule, matricule=matricule, classe=classe, sexe='M',
+                date_naissance=date(2015, 1, 1), lieu_naissance="Conakry",
+                date_inscription=date(2024, 9, 1), responsable_principal=resp,
+            )
+            EcheancierPaiement.objects.create(
+                eleve=eleve, annee_scolaire="2024-2025",
+                frais_inscription_du=50000, tranche_1_due=100000, tranche_2_due=100000, tranche_3_due=100000,
+                date_echeance_inscription=date(2024, 9, 1), date_echeance_tranche_1=date(2025, 1, 15),
+                date_echeance_tranche_2=date(2025, 3, 15), date_echeance_tranche_3=date(2025, 5, 15),
+            )
+            self.eleves.append(eleve)
+        e1, e2 = self.eleves
+        self.attente = self._paiement(e1, 150000, 'EN_ATTENTE', 'OM 2410-0001', date(2024, 10, 1))
+        self._paiement(e1, 100000, 'VALIDE', 'OM24100002', date(2024, 10, 3))
+        self._paiement(e1, 80000, 'EN_ATTENTE', 'OM24100003', date(2024, 10, 3))
+        self.sans_ref = self._paiement(e2, 50000, 'EN_ATTENTE', None, date(2024, 10, 2))
+
+        self.dossier = tempfile.mkdtemp()
+        self.chemin = os.path.join(self.dossier, 'releve.csv')
+        with open(self.chemin, 'w', encoding='utf-8') as fh:
+            fh.write(RELEVE)
+
+    def tearDown(self):
+        os.remove(self.chemin)
+        os.rmdir(self.dossier)
+
+    def _paiement(self, eleve, montant, statut, reference, jour):
+        return Paiement.objects.create(
+            eleve=eleve, type_paiement=self.type, mode_paiement=self.mode, montant=montant,
+            statut=statut, reference_externe=reference, date_paiement=jour,
+        )
+
+    def test_normalisation(self):
+        self.assertEqual(normaliser_reference(' om-2410.0001 '), 'OM24100001')
+        self.assertEqual(montant_cellule('150 000 GNF'), Decimal('150000'))
+        self.assertEqual(montant_cellule('150,000'), Decimal('150000'))
+        self.assertEqual(montant_cellule(150000.0), Decimal('150000'))
+        self.assertIsNone(montant_cellule('abc'))
+
+    def test_classement_puis_application(self):
+        with self.assertNumQueries(2):
+            resultat = rapprocher(lire_releve(self.chemin), ecole=self.ecole, creer_manquants=True)
+        self.assertEqual(
+            [ligne.resultat for ligne in resultat.lignes],
+            ['A_VALIDER', 'DEJA_VALIDE', 'ECART_MONTANT', 'A_VALIDER', 'A_CREER', 'NON_TROUVE',
+             'REFERENCE_EN_DOUBLE', 'LIGNE_INVALIDE'],
+        )
+        self.assertEqual(resultat.lignes[0].paiement_id, self.attente.id)
+        self.assertEqual(resultat.lignes[3].paiement_id, self.sans_ref.id)
+
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        appliquer(resultat, utilisateur=admin, type_paiement=self.type, mode_paiement=self.mode)
+        self.assertEqual((resultat.valides, resultat.crees), (2, 1))
+        self.attente.refresh_from_db()
+        self.sans_ref.refresh_from_db()
+        self.assertEqual((self.attente.statut, self.attente.valide_par), ('VALIDE', admin))
+        self.assertEqual(self.sans_ref.reference_externe, 'OM24100004')
+        cree = Paiement.objects.get(reference_externe='OM24100005')
+        self.assertEqual((cree.statut, cree.montant, cree.eleve), ('VALIDE', 75000, self.eleves[1]))
+        self.assertTrue(cree.numero_recu.startswith('REC'))
+        # Échéancier resynchronisé: 50 000 + 75 000 couvrent l'inscription et une partie de T1
+        echeancier = EcheancierPaiement.objects.get(eleve=self.eleves[1])
+        self.assertEqual(echeancier.tranche_1_payee, 75000)
+
+        # Un second passage ne valide rien de plus
+        resultat = rapprocher(lire_releve(self.chemin), ecole=self.ecole)
+        self.assertEqual(resultat.compteurs['A_VALIDER'], 0)
+        self.assertEqual(resultat.compteurs['DEJA_VALIDE'], 4)
+
+    def test_numero_de_recu_pris_par_un_enregistrement_concurrent(self):
+        resultat = rapprocher(lire_releve(self.chemin), ecole=self.ecole, creer_manquants=True)
+        reserver = rapprochement._numeros_recus
+        concurrents = []
+
+        def reserver_puis_collision(nombre):
+            numeros = reserver(nombre)
+            if not concurrents:
+                # Un Paiement.save() d'un autre utilisateur prend le premier numéro réservé
+                concurrents.append(self._paiement(self.eleves[0], 1000, 'EN_ATTENTE', None, date(2024, 10, 6)))
+                Paiement.objects.filter(pk=concurrents[0].pk).update(numero_recu=numeros[0])
+            return numeros
+
+        with mock.patch.object(rapprochement, '_numeros_recus', side_effect=reserver_puis_collision) as numeros:
+            appliquer(resultat, type_paiement=self.type, mode_paiement=self.mode)
+        self.assertEqual(numeros.call_count, 2)
+        self.assertEqual((resultat.valides, resultat.crees), (2, 1))
+        cree = Paiement.objects.get(reference_externe='OM24100005')
+        concurrents[0].refresh_from_db()
+        self.assertNotEqual(cree.numero_recu, concurrents[0].numero_recu)
+        self.assertEqual(int(cree.numero_recu[-4:]), int(concurrents[0].numero_recu[-4:]) + 1)
+
+    def test_commande_et_vue(self):
+        sortie = StringIO()
+        exceptions = os.path.join(self.dossier, 'exceptions.csv')
+        call_command('rapprocher_releve', self.chemin, ecole_id=self.ecole.id, dry_run=True,
+                     exceptions=exceptions, stdout=sortie)
+        self.assertIn('à valider 2', sortie.getvalue())
+        with open(exceptions, encoding='utf-8') as fh:
+            self.assertEqual(len(fh.read().strip().splitlines()), 6)  # en-tête + 5 exceptions
+        os.remove(exceptions)
+        self.assertEqual(Paiement.objects.filter(statut='VALIDE').count(), 1)
+
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        self.client.force_login(admin)
+        with open(self.chemin, 'rb') as fh:
+            releve = SimpleUploadedFile('releve.csv', fh.read())
+        response = self.client.post(reverse('paiements:rapprochement_releve'),
+                                    {'releve': releve, 'fenetre': '3', 'action': 'appliquer'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['compteurs']['A_VALIDER'], 2)
+        self.assertEqual(Paiement.objects.filter(statut='VALIDE').count(), 3)
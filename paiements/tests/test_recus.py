@@ -0,0 +1,124 @@
+import os
+import re
+import shutil
+import tempfile
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from eleves.models import Classe, Ecole, Eleve, Responsable
+from paiements import recus
+from paiements.models import ModePaiement, Paiement, PaiementRemise, RemiseReduction, TypePaiement
+
+
+class RecusCacheTests(TestCase):
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        reglages = override_settings(RECUS_DIR=self.dossier)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.addCleanup(shutil.rmtree, self.dossier, True)
+
+        ecole = Ecole.objects.create(nom="Ecole A", adresse="A", telephone="+224620000001", directeur="D")
+        classe = Classe.objects.create(nom="C1", ecole=ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        resp = Responsable.objects.create(prenom="P", nom="R", relation="PERE", telephone="+224620000011", adresse="A")
+        eleve = Eleve.objects.create(
+            nom="Nom", prenom="Prenom", matricule="E-1", classe=classe, sexe='M',
+            date_naissance=date(2015, 1, 1), lieu_naissance="Conakry",
+            date_inscription=date(2024, 9, 1), responsable_principal=resp,
+        )
+        type_paiement = TypePaiement.objects.create(nom="Scolarité")
+        mode = ModePaiement.objects.create(nom="Espèces")
+        self.paiements = [
+            Paiement.objects.create(eleve=eleve, type_paiement=type_paiement, mode_paiement=mode, montant=montant,
+                                    statut='VALIDE', date_paiement=date(2024, 10, jour))
+            for montant, jour in ((100000, 1), (50000, 2), (75000, 3))
+        ]
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pass-12345')
+        self.client.force_login(self.admin)
+
+    def _url(self, paiement):
+        return reverse('paiements:generer_recu_pdf', args=[paiement.id])
+
+    def test_rendu_unique_puis_cache(self):
+        paiement = self.paiements[0]
+        with mock.patch('paiements.recus.dessiner_recu', wraps=recus.dessiner_recu) as dessin:
+            premiere = self.client.get(self._url(paiement))
+            seconde = self.client.get(self._url(paiement))
+        self.assertEqual(dessin.call_count, 1)
+        self.assertEqual(premiere.status_code, 200)
+        contenu = b''.join(seconde.streaming_content)
+        self.assertTrue(contenu.startswith(b'%PDF'))
+        self.assertEqual(premiere['ETag'], seconde['ETag'])
+        self.assertIn('private', seconde['Cache-Control'])
+        self.assertIn('attachment', seconde['Content-Disposition'])
+
+        revalidation = self.client.get(self._url(paiement), HTTP_IF_NONE_MATCH=seconde['ETag'])
+        self.assertEqual(revalidation.status_code, 304)
+
+    def test_annulation_de_remise_invalide_le_recu(self):
+        paiement = self.paiements[0]
+        remise = RemiseReduction.objects.create(
+            nom="Fratrie", type_remise='MONTANT_FIXE', valeur=10000, motif='AUTRE',
+            date_debut=date(2024, 1, 1), date_fin=date(2025, 12, 31),
+        )
+        PaiementRemise.objects.create(paiement=paiement, remise=remise, montant_remise=10000)
+        etag = self.client.get(self._url(paiement))['ETag']
+        self.assertTrue(os.path.exists(recus.chemin_recu(paiement.id, etag.strip('"'))))
+
+        self.client.post(reverse('paiements:annuler_remise_paiement', args=[paiement.id]))
+        self.assertFalse(os.path.exists(recus.chemin_recu(paiement.id, etag.strip('"'))))
+        self.assertNotEqual(self.client.get(self._url(paiement))['ETag'], etag)
+
+    def test_nouveau_paiement_change_la_version_des_recus(self):
+        # Le solde global et les restes à payer imprimés dépendent des autres paiements
+        paiement = self.paiements[0]
+        etag = self.client.get(self._url(paiement))['ETag']
+        Paiement.objects.create(
+            eleve=paiement.eleve, type_paiement=paiement.type_paiement, mode_paiement=paiement.mode_paiement,
+            montant=20000, statut='VALIDE', date_paiement=date(2024, 10, 4),
+        )
+        with mock.patch('paiements.recus.dessiner_recu', wraps=recus.dessiner_recu) as dessin:
+            response = self.client.get(self._url(paiement), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(dessin.call_count, 1)
+        self.assertFalse(os.path.exists(recus.chemin_recu(paiement.id, etag.strip('"'))))
+
+    def test_impression_par_lot(self):
+        with mock.patch('paiements.recus.dessiner_recu', wraps=recus.dessiner_recu) as dessin:
+            response = self.client.get(reverse('paiements:imprimer_recus_lot'),
+                                       {'date_debut': '2024-10-01', 'date_fin': '2024-10-03'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dessin.call_count, 3)
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertEqual(len(re.findall(rb'/Type /Page\b', pdf)), 3)
+
+        # Second lot: les reçus mis en cache par le premier sont concaténés sans être redessinés
+        with mock.patch('paiements.recus.dessiner_recu', wraps=recus.dessiner_recu) as dessin:
+            selection = self.client.get(reverse('paiements:imprimer_recus_lot'),
+                                        {'ids': [self.paiements[2].id, self.paiements[0].id]})
+        self.assertEqual(dessin.call_count, 0)
+        self.assertEqual(len(re.findall(rb'/Type /Page\b', b''.join(selection.streaming_content))), 2)
+
+    def test_impression_par_lot_sans_pypdf(self):
+        with mock.patch('paiements.recus.fusion_disponible', return_value=False), \
+                mock.patch('paiements.recus.dessiner_recu', wraps=recus.dessiner_recu) as dessin:
+            response = self.client.get(reverse('paiements:imprimer_recus_lot'), {'ids': [p.id for p in self.paiements]})
+        self.assertEqual(dessin.call_count, 3)
+        self.assertEqual(len(re.findall(rb'/Type /Page\b', b''.join(response.streaming_content))), 3)
+
+    def test_identite_de_l_eleve_change_la_version(self):
+        paiement = self.paiements[0]
+        etag = self.client.get(self._url(paiement))['ETag']
+        eleve = paiement.eleve
+        eleve.nom = "Renommé"
+        eleve.save()
+        self.assertNotEqual(self.client.get(self._url(paiement))['ETag'], etag)
+        etag = self.client.get(self._url(paiement))['ETag']
+        Classe.objects.filter(pk=eleve.classe_id).update(nom="C2")
+        self.assertNotEqual(self.client.get(self._url(paiement))['ETag'], etag)
@@ -0,0 +1,153 @@
+import time
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from eleves.models import Classe, Ecole, Eleve, Responsable
+from paiements import remises
+from paiements.models import ModePaiement, Paiement, PaiementRemise, RemiseReduction, TypePaiement
+from utilisateurs.models import Profil
+
+
+class RemisesFratrieTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ecole = Ecole.objects.create(nom="Ecole A", adresse="A", telephone="+224620000001", directeur="Dir A")
+        self.autre_ecole = Ecole.objects.create(nom="Ecole B", adresse="B", telephone="+224620000002", directeur="Dir B")
+        self.classe = Classe.objects.create(nom="C1", ecole=self.ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        self.type = TypePaiement.objects.create(nom="Scolarité")
+        self.mode = ModePaiement.objects.create(nom="Espèces")
+        periode = {'date_debut': date(2024, 9, 1), 'date_fin': date(2025, 8, 31)}
+        self.deuxieme = RemiseReduction.objects.create(
+            nom="Réduction fratrie - 2ème enfant", type_remise='POURCENTAGE', valeur=10, motif='FRATRIE',
+            rang_fratrie=2, **periode,
+        )
+        self.troisieme = RemiseReduction.objects.create(
+            nom="Réduction fratrie - 3ème enfant et plus", type_remise='POURCENTAGE', valeur=15, motif='FRATRIE',
+            rang_fratrie=3, **periode,
+        )
+        self.merite = RemiseReduction.objects.create(
+            nom="Mérite", type_remise='MONTANT_FIXE', valeur=5000, motif='MERITE', **periode,
+        )
+        # Même famille saisie sous deux fiches responsables (numéro formaté différemment)
+        pere = self._responsable("Diallo", "Mamadou", "+224620112233")
+        mere = self._responsable("Bah", "Aïssatou", "+224 620-11-22-33")
+        voisin = self._responsable("Camara", "Ibrahima", "+224620999999")
+        self.aine = self._eleve("F-1", pere, date(2012, 3, 1))
+        self.cadet = self._eleve("F-2", mere, date(2014, 6, 1))
+        self.benjamin = self._eleve("F-3", pere, date(2017, 1, 1))
+        self.seul = self._eleve("S-1", voisin, date(2013, 1, 1))
+        for eleve in (self.aine, self.cadet, self.benjamin, self.seul):
+            self._payer(eleve, 100000)
+
+    def _responsable(self, nom, prenom, telephone):
+        return Responsable.objects.create(nom=nom, prenom=prenom, relation="PERE", telephone=telephone, adresse="Adr")
+
+    def _eleve(self, matricule, responsable, naissance):
+        return Eleve.objects.create(
+            nom="Nom", prenom=matricule, matricule=matricule, classe=self.classe, sexe='M',
+            date_naissance=naissance, lieu_naissance="Conakry", date_inscription=date(2024, 9, 1),
+            responsable_principal=responsable,
+        )
+
+    def _payer(self, eleve, montant, statut='EN_ATTENTE'):
+        return Paiement.objects.create(
+            eleve=eleve, type_paiement=self.type, mode_paiement=self.mode,
+            montant=montant, statut=statut, date_paiement=date(2024, 10, 1),
+        )
+
+    def _remises(self):
+        return {
+            (r.paiement.eleve_id, r.remise_id): int(r.montant_remise)
+            for r in PaiementRemise.objects.select_related('paiement')
+        }
+
+    def test_rangs_par_famille(self):
+        fratries = remises.fratries_ecole(self.ecole)
+        self.assertEqual([fratries[e.pk].rang for e in (self.aine, self.cadet, self.benjamin)], [1, 2, 3])
+        self.assertEqual(fratries[self.cadet.pk].taille, 3)
+        self.assertEqual((fratries[self.seul.pk].rang, fratries[self.seul.pk].taille), (1, 1))
+        self.assertEqual(remises.fratrie_eleve(self.benjamin).rang, 3)
+
+    def test_application_groupee_et_idempotente(self):
+        manuelle = PaiementRemise.objects.create(
+            paiement=Paiement.objects.get(eleve=self.aine), remise=self.merite, montant_remise=5000,
+        )
+        simulation = remises.appliquer_fratrie_ecole(self.ecole, simuler=True)
+        self.assertEqual(PaiementRemise.objects.count(), 1)
+
+        # Familles, paiements, une suppression et un insert groupés (+ savepoint), quel que soit le volume
+        with self.assertNumQueries(6):
+            resultat = remises.appliquer_fratrie_ecole(self.ecole)
+        self.assertEqual(resultat, simulation)
+        self.assertEqual(resultat['par_rang'], {2: 1, 3: 1})
+        attendu = {
+            (self.aine.pk, self.merite.pk): 5000,
+            (self.cadet.pk, self.deuxieme.pk): 10000,
+            (self.benjamin.pk, self.troisieme.pk): 15000,
+        }
+        self.assertEqual(self._remises(), attendu)
+
+        # Le cadet quitte l'école: le benjamin devient deuxième enfant
+        Eleve.objects.filter(pk=self.cadet.pk).update(statut='TRANSFERE')
+        remises.appliquer_fratrie_ecole(self.ecole)
+        self.assertTrue(PaiementRemise.objects.filter(pk=manuelle.pk).exists())
+        self.assertEqual(self._remises()[(self.benjamin.pk, self.deuxieme.pk)], 10000)
+        self.assertNotIn((self.benjamin.pk, self.troisieme.pk), self._remises())
+
+    def test_paiements_valides_non_modifies(self):
+        Paiement.objects.filter(eleve=self.cadet).update(statut='VALIDE')
+        call_command('appliquer_remises_fratrie', ecole_id=self.ecole.pk, stdout=StringIO())
+        self.assertEqual(set(self._remises()), {(self.benjamin.pk, self.troisieme.pk)})
+
+    def test_index_invalide_a_la_modification(self):
+        remises.index_remises()
+        with self.assertNumQueries(0):
+            self.assertEqual(remises.index_remises().fratrie(5, date(2024, 10, 1)), self.troisieme)
+        self.troisieme.actif = False
+        self.troisieme.save()
+        self.assertEqual(remises.index_remises().fratrie(5, date(2024, 10, 1)), self.deuxieme)
+        self.assertIsNone(remises.index_remises().fratrie(2, date(2025, 9, 1)))
+
+    def test_modification_par_un_autre_processus(self):
+        remises.index_remises()
+        # update() sans save(): ce processus n'est pas prévenu, comme s'il s'agissait d'un autre worker
+        RemiseReduction.objects.filter(pk=self.troisieme.pk).update(actif=False, date_modification=timezone.now())
+        with self.assertNumQueries(0):
+            self.assertEqual(remises.index_remises().fratrie(5, date(2024, 10, 1)), self.troisieme)
+        plus_tard = time.monotonic() + remises.VERIFICATION_SECONDES
+        with mock.patch.object(remises.time, 'monotonic', return_value=plus_tard):
+            self.assertEqual(remises.index_remises().fratrie(5, date(2024, 10, 1)), self.deuxieme)
+            with self.assertNumQueries(0):
+                remises.index_remises()
+
+    def test_apercu_ajax(self):
+        User = get_user_model()
+        comptable = User.objects.create_user(username="c1", password="pass12345")
+        Profil.objects.create(user=comptable, role='COMPTABLE', ecole=self.ecole, telephone="+224620000021")
+        self.client.force_login(comptable)
+        url = reverse('paiements:ajax_calculer_remise')
+
+        reponse = self.client.get(url, {'montant': '200000', 'eleve_id': self.benjamin.pk, 'date': '2024-10-01'}).json()
+        self.assertEqual(reponse['montant_apres_remise'], 170000)
+        self.assertEqual(reponse['fratrie'], {'rang': 3, 'taille': 3})
+        self.assertEqual(reponse['details'][0]['id'], self.troisieme.pk)
+
+        reponse = self.client.get(url, {'montant': '100000', 'remise_id': self.merite.pk, 'date': '2024-10-01'}).json()
+        self.assertEqual(reponse['calcul']['montant_final'], 95000)
+        self.assertEqual(reponse['calcul']['pourcentage_remise'], 5.0)
+
+        reponse = self.client.get(url, {'montant': '100000', 'remise_id': self.merite.pk, 'date': '2026-01-01'}).json()
+        self.assertFalse(reponse['success'])
+
+        # Élève d'une autre école: refusé
+        classe_b = Classe.objects.create(nom="C2", ecole=self.autre_ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        Eleve.objects.filter(pk=self.seul.pk).update(classe=classe_b)
+        self.assertEqual(self.client.get(url, {'montant': '1000', 'eleve_id': self.seul.pk}).status_code, 404)
@@ -1,21 +1,37 @@
 import os
 import threading
 import logging
-from typing import Optional, Literal
+from typing import TYPE_CHECKING, Optional, Literal
 
+from ecole_moderne.metrics import incrementer
 from .utils_security import mask_secret
 
-try:
+if TYPE_CHECKING:
     from twilio.rest import Client
-except Exception:
-    Client = None  # Twilio not installed yet
 
 Channel = Literal["sms", "whatsapp"]
 
 logger = logging.getLogger(__name__)
 
 
-def _get_client() -> Optional[Client]:
+def _client_class():
+    """Twilio REST client class, imported on first use (the SDK is slow to import)."""
+    try:
+        from twilio.rest import Client
+    except Exception:
+        return None  # Twilio not installed yet
+    return Client
+
+
+def _request_validator_class():
+    try:
+        from twilio.request_validator import RequestValidator
+    except Exception:
+        return None
+    return RequestValidator
+
+
+def _get_client() -> Optional["Client"]:
     account_sid = os.getenv("TWILIO_ACCOUNT_SID")
     auth_token = os.getenv("TWILIO_AUTH_TOKEN")
     if not account_sid or not auth_token:
@@ -25,6 +41,7 @@ def _get_client() -> Optional[Client]:
             mask_secret(auth_token),
         )
         return None
+    Client = _client_class()
     if Client is None:
         logger.debug("Twilio SDK not installed; Client is None")
         return None
@@ -39,6 +56,23 @@ def _get_client() -> Optional[Client]:
         return None
 
 
+def is_valid_twilio_request(request) -> bool:
+    """Check the X-Twilio-Signature header of an incoming webhook.
+
+    Validation can be disabled for local testing with TWILIO_VALIDATE_SIGNATURE=false;
+    otherwise a missing auth token or SDK rejects the request.
+    """
+    if os.getenv("TWILIO_VALIDATE_SIGNATURE", "true").lower() in {"0", "false", "no"}:
+        return True
+    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+    RequestValidator = _request_validator_class() if auth_token else None
+    if RequestValidator is None:
+        logger.warning("Twilio webhook rejected: signature cannot be validated (token or SDK missing)")
+        return False
+    signature = request.META.get("HTTP_X_TWILIO_SIGNATURE", "")
+    return RequestValidator(auth_token).validate(request.build_absolute_uri(), request.POST.dict(), signature)
+
+
 def _format_recipient(number: str, channel: Channel) -> str:
     number = (number or "").strip()
     if channel == "whatsapp":
@@ -64,6 +98,7 @@ def send_message(
     client = _get_client()
     if not client:
         logger.warning("Twilio client unavailable; check env and installation")
+        incrementer("ecole_messages_twilio_total", canal=channel, resultat="echec")
         return False, "TWILIO_CLIENT_UNAVAILABLE"
 
     # Prefer Messaging Service SID if provided; else resolve sender number per channel
@@ -80,6 +115,7 @@ def send_message(
 
         if not from_number:
             logger.warning("Twilio sender missing (TWILIO_FROM[_WHATSAPP/_SMS]) and no Messaging Service SID")
+            incrementer("ecole_messages_twilio_total", canal=channel, resultat="echec")
             return False, "TWILIO_FROM_MISSING"
 
     try:
@@ -105,6 +141,7 @@ def send_message(
             from_logged,
             mask_secret(getattr(msg, "sid", ""), show=6),
         )
+        incrementer("ecole_messages_twilio_total", canal=channel, resultat="envoye")
         return True, getattr(msg, "sid", None) or "SENT"
     except Exception as e:
         logger.error(
@@ -113,6 +150,7 @@ def send_message(
             mask_secret(from_number),
             str(e),
         )
+        incrementer("ecole_messages_twilio_total", canal=channel, resultat="echec")
         return False, str(e)
 
 
@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_async
 from .views_tranches import export_tranches_par_classe_pdf, export_tranches_par_classe_excel
 
 app_name = 'paiements'
 
+# Points d'accès AJAX: version asynchrone sous ASGI (AJAX_ASYNC), synchrone sinon
+ajax = views_async if settings.AJAX_ASYNC else views
+
 urlpatterns = [
     # Tableau de bord
     path('', views.tableau_bord_paiements, name='tableau_bord'),
@@ -16,6 +20,7 @@ urlpatterns = [
     path('valider/<int:paiement_id>/', views.valider_paiement, name='valider_paiement'),
     path('relancer/<int:eleve_id>/', views.relancer_eleve, name='relancer_eleve'),
     path('relances/', views.liste_relances, name='liste_relances'),
+    path('rapprochement/', views.rapprochement_releve, name='rapprochement_releve'),
     path('retards/envoyer/', views.envoyer_notifs_retards, name='envoyer_notifs_retards'),
     
     # Échéanciers
@@ -26,6 +31,7 @@ urlpatterns = [
     
     # Génération de documents
     path('recu/<int:paiement_id>/pdf/', views.generer_recu_pdf, name='generer_recu_pdf'),
+    path('recus/lot/pdf/', views.imprimer_recus_lot, name='imprimer_recus_lot'),
     path('export/tranches-par-classe/pdf/', export_tranches_par_classe_pdf, name='export_tranches_par_classe_pdf'),
     path('export/tranches-par-classe/excel/', export_tranches_par_classe_excel, name='export_tranches_par_classe_excel'),
     path('export/liste/excel/', views.export_liste_paiements_excel, name='export_liste_paiements_excel'),
@@ -45,10 +51,13 @@ urlpatterns = [
     path('api/paiements/<int:pk>/', views.api_paiement_detail, name='api_paiement_detail'),
     
     # AJAX endpoints
-    path('ajax/statistiques/', views.ajax_statistiques_paiements, name='ajax_statistiques_paiements'),
-    path('ajax/eleve-info/', views.ajax_eleve_info, name='ajax_eleve_info'),
+    path('ajax/statistiques/', ajax.ajax_statistiques_paiements, name='ajax_statistiques_paiements'),
+    path('ajax/eleve-info/', ajax.ajax_eleve_info, name='ajax_eleve_info'),
     path('ajax/calculer-remise/', views.ajax_calculer_remise, name='ajax_calculer_remise'),
-    path('ajax/classes/', views.ajax_classes_par_ecole, name='ajax_classes_par_ecole'),
+    path('ajax/classes/', ajax.ajax_classes_par_ecole, name='ajax_classes_par_ecole'),
+    path('ajax/async/statistiques/', views_async.ajax_statistiques_paiements, name='ajax_statistiques_paiements_async'),
+    path('ajax/async/eleve-info/', views_async.ajax_eleve_info, name='ajax_eleve_info_async'),
+    path('ajax/async/classes/', views_async.ajax_classes_par_ecole, name='ajax_classes_par_ecole_async'),
     
     # Webhooks (Twilio)
     path('twilio/inbound/', views.twilio_inbound, name='twilio_inbound'),
@@ -5,7 +5,7 @@ from django.views.decorators.vary import vary_on_cookie
 from django.contrib import messages
 from django.db import transaction
 from django.db.models import Sum, Count
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import FileResponse, JsonResponse, HttpResponse, Http404
 from django.shortcuts import get_object_or_404, render, redirect
 from django.utils import timezone
 from django.db.models import Q, Sum, Count
@@ -14,34 +14,36 @@ from django.utils import timezone
 from decimal import Decimal
 from datetime import date, datetime
 import os
+import functools
 import logging
+import tempfile
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
 from django.db.models import F, ExpressionWrapper, DecimalField, Case, When, Value, Q, Sum, Count
 from django.db.models.functions import Coalesce, Least
 from django.db.models.functions import Greatest
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment, Font, PatternFill, Border, Side, numbers
 from io import BytesIO
-try:
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.utils import ImageReader
-except Exception:
-    canvas = None
-    A4 = (595.27, 841.89)
-    ImageReader = None
-from ecole_moderne.pdf_utils import draw_logo_watermark
+from ecole_moderne import pdf
+from ecole_moderne.exports import Colonne, exporter
+from ecole_moderne.metrics import incrementer
 from ecole_moderne.security_decorators import require_school_object
-
+from ecole_moderne.replica import lecture_replica
+
+from .echeanciers import construire_echeancier, synchroniser_echeanciers
+from .statistiques import statistiques_tableau_bord
+from .recus import imprimer_lot, invalider_recu, obtenir_recu
+from .rapprochement import EXCEPTIONS as EXCEPTIONS_RAPPROCHEMENT, appliquer, lire_releve, rapprocher
+from .remises import apercu as apercu_remise
+from eleves.importation import ErreurImport
 from .models import Paiement, EcheancierPaiement, TypePaiement, ModePaiement, RemiseReduction, PaiementRemise, Relance, TwilioInboundMessage
 from eleves.models import Eleve, GrilleTarifaire, Classe
 from .forms import PaiementForm, EcheancierForm, RechercheForm
 from .remise_forms import PaiementRemiseForm, CalculateurRemiseForm
 from utilisateurs.utils import user_is_admin, filter_by_user_school, user_school
 from utilisateurs.permissions import has_permission, get_user_permissions, can_add_payments, can_modify_payments, can_delete_payments, can_validate_payments, can_view_reports, can_apply_discounts
+from .messagerie import planifier_traitement
+from .twilio_utils import is_valid_twilio_request as _is_valid_twilio_request
 from .notifications import (
     send_payment_receipt,
     send_enrollment_confirmation,
@@ -65,97 +67,17 @@ def ensure_echeancier_for_eleve(eleve: "Eleve", *, created_by=None) -> "Echeanci
     if ech:
         return ech
 
-    # Déterminer la meilleure grille disponible
-    try:
-        niveau = getattr(eleve.classe, 'niveau', None)
-        ecole = getattr(eleve.classe, 'ecole', None)
-        annee_classe = getattr(eleve.classe, 'annee_scolaire', None)
-    except Exception:
-        niveau = None
-        ecole = None
-        annee_classe = None
-
-    try:
-        from datetime import date as _d
-        today_d = _d.today()
-    except Exception:
-        from datetime import date as _d
-        today_d = _d.today()
-
-    annee_scolaire_def = f"{today_d.year}-{today_d.year+1}" if today_d.month >= 9 else f"{today_d.year-1}-{today_d.year}"
-    grille = None
-    try:
-        if ecole and niveau:
-            # 1) Grille exacte sur l'année de la classe
-            if annee_classe:
-                grille = GrilleTarifaire.objects.filter(ecole=ecole, niveau=niveau, annee_scolaire=annee_classe).first()
-            # 2) Sinon année scolaire par défaut
-            if grille is None:
-                grille = GrilleTarifaire.objects.filter(ecole=ecole, niveau=niveau, annee_scolaire=annee_scolaire_def).first()
-            # 3) Sinon la plus récente
-            if grille is None:
-                grille = GrilleTarifaire.objects.filter(ecole=ecole, niveau=niveau).order_by('-annee_scolaire').first()
-    except Exception:
-        grille = None
-
-    # Préparer les champs
-    if grille:
-        annee_scol = grille.annee_scolaire
-        fi = grille.frais_inscription or 0
-        t1 = grille.tranche_1 or 0
-        t2 = grille.tranche_2 or 0
-        t3 = grille.tranche_3 or 0
-    else:
-        annee_scol = annee_classe or annee_scolaire_def
-        fi = 0
-        t1 = 0
-        t2 = 0
-        t3 = 0
-
-    # Dates d'échéance par défaut
-    try:
-        try:
-            annee_debut = int(str(annee_scol).split('-')[0])
-        except Exception:
-            annee_debut = today_d.year if today_d.month >= 9 else today_d.year - 1
-        annee_fin = annee_debut + 1
-        from datetime import date as _d
-        d_insc = today_d
-        d_t1 = _d(annee_fin, 1, 15)
-        d_t2 = _d(annee_fin, 3, 15)
-        d_t3 = _d(annee_fin, 5, 15)
-    except Exception:
-        d_insc = today_d
-        d_t1 = today_d
-        d_t2 = today_d
-        d_t3 = today_d
-
+    ech = construire_echeancier(eleve, created_by=created_by)
     with transaction.atomic():
-        ech = EcheancierPaiement.objects.create(
-            eleve=eleve,
-            annee_scolaire=annee_scol,
-            frais_inscription_du=fi,
-            tranche_1_due=t1,
-            tranche_2_due=t2,
-            tranche_3_due=t3,
-            date_echeance_inscription=d_insc,
-            date_echeance_tranche_1=d_t1,
-            date_echeance_tranche_2=d_t2,
-            date_echeance_tranche_3=d_t3,
-            cree_par=created_by if created_by and getattr(created_by, 'is_authenticated', False) else None,
-        )
+        ech.save()
     return ech
 
 def _auto_validate_echeancier_for_eleve(eleve: "Eleve") -> None:
     """Synchronise l'échéancier de l'élève avec les paiements VALIDÉS avant impression du reçu.
 
-    Règles conservatrices:
-    - Si la somme des paiements validés + remises couvre le total dû -> statut = PAYE_COMPLET
-      et on aligne les champs *_payee sur les *_due pour cohérence d'affichage.
-    - Si couverture = 0 -> statut = A_PAYER (pas d'allocation détaillée effectuée ici)
-    - Sinon -> statut = PAYE_PARTIEL (sans répartir finement par tranche)
-
-    Cette fonction évite les incohérences si l'allocation manuelle par tranche a été oubliée.
+    Enveloppe mono-élève de `paiements.echeanciers.synchroniser_echeanciers`, qui applique
+    les règles d'allocation (inscription -> T1 -> T2 -> T3) et de statut (PAYE_COMPLET,
+    EN_RETARD, A_PAYER, PAYE_PARTIEL). L'instance `eleve.echeancier` est mise à jour sur place.
     """
     try:
         # Récupérer l'échéancier (sans exception si absent)
@@ -164,114 +86,7 @@ def _auto_validate_echeancier_for_eleve(eleve: "Eleve") -> None:
             echeancier = EcheancierPaiement.objects.filter(eleve=eleve).first()
         if not echeancier:
             return
-
-        # Totaux dus
-        total_du = int((echeancier.frais_inscription_du or 0)
-                       + (echeancier.tranche_1_due or 0)
-                       + (echeancier.tranche_2_due or 0)
-                       + (echeancier.tranche_3_due or 0))
-
-        # Paiements validés et remises appliquées sur des paiements
-        aggs = (
-            Paiement.objects
-            .filter(eleve=eleve, statut='VALIDE')
-            .aggregate(sum_montant=Sum('montant'), sum_remises=Sum('remises__montant_remise'))
-        )
-        sum_montant = int(aggs.get('sum_montant') or 0)
-        sum_remises = int(aggs.get('sum_remises') or 0)
-
-        couverture = max(0, sum_montant + sum_remises)
-
-        # Déterminer le nouveau statut avec gestion du retard
-        # Calcul de l'exigible (sommes dont la date d'échéance est passée ou aujourd'hui)
-        from django.utils import timezone as _tz
-        today = _tz.localdate() if hasattr(_tz, 'localdate') else date.today()
-        exigible = 0
-        if echeancier.date_echeance_inscription and echeancier.date_echeance_inscription <= today:
-            exigible += int(echeancier.frais_inscription_du or 0)
-        if echeancier.date_echeance_tranche_1 and echeancier.date_echeance_tranche_1 <= today:
-            exigible += int(echeancier.tranche_1_due or 0)
-        if echeancier.date_echeance_tranche_2 and echeancier.date_echeance_tranche_2 <= today:
-            exigible += int(echeancier.tranche_2_due or 0)
-        if echeancier.date_echeance_tranche_3 and echeancier.date_echeance_tranche_3 <= today:
-            exigible += int(echeancier.tranche_3_due or 0)
-
-        # Allocation conservatrice sur les tranches SANS jamais réduire l'existant
-        # 1) total déjà indiqué comme payé dans l'échéancier
-        old_insc = int(echeancier.frais_inscription_paye or 0)
-        old_t1 = int(echeancier.tranche_1_payee or 0)
-        old_t2 = int(echeancier.tranche_2_payee or 0)
-        old_t3 = int(echeancier.tranche_3_payee or 0)
-        current_total_paid = max(0, old_insc + old_t1 + old_t2 + old_t3)
-
-        # 2) Incrément à répartir basé sur la couverture réelle
-        increment = max(0, couverture - current_total_paid)
-        remaining = increment
-
-        def _alloc(due: int, paid: int, remaining_local: int):
-            due_i = int(due or 0)
-            paid_i = int(paid or 0)
-            room = max(0, due_i - paid_i)
-            take = min(room, max(0, int(remaining_local)))
-            return paid_i + take, remaining_local - take
-
-        changed = False
-        if remaining > 0:
-            # Ordre: inscription -> T1 -> T2 -> T3
-            new_insc, remaining = _alloc(echeancier.frais_inscription_du, old_insc, remaining)
-            new_t1, remaining = _alloc(echeancier.tranche_1_due, old_t1, remaining)
-            new_t2, remaining = _alloc(echeancier.tranche_2_due, old_t2, remaining)
-            new_t3, remaining = _alloc(echeancier.tranche_3_due, old_t3, remaining)
-
-            if new_insc != old_insc:
-                echeancier.frais_inscription_paye = new_insc
-                changed = True
-            if new_t1 != old_t1:
-                echeancier.tranche_1_payee = new_t1
-                changed = True
-            if new_t2 != old_t2:
-                echeancier.tranche_2_payee = new_t2
-                changed = True
-            if new_t3 != old_t3:
-                echeancier.tranche_3_payee = new_t3
-                changed = True
-
-        # Somme payée effective bornée au total dû
-        paye_effectif = min(couverture, total_du)
-
-        if total_du <= 0:
-            new_statut = 'PAYE_COMPLET'
-        elif paye_effectif >= total_du:
-            new_statut = 'PAYE_COMPLET'
-        elif exigible > 0 and paye_effectif < exigible:
-            new_statut = 'EN_RETARD'
-        elif paye_effectif <= 0:
-            new_statut = 'A_PAYER'
-        else:
-            new_statut = 'PAYE_PARTIEL'
-
-        # Appliquer le statut et éventuellement aligner les montants payés si totalement soldé
-        # 'changed' peut déjà être True si allocation ci-dessus a modifié des champs
-        if echeancier.statut != new_statut:
-            echeancier.statut = new_statut
-            changed = True
-        if new_statut == 'PAYE_COMPLET':
-            # Aligner les montants payés pour refléter le soldé complet
-            if echeancier.frais_inscription_paye != echeancier.frais_inscription_du:
-                echeancier.frais_inscription_paye = echeancier.frais_inscription_du
-                changed = True
-            if echeancier.tranche_1_payee != echeancier.tranche_1_due:
-                echeancier.tranche_1_payee = echeancier.tranche_1_due
-                changed = True
-            if echeancier.tranche_2_payee != echeancier.tranche_2_due:
-                echeancier.tranche_2_payee = echeancier.tranche_2_due
-                changed = True
-            if echeancier.tranche_3_payee != echeancier.tranche_3_due:
-                echeancier.tranche_3_payee = echeancier.tranche_3_due
-                changed = True
-
-        if changed:
-            echeancier.save()
+        synchroniser_echeanciers([echeancier])
     except Exception:
         # Ne jamais bloquer l'impression du reçu à cause de cette étape
         logging.getLogger(__name__).exception("Erreur lors de la validation automatique de l'échéancier")
@@ -281,7 +96,8 @@ def _auto_validate_echeancier_for_eleve(eleve: "Eleve") -> None:
 def twilio_inbound(request):
     """Réception des messages entrants Twilio (SMS/WhatsApp).
 {{ ... }}
-    Journalise les données utiles et répond 200.
+    Journalise les données utiles, place le message dans la file de traitement
+    (paiements.messagerie) et répond 200.
     """
     if not _is_valid_twilio_request(request):
         return HttpResponse("Invalid signature", status=403)
@@ -303,7 +119,7 @@ def twilio_inbound(request):
         except Exception:
             num_media = 0
         channel = 'WHATSAPP' if from_number.lower().startswith('whatsapp:') else 'SMS'
-        TwilioInboundMessage.objects.update_or_create(
+        message, _ = TwilioInboundMessage.objects.update_or_create(
             message_sid=message_sid,
             defaults={
                 'channel': channel,
@@ -315,6 +131,8 @@ def twilio_inbound(request):
                 'raw_data': data,
             }
         )
+        # Réponse (SOLDE, AIDE...) traitée hors requête: Twilio n'attend que l'accusé 200
+        transaction.on_commit(lambda: planifier_traitement(message.pk))
     except Exception:
         logging.getLogger(__name__).exception("Erreur lors de l'enregistrement du message entrant Twilio")
     return JsonResponse({"status": "ok"})
@@ -361,94 +179,15 @@ def twilio_status_callback(request):
 # Tableau de bord Paiements – statistiques réelles + listes
 # ---------------------------------------------------------------
 
+def _filtre_ecole(user):
+    """Restriction par école de `user` sous la forme `filtrer(qs, field_path)` (voir statistiques.py)."""
+    return lambda qs, field_path: filter_by_user_school(qs, user, field_path)
+
 def _compute_stats(user):
     """Calcule les statistiques affichées sur le tableau de bord en respectant l'école de l'utilisateur (sauf admin).
     Retourne un dict: total_paiements_mois, nombre_paiements_mois, eleves_en_retard, paiements_en_attente.
     """
-    try:
-        from django.utils import timezone as _tz
-        today = _tz.localdate() if hasattr(_tz, 'localdate') else date.today()
-    except Exception:
-        today = date.today()
-
-    # Début du mois courant
-    try:
-        month_start = today.replace(day=1)
-    except Exception:
-        # fallback simple
-        month_start = date(today.year, today.month, 1)
-
-    # Somme des paiements validés sur le mois (DateField -> filtre inclusif par bornes)
-    _qs_total_mois = Paiement.objects.filter(
-        statut='VALIDE',
-        date_paiement__gte=month_start,
-        date_paiement__lte=today,
-    )
-    _qs_total_mois = filter_by_user_school(_qs_total_mois, user, 'eleve__classe__ecole')
-    total_mois = (_qs_total_mois.aggregate(total=Sum('montant'))['total'] or 0)
-
-    # Nombre de paiements (tous statuts) ce mois
-    _qs_nb = Paiement.objects.filter(
-        date_paiement__gte=month_start,
-        date_paiement__lte=today,
-    )
-    _qs_nb = filter_by_user_school(_qs_nb, user, 'eleve__classe__ecole')
-    nb_paiements_mois = _qs_nb.count()
-
-    # Élèves en retard: montants exigibles (échéances dépassées) > payés + remises
-    exigible_expr = (
-        Case(
-            When(date_echeance_inscription__lte=today, then=F('frais_inscription_du')),
-            default=Value(0),
-            output_field=DecimalField(max_digits=10, decimal_places=0),
-        )
-        + Case(
-            When(date_echeance_tranche_1__lte=today, then=F('tranche_1_due')),
-            default=Value(0),
-            output_field=DecimalField(max_digits=10, decimal_places=0),
-        )
-        + Case(
-            When(date_echeance_tranche_2__lte=today, then=F('tranche_2_due')),
-            default=Value(0),
-            output_field=DecimalField(max_digits=10, decimal_places=0),
-        )
-        + Case(
-            When(date_echeance_tranche_3__lte=today, then=F('tranche_3_due')),
-            default=Value(0),
-            output_field=DecimalField(max_digits=10, decimal_places=0),
-        )
-    )
-    remises_expr = Coalesce(
-        Sum('eleve__paiements__remises__montant_remise', filter=Q(eleve__paiements__statut='VALIDE')),
-        Value(0),
-        output_field=DecimalField(max_digits=10, decimal_places=0),
-    )
-    # Les remises ne doivent compenser que le montant exigible à date (pas les échéances futures)
-    remises_applicables = Least(remises_expr, exigible_expr)
-    paye_effectif_expr = (
-        F('frais_inscription_paye') + F('tranche_1_payee') + F('tranche_2_payee') + F('tranche_3_payee')
-        + remises_applicables
-    )
-    retard_expr = ExpressionWrapper(exigible_expr - paye_effectif_expr, output_field=DecimalField(max_digits=10, decimal_places=0))
-    _qs_retard = (
-        EcheancierPaiement.objects
-        .annotate(retard=retard_expr)
-        .filter(retard__gt=0)
-    )
-    _qs_retard = filter_by_user_school(_qs_retard, user, 'eleve__classe__ecole')
-    eleves_retard_count = _qs_retard.count()
-
-    # Paiements en attente
-    _qs_attente = Paiement.objects.filter(statut='EN_ATTENTE')
-    _qs_attente = filter_by_user_school(_qs_attente, user, 'eleve__classe__ecole')
-    en_attente_count = _qs_attente.count()
-
-    return {
-        'total_paiements_mois': int(total_mois or 0),
-        'nombre_paiements_mois': int(nb_paiements_mois or 0),
-        'eleves_en_retard': int(eleves_retard_count or 0),
-        'paiements_en_attente': int(en_attente_count or 0),
-    }
+    return statistiques_tableau_bord(_filtre_ecole(user))
 
 
 @login_required
@@ -1041,6 +780,8 @@ def valider_paiement(request, paiement_id:int):
         except Exception:
             logging.getLogger(__name__).exception("Erreur ensure/auto-validate échéancier après validation du paiement")
 
+    incrementer('ecole_paiements_valides_total')
+
     # Envoyer le reçu de paiement après validation
     try:
         send_payment_receipt(paiement.eleve, paiement)
@@ -1445,11 +1186,10 @@ def valider_echeancier(request, eleve_id: int):
 @login_required
 @require_school_object(Paiement, pk_kwarg='paiement_id', field_path='eleve__classe__ecole')
 def generer_recu_pdf(request, paiement_id:int):
-    """Génère un reçu PDF téléchargeable pour un paiement validé.
+    """Sert le reçu PDF d'un paiement validé.
 
-    - Ajoute un filigrane via `ecole_moderne/pdf_utils.draw_logo_watermark`
-    - Inclut les informations clés du paiement et de l'élève
-    - Liste les remises appliquées et affiche le total des remises
+    Le reçu est rendu une seule fois (voir `paiements.recus`) puis servi depuis le
+    cache avec un ETag; l'échéancier n'est resynchronisé qu'au moment du rendu.
     """
     paiement_qs = Paiement.objects.select_related('eleve', 'type_paiement', 'mode_paiement', 'eleve__classe', 'eleve__classe__ecole')
     paiement_qs = filter_by_user_school(paiement_qs, request.user, 'eleve__classe__ecole')
@@ -1460,350 +1200,90 @@ def generer_recu_pdf(request, paiement_id:int):
         messages.warning(request, "Le reçu n'est disponible que pour les paiements validés.")
         return redirect('paiements:detail_paiement', paiement_id=paiement.id)
 
-    if canvas is None:
+    if not pdf.disponible():
         return HttpResponse("La génération de PDF n'est pas disponible sur ce serveur (ReportLab manquant).", status=500)
 
-    # Valider/synchroniser l'échéancier de l'élève avant génération du reçu
+    # Rendu unique: les téléchargements suivants servent le fichier en cache
+    chemin, version, rendu = obtenir_recu(paiement, preparer=_preparer_recu)
+    if rendu:
+        incrementer('ecole_recus_generes_total', type='paiement')
+    return _reponse_recu(request, chemin, version, f"Recu_{paiement.numero_recu}.pdf")
+
+
+def _preparer_recu(paiement):
+    """Valide/synchronise l'échéancier de l'élève avant le rendu d'un reçu."""
     try:
         with transaction.atomic():
             _auto_validate_echeancier_for_eleve(paiement.eleve)
     except Exception:
         logging.getLogger(__name__).exception("Validation automatique de l'échéancier avant reçu échouée")
 
-    # Calcul total remises
-    remises_total = paiement.remises.aggregate(total=Sum('montant_remise')).get('total') or 0
 
-    # Préparer le buffer et le canvas
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
+def _reponse_recu(request, chemin, version, filename):
+    """Sert un reçu en cache; la version (empreinte du contenu) sert d'ETag."""
+    etag = f'"{version}"'
+    if etag in [v.strip() for v in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponse(status=304)
+    else:
+        response = FileResponse(open(chemin, 'rb'), as_attachment=True, filename=filename,
+                                content_type='application/pdf')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
 
-    # Filigrane: toujours actif pour les reçus PDF (opacité optimisée définie dans pdf_utils)
-    try:
-        draw_logo_watermark(c, width, height)
-    except Exception:
-        pass
 
-    # Mise en page simple
-    left = 40
-    top = height - 40
-    line_h = 18
-
-    def draw_line(text, x=left, y=None, bold=False):
-        nonlocal top
-        if y is None:
-            y = top
-        font_name = 'Helvetica-Bold' if bold else 'Helvetica'
-        c.setFont(font_name, 11)
-        c.drawString(x, y, text)
-        top = y - line_h
-
-    # Logo en en-tête (côté gauche)
-    try:
-        from django.contrib.staticfiles import finders
-        logo_path = finders.find('logos/logo.png')
-        
-        if logo_path and ImageReader is not None:
-            try:
-                logo_img = ImageReader(logo_path)
-                logo_w, logo_h = 80, 80
-                c.drawImage(logo_img, left, top - logo_h, width=logo_w, height=logo_h, preserveAspectRatio=True, mask='auto')
-                
-                # Titre à côté du logo
-                c.setFont('Helvetica-Bold', 18)
-                c.drawString(left + logo_w + 20, top - 25, "REÇU DE PAIEMENT")
-                
-                # Nom de l'école sous le titre
-                c.setFont('Helvetica-Bold', 12)
-                ecole_nom = paiement.eleve.classe.ecole.nom if getattr(paiement.eleve.classe, 'ecole', None) else ""
-                c.drawString(left + logo_w + 20, top - 45, ecole_nom)
-                
-                top -= (logo_h + 20)
-            except Exception:
-                # Fallback sans logo
-                c.setFont('Helvetica-Bold', 18)
-                c.drawString(left, top, "REÇU DE PAIEMENT")
-                top -= 15
-                c.setFont('Helvetica-Bold', 12)
-                c.drawString(left, top, (paiement.eleve.classe.ecole.nom if getattr(paiement.eleve.classe, 'ecole', None) else ""))
-                top -= 25
-        else:
-            # Fallback sans logo
-            c.setFont('Helvetica-Bold', 18)
-            c.drawString(left, top, "REÇU DE PAIEMENT")
-            top -= 15
-            c.setFont('Helvetica-Bold', 12)
-            c.drawString(left, top, (paiement.eleve.classe.ecole.nom if getattr(paiement.eleve.classe, 'ecole', None) else ""))
-            top -= 25
-    except Exception:
-        # Fallback en cas d'erreur
-        c.setFont('Helvetica-Bold', 18)
-        c.drawString(left, top, "REÇU DE PAIEMENT")
-        top -= 15
-        c.setFont('Helvetica-Bold', 12)
-        c.drawString(left, top, (paiement.eleve.classe.ecole.nom if getattr(paiement.eleve.classe, 'ecole', None) else ""))
-        top -= 25
-
-    # Photo élève (en haut à droite si disponible) ou placeholder avec initiales si absente
-    try:
-        img_drawn = False
-        img_w, img_h = 100, 100
-        x_img = width - 40 - img_w
-        y_img = height - 40 - img_h
-        if ImageReader is not None:
-            photo_path = getattr(getattr(paiement.eleve, 'photo', None), 'path', None)
-            if photo_path and os.path.exists(photo_path):
-                try:
-                    img = ImageReader(photo_path)
-                    c.drawImage(img, x_img, y_img, width=img_w, height=img_h, preserveAspectRatio=True, mask='auto')
-                    img_drawn = True
-                except Exception:
-                    img_drawn = False
-        if not img_drawn:
-            # Dessiner un placeholder avec initiales
-            nom_complet = str(getattr(paiement.eleve, 'nom_complet', '') or '').strip()
-            initiales = ''.join([p[0].upper() for p in nom_complet.split()[:2]]) or 'E'
-            c.setLineWidth(1)
-            try:
-                c.roundRect(x_img, y_img, img_w, img_h, 8)
-            except Exception:
-                c.rect(x_img, y_img, img_w, img_h)
-            c.setFont('Helvetica-Bold', 24)
-            c.drawCentredString(x_img + img_w/2, y_img + img_h/2 - 8, initiales)
-            c.setFont('Helvetica', 8)
-            c.drawCentredString(x_img + img_w/2, y_img + 6, "Pas de photo")
-        # Afficher le nom de l'élève sous l'image/placeholder
-        try:
-            nom_aff = str(getattr(paiement.eleve, 'nom_complet', '') or '').strip()
-            if nom_aff:
-                c.setFont('Helvetica', 9)
-                c.drawCentredString(x_img + img_w/2, y_img - 12, nom_aff)
-        except Exception:
-            pass
-    except Exception:
-        # En cas de problème avec le rendu de la photo/placeholder, ne pas bloquer la génération du reçu
-        pass
+MAX_RECUS_LOT = 500
 
-    # Informations paiement
-    draw_line(f"Numéro de reçu : {paiement.numero_recu}", bold=True)
-    draw_line(f"Date de paiement : {paiement.date_paiement.strftime('%d/%m/%Y')}")
-    draw_line(f"Type de paiement : {paiement.type_paiement.nom}")
-    draw_line(f"Mode de paiement : {paiement.mode_paiement.nom}")
-    if getattr(paiement, 'reference_externe', None):
-        draw_line(f"Référence externe : {paiement.reference_externe}")
-    if getattr(paiement, 'observations', None):
-        # Limiter l'observation à une ligne raisonnable pour le reçu
-        obs = str(paiement.observations).strip()
-        if obs:
-            draw_line(f"Observations : {obs}")
-    draw_line(f"Montant : {str(f'{paiement.montant:,.0f}').replace(',', ' ')} GNF", bold=True)
-
-    if remises_total and int(remises_total) > 0:
-        draw_line(f"Total remises : -{str(f'{int(remises_total):,}').replace(',', ' ')} GNF")
-    # Montant net (jamais négatif)
-    montant_net = max(0, int(paiement.montant - (remises_total or 0)))
-    draw_line(f"Montant net à payer : {str(f'{montant_net:,}').replace(',', ' ')} GNF", bold=True)
-
-    # Affectation du paiement courant sur les tranches (simulation déterministe)
-    # Objectif: montrer, pour CE reçu, quelle partie couvre Inscription/T1/T2/T3
-    try:
-        echeancier_for_alloc = getattr(paiement.eleve, 'echeancier', None)
-    except Exception:
-        echeancier_for_alloc = None
-    if echeancier_for_alloc:
-        try:
-            # Restants initiaux égaux aux dus de l'échéancier
-            rest_insc = int(echeancier_for_alloc.frais_inscription_du or 0)
-            rest_t1 = int(echeancier_for_alloc.tranche_1_due or 0)
-            rest_t2 = int(echeancier_for_alloc.tranche_2_due or 0)
-            rest_t3 = int(echeancier_for_alloc.tranche_3_due or 0)
-
-            # Parcourir tous les paiements validés (y compris celui-ci) dans l'ordre
-            paiements_valides = (
-                Paiement.objects
-                .filter(eleve=paiement.eleve, statut='VALIDE')
-                .order_by('date_paiement', 'date_creation', 'id')
-            )
 
-            allocations = {}
-            for p in paiements_valides.iterator():
-                # Couverture de ce paiement = montant + remises sur CE paiement
-                try:
-                    rem_p = p.remises.aggregate(total=Sum('montant_remise')).get('total') or 0
-                except Exception:
-                    rem_p = 0
-                reste_a_repartir = max(0, int(p.montant) + int(rem_p))
-
-                a_insc = a_t1 = a_t2 = a_t3 = 0
-                if reste_a_repartir and rest_insc > 0:
-                    a = min(rest_insc, reste_a_repartir)
-                    a_insc = a
-                    rest_insc -= a
-                    reste_a_repartir -= a
-                if reste_a_repartir and rest_t1 > 0:
-                    a = min(rest_t1, reste_a_repartir)
-                    a_t1 = a
-                    rest_t1 -= a
-                    reste_a_repartir -= a
-                if reste_a_repartir and rest_t2 > 0:
-                    a = min(rest_t2, reste_a_repartir)
-                    a_t2 = a
-                    rest_t2 -= a
-                    reste_a_repartir -= a
-                if reste_a_repartir and rest_t3 > 0:
-                    a = min(rest_t3, reste_a_repartir)
-                    a_t3 = a
-                    rest_t3 -= a
-                    reste_a_repartir -= a
-
-                allocations[p.id] = (a_insc, a_t1, a_t2, a_t3)
-
-            if allocations.get(paiement.id):
-                top -= 6
-                draw_line("Affectation du paiement", bold=True)
-                a_insc, a_t1, a_t2, a_t3 = allocations[paiement.id]
-                draw_line(f"Inscription: {str(f'{int(a_insc):,}').replace(',', ' ')} GNF")
-                draw_line(f"1ère tranche: {str(f'{int(a_t1):,}').replace(',', ' ')} GNF")
-                draw_line(f"2ème tranche: {str(f'{int(a_t2):,}').replace(',', ' ')} GNF")
-                draw_line(f"3ème tranche: {str(f'{int(a_t3):,}').replace(',', ' ')} GNF")
-        except Exception:
-            pass
+@login_required
+def imprimer_recus_lot(request):
+    """Imprime en un seul PDF les reçus d'une sélection (`ids`) ou d'une période (`date_debut`/`date_fin`).
 
-    # Élève
-    top -= 6
-    draw_line("Informations de l'élève", bold=True)
-    draw_line(f"Nom : {paiement.eleve.nom_complet}")
-    if getattr(paiement.eleve, 'matricule', None):
-        draw_line(f"Matricule : {paiement.eleve.matricule}")
-    if getattr(paiement.eleve, 'classe', None):
-        draw_line(f"Classe : {paiement.eleve.classe}")
+    Seuls les paiements validés de l'école de l'utilisateur sont retenus. Les reçus
+    en cache sont réutilisés tels quels, seuls les manquants sont rendus (`imprimer_lot`).
+    """
+    params = request.POST if request.method == 'POST' else request.GET
+    qs = Paiement.objects.select_related('eleve', 'type_paiement', 'mode_paiement', 'eleve__classe', 'eleve__classe__ecole')
+    qs = filter_by_user_school(qs, request.user, 'eleve__classe__ecole').filter(statut='VALIDE')
 
-    # Échéances (si disponibles sur l'échéancier de l'élève)
+    ids = [int(v) for v in params.getlist('ids') if str(v).strip().isdigit()]
     try:
-        echeancier = getattr(paiement.eleve, 'echeancier', None)
-    except Exception:
-        echeancier = None
-    if echeancier:
-        top -= 6
-        draw_line("Échéances", bold=True)
-        try:
-            def _fmt_amount(v):
-                try:
-                    return str(f"{int(v or 0):,}").replace(',', ' ')
-                except Exception:
-                    return str(v or 0)
-            def _fmt_date(d):
-                try:
-                    return d.strftime('%d/%m/%Y') if d else ''
-                except Exception:
-                    return str(d) if d else ''
-            # Inscription
-            draw_line(f"Inscription: {_fmt_amount(echeancier.frais_inscription_du)} GNF - Échéance: {_fmt_date(echeancier.date_echeance_inscription)}")
-            # Tranches
-            draw_line(f"1ère tranche: {_fmt_amount(echeancier.tranche_1_due)} GNF - Échéance: {_fmt_date(echeancier.date_echeance_tranche_1)}")
-            draw_line(f"2ème tranche: {_fmt_amount(echeancier.tranche_2_due)} GNF - Échéance: {_fmt_date(echeancier.date_echeance_tranche_2)}")
-            draw_line(f"3ème tranche: {_fmt_amount(echeancier.tranche_3_due)} GNF - Échéance: {_fmt_date(echeancier.date_echeance_tranche_3)}")
-        except Exception:
-            pass
-
-        # Restes à payer par tranche
-        try:
-            def _reste(due, paye):
-                try:
-                    return max(0, int((due or 0) - (paye or 0)))
-                except Exception:
-                    return 0
-            # Calcul global basé sur les paiements validés: somme(montants) - somme(remises)
-            try:
-                total_du = int((echeancier.frais_inscription_du or 0) + (echeancier.tranche_1_due or 0) + (echeancier.tranche_2_due or 0) + (echeancier.tranche_3_due or 0))
-            except Exception:
-                total_du = 0
-
-            try:
-                aggs = (
-                    Paiement.objects
-                    .filter(eleve=paiement.eleve, statut='VALIDE')
-                    .aggregate(sum_montant=Sum('montant'), sum_remises=Sum('remises__montant_remise'))
-                )
-                sum_montant = int(aggs.get('sum_montant') or 0)
-                sum_remises = int(aggs.get('sum_remises') or 0)
-            except Exception:
-                sum_montant = 0
-                sum_remises = 0
+        date_debut = datetime.strptime(params['date_debut'], '%Y-%m-%d').date() if params.get('date_debut') else None
+        date_fin = datetime.strptime(params['date_fin'], '%Y-%m-%d').date() if params.get('date_fin') else None
+    except ValueError:
+        messages.error(request, "Dates invalides (format attendu AAAA-MM-JJ).")
+        return redirect('paiements:liste_paiements')
+    if ids:
+        qs = qs.filter(pk__in=ids)
+    elif date_debut or date_fin:
+        if date_debut:
+            qs = qs.filter(date_paiement__gte=date_debut)
+        if date_fin:
+            qs = qs.filter(date_paiement__lte=date_fin)
+    else:
+        messages.warning(request, "Sélectionnez des paiements ou une période.")
+        return redirect('paiements:liste_paiements')
 
-            # Calcul de la couverture: montants payés + remises validées (les remises couvrent une partie du dû)
-            couverture_validee = max(0, int(sum_montant) + int(sum_remises))
-            # Inclure le paiement courant s'il n'est pas encore validé (montant + remises sur ce reçu)
-            try:
-                couverture_courante = max(0, int(paiement.montant) + int(remises_total or 0))
-            except Exception:
-                couverture_courante = 0
-            couverture_effective = couverture_validee + (couverture_courante if paiement.statut != 'VALIDE' else 0)
-            tout_solde = (total_du <= couverture_effective)
-            solde_global = max(0, int(total_du - couverture_effective))
-
-            top -= 6
-            # Solde global restant
-            draw_line(f"Solde global restant : {str(f'{solde_global:,}').replace(',', ' ')} GNF", bold=True)
-            draw_line("Restes à payer par tranche", bold=True)
-            if tout_solde:
-                r_insc = r_t1 = r_t2 = r_t3 = 0
-            else:
-                r_insc = _reste(echeancier.frais_inscription_du, echeancier.frais_inscription_paye)
-                r_t1 = _reste(echeancier.tranche_1_due, echeancier.tranche_1_payee)
-                r_t2 = _reste(echeancier.tranche_2_due, echeancier.tranche_2_payee)
-                r_t3 = _reste(echeancier.tranche_3_due, echeancier.tranche_3_payee)
-            draw_line(f"Inscription: {str(f'{r_insc:,}').replace(',', ' ')} GNF")
-            draw_line(f"1ère tranche: {str(f'{r_t1:,}').replace(',', ' ')} GNF")
-            draw_line(f"2ème tranche: {str(f'{r_t2:,}').replace(',', ' ')} GNF")
-            draw_line(f"3ème tranche: {str(f'{r_t3:,}').replace(',', ' ')} GNF")
-        except Exception:
-            pass
+    paiements = list(qs.order_by('date_paiement', 'numero_recu', 'id')[:MAX_RECUS_LOT + 1])
+    if not paiements:
+        messages.info(request, "Aucun paiement validé pour cette sélection.")
+        return redirect('paiements:liste_paiements')
+    if len(paiements) > MAX_RECUS_LOT:
+        messages.warning(request, f"Sélection trop large: {MAX_RECUS_LOT} reçus au maximum par impression.")
+        return redirect('paiements:liste_paiements')
+    if not pdf.disponible():
+        return HttpResponse("La génération de PDF n'est pas disponible sur ce serveur (ReportLab manquant).", status=500)
 
-    # Remises détaillées
-    if remises_total and int(remises_total) > 0:
-        top -= 6
-        draw_line("Remises appliquées", bold=True)
-        for pr in paiement.remises.select_related('remise').all():
-            nom = getattr(pr.remise, 'nom', 'Remise')
-            montant = str(f"{int(pr.montant_remise):,}").replace(',', ' ')
-            draw_line(f"- {nom} : -{montant} GNF")
-
-    # Bloc signatures
-    top -= 20
-    c.setFont('Helvetica-Bold', 11)
-    c.drawString(left, top, "Signatures")
-    top -= 16
-    # Lignes de signature (caissier et responsable)
-    sig_line_y = top
-    c.setLineWidth(0.8)
-    # Caissier à gauche
-    c.line(left, sig_line_y, left + 200, sig_line_y)
-    c.setFont('Helvetica', 10)
-    c.drawString(left, sig_line_y - 14, "Caissier(e)")
-    # Responsable à droite
-    right_x = left + 260
-    c.setLineWidth(0.8)
-    c.line(right_x, sig_line_y, right_x + 200, sig_line_y)
-    c.setFont('Helvetica', 10)
-    c.drawString(right_x, sig_line_y - 14, "Responsable")
-
-    # Pied de page
-    c.setFont('Helvetica', 9)
-    c.drawRightString(width - 40, 30, f"Généré le {timezone.now().strftime('%d/%m/%Y %H:%M')}")
-
-    c.showPage()
-    c.save()
-
-    pdf = buffer.getvalue()
-    buffer.close()
-
-    filename = f"Recu_{paiement.numero_recu}.pdf"
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    sortie = tempfile.TemporaryFile()
+    rendus = imprimer_lot(paiements, sortie, preparer=_preparer_recu)
+    if rendus:
+        incrementer('ecole_recus_generes_total', rendus, type='paiement')
+    sortie.seek(0)
+    filename = f"Recus_{timezone.localdate().strftime('%Y%m%d')}_{len(paiements)}.pdf"
+    return FileResponse(sortie, as_attachment=True, filename=filename, content_type='application/pdf')
 
 @login_required
+@lecture_replica
 def export_liste_paiements_excel(request):
     """Exporte en Excel la liste des paiements selon les filtres (q, statut).
     Colonnes: Élève, Classe, École, Type, Montant, Mode, Date, Statut, N° Reçu, Observations
@@ -1832,83 +1312,21 @@ def export_liste_paiements_excel(request):
     if statut:
         qs = qs.filter(statut=statut)
 
-    # Créer le classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Paiements'
-
-    headers = [
-        'Élève', 'Classe', 'École', 'Type', 'Montant (GNF)', 'Mode', 'Date', 'Statut', 'N° Reçu', 'Observations'
+    colonnes = [
+        Colonne('Élève', lambda p: f"{p.eleve.nom} {p.eleve.prenom}".strip(), largeur=22),
+        Colonne('Classe', 'eleve.classe.nom', largeur=14),
+        Colonne('École', 'eleve.classe.ecole.nom', largeur=18),
+        Colonne('Type', 'type_paiement.nom', largeur=18),
+        Colonne('Montant (GNF)', 'montant', largeur=16, format='montant', total=True),
+        Colonne('Mode', 'mode_paiement.nom', largeur=14),
+        Colonne('Date', 'date_paiement', largeur=12, format='date'),
+        Colonne('Statut', 'statut', largeur=12),
+        Colonne('N° Reçu', 'numero_recu', largeur=12),
+        Colonne('Observations', 'observations', largeur=40),
     ]
-    ws.append(headers)
-
-    # Styles
-    header_fill = PatternFill(start_color='007bff', end_color='007bff', fill_type='solid')
-    header_font = Font(color='FFFFFF', bold=True)
-    thin = Side(style='thin', color='DDDDDD')
-    border_all = Border(left=thin, right=thin, top=thin, bottom=thin)
-    for col_idx in range(1, len(headers) + 1):
-        c = ws.cell(row=1, column=col_idx)
-        c.fill = header_fill
-        c.font = header_font
-        c.alignment = Alignment(horizontal='center', vertical='center')
-        c.border = border_all
-
-    # Lignes
-    row_idx = 2
-    for p in qs.iterator():
-        eleve_nom = f"{getattr(p.eleve, 'nom', '')} {getattr(p.eleve, 'prenom', '')}".strip()
-        classe_nom = getattr(getattr(p.eleve, 'classe', None), 'nom', '')
-        ecole_nom = getattr(getattr(getattr(p.eleve, 'classe', None), 'ecole', None), 'nom', '')
-        type_nom = getattr(p.type_paiement, 'nom', '')
-        mode_nom = getattr(p.mode_paiement, 'nom', '')
-        date_val = getattr(p, 'date_paiement', None)
-        statut_txt = getattr(p, 'statut', '')
-        recu = getattr(p, 'numero_recu', '')
-        obs = getattr(p, 'observations', '') or ''
-
-        ws.cell(row=row_idx, column=1, value=eleve_nom)
-        ws.cell(row=row_idx, column=2, value=classe_nom)
-        ws.cell(row=row_idx, column=3, value=ecole_nom)
-
-        ws.cell(row=row_idx, column=4, value=type_nom)
-        montant_cell = ws.cell(row=row_idx, column=5, value=float(p.montant or 0))
-        montant_cell.number_format = numbers.FORMAT_NUMBER_COMMA_SEPARATED1
-        ws.cell(row=row_idx, column=6, value=mode_nom)
-
-        date_cell = ws.cell(row=row_idx, column=7, value=date_val)
-        date_cell.number_format = 'DD/MM/YYYY'
-        ws.cell(row=row_idx, column=8, value=statut_txt)
-        ws.cell(row=row_idx, column=9, value=recu)
-        ws.cell(row=row_idx, column=10, value=obs)
-
-        for col in range(1, len(headers) + 1):
-            ws.cell(row=row_idx, column=col).border = border_all
-            if col in (1, 2, 3, 4, 6, 8, 9, 10):
-                ws.cell(row=row_idx, column=col).alignment = Alignment(vertical='top')
-
-        row_idx += 1
-
-    # Ajustement des largeurs de colonnes
-    widths = [22, 14, 18, 18, 16, 14, 12, 12, 12, 40]
-    for i, w in enumerate(widths, start=1):
-        ws.column_dimensions[get_column_letter(i)].width = w
-
-    # Ligne de total montant
-    if row_idx > 2:
-        total_label_cell = ws.cell(row=row_idx, column=4, value='Total:')
-        total_label_cell.font = Font(bold=True)
-        total_cell = ws.cell(row=row_idx, column=5, value=f"=SUM(E2:E{row_idx-1})")
-        total_cell.number_format = numbers.FORMAT_NUMBER_COMMA_SEPARATED1
-        total_cell.font = Font(bold=True)
-
-    # Réponse HTTP
     ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"paiements_{ts}.xlsx"
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
+    return exporter(request, qs, colonnes, nom_fichier=f"paiements_{ts}", titre_feuille='Paiements',
+                    couleur_entete='007BFF')
 
 @login_required
 def rapport_remises(request):
@@ -1987,6 +1405,7 @@ def rapport_remises(request):
 
 @login_required
 @user_passes_test(lambda u: u.is_staff or (hasattr(u, 'profil') and u.profil.role in ['ADMIN', 'COMPTABLE', 'DIRECTEUR']))
+@lecture_replica
 def liste_eleves_soldes(request):
     """Liste des élèves soldés en tenant compte des remises (hors frais d'inscription).
 
@@ -2232,24 +1651,10 @@ def liste_eleves_soldes(request):
         return render(request, template, context)
     return HttpResponse('Élèves soldés')
 
-@login_required
-def ajax_eleve_info(request):
-    """Retourne des informations élève + échéancier pour le formulaire paiement.
-    Attend un paramètre `matricule` (GET). Utilisé par `templates/paiements/form_paiement.html`.
+def _donnees_eleve_info(eleve):
+    """Réponse de `ajax_eleve_info` (vue synchrone et asynchrone).
+    `eleve` doit être chargé avec select_related('classe__ecole', 'echeancier'): aucune requête ici.
     """
-    matricule = request.GET.get('matricule') or request.POST.get('matricule')
-    if not matricule:
-        return JsonResponse({'success': False, 'error': 'Matricule requis.'}, status=400)
-
-    try:
-        eleve_qs = Eleve.objects.select_related('classe', 'classe__ecole')
-        # Sécurité: restreindre aux élèves de l'école de l'utilisateur
-        eleve_qs = filter_by_user_school(eleve_qs, request.user, 'classe__ecole')
-        eleve = eleve_qs.get(matricule__iexact=matricule)
-    except Eleve.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'Élève introuvable.'}, status=404)
-
-    # Construire la réponse
     # Sécuriser l'accès à l'URL de la photo (FieldFile.url peut lever une exception si vide)
     photo_url = ''
     try:
@@ -2295,18 +1700,45 @@ def ajax_eleve_info(request):
             'reste_a_payer': int((echeancier.total_du or 0) - (echeancier.total_paye or 0)),
         }
         data['has_echeancier'] = True
+    return data
+
+def _classes_select(filtrer, ecole_id=None, annee=None):
+    """Classes proposées dans les listes déroulantes: [{'id', 'nom', 'ecole_nom'}]."""
+    qs = filtrer(Classe.objects.all(), 'ecole')
+    if str(ecole_id or '').isdigit():
+        qs = qs.filter(ecole_id=int(ecole_id))
+    if annee:
+        qs = qs.filter(annee_scolaire=annee)
+    return qs.order_by('ecole__nom', 'nom').values('id', 'nom', ecole_nom=F('ecole__nom'))
 
-    return JsonResponse(data)
+@login_required
+def ajax_eleve_info(request):
+    """Retourne des informations élève + échéancier pour le formulaire paiement.
+    Attend un paramètre `matricule` (GET). Utilisé par `templates/paiements/form_paiement.html`.
+    """
+    matricule = request.GET.get('matricule') or request.POST.get('matricule')
+    if not matricule:
+        return JsonResponse({'success': False, 'error': 'Matricule requis.'}, status=400)
+
+    try:
+        eleve_qs = Eleve.objects.select_related('classe', 'classe__ecole', 'echeancier')
+        # Sécurité: restreindre aux élèves de l'école de l'utilisateur
+        eleve_qs = filter_by_user_school(eleve_qs, request.user, 'classe__ecole')
+        eleve = eleve_qs.get(matricule__iexact=matricule)
+    except Eleve.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Élève introuvable.'}, status=404)
+
+    return JsonResponse(_donnees_eleve_info(eleve))
 
 @login_required
 def ajax_classes_par_ecole(request):
-    return JsonResponse({'ok': True, 'classes': []})
+    """Classes (filtrées par `ecole_id` et `annee`) pour les listes déroulantes."""
+    classes = _classes_select(_filtre_ecole(request.user), request.GET.get('ecole_id'), request.GET.get('annee'))
+    return JsonResponse({'success': True, 'classes': list(classes)})
 
 @login_required
 def ajax_statistiques_paiements(request):
-    """Endpoint AJAX minimal pour statistiques paiements.
-    Fourni pour satisfaire le routage; peut être enrichi ultérieurement.
-    """
+    """Statistiques du tableau de bord (rafraîchies toutes les 30 s par `tableau_bord.html`)."""
     try:
         base = filter_by_user_school(Paiement.objects.all(), request.user, 'eleve__classe__ecole')
         total = base.count()
@@ -2314,25 +1746,69 @@ def ajax_statistiques_paiements(request):
     except Exception:
         total = 0
         montant_total = 0
-    return JsonResponse({'success': True, 'total': total, 'montant_total': montant_total})
+    return JsonResponse({
+        'success': True, 'total': total, 'montant_total': montant_total, 'stats': _compute_stats(request.user),
+    })
 
 @login_required
 @require_http_methods(["GET", "POST"])
 def ajax_calculer_remise(request):
-    """Calcule un aperçu de remise. Implémentation basique pour compatibilité UI.
-    Accepte un paramètre 'montant' et retourne le même montant en sortie par défaut.
+    """Aperçu de remise, évalué sur l'index mémoire des remises actives (paiements/remises.py).
+
+    Paramètres: 'montant', et 'remise_id' (remise choisie) et/ou 'eleve_id' (sans
+    remise_id: règle fratrie selon le rang de l'élève dans sa famille), 'date'
+    (AAAA-MM-JJ, aujourd'hui par défaut). Aucune écriture en base.
     """
-    montant_raw = request.GET.get('montant') or request.POST.get('montant') or '0'
+    donnees = request.POST if request.method == 'POST' else request.GET
+    montant_raw = donnees.get('montant') or '0'
     try:
-        montant = int(float(str(montant_raw).replace(' ', '').replace(',', '.')))
+        montant = Decimal(str(montant_raw).replace(' ', '').replace(',', '.')).quantize(Decimal('1'))
     except Exception:
-        montant = 0
-    return JsonResponse({
+        return JsonResponse({'success': False, 'error': "Montant invalide."}, status=400)
+    if montant < 0:
+        return JsonResponse({'success': False, 'error': "Montant invalide."}, status=400)
+    try:
+        jour = date.fromisoformat(donnees['date']) if donnees.get('date') else timezone.localdate()
+        remise_id = int(donnees['remise_id']) if donnees.get('remise_id') else None
+        eleve_id = int(donnees['eleve_id']) if donnees.get('eleve_id') else None
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': "Paramètres invalides."}, status=400)
+
+    eleve = None
+    if eleve_id:
+        eleve = get_object_or_404(
+            filter_by_user_school(
+                Eleve.objects.select_related('classe', 'responsable_principal'), request.user, 'classe__ecole'
+            ),
+            pk=eleve_id,
+        )
+    details, fratrie = apercu_remise(montant, remise_id=remise_id, eleve=eleve, jour=jour)
+    if remise_id and not details:
+        return JsonResponse({'success': False, 'error': "Remise inactive ou hors de sa période de validité."})
+
+    total = min(sum((d['montant'] for d in details), Decimal('0')), montant)
+    reponse = {
         'success': True,
-        'montant_initial': montant,
-        'montant_apres_remise': montant,
-        'details': [],
-    })
+        'montant_initial': int(montant),
+        'montant_apres_remise': int(montant - total),
+        'details': [
+            {'id': d['remise'].pk, 'nom': d['remise'].nom, 'motif': d['remise'].motif, 'montant': int(d['montant'])}
+            for d in details
+        ],
+    }
+    if fratrie is not None:
+        reponse['fratrie'] = {'rang': fratrie.rang, 'taille': fratrie.taille}
+    if details:
+        remise = details[0]['remise']
+        reponse['calcul'] = {
+            'montant_original': int(montant),
+            'montant_remise': int(total),
+            'montant_final': int(montant - total),
+            'pourcentage_remise': round(float(total / montant * 100), 2) if montant > 0 else 0,
+            'remise_nom': remise.nom,
+            'remise_type': remise.get_type_remise_display(),
+        }
+    return JsonResponse(reponse)
 
 @login_required
 @can_apply_discounts
@@ -2410,18 +1886,17 @@ def appliquer_remise_paiement(request, paiement_id:int):
             with transaction.atomic():
                 # Remplacer les remises existantes par la sélection
                 PaiementRemise.objects.filter(paiement=paiement).delete()
-                created = 0
+                nouvelles = []
                 for remise in remises:
                     try:
                         montant_remise = remise.calculer_remise(paiement.montant)
                     except Exception:
                         montant_remise = 0
-                    PaiementRemise.objects.create(
+                    nouvelles.append(PaiementRemise(
                         paiement=paiement,
                         remise=remise,
                         montant_remise=montant_remise,
-                    )
-                    created += 1
+                    ))
 
                 # Appliquer également la remise scolarité (%) si choisie
                 if pct_value > 0:
@@ -2463,12 +1938,15 @@ def appliquer_remise_paiement(request, paiement_id:int):
                             montant_remise_pct = min(float(montant_remise_pct), float(paiement.montant))
                         except Exception:
                             pass
-                    PaiementRemise.objects.create(
+                    nouvelles.append(PaiementRemise(
                         paiement=paiement,
                         remise=remise_pct,
                         montant_remise=montant_remise_pct,
-                    )
-                    created += 1
+                    ))
+                PaiementRemise.objects.bulk_create(nouvelles)
+                created = len(nouvelles)
+                # Le reçu en cache ne reflète plus les remises
+                transaction.on_commit(lambda: invalider_recu(paiement.id))
             messages.success(request, f"Remises appliquées: {created}.")
             return redirect('paiements:detail_paiement', paiement_id=paiement.id)
         else:
@@ -2519,11 +1997,13 @@ def annuler_remise_paiement(request, paiement_id:int, remise_id:int=None):
         else:
             PaiementRemise.objects.filter(paiement=paiement).delete()
             messages.success(request, "Toutes les remises de ce paiement ont été supprimées.")
+        invalider_recu(paiement.id)
     except Exception:
         messages.error(request, "Impossible d'annuler la remise.")
     return redirect('paiements:detail_paiement', paiement_id=paiement.id)
 
 @login_required
+@lecture_replica
 def export_paiements_periode_excel(request):
     """Exporte les paiements entre deux dates (du, au) en Excel.
     Paramètres: ?du=YYYY-MM-DD&au=YYYY-MM-DD&statut=VALIDE|EN_ATTENTE|... (optionnel)
@@ -2532,7 +2012,7 @@ def export_paiements_periode_excel(request):
     au = request.GET.get('au')
     statut = (request.GET.get('statut') or '').strip()
 
-    qs = Paiement.objects.select_related('eleve', 'type_paiement', 'mode_paiement')
+    qs = Paiement.objects.select_related('eleve', 'eleve__classe', 'eleve__classe__ecole', 'type_paiement', 'mode_paiement')
     # Sécurité: restreindre aux paiements de l'école de l'utilisateur
     qs = filter_by_user_school(qs, request.user, 'eleve__classe__ecole')
     # Filtres période
@@ -2546,30 +2026,82 @@ def export_paiements_periode_excel(request):
     if statut:
         qs = qs.filter(statut=statut)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Paiements'
-    headers = ['Élève', 'Matricule', 'Classe', 'École', 'Type', 'Montant', 'Mode', 'Date', 'Statut', 'N° Reçu']
-    ws.append(headers)
-    for p in qs.order_by('date_paiement', 'id'):
-        ws.append([
-            f"{getattr(p.eleve, 'nom', '')} {getattr(p.eleve, 'prenom', '')}",
-            getattr(p.eleve, 'matricule', ''),
-            getattr(getattr(p.eleve, 'classe', None), 'nom', ''),
-            getattr(getattr(getattr(p.eleve, 'classe', None), 'ecole', None), 'nom', ''),
-            getattr(p.type_paiement, 'nom', ''),
-            int(p.montant or 0),
-            getattr(p.mode_paiement, 'nom', ''),
-            getattr(p, 'date_paiement', None).strftime('%Y-%m-%d') if getattr(p, 'date_paiement', None) else '',
-            p.statut,
-            p.numero_recu or '',
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    filename = 'paiements_periode.xlsx'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
+    colonnes = [
+        Colonne('Élève', lambda p: f"{p.eleve.nom} {p.eleve.prenom}", largeur=25),
+        Colonne('Matricule', 'eleve.matricule'),
+        Colonne('Classe', 'eleve.classe.nom'),
+        Colonne('École', 'eleve.classe.ecole.nom', largeur=20),
+        Colonne('Type', 'type_paiement.nom'),
+        Colonne('Montant', 'montant', format='montant'),
+        Colonne('Mode', 'mode_paiement.nom'),
+        Colonne('Date', 'date_paiement', format='date', largeur=12),
+        Colonne('Statut', 'statut', largeur=12),
+        Colonne('N° Reçu', 'numero_recu'),
+    ]
+    return exporter(request, qs.order_by('date_paiement', 'id'), colonnes, nom_fichier='paiements_periode',
+                    titre_feuille='Paiements')
+
+@login_required
+def rapprochement_releve(request):
+    """Rapprochement d'un relevé Mobile Money / bancaire avec les paiements.
+
+    - simuler: classe les lignes sans rien écrire
+    - appliquer: valide les paiements trouvés (et crée les manquants si demandé)
+    - exceptions: télécharge les lignes non rapprochées (CSV)
+    """
+    if not (user_is_admin(request.user) or has_permission(request.user, 'peut_valider_paiements')):
+        messages.error(request, "Vous n'avez pas l'autorisation de valider des paiements.")
+        return redirect('paiements:liste_paiements')
+
+    resultat = None
+    if request.method == 'POST':
+        fichier = request.FILES.get('releve')
+        extension = os.path.splitext(getattr(fichier, 'name', ''))[1].lower()
+        action = request.POST.get('action') or 'simuler'
+        creer = request.POST.get('creer') == 'on'
+        type_paiement = TypePaiement.objects.filter(pk=request.POST.get('type_paiement') or None).first()
+        mode_paiement = ModePaiement.objects.filter(pk=request.POST.get('mode_paiement') or None).first()
+        try:
+            fenetre = max(0, min(31, int(request.POST.get('fenetre') or 3)))
+        except ValueError:
+            fenetre = 3
+        if fichier is None or extension not in ('.xlsx', '.csv'):
+            messages.error(request, "Veuillez fournir un relevé .xlsx ou .csv.")
+        elif creer and action == 'appliquer' and (type_paiement is None or mode_paiement is None):
+            messages.error(request, "Choisissez le type et le mode des paiements à créer.")
+        else:
+            with tempfile.NamedTemporaryFile(suffix=extension) as copie:
+                for morceau in fichier.chunks():
+                    copie.write(morceau)
+                copie.flush()
+                try:
+                    lignes = lire_releve(copie.name)
+                except ErreurImport as ex:
+                    lignes = None
+                    messages.error(request, str(ex))
+            if lignes is not None:
+                ecole = None if request.user.is_superuser else user_school(request.user)
+                resultat = rapprocher(lignes, ecole=ecole, fenetre_jours=fenetre, creer_manquants=creer)
+                if action == 'exceptions':
+                    response = HttpResponse(content_type='text/csv; charset=utf-8')
+                    response['Content-Disposition'] = 'attachment; filename="exceptions_rapprochement.csv"'
+                    resultat.ecrire_exceptions(response)
+                    return response
+                if action == 'appliquer':
+                    appliquer(resultat, utilisateur=request.user, type_paiement=type_paiement, mode_paiement=mode_paiement)
+                    messages.success(request, f"{resultat.valides} paiement(s) validé(s), {resultat.crees} créé(s).")
+
+    context = {
+        'titre_page': "Rapprochement de relevé",
+        'resultat': resultat,
+        'compteurs': resultat.compteurs if resultat else None,
+        'exceptions': [
+            (ligne, EXCEPTIONS_RAPPROCHEMENT[ligne.resultat]) for ligne in resultat.exceptions[:500]
+        ] if resultat else [],
+        'types_paiement': TypePaiement.objects.filter(actif=True).order_by('nom'),
+        'modes_paiement': ModePaiement.objects.filter(actif=True).order_by('nom'),
+    }
+    return render(request, 'paiements/rapprochement.html', context)
 
 @login_required
 def rapport_retards(request):
@@ -2708,8 +2240,12 @@ def api_paiement_detail(request, pk:int):
     }
     return JsonResponse(data)
 
+@functools.lru_cache(maxsize=None)
 def _template_exists(path:str)->bool:
-    """Utilitaire léger: détecte si un template existe dans le chargeur Django."""
+    """Utilitaire léger: détecte si un template existe dans le chargeur Django.
+
+    Mémoïsé par processus: l'ensemble des templates ne change pas sans redéploiement.
+    """
     try:
         from django.template.loader import get_template
         get_template(path)
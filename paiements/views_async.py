@@ -0,0 +1,61 @@
+"""Versions asynchrones des points d'accès AJAX fréquents (formulaire de paiement, tableau de bord).
+
+Servies par `ecole_moderne.asgi` (uvicorn): une requête en attente de la base ne
+bloque pas de worker. Mêmes réponses JSON que les vues synchrones de `views.py`,
+qui restent utilisées sous WSGI; `AJAX_ASYNC` choisit la version routée (voir urls.py).
+"""
+from django.contrib.auth.decorators import login_required
+from django.db.models import Sum
+from django.http import JsonResponse
+from django.utils import timezone
+
+from eleves.models import Eleve
+from ecole_moderne.asynchrone import en_cache_async, portee_async
+from .models import Paiement
+from .statistiques import astatistiques_tableau_bord
+from .views import _classes_select, _donnees_eleve_info
+
+
+@login_required
+async def ajax_eleve_info(request):
+    """Élève + échéancier pour le formulaire de paiement (non mis en cache: soldes à jour)."""
+    matricule = request.GET.get('matricule') or request.POST.get('matricule')
+    if not matricule:
+        return JsonResponse({'success': False, 'error': 'Matricule requis.'}, status=400)
+    portee = await portee_async(request)
+    eleve_qs = portee.filtrer(Eleve.objects.select_related('classe', 'classe__ecole', 'echeancier'), 'classe__ecole')
+    try:
+        eleve = await eleve_qs.aget(matricule__iexact=matricule)
+    except Eleve.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Élève introuvable.'}, status=404)
+    return JsonResponse(_donnees_eleve_info(eleve))
+
+
+@login_required
+async def ajax_classes_par_ecole(request):
+    portee = await portee_async(request)
+    ecole_id = request.GET.get('ecole_id') or ''
+    annee = request.GET.get('annee') or ''
+
+    async def calcul():
+        return [c async for c in _classes_select(portee.filtrer, ecole_id, annee)]
+
+    classes = await en_cache_async(f"ajax:paiements:classes:{portee.cle}:{ecole_id}:{annee}", calcul)
+    return JsonResponse({'success': True, 'classes': classes})
+
+
+@login_required
+async def ajax_statistiques_paiements(request):
+    portee = await portee_async(request)
+    today = timezone.localdate()
+
+    async def calcul():
+        base = portee.filtrer(Paiement.objects.all(), 'eleve__classe__ecole')
+        return {
+            'success': True,
+            'total': await base.acount(),
+            'montant_total': int((await base.aaggregate(total=Sum('montant')))['total'] or 0),
+            'stats': await astatistiques_tableau_bord(portee.filtrer, today),
+        }
+
+    return JsonResponse(await en_cache_async(f"ajax:paiements:statistiques:{portee.cle}:{today}", calcul))
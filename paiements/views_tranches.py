@@ -9,6 +9,7 @@ from eleves.models import Classe
 from paiements.models import Paiement
 from utilisateurs.utils import user_is_admin, user_school
 from rapports.utils import _draw_header_and_watermark
+from ecole_moderne.replica import lecture_replica
 
 # ReportLab
 # ReportLab: fera l'objet d'un import différé dans la vue PDF
@@ -30,6 +31,7 @@ def _annee_vers_dates(annee_scolaire: str):
 
 
 @login_required
+@lecture_replica
 def export_tranches_par_classe_pdf(request):
     """Export PDF des tranches par classe avec logo entête et filigrane.
 
@@ -86,11 +88,10 @@ def export_tranches_par_classe_pdf(request):
 
     # Import différé de ReportLab pour éviter les erreurs si non installé
     try:
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib import colors
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import cm
+        from ecole_moderne.pdf import (
+            A4, landscape, SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer,
+            colors, getSampleStyleSheet, ParagraphStyle, cm,
+        )
     except Exception:
         return HttpResponse("ReportLab n'est pas installé. Veuillez exécuter: pip install reportlab", status=500)
 
@@ -203,6 +204,7 @@ def export_tranches_par_classe_pdf(request):
     return response
 
 @login_required
+@lecture_replica
 def export_tranches_par_classe_excel(request):
     """Export Excel (XLSX) des tranches par classe: Élève, Inscription payée, Tranche 1, Tranche 2, Tranche 3, Total dû, Total payé, Reste.
 
@@ -222,8 +224,7 @@ def export_tranches_par_classe_excel(request):
 
     # Import openpyxl
     try:
-        from openpyxl import Workbook
-        from openpyxl.utils import get_column_letter
+        from ecole_moderne.xlsx import Workbook, get_column_letter
     except Exception:
         return HttpResponse("OpenPyXL n'est pas installé. Veuillez exécuter: pip install openpyxl", status=500)
 
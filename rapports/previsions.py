@@ -0,0 +1,231 @@
+"""Prévisions de trésorerie: encaissements et arriérés attendus semaine par semaine.
+
+Méthode, pour une école:
+
+1. Historique des délais: les échéanciers et les paiements validés (et leurs remises)
+   sont lus en trois requêtes. Pour chaque tranche, le délai de paiement est le
+   nombre de semaines entre sa date d'échéance et le jour où le cumul payé par l'élève
+   a atteint le cumul dû jusqu'à cette tranche (ordre inscription -> T1 -> T2 -> T3,
+   comme paiements/echeanciers.py). Une tranche échue non soldée est une
+   observation censurée. On en tire un taux de paiement hebdomadaire par délai
+   (estimateur de Kaplan-Meier, lissé par un a priori Beta pour les petites écoles).
+2. Projection: les restes à payer sont rangés en colonnes (montant, décalage en
+   semaines par rapport à aujourd'hui) puis agrégés par décalage (somme et somme
+   des carrés). Toutes les tranches d'un même décalage partagent la même loi de
+   paiement: le calcul ne dépend que du nombre de décalages distincts, pas du
+   nombre d'élèves. Chaque tranche étant payée ou non, la variance d'une semaine est
+   la somme de montant² x p x (1 - p); la bande est moyenne ± Z écarts-types.
+
+Les résultats sont mis en cache par école et par jour (`prevoir`).
+"""
+from array import array
+from collections import defaultdict
+from datetime import date, timedelta
+from math import sqrt
+from typing import Optional
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from paiements.echeanciers import TRANCHES
+from paiements.models import EcheancierPaiement, Paiement, PaiementRemise
+
+HORIZON_SEMAINES = 8
+MAX_DELAI_SEMAINES = 26  # au-delà, le taux de la dernière semaine s'applique
+A_PRIORI = (1.0, 3.0)  # Beta(paiements, non-paiements): 25 % par semaine sans historique
+Z = 1.645  # bande de confiance à 90 %
+TIMEOUT = 24 * 3600
+
+
+def _semaines(jours: int) -> int:
+    return jours // 7
+
+
+def _colonnes_echeanciers(ecole):
+    """Une ligne par échéancier: (eleve_id, élève actif, dus, payés, échéances)."""
+    champs = [c for tranche in TRANCHES for c in tranche]
+    lignes = (
+        EcheancierPaiement.objects
+        .filter(eleve__classe__ecole=ecole)
+        .values_list('eleve_id', 'eleve__statut', *champs)
+        .order_by()
+    )
+    for eleve_id, statut, *valeurs in lignes:
+        dus = [int(valeurs[3 * i] or 0) for i in range(len(TRANCHES))]
+        payes = [int(valeurs[3 * i + 1] or 0) for i in range(len(TRANCHES))]
+        echeances = [valeurs[3 * i + 2] for i in range(len(TRANCHES))]
+        yield eleve_id, statut == 'ACTIF', dus, payes, echeances
+
+
+def _versements(ecole):
+    """{eleve_id: [(date, montant), ...]} triés: paiements validés et remises à leur date."""
+    versements = defaultdict(list)
+    for eleve_id, jour, montant in (
+        Paiement.objects.filter(eleve__classe__ecole=ecole, statut='VALIDE')
+        .values_list('eleve_id', 'date_paiement', 'montant').order_by()
+    ):
+        versements[eleve_id].append((jour, int(montant or 0)))
+    for eleve_id, jour, montant in (
+        PaiementRemise.objects.filter(paiement__eleve__classe__ecole=ecole, paiement__statut='VALIDE')
+        .values_list('paiement__eleve_id', 'paiement__date_paiement', 'montant_remise').order_by()
+    ):
+        versements[eleve_id].append((jour, int(montant or 0)))
+    for liste in versements.values():
+        liste.sort()
+    return versements
+
+
+class LoiDelais:
+    """Taux de paiement hebdomadaire h[k] d'une tranche encore due k semaines après l'échéance."""
+
+    def __init__(self, payees, censurees, a_priori=A_PRIORI):
+        taille = MAX_DELAI_SEMAINES
+        self.observations = sum(payees) + sum(censurees)
+        self.taux = array('d', [0.0] * taille)
+        a_risque = 0
+        # Une tranche payée au délai k était à risque aux délais 0..k; censurée à l'âge c: 0..c-1
+        for k in range(taille - 1, -1, -1):
+            a_risque += payees[k] + censurees[k + 1]
+            self.taux[k] = (payees[k] + a_priori[0]) / (a_risque + a_priori[0] + a_priori[1])
+
+    @classmethod
+    def estimer(cls, echeanciers, versements, today: date) -> "LoiDelais":
+        taille = MAX_DELAI_SEMAINES
+        payees = array('q', [0] * taille)
+        censurees = array('q', [0] * (taille + 1))
+        for eleve_id, _, dus, _, echeances in echeanciers:
+            historique = versements.get(eleve_id, ())
+            cumul_du = cumul_paye = 0
+            i = 0
+            for du, echeance in zip(dus, echeances):
+                cumul_du += du
+                if du <= 0 or echeance is None:
+                    continue
+                while i < len(historique) and cumul_paye < cumul_du:
+                    jour_solde = historique[i][0]
+                    cumul_paye += historique[i][1]
+                    i += 1
+                if cumul_paye >= cumul_du and i:
+                    delai = _semaines((jour_solde - echeance).days)
+                    payees[min(max(delai, 0), taille - 1)] += 1
+                elif echeance <= today:
+                    age = _semaines((today - echeance).days)
+                    if age:
+                        censurees[min(age, taille)] += 1
+        return cls(payees, censurees)
+
+    def h(self, k: int) -> float:
+        return self.taux[min(k, MAX_DELAI_SEMAINES - 1)]
+
+    def paiements(self, depart: int, delai: int, horizon: int):
+        """Probabilités de paiement par semaine de prévision (0..horizon-1) et de non-paiement cumulé.
+
+        `depart`: semaine de prévision de l'échéance (0 si déjà échue);
+        `delai`: semaines déjà écoulées depuis l'échéance sans paiement.
+        """
+        probas, restants = [0.0] * horizon, [1.0] * horizon
+        survie = 1.0
+        for semaine in range(depart, horizon):
+            p = survie * self.h(delai + semaine - depart)
+            probas[semaine] = p
+            survie -= p
+            restants[semaine] = survie
+        return probas, restants
+
+    def resume(self):
+        survie, cumul, mediane = 1.0, [], None
+        for k in range(MAX_DELAI_SEMAINES):
+            survie *= 1 - self.h(k)
+            cumul.append(1 - survie)
+            if mediane is None and 1 - survie >= 0.5:
+                mediane = k
+        return {
+            'observations': self.observations,
+            'dans_la_semaine': round(cumul[0], 3),
+            'sous_4_semaines': round(cumul[3], 3),
+            'mediane_semaines': mediane,
+        }
+
+
+def _bande(moyenne, variance):
+    ecart = Z * sqrt(max(variance, 0.0))
+    return {'attendu': round(moyenne), 'bas': round(max(moyenne - ecart, 0.0)), 'haut': round(moyenne + ecart)}
+
+
+def calculer(ecole, *, today: Optional[date] = None, horizon: int = HORIZON_SEMAINES):
+    """Prévision (non mise en cache) des encaissements et arriérés des `horizon` prochaines semaines."""
+    today = today or timezone.localdate()
+    echeanciers = list(_colonnes_echeanciers(ecole))
+    loi = LoiDelais.estimer(echeanciers, _versements(ecole), today)
+
+    # Colonnes des restes à payer des élèves actifs: montant et décalage (semaines, < 0 si échue)
+    montants, decalages = array('q'), array('q')
+    echus = 0
+    for _, actif, dus, payes, echeances in echeanciers:
+        if not actif:
+            continue
+        for du, paye, echeance in zip(dus, payes, echeances):
+            reste = du - paye
+            if reste > 0 and echeance is not None:
+                if echeance < today:
+                    echus += reste
+                montants.append(reste)
+                decalages.append(
+                    _semaines((echeance - today).days) if echeance >= today else -_semaines((today - echeance).days)
+                )
+
+    # Agrégation par décalage: somme et somme des carrés des montants
+    sommes, carres = defaultdict(int), defaultdict(int)
+    for montant, decalage in zip(montants, decalages):
+        sommes[decalage] += montant
+        carres[decalage] += montant * montant
+
+    encaissements = [[0.0, 0.0] for _ in range(horizon)]
+    arrieres = [[0.0, 0.0] for _ in range(horizon)]
+    total = [0.0, 0.0]
+    for decalage, somme in sommes.items():
+        if decalage >= horizon:
+            continue
+        depart, delai = max(decalage, 0), max(-decalage, 0)
+        probas, restants = loi.paiements(depart, delai, horizon)
+        carre = carres[decalage]
+        for semaine in range(depart, horizon):
+            p, r = probas[semaine], restants[semaine]
+            encaissements[semaine][0] += somme * p
+            encaissements[semaine][1] += carre * p * (1 - p)
+            arrieres[semaine][0] += somme * r
+            arrieres[semaine][1] += carre * r * (1 - r)
+        paye = 1 - restants[-1]
+        total[0] += somme * paye
+        total[1] += carre * paye * (1 - paye)
+
+    return {
+        'ecole_id': getattr(ecole, 'pk', ecole),
+        'date': today.isoformat(),
+        'horizon': horizon,
+        'niveau_confiance': 0.9,
+        'encours': int(sum(montants)),
+        'arrieres_actuels': echus,
+        'delais': loi.resume(),
+        'semaines': [
+            {
+                'debut': (today + timedelta(weeks=s)).isoformat(),
+                'fin': (today + timedelta(weeks=s, days=6)).isoformat(),
+                'encaissements': _bande(*encaissements[s]),
+                'arrieres': _bande(*arrieres[s]),
+            }
+            for s in range(horizon)
+        ],
+        'total_encaissements': _bande(*total),
+    }
+
+
+def prevoir(ecole, *, today: Optional[date] = None, horizon: int = HORIZON_SEMAINES):
+    """Prévision de `calculer`, en cache par école, par jour et par horizon."""
+    today = today or timezone.localdate()
+    cle = f"previsions:{getattr(ecole, 'pk', ecole)}:{today.isoformat()}:{horizon}"
+    resultat = cache.get(cle)
+    if resultat is None:
+        resultat = calculer(ecole, today=today, horizon=horizon)
+        cache.set(cle, resultat, TIMEOUT)
+    return resultat
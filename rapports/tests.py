@@ -1,3 +1,98 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from eleves.models import Classe, Ecole, Eleve, Responsable
+from paiements.models import EcheancierPaiement, ModePaiement, Paiement, TypePaiement
+from rapports import previsions
+
+
+class PrevisionsTresorerieTests(TestCase):
+    AUJOURDHUI = date(2025, 3, 3)
+
+    def setUp(self):
+        cache.clear()
+        self.ecole = Ecole.objects.create(nom="Ecole A", adresse="A", telephone="+224620000001", directeur="Dir A")
+        classe = Classe.objects.create(nom="C1", ecole=self.ecole, niveau="PRIMAIRE_1", annee_scolaire="2024-2025")
+        responsable = Responsable.objects.create(prenom="P", nom="R", relation="PERE", telephone="+224620000011", adresse="Adr")
+        type_paiement = TypePaiement.objects.create(nom="Scolarité")
+        mode = ModePaiement.objects.create(nom="Espèces")
+        j = self.AUJOURDHUI
+        # T1 échue il y a 8 semaines (payée avec 1 semaine de retard par la moitié des élèves),
+        # T2 due dans 2 semaines, T3 dans 12 semaines (hors horizon)
+        for i in range(10):
+            eleve = Eleve.objects.create(
+                nom="Nom", prenom=str(i), matricule=f"P-{i}", classe=classe, sexe='M',
+                date_naissance=date(2015, 1, 1), lieu_naissance="Conakry", date_inscription=date(2024, 9, 1),
+                responsable_principal=responsable,
+            )
+            paye = i < 5
+            EcheancierPaiement.objects.create(
+                eleve=eleve, annee_scolaire="2024-2025",
+                frais_inscription_du=0, tranche_1_due=100000, tranche_2_due=100000, tranche_3_due=100000,
+                tranche_1_payee=100000 if paye else 0,
+                date_echeance_inscription=j - timedelta(weeks=20), date_echeance_tranche_1=j - timedelta(weeks=8),
+                date_echeance_tranche_2=j + timedelta(weeks=2), date_echeance_tranche_3=j + timedelta(weeks=12),
+            )
+            if paye:
+                Paiement.objects.create(
+                    eleve=eleve, type_paiement=type_paiement, mode_paiement=mode, montant=100000,
+                    statut='VALIDE', date_paiement=j - timedelta(weeks=7),
+                )
+
+    def test_loi_des_delais(self):
+        prevision = previsions.calculer(self.ecole, today=self.AUJOURDHUI)
+        self.assertEqual(prevision['delais']['observations'], 10)  # 5 payées + 5 censurées
+        self.assertEqual(prevision['encours'], 2_500_000)
+        self.assertEqual(prevision['arrieres_actuels'], 500_000)
+
+    def test_projection_et_bandes(self):
+        prevision = previsions.calculer(self.ecole, today=self.AUJOURDHUI)
+        semaines = prevision['semaines']
+        self.assertEqual(len(semaines), previsions.HORIZON_SEMAINES)
+        self.assertEqual(semaines[2]['debut'], (self.AUJOURDHUI + timedelta(weeks=2)).isoformat())
+        for semaine in semaines:
+            for cle in ('encaissements', 'arrieres'):
+                bande = semaine[cle]
+                self.assertLessEqual(bande['bas'], bande['attendu'])
+                self.assertLessEqual(bande['attendu'], bande['haut'])
+        # L'échéance de T2 en semaine 2 augmente les encaissements et les arriérés
+        self.assertGreater(semaines[2]['encaissements']['attendu'], semaines[1]['encaissements']['attendu'])
+        self.assertGreater(semaines[2]['arrieres']['attendu'], semaines[1]['arrieres']['attendu'])
+        self.assertLessEqual(semaines[0]['arrieres']['attendu'], 500_000)
+
+        # Agrégation par décalage == calcul tranche par tranche
+        loi = previsions.LoiDelais.estimer(
+            list(previsions._colonnes_echeanciers(self.ecole)), previsions._versements(self.ecole), self.AUJOURDHUI,
+        )
+        attendu = [0.0] * previsions.HORIZON_SEMAINES
+        for depart, delai, montant, nombre in ((0, 8, 100000, 5), (2, 0, 100000, 10)):
+            probas, _ = loi.paiements(depart, delai, previsions.HORIZON_SEMAINES)
+            for s, p in enumerate(probas):
+                attendu[s] += montant * nombre * p
+        self.assertEqual([s['encaissements']['attendu'] for s in semaines], [round(v) for v in attendu])
+        self.assertEqual(prevision['total_encaissements']['attendu'], round(sum(attendu)))
+
+    def test_cache_par_jour_et_json(self):
+        previsions.prevoir(self.ecole, today=self.AUJOURDHUI)
+        with self.assertNumQueries(0):
+            previsions.prevoir(self.ecole, today=self.AUJOURDHUI)
+
+        admin = get_user_model().objects.create_superuser(username="admin", password="pass12345")
+        self.client.force_login(admin)
+        url = reverse('rapports:previsions_tresorerie')
+        reponse = self.client.get(url, {'ecole': self.ecole.pk, 'format': 'json', 'horizon': 4})
+        self.assertEqual(reponse.status_code, 200)
+        donnees = reponse.json()
+        self.assertTrue(donnees['success'])
+        self.assertEqual(len(donnees['semaines']), 4)
 
-# Create your tests here.
+    def test_page_html(self):
+        admin = get_user_model().objects.create_superuser(username="admin", password="pass12345")
+        self.client.force_login(admin)
+        reponse = self.client.get(reverse('rapports:previsions_tresorerie'), {'ecole': self.ecole.pk})
+        self.assertContains(reponse, "Prévisions de trésorerie")
+        self.assertEqual(len(reponse.context['prevision']['semaines']), previsions.HORIZON_SEMAINES)
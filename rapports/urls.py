@@ -16,4 +16,5 @@ urlpatterns = [
     path('liste/', views.liste_rapports, name='liste_rapports'),
     path('remises/', views.rapport_remises_detaille, name='rapport_remises'),
     path('transport/', views.rapport_transport_scolaire, name='rapport_transport'),
+    path('previsions/', views.previsions_tresorerie, name='previsions_tresorerie'),
 ]
@@ -6,18 +6,13 @@ from decimal import Decimal
 from django.db.models import Sum, Count, Q
 from django.utils import timezone as django_timezone
 from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 
 from eleves.models import Eleve, Ecole
 from paiements.models import Paiement, EcheancierPaiement, PaiementRemise
 from depenses.models import Depense
 from salaires.models import Enseignant, EtatSalaire
 from utilisateurs.utils import user_is_admin, user_school
+from ecole_moderne.archives import selon_periode
 from django.contrib.staticfiles import finders
 from django.conf import settings
 
@@ -36,6 +31,7 @@ def _draw_header_and_watermark(c, doc):
     - Filigrane: logo agrandi (~500% largeur) centré, faible opacité si disponible
     - Entête: logo à gauche + nom de l'établissement
     """
+    from ecole_moderne.pdf import A4, colors
     width, height = A4
     logo_path = _get_logo_path()
 
@@ -94,6 +90,7 @@ def _draw_header_and_watermark(c, doc):
     finally:
         c.restoreState()
 
+@selon_periode
 def collecter_donnees_periode(debut, fin, type_periode, user=None):
     """Collecte les données pour une période donnée"""
     donnees = {
@@ -351,6 +348,10 @@ def collecter_donnees_periode(debut, fin, type_periode, user=None):
 
 def generer_pdf_periode(donnees, debut, fin, type_periode):
     """Génère le PDF pour un rapport de période"""
+    from ecole_moderne.pdf import (
+        A4, colors, getSampleStyleSheet, inch, Paragraph, ParagraphStyle, SimpleDocTemplate,
+        Spacer, Table, TableStyle,
+    )
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     styles = getSampleStyleSheet()
@@ -8,14 +8,9 @@ from django.utils import timezone as django_timezone
 from decimal import Decimal
 import json
 from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 
 from .models import Rapport, TypeRapport, ExportProgramme
+from . import previsions
 from .utils import collecter_donnees_periode, generer_pdf_periode, _draw_header_and_watermark
 from eleves.models import Eleve, Ecole
 from paiements.models import Paiement, PaiementRemise, EcheancierPaiement, TypePaiement
@@ -23,9 +18,9 @@ from bus.models import AbonnementBus
 from depenses.models import Depense
 from salaires.models import Enseignant, EtatSalaire
 from utilisateurs.utils import user_is_admin, user_school
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Font, PatternFill, Border, Side, numbers
-from openpyxl.utils import get_column_letter
+from ecole_moderne.exports import Colonne, Feuille, format_demande, reponse_export
+from ecole_moderne.archives import selon_periode
+from ecole_moderne.replica import lecture_replica
 
 # Décorateur d'accès admin uniquement
 admin_required = user_passes_test(user_is_admin)
@@ -48,6 +43,7 @@ def can_access_rapports(user):
 
 @login_required
 @admin_required
+@lecture_replica
 def tableau_bord(request):
     """Vue principale du module Rapports"""
     context = {
@@ -65,6 +61,7 @@ def tableau_bord(request):
 
 @login_required
 @admin_required
+@lecture_replica
 def generer_rapport_journalier(request):
     """Génère un rapport journalier automatique"""
     date_rapport = date.today()
@@ -99,6 +96,7 @@ def generer_rapport_journalier(request):
 
 @login_required
 @admin_required
+@lecture_replica
 def export_rapport_annuel_excel(request):
     """Export Excel du rapport annuel."""
     aujourd_hui = date.today()
@@ -112,14 +110,12 @@ def export_rapport_annuel_excel(request):
     fin_dt = django_timezone.make_aware(datetime.combine(fin_annee, datetime.max.time()))
 
     donnees = collecter_donnees_periode(debut_dt, fin_dt, 'ANNUEL', user=request.user)
-    wb = _build_excel_from_donnees(donnees, titre=f"Rapport Annuel - {debut_annee.year}")
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="rapport_annuel_{debut_annee.year}.xlsx"'
-    wb.save(response)
-    return response
+    return _export_rapport(request, donnees, f"Rapport Annuel - {debut_annee.year}",
+                           f"rapport_annuel_{debut_annee.year}")
 
 @login_required
 @admin_required
+@lecture_replica
 def export_rapport_mensuel_excel(request):
     """Export Excel du rapport mensuel."""
     aujourd_hui = date.today()
@@ -134,14 +130,12 @@ def export_rapport_mensuel_excel(request):
     fin_dt = django_timezone.make_aware(datetime.combine(fin_mois, datetime.max.time()))
 
     donnees = collecter_donnees_periode(debut_dt, fin_dt, 'MENSUEL', user=request.user)
-    wb = _build_excel_from_donnees(donnees, titre=f"Rapport Mensuel - {debut_mois.strftime('%B %Y')}")
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="rapport_mensuel_{debut_mois.strftime("%Y%m")}.xlsx"'
-    wb.save(response)
-    return response
+    return _export_rapport(request, donnees, f"Rapport Mensuel - {debut_mois.strftime('%B %Y')}",
+                           f"rapport_mensuel_{debut_mois.strftime('%Y%m')}")
 
 @login_required
 @admin_required
+@lecture_replica
 def export_rapport_hebdomadaire_excel(request):
     """Export Excel du rapport hebdomadaire (lundi-dimanche)."""
     aujourd_hui = date.today()
@@ -154,14 +148,12 @@ def export_rapport_hebdomadaire_excel(request):
     fin_dt = django_timezone.make_aware(datetime.combine(fin_semaine, datetime.max.time()))
 
     donnees = collecter_donnees_periode(debut_dt, fin_dt, 'HEBDOMADAIRE', user=request.user)
-    wb = _build_excel_from_donnees(donnees, titre=f"Rapport Hebdomadaire - {debut_semaine.strftime('%d/%m')} au {fin_semaine.strftime('%d/%m/%Y')}")
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="rapport_hebdomadaire_{debut_semaine.strftime("%Y%m%d")}.xlsx"'
-    wb.save(response)
-    return response
+    return _export_rapport(request, donnees, f"Rapport Hebdomadaire - {debut_semaine.strftime('%d/%m')} au {fin_semaine.strftime('%d/%m/%Y')}",
+                           f"rapport_hebdomadaire_{debut_semaine.strftime('%Y%m%d')}")
 
 @login_required
 @admin_required
+@lecture_replica
 def export_rapport_journalier_excel(request):
     """Export Excel du rapport journalier (mêmes données que le PDF)."""
     date_rapport = date.today()
@@ -169,15 +161,12 @@ def export_rapport_journalier_excel(request):
         date_rapport = datetime.strptime(request.GET.get('date'), '%Y-%m-%d').date()
 
     donnees = collecter_donnees_journalieres(date_rapport, user=request.user)
-    wb = _build_excel_from_donnees(donnees, titre=f"Rapport Journalier - {date_rapport.strftime('%d/%m/%Y')}")
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="rapport_journalier_{date_rapport.strftime("%Y%m%d")}.xlsx"'
-    wb.save(response)
-    return response
+    return _export_rapport(request, donnees, f"Rapport Journalier - {date_rapport.strftime('%d/%m/%Y')}",
+                           f"rapport_journalier_{date_rapport.strftime('%Y%m%d')}")
 
 @login_required
 @admin_required
+@lecture_replica
 def generer_rapport_hebdomadaire(request):
     """Génère un rapport hebdomadaire"""
     # Calcul de la semaine (lundi à dimanche)
@@ -217,6 +206,7 @@ def generer_rapport_hebdomadaire(request):
 
 @login_required
 @admin_required
+@lecture_replica
 def generer_rapport_mensuel(request):
     """Génère un rapport mensuel"""
     aujourd_hui = date.today()
@@ -257,6 +247,7 @@ def generer_rapport_mensuel(request):
 
 @login_required
 @admin_required
+@lecture_replica
 def generer_rapport_annuel(request):
     """Génère un rapport annuel"""
     aujourd_hui = date.today()
@@ -296,6 +287,7 @@ def generer_rapport_annuel(request):
 
 @login_required
 @admin_required
+@lecture_replica
 def liste_rapports(request):
     """Liste tous les rapports générés"""
     rapports = Rapport.objects.filter(
@@ -310,6 +302,7 @@ def liste_rapports(request):
 
 @login_required
 @admin_required
+@lecture_replica
 def rapport_transport_scolaire(request):
     """Tableau Transport scolaire par classe: Classe | Nombre d'abonnés | Total payé | Reste à payer
 
@@ -415,106 +408,56 @@ def get_or_create_type_rapport(nom):
     )
     return type_rapport
 
-def _build_excel_from_donnees(donnees, titre):
-    """Construit un classeur Excel à partir de la structure de données des rapports.
+def _feuilles_rapport(donnees, titre):
+    """Feuilles d'export à partir de la structure de données des rapports.
     Feuille 1: Synthèse par école.
     Feuille 2: Répartition par classe (toutes écoles).
     """
-    wb = Workbook()
-    ws1 = wb.active
-    ws1.title = 'Synthèse'
+    ecoles = list(donnees.get('ecoles', {}).values())
+
+    def paiements(cle):
+        return lambda e: e['paiements'].get(cle, 0) or 0
+
+    synthese = [
+        Colonne('École', 'nom', largeur=26),
+        Colonne('Nouveaux élèves', lambda e: e.get('nouveaux_eleves', 0), format='entier', largeur=16),
+        Colonne('Nb paiements', paiements('nombre'), format='entier', largeur=14),
+        Colonne('Scolarité normale', paiements('total_du_concernes'), format='montant', largeur=18),
+        Colonne("Scolarité payée", paiements('scolarite'), format='montant', largeur=18),
+        Colonne("Frais d'inscription", paiements('frais_inscription'), format='montant', largeur=18),
+        Colonne('Reste à payer', paiements('reste_a_payer'), format='montant', largeur=16),
+        Colonne('Montant original', paiements('montant_original'), format='montant', largeur=18),
+        Colonne('Remises', paiements('total_remises'), format='montant', largeur=16),
+        Colonne('Net encaissé', paiements('montant_total'), format='montant', largeur=16),
+        Colonne('Nb dépenses', lambda e: e['depenses'].get('nombre', 0), format='entier', largeur=14),
+        Colonne('Total dépenses', lambda e: e['depenses'].get('montant_total', 0) or 0, format='montant', largeur=16),
+        Colonne('États salaires', lambda e: e['salaires'].get('etats_valides', 0), format='entier', largeur=14),
+        Colonne('Total salaires', lambda e: e['salaires'].get('montant_total', 0) or 0, format='montant', largeur=16),
+    ]
+    par_classe = [
+        Colonne('École', 'ecole', largeur=22),
+        Colonne('Classe', 'classe', largeur=18),
+        Colonne('Effectif', 'effectif', format='entier', largeur=12),
+        Colonne('Total dû', 'total_du', format='montant', largeur=16),
+        Colonne('Total payé', 'total_paye', format='montant', largeur=16),
+        Colonne('Remises', 'remises', format='montant', largeur=16),
+        Colonne('Reste à payer', 'reste', format='montant', largeur=16),
+    ]
+    classes = (
+        dict(c, ecole=e.get('nom', ''))
+        for e in ecoles for c in (e.get('classes', []) or [])
+    )
+    return [
+        Feuille('Synthèse', synthese, ecoles, intitule=titre, couleur_entete='0D47A1'),
+        Feuille('Par classe', par_classe, classes, couleur_entete='0D47A1'),
+    ]
 
-    header_fill = PatternFill(start_color='0D47A1', end_color='0D47A1', fill_type='solid')
-    header_font = Font(color='FFFFFF', bold=True)
-    thin = Side(style='thin', color='DDDDDD')
-    border_all = Border(left=thin, right=thin, top=thin, bottom=thin)
 
-    # Titre
-    ws1.append([titre])
-    ws1.merge_cells(start_row=1, start_column=1, end_row=1, end_column=8)
-    ws1['A1'].font = Font(bold=True, size=14)
-    ws1['A1'].alignment = Alignment(horizontal='center')
-
-    headers1 = [
-        'École', 'Nouveaux élèves', 'Nb paiements', 'Scolarité normale', "Scolarité payée",
-        "Frais d'inscription", 'Reste à payer', 'Montant original', 'Remises', 'Net encaissé',
-        'Nb dépenses', 'Total dépenses', 'États salaires', 'Total salaires'
-    ]
-    ws1.append(headers1)
-    for col in range(1, len(headers1) + 1):
-        c = ws1.cell(row=2, column=col)
-        c.fill = header_fill
-        c.font = header_font
-        c.alignment = Alignment(horizontal='center')
-        c.border = border_all
-
-    row = 3
-    for _, e in donnees.get('ecoles', {}).items():
-        vals = [
-            e.get('nom', ''),
-            e.get('nouveaux_eleves', 0),
-            e['paiements'].get('nombre', 0),
-            float(e['paiements'].get('total_du_concernes', 0) or 0),
-            float(e['paiements'].get('scolarite', 0) or 0),
-            float(e['paiements'].get('frais_inscription', 0) or 0),
-            float(e['paiements'].get('reste_a_payer', 0) or 0),
-            float(e['paiements'].get('montant_original', 0) or 0),
-            float(e['paiements'].get('total_remises', 0) or 0),
-            float(e['paiements'].get('montant_total', 0) or 0),
-            e['depenses'].get('nombre', 0),
-            float(donnees.get('depenses_globales', {}).get('montant_total', 0) or 0) if False else float(e['depenses'].get('montant_total', 0) or 0),
-            e['salaires'].get('etats_valides', 0),
-            float(e['salaires'].get('montant_total', 0) or 0),
-        ]
-        ws1.append(vals)
-        for col in range(1, len(headers1) + 1):
-            cell = ws1.cell(row=row, column=col)
-            cell.border = border_all
-            if col >= 4 and col != 11 and col != 13:  # colonnes montants
-                cell.number_format = numbers.FORMAT_NUMBER_COMMA_SEPARATED1
-        row += 1
-
-    # Largeurs
-    widths = [26, 16, 14, 18, 18, 18, 16, 18, 16, 16, 14, 16, 14, 16]
-    for i, w in enumerate(widths, start=1):
-        ws1.column_dimensions[get_column_letter(i)].width = w
-
-    # Feuille 2: par classe
-    ws2 = wb.create_sheet('Par classe')
-    headers2 = ['École', 'Classe', 'Effectif', 'Total dû', 'Total payé', 'Remises', 'Reste à payer']
-    ws2.append(headers2)
-    for col in range(1, len(headers2) + 1):
-        c = ws2.cell(row=1, column=col)
-        c.fill = header_fill
-        c.font = header_font
-        c.alignment = Alignment(horizontal='center')
-        c.border = border_all
-
-    r = 2
-    for _, e in donnees.get('ecoles', {}).items():
-        ecole_nom = e.get('nom', '')
-        for c in e.get('classes', []) or []:
-            ws2.append([
-                ecole_nom,
-                c.get('classe', ''),
-                c.get('effectif', 0),
-                float(c.get('total_du', 0) or 0),
-                float(c.get('total_paye', 0) or 0),
-                float(c.get('remises', 0) or 0),
-                float(c.get('reste', 0) or 0),
-            ])
-            for col in range(1, len(headers2) + 1):
-                cell = ws2.cell(row=r, column=col)
-                cell.border = border_all
-                if col >= 4:
-                    cell.number_format = numbers.FORMAT_NUMBER_COMMA_SEPARATED1
-            r += 1
-
-    for i, w in enumerate([22, 18, 12, 16, 16, 16, 16], start=1):
-        ws2.column_dimensions[get_column_letter(i)].width = w
-
-    return wb
+def _export_rapport(request, donnees, titre, nom_fichier):
+    return reponse_export(_feuilles_rapport(donnees, titre), nom_fichier=nom_fichier, format=format_demande(request))
 
+
+@selon_periode
 def collecter_donnees_journalieres(date_rapport, user=None):
     """Collecte toutes les données importantes pour le rapport journalier"""
     donnees = {
@@ -781,10 +724,14 @@ def collecter_donnees_journalieres(date_rapport, user=None):
 
 def generer_pdf_journalier(donnees, date_rapport):
     """Génère le PDF du rapport journalier"""
+    from ecole_moderne.pdf import (
+        A4, colors, getSampleStyleSheet, inch, Paragraph, ParagraphStyle, SimpleDocTemplate,
+        Spacer, Table, TableStyle,
+    )
     buffer = BytesIO()
     
     # Créer le canvas pour ajouter le filigrane
-    from reportlab.pdfgen import canvas as pdf_canvas
+    from ecole_moderne.pdf import canvas as pdf_canvas
     
     class WatermarkDocTemplate(SimpleDocTemplate):
         def __init__(self, *args, **kwargs):
@@ -807,7 +754,7 @@ def generer_pdf_journalier(donnees, date_rapport):
         from django.contrib.staticfiles import finders
         logo_path = finders.find('logos/logo.png')
         if logo_path:
-            from reportlab.platypus import Image
+            from ecole_moderne.pdf import Image
             logo = Image(logo_path, width=60, height=60)
             story.append(logo)
             story.append(Spacer(1, 10))
@@ -949,6 +896,7 @@ def generer_pdf_journalier(donnees, date_rapport):
 
 @login_required
 @user_passes_test(can_access_rapports)
+@lecture_replica
 def rapport_remises_detaille(request):
     """Rapport détaillé des remises appliquées"""
     date_debut = request.GET.get('date_debut')
@@ -1010,3 +958,37 @@ def rapport_remises_detaille(request):
     }
     
     return render(request, 'rapports/rapport_remises.html', context)
+
+
+@login_required
+@user_passes_test(can_access_rapports)
+@lecture_replica
+def previsions_tresorerie(request):
+    """Encaissements et arriérés attendus des prochaines semaines, avec bande de confiance.
+
+    `?format=json` renvoie la prévision brute; `?horizon=` (1 à 26 semaines, 8 par défaut);
+    `?ecole=` pour un superutilisateur sans école sélectionnée.
+    """
+    ecole = getattr(request, 'ecole_courante', None) or user_school(request.user)
+    if request.user.is_superuser and request.GET.get('ecole'):
+        ecole = get_object_or_404(Ecole, pk=request.GET['ecole'])
+    try:
+        horizon = min(max(int(request.GET.get('horizon') or previsions.HORIZON_SEMAINES), 1),
+                      previsions.MAX_DELAI_SEMAINES)
+    except ValueError:
+        horizon = previsions.HORIZON_SEMAINES
+    if ecole is None:
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'success': False, 'error': "Aucune école sélectionnée."}, status=400)
+        return render(request, 'rapports/previsions_tresorerie.html', {'prevision': None})
+
+    prevision = previsions.prevoir(ecole, horizon=horizon)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'success': True, 'ecole': ecole.nom, **prevision})
+    context = {
+        'ecole': ecole,
+        'prevision': prevision,
+        'horizon': horizon,
+        'pourcentage_confiance': round(prevision['niveau_confiance'] * 100),
+    }
+    return render(request, 'rapports/previsions_tresorerie.html', context)
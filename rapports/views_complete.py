@@ -7,12 +7,6 @@ from datetime import datetime, timedelta, date
 from decimal import Decimal
 import json
 from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 
 from .models import Rapport, TypeRapport, ExportProgramme
 from .utils import collecter_donnees_periode, generer_pdf_periode
@@ -279,6 +273,10 @@ def collecter_donnees_journalieres(date_rapport):
 
 def generer_pdf_journalier(donnees, date_rapport):
     """Génère le PDF du rapport journalier"""
+    from ecole_moderne.pdf import (
+        A4, colors, getSampleStyleSheet, inch, Paragraph, ParagraphStyle, SimpleDocTemplate,
+        Spacer, Table, TableStyle,
+    )
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     styles = getSampleStyleSheet()
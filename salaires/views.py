@@ -12,11 +12,6 @@ import os
 from django.conf import settings
 
 # ReportLab for PDF exports
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
 
 from .models import (
     Enseignant, AffectationClasse, PeriodeSalaire, 
@@ -27,6 +22,8 @@ from eleves.models import Ecole, Classe
 from utilisateurs.utils import user_is_admin, user_school
 from utilisateurs.permissions import can_add_teachers
 from ecole_moderne.security_decorators import delete_permission_required, require_school_object
+from ecole_moderne.exports import Colonne, exporter, format_demande
+from ecole_moderne.replica import lecture_replica
 
 def _ecole_utilisateur(request):
     """Compat: utiliser l'utilitaire centralisé"""
@@ -196,6 +193,7 @@ def liste_enseignants(request):
 
 
 @login_required
+@lecture_replica
 def export_enseignants_csv(request):
     """Export CSV de la liste des enseignants en respectant les filtres"""
     search = request.GET.get('search', '')
@@ -221,34 +219,30 @@ def export_enseignants_csv(request):
     if statut:
         enseignants = enseignants.filter(statut=statut)
 
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = 'attachment; filename="enseignants.csv"'
-    writer = csv.writer(response)
-    writer.writerow([
-        'Ecole', 'Nom', 'Prénoms', 'Email', 'Téléphone', 'Type', 'Statut',
-        'Salaire Fixe', 'Taux Horaire', 'Heures Mensuelles'
-    ])
-
-    for ens in enseignants.order_by('ecole__nom', 'nom'):
-        writer.writerow([
-            getattr(ens.ecole, 'nom', ''),
-            ens.nom,
-            ens.prenoms,
-            ens.email or '',
-            getattr(ens, 'telephone', ''),
-            ens.type_enseignant,
-            ens.statut,
-            ens.salaire_fixe or '',
-            ens.taux_horaire or '',
-            ens.heures_mensuelles or ''
-        ])
-
-    return response
+    colonnes = [
+        Colonne('Ecole', 'ecole.nom'),
+        Colonne('Nom', 'nom'),
+        Colonne('Prénoms', 'prenoms'),
+        Colonne('Email', 'email'),
+        Colonne('Téléphone', 'telephone'),
+        Colonne('Type', 'type_enseignant'),
+        Colonne('Statut', 'statut'),
+        Colonne('Salaire Fixe', 'salaire_fixe', format='montant'),
+        Colonne('Taux Horaire', 'taux_horaire', format='montant'),
+        Colonne('Heures Mensuelles', 'heures_mensuelles', format='decimal'),
+    ]
+    return exporter(request, enseignants.order_by('ecole__nom', 'nom'), colonnes, nom_fichier='enseignants',
+                    titre_feuille='Enseignants', separateur=',', format=format_demande(request, defaut='csv'))
 
 
 @login_required
+@lecture_replica
 def export_enseignants_pdf(request):
     """Export PDF de la liste des enseignants en respectant les mêmes filtres que la vue liste et CSV."""
+    from ecole_moderne.pdf import (
+        A4, cm, colors, getSampleStyleSheet, landscape, Paragraph, ParagraphStyle,
+        SimpleDocTemplate, Spacer, Table, TableStyle,
+    )
     # Filtres
     search = request.GET.get('search', '')
     ecole_id = request.GET.get('ecole', '')
@@ -659,6 +653,7 @@ def etats_salaire(request):
     return render(request, 'salaires/etats_salaire.html', context)
 
 @login_required
+@lecture_replica
 def export_etats_salaire_csv(request):
     """Export CSV des états de salaire en respectant exactement les filtres de la vue liste."""
     # Filtres identiques à etats_salaire()
@@ -719,8 +714,13 @@ def export_etats_salaire_csv(request):
     return response
 
 @login_required
+@lecture_replica
 def export_etats_salaire_pdf(request):
     """Export PDF des états de salaire avec les mêmes filtres, en-tête logo et filigrane."""
+    from ecole_moderne.pdf import (
+        A4, cm, colors, getSampleStyleSheet, landscape, Paragraph, SimpleDocTemplate,
+        Spacer, Table, TableStyle,
+    )
     # Filtres
     periode_id = request.GET.get('periode', '')
     ecole_id = request.GET.get('ecole', '')
@@ -990,11 +990,7 @@ def marquer_paye(request, etat_id):
 @login_required
 def fiche_paie_pdf(request, etat_id):
     """Génère une fiche de paie PDF pour un état de salaire"""
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.units import cm
-    from reportlab.lib import colors
-    from reportlab.platypus import Table, TableStyle
+    from ecole_moderne.pdf import A4, canvas, cm, colors, Table, TableStyle
     from django.http import HttpResponse
     from datetime import datetime
     
@@ -1329,8 +1325,13 @@ def rapport_paiements(request):
 
 
 @login_required
+@lecture_replica
 def export_rapport_paiements_pdf(request):
     """Export PDF du rapport des salaires payés (paysage)."""
+    from ecole_moderne.pdf import (
+        A4, cm, colors, getSampleStyleSheet, Image, landscape, Paragraph, SimpleDocTemplate,
+        Spacer, Table, TableStyle,
+    )
     ecole_user = _ecole_utilisateur(request)
     restreindre = not user_is_admin(request.user) and ecole_user is not None
 
@@ -1376,7 +1377,7 @@ def export_rapport_paiements_pdf(request):
         from django.contrib.staticfiles import finders
         logo_path = finders.find('logos/logo.png')
         if logo_path:
-            from reportlab.platypus import Image
+            from ecole_moderne.pdf import Image
             logo = Image(logo_path, width=60, height=60)
             elements.append(logo)
             elements.append(Spacer(1, 10))
@@ -1,9 +1,15 @@
+from django.utils.functional import SimpleLazyObject
+
+from ecole_moderne.fragments import cle_navigation, permissions_en_cache
 from .models import Profil
 from .permissions import get_user_permissions, check_comptable_restrictions
 
 def user_context(request):
     """
     Ajoute des informations utilisateur au contexte global
+
+    Les dictionnaires de permissions sont mémoïsés (voir ecole_moderne.fragments) et
+    `nav_cache_key` sert de clé de variation aux fragments de navigation en cache.
     """
     context = {
         'user_profil': None,
@@ -13,22 +19,29 @@ def user_context(request):
         'user_permissions': {},
         'user_restrictions': {},
     }
-    
+    ecole_id = None
+
     if request.user.is_authenticated:
         try:
             profil = request.user.profil
+            ecole_id = profil.ecole_id
             context.update({
                 'user_profil': profil,
                 'user_role': profil.role,
-                'user_ecole': profil.ecole,
+                'user_ecole': SimpleLazyObject(lambda: profil.ecole),
                 'is_admin': request.user.is_superuser or profil.role == 'ADMIN',
-                'user_permissions': get_user_permissions(request.user),
-                'user_restrictions': check_comptable_restrictions(request.user),
+                'user_permissions': permissions_en_cache(request.user, get_user_permissions),
+                'user_restrictions': permissions_en_cache(request.user, check_comptable_restrictions),
             })
         except Profil.DoesNotExist:
             context.update({
                 'user_permissions': get_user_permissions(request.user),
                 'user_restrictions': check_comptable_restrictions(request.user),
             })
-    
+
+    ecole_courante = getattr(request, 'ecole_courante', None)
+    context['nav_cache_key'] = cle_navigation(
+        request.user, context['user_role'], context['user_permissions'],
+        ecole_courante.id if ecole_courante else ecole_id,
+    )
     return context
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from ecole_moderne.archives import etiqueter_par_dates
+
+
+def etiqueter(apps, schema_editor):
+    etiqueter_par_dates(apps.get_model('utilisateurs', 'JournalActivite').objects.all(), 'date_action')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utilisateurs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalactivite',
+            name='annee_scolaire',
+            field=models.CharField(blank=True, db_index=True, max_length=9, null=True, verbose_name='Année scolaire'),
+        ),
+        migrations.CreateModel(
+            name='ClotureAnnee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee_scolaire', models.CharField(max_length=9, unique=True, verbose_name='Année scolaire clôturée')),
+                ('etape', models.CharField(choices=[('ETIQUETAGE', 'Étiquetage des années scolaires'), ('REFERENTIEL', 'Copie du référentiel vers les archives'), ('PASSAGE', "Passage à l'année suivante"), ('ARCHIVAGE', 'Archivage des années anciennes'), ('TERMINEE', 'Terminée')], default='ETIQUETAGE', max_length=20, verbose_name='Prochaine étape')),
+                ('compteurs', models.JSONField(blank=True, default=dict, verbose_name='Lignes traitées par étape')),
+                ('date_debut', models.DateTimeField(auto_now_add=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('lance_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': "Clôture d'année scolaire",
+                'verbose_name_plural': "Clôtures d'années scolaires",
+                'ordering': ['-annee_scolaire'],
+            },
+        ),
+        migrations.RunPython(etiqueter, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from django.utils import timezone
 from eleves.models import Ecole
+from ecole_moderne.archives import annee_scolaire_de, invalider_limite
+from ecole_moderne.fragments import invalider_navigation
 
 class Profil(models.Model):
     """Modèle pour étendre le profil utilisateur"""
@@ -55,6 +58,16 @@ class Profil(models.Model):
     
     def __str__(self):
         return f"{self.user.get_full_name()} ({self.get_role_display()})"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Rôle, école et permissions déterminent les menus et permissions en cache
+        invalider_navigation()
+
+    def delete(self, *args, **kwargs):
+        resultat = super().delete(*args, **kwargs)
+        invalider_navigation()
+        return resultat
     
     @property
     def nom_complet(self):
@@ -113,12 +126,18 @@ class JournalActivite(models.Model):
     user_agent = models.TextField(blank=True, null=True, verbose_name="User Agent")
     
     date_action = models.DateTimeField(auto_now_add=True, verbose_name="Date de l'action")
+    annee_scolaire = models.CharField(max_length=9, blank=True, null=True, db_index=True, verbose_name="Année scolaire")
     
     class Meta:
         verbose_name = "Journal d'activité"
         verbose_name_plural = "Journal des activités"
         ordering = ['-date_action']
     
+    def save(self, *args, **kwargs):
+        if not self.annee_scolaire:
+            self.annee_scolaire = annee_scolaire_de(self.date_action or timezone.now())
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username} - {self.get_action_display()} {self.get_type_objet_display()} ({self.date_action.strftime('%d/%m/%Y %H:%M')})"
 
@@ -169,3 +188,34 @@ class ParametreSysteme(models.Model):
         else:
             return self.valeur
 
+
+class ClotureAnnee(models.Model):
+    """Suivi d'une clôture d'année scolaire (`manage.py cloturer_annee`), pour reprendre
+    une clôture interrompue à l'étape où elle s'est arrêtée."""
+    ETAPE_CHOICES = [
+        ('ETIQUETAGE', 'Étiquetage des années scolaires'),
+        ('REFERENTIEL', 'Copie du référentiel vers les archives'),
+        ('PASSAGE', "Passage à l'année suivante"),
+        ('ARCHIVAGE', 'Archivage des années anciennes'),
+        ('TERMINEE', 'Terminée'),
+    ]
+
+    annee_scolaire = models.CharField(max_length=9, unique=True, verbose_name="Année scolaire clôturée")
+    etape = models.CharField(max_length=20, choices=ETAPE_CHOICES, default='ETIQUETAGE', verbose_name="Prochaine étape")
+    compteurs = models.JSONField(default=dict, blank=True, verbose_name="Lignes traitées par étape")
+    date_debut = models.DateTimeField(auto_now_add=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+    lance_par = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Clôture d'année scolaire"
+        verbose_name_plural = "Clôtures d'années scolaires"
+        ordering = ['-annee_scolaire']
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # L'année la plus ancienne gardée sur la base principale a peut-être changé
+        invalider_limite()
+
+    def __str__(self):
+        return f"Clôture {self.annee_scolaire} - {self.get_etape_display()}"
@@ -13,6 +13,7 @@ import logging
 from .models import Profil
 from .permissions import can_manage_users, get_user_permissions, check_comptable_restrictions
 from .utils import user_is_admin
+from ecole_moderne.replica import lecture_replica
 
 logger = logging.getLogger(__name__)
 
@@ -288,6 +289,7 @@ def ajax_user_permissions(request):
 
 @login_required
 @can_manage_users
+@lecture_replica
 def export_permissions_csv(request):
     """
     Exporter les permissions des comptables en CSV